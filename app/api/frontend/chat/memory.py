@@ -45,7 +45,8 @@ async def create_agent_memory(
                 max_items=memory_data.config.max_items,
                 retrieval_strategy=memory_data.config.retrieval_strategy,
                 storage_backend=memory_data.config.storage_backend,
-                vector_backend=memory_data.config.vector_backend
+                vector_backend=memory_data.config.vector_backend,
+                time_decay_half_life=memory_data.config.time_decay_half_life
             )
             
         memory_content = memory_data.content if memory_data else None
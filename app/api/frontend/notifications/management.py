@@ -19,6 +19,8 @@ from app.api.frontend.dependencies import (
 )
 from app.api.shared.responses import InternalResponseFormatter
 from app.api.shared.validators import ValidatorFactory
+from app.config import settings
+from app.messaging.core.fanout import FanoutHub, create_pubsub_bus
 
 logger = logging.getLogger(__name__)
 
@@ -707,48 +709,38 @@ async def update_notification_settings(
 # 实时通知WebSocket接口
 # ================================
 
-class NotificationConnectionManager:
-    """通知连接管理器"""
+class NotificationConnectionManager(FanoutHub):
+    """通知连接管理器
+    
+    基于FanoutHub：通知只序列化一次，经发布订阅总线送达所有工作进程的连接，
+    每个连接使用独立的有界发送队列
+    """
     
     def __init__(self):
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+        super().__init__(
+            bus=create_pubsub_bus(getattr(settings, "NOTIFICATION_PUBSUB_BACKEND", "redis")),
+            channel="notifications:fanout",
+            queue_size=getattr(settings, "NOTIFICATION_WS_QUEUE_SIZE", 256)
+        )
     
     async def connect(self, websocket: WebSocket, user_id: int):
         """建立连接"""
-        await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
+        await super().connect(websocket, user_id)
         logger.info(f"用户 {user_id} 建立通知WebSocket连接")
     
     def disconnect(self, websocket: WebSocket, user_id: int):
         """断开连接"""
-        if user_id in self.active_connections:
-            try:
-                self.active_connections[user_id].remove(websocket)
-                if not self.active_connections[user_id]:
-                    del self.active_connections[user_id]
-                logger.info(f"用户 {user_id} 断开通知WebSocket连接")
-            except ValueError:
-                pass
+        if websocket in self.connections.get(str(user_id), {}):
+            super().disconnect(websocket, user_id)
+            logger.info(f"用户 {user_id} 断开通知WebSocket连接")
     
     async def send_personal_notification(self, user_id: int, notification: Dict[str, Any]):
         """发送个人通知"""
-        if user_id in self.active_connections:
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_text(json.dumps(notification))
-                except Exception as e:
-                    logger.error(f"发送通知失败: user_id={user_id}, error={str(e)}")
+        await self.send_to_user(user_id, notification)
     
     async def send_broadcast_notification(self, notification: Dict[str, Any]):
         """发送广播通知"""
-        for user_id, connections in self.active_connections.items():
-            for connection in connections:
-                try:
-                    await connection.send_text(json.dumps(notification))
-                except Exception as e:
-                    logger.error(f"发送广播通知失败: user_id={user_id}, error={str(e)}")
+        await self.broadcast(notification)
 
 
 # 全局连接管理器
@@ -773,13 +765,13 @@ async def notification_websocket(
         await notification_manager.connect(websocket, user_id)
         
         # 发送连接确认消息
-        await websocket.send_text(json.dumps({
+        notification_manager.send_local(websocket, user_id, {
             "type": "connection_established",
             "message": "通知连接已建立",
             "timestamp": datetime.now().isoformat()
-        }))
+        })
         
-        # 保持连接并处理客户端消息
+        # 保持连接并处理客户端消息，回复也经由连接的发送队列，避免与推送并发写同一连接
         try:
             while True:
                 data = await websocket.receive_text()
@@ -787,18 +779,18 @@ async def notification_websocket(
                 
                 # 处理客户端消息
                 if message.get("type") == "ping":
-                    await websocket.send_text(json.dumps({
+                    notification_manager.send_local(websocket, user_id, {
                         "type": "pong",
                         "timestamp": datetime.now().isoformat()
-                    }))
+                    })
                 elif message.get("type") == "subscribe":
                     # 处理订阅特定类型的通知
                     categories = message.get("categories", [])
-                    await websocket.send_text(json.dumps({
+                    notification_manager.send_local(websocket, user_id, {
                         "type": "subscribed",
                         "categories": categories,
                         "timestamp": datetime.now().isoformat()
-                    }))
+                    })
                 
         except WebSocketDisconnect:
             notification_manager.disconnect(websocket, user_id)
@@ -4,10 +4,11 @@
 
 from fastapi import APIRouter
 
-from app.api.frontend.system import settings
+from app.api.frontend.system import settings, metrics
 
 # 创建系统模块路由
 router = APIRouter()
 
 # 注册子路由
 router.include_router(settings.router, prefix="/settings", tags=["系统设置"])
+router.include_router(metrics.router, tags=["系统指标"])
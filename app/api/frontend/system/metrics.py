@@ -0,0 +1,28 @@
+"""
+系统指标 - 前端路由模块
+按Prometheus文本格式暴露进程内收集的指标，供Prometheus直接抓取
+"""
+
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import PlainTextResponse
+
+from app.utils.monitoring.core.metrics import get_metrics_collector
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """
+    获取Prometheus格式的指标
+    """
+    try:
+        body = get_metrics_collector().render_prometheus()
+        return PlainTextResponse(content=body, media_type=PROMETHEUS_CONTENT_TYPE)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取系统指标失败: {str(e)}"
+        )
@@ -406,7 +406,7 @@ async def create_document(
         mime_type=mime_type,
         file_size=file_size,
         status="pending",
-        metadata=parsed_metadata
+        meta_data=parsed_metadata
     )
     
     db.add(db_document)
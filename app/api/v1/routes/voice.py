@@ -13,6 +13,7 @@ import io
 from app.models.database import get_db
 from app.api.v1.dependencies import ResponseFormatter, get_request_context
 from app.messaging.core.models import VoiceMessage
+from app.services.chat.voice_service import VoiceService
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -79,6 +80,25 @@ async def text_to_speech(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"文本转语音处理出错: {str(e)}")
 
 
+@router.post("/text-to-speech/stream")
+async def text_to_speech_stream(
+    text: str = Form(...),
+    config_id: str = Form(...),
+    request_context = Depends(get_request_context),
+    voice_service: VoiceService = Depends()
+):
+    """
+    流式文本转语音API
+    使用指定的语音配置边合成边返回音频，相同文本和配置的结果从缓存返回
+    """
+    user_id = request_context.user_id
+    if not user_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="未认证的请求")
+    
+    audio_stream = await voice_service.text_to_speech_stream(text, config_id, user_id)
+    return StreamingResponse(audio_stream, media_type="application/octet-stream")
+
+
 @router.get("/voices")
 async def list_voices(db: Session = Depends(get_db)):
     """
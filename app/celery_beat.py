@@ -101,6 +101,7 @@ celery_app.conf.task_routes = {
     # 默认队列
     'process_document': {'queue': 'default'},
     'rebuild_vector_store': {'queue': 'default'},
+    'rebuild_vector_batch': {'queue': 'default'},
     'generate_assistant_response': {'queue': 'default'},
 }
 
@@ -326,6 +326,7 @@ class Settings(BaseSettings):
     # 实时功能
     REAL_TIME_NOTIFICATIONS_ENABLED: bool = Field(default=True, description="实时通知启用状态")
     WEBSOCKET_ENABLED: bool = Field(default=True, description="WebSocket启用状态")
+    MESSAGE_STREAM_MAX_QUEUE: int = Field(default=1024, description="后台生产的消息流待发送队列上限")
     
     # 数据导出功能
     DATA_EXPORT_ENABLED: bool = Field(default=True, description="数据导出启用状态")
@@ -8,6 +8,7 @@ import logging
 from pathlib import Path
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 # 检查是否有LightRAG本地库
 try:
@@ -22,7 +23,7 @@ from app.frameworks.lightrag.config import lightrag_config
 
 # 本地模式组件
 from app.frameworks.lightrag.graph import get_graph_manager
-from app.frameworks.lightrag.document_processor import get_document_processor
+from app.frameworks.lightrag.document_processor import get_document_processor, get_ingest_semaphore
 from app.frameworks.lightrag.query_engine import create_lightrag_query_engine
 
 # Docker服务模式组件
@@ -222,40 +223,60 @@ class LightRAGClient:
             self.docker_service.ensure_workdir_exists(graph_id)
             task_results = []
             
-            # 逐个处理文档
-            for doc in documents:
-                # 根据文档类型处理
-                if "text" in doc:
-                    # 文本内容
-                    result = self.docker_service.process_document(
-                        content=doc["text"],
-                        is_file=False,
-                        workdir_id=graph_id,
-                        description=doc.get("metadata", {}).get("description", None)
-                    )
-                elif "file_path" in doc:
+            # 并发处理文档，同一工作目录的并发数受限
+            concurrency = max(1, getattr(settings, "LIGHTRAG_INGEST_CONCURRENCY", 4))
+            semaphore = get_ingest_semaphore(graph_id, concurrency)
+            
+            def process_one(doc: Dict[str, Any]) -> Dict[str, Any]:
+                description = doc.get("metadata", {}).get("description", None)
+                if "text" not in doc and "file_path" not in doc:
+                    raise ValueError("LightRAG文档格式不支持，需要text或file_path")
+                with semaphore:
+                    # 根据文档类型处理
+                    if "text" in doc:
+                        # 文本内容
+                        return self.docker_service.process_document(
+                            content=doc["text"],
+                            is_file=False,
+                            workdir_id=graph_id,
+                            description=description
+                        )
                     # 文件路径
-                    result = self.docker_service.process_document(
+                    return self.docker_service.process_document(
                         content="",
                         is_file=True,
                         file_path=doc["file_path"],
                         workdir_id=graph_id,
-                        description=doc.get("metadata", {}).get("description", None)
+                        description=description
                     )
-                else:
-                    logger.warning(f"LightRAG文档格式不支持: {doc}")
-                    continue
+            
+            errors = []
+            with ThreadPoolExecutor(max_workers=min(concurrency, max(len(documents), 1))) as executor:
+                futures = [executor.submit(process_one, doc) for doc in documents]
+                # 按输入顺序收集结果，单个文档失败记录为该文档的错误结果
+                for index, (doc, future) in enumerate(zip(documents, futures)):
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        logger.error(f"LightRAG处理第 {index} 个文档失败: {str(e)}")
+                        result = {"success": False, "error": str(e)}
+                    if not result.get("success", False):
+                        errors.append({"index": index, "error": result.get("error", "处理失败")})
                     
-                task_results.append(result)
-                
-                # 回调处理
-                if callback and callable(callback):
-                    callback({
-                        "status": "processing",
-                        "current": len(task_results),
-                        "total": len(documents),
-                        "document": doc
-                    })
+                    task_results.append(result)
+                    
+                    # 回调处理
+                    if callback and callable(callback):
+                        callback({
+                            "status": "processing",
+                            "current": len(task_results),
+                            "total": len(documents),
+                            "document": doc,
+                            "result": result
+                        })
+            
+            if errors:
+                logger.warning(f"LightRAG导入工作目录 {graph_id} 时 {len(errors)}/{len(documents)} 个文档失败")
             
             # 处理完成后回调
             if callback and callable(callback):
@@ -263,7 +284,10 @@ class LightRAGClient:
                     "status": "completed",
                     "current": len(task_results),
                     "total": len(documents),
-                    "success_count": sum(1 for r in task_results if r.get("success", False))
+                    "success_count": len(task_results) - len(errors),
+                    "failed_count": len(errors),
+                    "errors": errors,
+                    "results": task_results
                 })
                 
             # 返回任务标识
@@ -8,6 +8,7 @@ import logging
 import time
 from pathlib import Path
 import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor
 
 # 尝试导入LightRAG依赖
@@ -37,6 +38,21 @@ ProgressCallback = Callable[[str, str, float, Optional[Dict[str, Any]]], None]
 def null_callback(task_id: str, status: str, progress: float, info: Optional[Dict[str, Any]] = None) -> None:
     pass
 
+# 工作目录 -> 导入并发信号量，同一工作目录的多次导入（本地和Docker模式）共享并发上限
+_ingest_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_ingest_semaphores_lock = threading.Lock()
+
+
+def get_ingest_semaphore(graph_id: str, limit: int) -> threading.BoundedSemaphore:
+    """获取工作目录的导入并发信号量"""
+    with _ingest_semaphores_lock:
+        semaphore = _ingest_semaphores.get(graph_id)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(limit)
+            _ingest_semaphores[graph_id] = semaphore
+        return semaphore
+
+
 class DocumentProcessor:
     """文档处理器，处理文档并构建知识图谱"""
     
@@ -214,17 +230,35 @@ class DocumentProcessor:
             # 更新进度
             callback(task_id, "processing", 0.3, {"converted_documents": len(light_documents)})
             
-            # 处理文档
-            for i, doc in enumerate(light_documents):
-                # 添加文档到图谱
-                graph.add_document(doc)
-                
-                # 计算和更新进度
-                progress = 0.3 + (i + 1) / len(light_documents) * 0.4
-                callback(task_id, "processing", progress, {
-                    "processed_documents": i + 1,
-                    "total_documents": len(light_documents)
-                })
+            # 并发处理文档，同一图谱的并发数受限
+            concurrency = max(1, getattr(settings, "LIGHTRAG_INGEST_CONCURRENCY", 4))
+            semaphore = get_ingest_semaphore(graph_id, concurrency)
+            
+            def add_one(doc: LightDocument) -> None:
+                with semaphore:
+                    graph.add_document(doc)
+            
+            errors = []
+            with ThreadPoolExecutor(max_workers=min(concurrency, max(len(light_documents), 1))) as executor:
+                futures = [executor.submit(add_one, doc) for doc in light_documents]
+                # 按输入顺序报告进度，单个文档失败记录为该文档的错误
+                for i, future in enumerate(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error(f"LightRAG处理第 {i} 个文档失败: {str(e)}")
+                        errors.append({"index": i, "error": str(e)})
+                    
+                    # 计算和更新进度
+                    progress = 0.3 + (i + 1) / len(light_documents) * 0.4
+                    callback(task_id, "processing", progress, {
+                        "processed_documents": i + 1,
+                        "total_documents": len(light_documents),
+                        "failed_documents": len(errors)
+                    })
+            
+            if errors:
+                logger.warning(f"LightRAG导入图谱 {graph_id} 时 {len(errors)}/{len(light_documents)} 个文档失败")
             
             # 如果启用了知识图谱，则构建图谱关系
             if use_knowledge_graph:
@@ -249,6 +283,8 @@ class DocumentProcessor:
                 "graph_id": graph_id,
                 "total_documents": len(documents),
                 "processed_documents": len(documents),
+                "failed_documents": len(errors),
+                "errors": errors,
                 "elapsed_seconds": time.time() - self.active_tasks[task_id]["start_time"]
             })
             
@@ -1,12 +1,19 @@
 """
 LightRAG工作目录管理器模块
 用于管理LightRAG工作目录的创建、配置和维护
+
+各工作目录的LightRAG实例保存在有界的LRU池中：首次使用时才创建，同一工作目录的创建
+过程加锁，实例数超过上限时关闭最久未使用且未被持有的实例。进程内存超过上限时只下调
+实例数上限，而不是按内存持续淘汰（淘汰后RSS通常不会回落）
 """
 
 import os
 import asyncio
 import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from typing import Dict, List, Optional, Any
+import psutil
 import psycopg2
 from psycopg2.extras import DictCursor
 
@@ -24,6 +31,17 @@ except ImportError:
 
 logger = setup_logger("lightrag_workdir_manager")
 
+
+class _PooledRag:
+    """池中的LightRAG实例及其使用计数"""
+    
+    __slots__ = ("rag", "in_use")
+    
+    def __init__(self, rag: Any):
+        self.rag = rag
+        self.in_use = 0
+
+
 class WorkdirManager:
     """LightRAG 工作目录管理器
     
@@ -40,7 +58,15 @@ class WorkdirManager:
             "password": self.config.pg_password,
             "database": self.config.pg_db
         }
-        self.rag_instances: Dict[str, Any] = {}
+        
+        # LightRAG实例池，按最近使用排序
+        self.rag_instances: "OrderedDict[str, _PooledRag]" = OrderedDict()
+        self.max_instances = max(1, getattr(settings, "LIGHTRAG_MAX_INSTANCES", 16))
+        self.max_memory_mb = getattr(settings, "LIGHTRAG_POOL_MAX_MEMORY_MB", 0)  # 0表示不按内存淘汰
+        self._instance_locks: Dict[str, asyncio.Lock] = {}
+        self._connection_exported = False
+        # 按内存上限下调后的实例数上限，None表示未下调
+        self._memory_capacity: Optional[int] = None
         
         # 确保工作目录基础目录存在
         os.makedirs(self.config.base_dir, exist_ok=True)
@@ -190,6 +216,9 @@ class WorkdirManager:
     async def get_rag_instance(self, workdir_path: str) -> Any:
         """获取指定工作目录的LightRAG实例
         
+        返回的实例已被持有，不会被淘汰，使用完毕后必须调用release_rag_instance释放；
+        优先使用acquire，它会自动释放
+        
         Args:
             workdir_path: 工作目录路径
             
@@ -201,55 +230,191 @@ class WorkdirManager:
             
         if not self.config.enabled:
             raise ValueError("LightRAG未启用，无法获取RAG实例")
+        
+        return (await self._get_entry(workdir_path, pin=True)).rag
+    
+    async def release_rag_instance(self, workdir_path: str) -> None:
+        """释放get_rag_instance持有的实例，之后该实例可以被淘汰
+        
+        Args:
+            workdir_path: 工作目录路径
+        """
+        entry = self.rag_instances.get(workdir_path)
+        if entry is None or entry.in_use <= 0:
+            return
+        entry.in_use -= 1
+        # 持有期间可能因全部实例都被持有而超出上限，释放后补做淘汰
+        await self._evict()
+    
+    @asynccontextmanager
+    async def acquire(self, workdir_path: str):
+        """持有工作目录的LightRAG实例，持有期间该实例不会被淘汰
+        
+        Args:
+            workdir_path: 工作目录路径
+        """
+        if not HAS_LIGHTRAG:
+            raise ImportError("LightRAG库未安装，无法创建RAG实例")
             
-        if workdir_path not in self.rag_instances:
-            workdir_info = await self.get_workdir_info(workdir_path)
-            if not workdir_info:
-                raise ValueError(f"工作目录 {workdir_path} 不存在")
-                
-            # 更新访问时间
-            with self.get_db_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(
-                        "UPDATE public.lightrag_workdirs SET last_accessed = CURRENT_TIMESTAMP WHERE id = %s",
-                        (workdir_info['id'],)
-                    )
-                    conn.commit()
-            
-            # 设置环境变量
-            os.environ["POSTGRES_HOST"] = self.config.pg_host
-            os.environ["POSTGRES_PORT"] = str(self.config.pg_port)
-            os.environ["POSTGRES_USER"] = self.config.pg_user
-            os.environ["POSTGRES_PASSWORD"] = self.config.pg_password
-            os.environ["POSTGRES_DATABASE"] = self.config.pg_db
-            os.environ["AGE_GRAPH_NAME"] = workdir_info['schema_name']
-            
-            # 初始化LightRAG实例
-            rag = LightRAG(
-                working_dir=os.path.join(self.config.base_dir, workdir_path),
-                llm_model_func=self._get_llm_func(),
-                embedding_func=self._get_embedding_func(),
-                kv_storage="PGKVStorage",
-                doc_status_storage="PGDocStatusStorage",
-                graph_storage="PGGraphStorage",
-                vector_storage="PGVectorStorage",
-                # 为每个存储类型指定Schema
-                kv_storage_cls_kwargs={"schema": workdir_info['schema_name']},
-                doc_status_storage_cls_kwargs={"schema": workdir_info['schema_name']},
-                graph_storage_cls_kwargs={
-                    "schema": workdir_info['schema_name'],
-                    "graph_name": workdir_info['schema_name']  # AGE图名称
-                },
-                vector_db_storage_cls_kwargs={
-                    "schema": workdir_info['schema_name'],
-                    "cosine_better_than_threshold": 0.4
-                }
-            )
-            
-            await rag.initialize_storages()
-            self.rag_instances[workdir_path] = rag
+        if not self.config.enabled:
+            raise ValueError("LightRAG未启用，无法获取RAG实例")
+        
+        rag = await self.get_rag_instance(workdir_path)
+        try:
+            yield rag
+        finally:
+            await self.release_rag_instance(workdir_path)
+    
+    async def _get_entry(self, workdir_path: str, pin: bool = False) -> _PooledRag:
+        """从池中取实例，不存在时在工作目录锁内创建"""
+        entry = self.rag_instances.get(workdir_path)
+        if entry is None:
+            lock = self._instance_locks.setdefault(workdir_path, asyncio.Lock())
+            async with lock:
+                entry = self.rag_instances.get(workdir_path)
+                if entry is None:
+                    entry = _PooledRag(await self._create_rag_instance(workdir_path))
+                    self.rag_instances[workdir_path] = entry
+                    if pin:
+                        entry.in_use += 1
+                    self._adjust_memory_capacity()
+                    await self._evict()
+                    return entry
+        
+        self.rag_instances.move_to_end(workdir_path)
+        if pin:
+            entry.in_use += 1
+        return entry
+    
+    async def _create_rag_instance(self, workdir_path: str) -> Any:
+        """创建并初始化工作目录的LightRAG实例"""
+        workdir_info = await self.get_workdir_info(workdir_path)
+        if not workdir_info:
+            raise ValueError(f"工作目录 {workdir_path} 不存在")
+        
+        # 更新访问时间
+        await asyncio.to_thread(self._touch_workdir, workdir_info['id'])
+        
+        schema_name = workdir_info['schema_name']
+        self._export_connection_settings()
+        
+        # 初始化LightRAG实例，schema和图名称按实例显式传入
+        rag = LightRAG(
+            working_dir=os.path.join(self.config.base_dir, workdir_path),
+            llm_model_func=self._get_llm_func(),
+            embedding_func=self._get_embedding_func(),
+            kv_storage="PGKVStorage",
+            doc_status_storage="PGDocStatusStorage",
+            graph_storage="PGGraphStorage",
+            vector_storage="PGVectorStorage",
+            # 为每个存储类型指定Schema
+            kv_storage_cls_kwargs={"schema": schema_name},
+            doc_status_storage_cls_kwargs={"schema": schema_name},
+            graph_storage_cls_kwargs={
+                "schema": schema_name,
+                "graph_name": schema_name  # AGE图名称
+            },
+            vector_db_storage_cls_kwargs={
+                "schema": schema_name,
+                "cosine_better_than_threshold": 0.4
+            }
+        )
+        
+        await rag.initialize_storages()
+        logger.info(f"LightRAG实例已创建: {workdir_path}，池中实例数 {len(self.rag_instances) + 1}")
+        return rag
+    
+    def _touch_workdir(self, workdir_id: int) -> None:
+        """更新工作目录的最后访问时间"""
+        with self.get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    "UPDATE public.lightrag_workdirs SET last_accessed = CURRENT_TIMESTAMP WHERE id = %s",
+                    (workdir_id,)
+                )
+                conn.commit()
+    
+    def _export_connection_settings(self) -> None:
+        """向LightRAG的PostgreSQL客户端提供连接参数
+        
+        LightRAG的PG存储共用一个进程级连接池，连接参数只能从环境变量读取；这些参数对
+        所有工作目录相同，因此只在首次创建实例时导出一次，且不覆盖已有的环境配置。
+        各工作目录不同的schema和图名称通过存储参数显式传入，不再经由环境变量
+        """
+        if self._connection_exported:
+            return
+        for key, value in (
+            ("POSTGRES_HOST", self.config.pg_host),
+            ("POSTGRES_PORT", self.config.pg_port),
+            ("POSTGRES_USER", self.config.pg_user),
+            ("POSTGRES_PASSWORD", self.config.pg_password),
+            ("POSTGRES_DATABASE", self.config.pg_db),
+        ):
+            if value is not None:
+                os.environ.setdefault(key, str(value))
+        self._connection_exported = True
+    
+    @property
+    def capacity(self) -> int:
+        """当前实例数上限"""
+        if self._memory_capacity is None:
+            return self.max_instances
+        return min(self.max_instances, self._memory_capacity)
+    
+    def _adjust_memory_capacity(self) -> None:
+        """新建实例后按进程内存调整实例数上限
         
-        return self.rag_instances[workdir_path]
+        首次超过内存上限时把上限定为当前实例数减一，之后池保持在该规模，每次新建实例
+        最多淘汰一个旧实例，不会因RSS不回落而反复清空整个池；内存回落到上限的80%以下时
+        取消下调
+        """
+        if not self.max_memory_mb:
+            return
+        rss_mb = psutil.Process().memory_info().rss / (1024 * 1024)
+        if rss_mb > self.max_memory_mb:
+            if self._memory_capacity is not None:
+                return
+            self._memory_capacity = max(1, min(self.max_instances, len(self.rag_instances) - 1))
+            logger.warning(
+                f"进程内存 {rss_mb:.0f}MB 超过上限 {self.max_memory_mb}MB，"
+                f"LightRAG实例数上限下调为 {self._memory_capacity}"
+            )
+        elif self._memory_capacity is not None and rss_mb < self.max_memory_mb * 0.8:
+            self._memory_capacity = None
+    
+    def _over_capacity(self) -> bool:
+        """池是否超过实例数上限"""
+        return len(self.rag_instances) > self.capacity
+    
+    async def _evict(self) -> None:
+        """按LRU顺序关闭空闲实例，直到池回到上限以内"""
+        while self._over_capacity():
+            victim = next(
+                (path for path, entry in self.rag_instances.items() if entry.in_use == 0),
+                None
+            )
+            # 最新创建的实例或全部实例都在使用中时停止淘汰
+            if victim is None or victim == next(reversed(self.rag_instances)):
+                break
+            await self._close_instance(victim)
+    
+    async def _close_instance(self, workdir_path: str) -> None:
+        """从池中移除实例并释放其存储连接"""
+        entry = self.rag_instances.pop(workdir_path, None)
+        self._instance_locks.pop(workdir_path, None)
+        if entry is None:
+            return
+        try:
+            if hasattr(entry.rag, "finalize_storages"):
+                await entry.rag.finalize_storages()
+            logger.info(f"LightRAG实例已淘汰: {workdir_path}")
+        except Exception as e:
+            logger.warning(f"关闭LightRAG实例 {workdir_path} 时出错: {str(e)}")
+    
+    async def close(self) -> None:
+        """关闭池中的所有实例"""
+        for workdir_path in list(self.rag_instances):
+            await self._close_instance(workdir_path)
     
     def _get_llm_func(self):
         """获取LLM函数
@@ -340,8 +505,8 @@ class WorkdirManager:
         if not HAS_LIGHTRAG:
             raise ImportError("LightRAG库未安装，无法执行查询")
             
-        rag = await self.get_rag_instance(workdir_path)
-        return await rag.aquery(question, param=QueryParam(mode=mode))
+        async with self.acquire(workdir_path) as rag:
+            return await rag.aquery(question, param=QueryParam(mode=mode))
     
     async def query_all(self, question: str, mode: str = "hybrid") -> Dict[str, str]:
         """查询所有工作目录并返回结果
@@ -390,3 +555,12 @@ def get_workdir_manager() -> WorkdirManager:
     if _workdir_manager is None:
         _workdir_manager = WorkdirManager()
     return _workdir_manager
+
+
+async def shutdown_workdir_manager() -> None:
+    """关闭工作目录管理器池中的实例（系统关闭时调用）"""
+    global _workdir_manager
+    
+    if _workdir_manager is not None:
+        await _workdir_manager.close()
+        _workdir_manager = None
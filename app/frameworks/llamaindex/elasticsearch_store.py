@@ -5,9 +5,12 @@ LlamaIndex与Elasticsearch集成模块
 
 from typing import Dict, List, Optional, Any, Union, Sequence, Set, Tuple
 import json
+import asyncio
 import logging
-from elasticsearch import Elasticsearch, helpers
-from elasticsearch.exceptions import NotFoundError
+import weakref
+from elasticsearch import Elasticsearch, AsyncElasticsearch, helpers
+from elasticsearch.helpers import async_bulk
+from elasticsearch.exceptions import NotFoundError, BadRequestError, AuthorizationException
 
 from llama_index.core.schema import Document, TextNode, BaseNode
 from llama_index.core.vector_stores.types import VectorStore, VectorStoreQuery
@@ -36,6 +39,10 @@ class ElasticsearchStore(VectorStore):
         embedding_dimension: int = 1536,
         es_client: Optional[Elasticsearch] = None,
         image_vector_field: str = "image_vector",
+        async_es_client: Optional[AsyncElasticsearch] = None,
+        bulk_concurrency: int = 4,
+        use_rrf: bool = True,
+        num_candidates_factor: int = 10,
     ):
         """
         初始化Elasticsearch存储
@@ -54,6 +61,11 @@ class ElasticsearchStore(VectorStore):
             bulk_size: 批量操作大小
             embedding_dimension: 嵌入维度
             es_client: 可选的ES客户端实例
+            image_vector_field: 存储图像向量的字段名
+            async_es_client: 可选的异步ES客户端实例，不提供时按需创建
+            bulk_concurrency: 异步批量写入的并发批次数
+            use_rrf: 混合检索是否优先使用RRF融合（ES不支持时自动回退为加权求和）
+            num_candidates_factor: kNN候选数相对top_k的倍数
         """
         self._index_name = index_name
         self._vector_field = vector_field
@@ -63,30 +75,43 @@ class ElasticsearchStore(VectorStore):
         self._bulk_size = bulk_size
         self._embedding_dimension = embedding_dimension
         self._image_vector_field = image_vector_field
+        self._bulk_concurrency = max(1, bulk_concurrency)
+        self._use_rrf = use_rrf
+        self._num_candidates_factor = max(1, num_candidates_factor)
+        
+        # 检索结果不返回向量和图像二进制字段，减小响应体积
+        self._source_excludes = [self._vector_field, self._image_vector_field, "image_data"]
+        
+        # 使用配置中的ES连接信息，异步客户端按需以相同参数创建
+        es_url = es_url or settings.ELASTICSEARCH_URL
+        es_user = es_user or settings.ELASTICSEARCH_USERNAME
+        es_password = es_password or settings.ELASTICSEARCH_PASSWORD
+        es_cloud_id = es_cloud_id or settings.ELASTICSEARCH_CLOUD_ID
+        es_api_key = es_api_key or settings.ELASTICSEARCH_API_KEY
+        
+        if es_cloud_id:
+            self._client_kwargs = {
+                "cloud_id": es_cloud_id,
+                "api_key": es_api_key if es_api_key else None,
+                "basic_auth": (es_user, es_password) if es_user and es_password else None
+            }
+        else:
+            self._client_kwargs = {
+                "hosts": es_url,
+                "basic_auth": (es_user, es_password) if es_user and es_password else None,
+                "api_key": es_api_key if es_api_key else None
+            }
         
         if es_client is not None:
             self._client = es_client
         else:
-            # 使用配置中的ES连接信息
-            es_url = es_url or settings.ELASTICSEARCH_URL
-            es_user = es_user or settings.ELASTICSEARCH_USERNAME
-            es_password = es_password or settings.ELASTICSEARCH_PASSWORD
-            es_cloud_id = es_cloud_id or settings.ELASTICSEARCH_CLOUD_ID
-            es_api_key = es_api_key or settings.ELASTICSEARCH_API_KEY
-            
             # 构建ES客户端
-            if es_cloud_id:
-                self._client = Elasticsearch(
-                    cloud_id=es_cloud_id, 
-                    api_key=es_api_key if es_api_key else None,
-                    basic_auth=(es_user, es_password) if es_user and es_password else None
-                )
-            else:
-                self._client = Elasticsearch(
-                    es_url,
-                    basic_auth=(es_user, es_password) if es_user and es_password else None,
-                    api_key=es_api_key if es_api_key else None
-                )
+            self._client = Elasticsearch(**self._client_kwargs)
+        
+        # 事件循环 -> 异步客户端；AsyncElasticsearch的连接绑定创建时的事件循环，
+        # 请求循环和同步检索的后台循环各用各的客户端
+        self._async_client = async_es_client
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncElasticsearch]" = weakref.WeakKeyDictionary()
         
         # 初始化索引
         self._initialize_index()
@@ -173,6 +198,162 @@ class ElasticsearchStore(VectorStore):
         else:
             return "cosine"
     
+    def _get_async_client(self) -> AsyncElasticsearch:
+        """获取当前事件循环的异步ES客户端，首次使用时创建；传入的客户端归首个使用它的循环"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            if self._async_client is not None:
+                client, self._async_client = self._async_client, None
+            else:
+                client = AsyncElasticsearch(**self._client_kwargs)
+            self._async_clients[loop] = client
+        return client
+    
+    async def aclose(self) -> None:
+        """关闭当前事件循环的异步ES客户端"""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+    
+    def _build_filter_clauses(self, filters: Optional[Any]) -> List[Dict[str, Any]]:
+        """
+        构建过滤子句
+        
+        过滤条件放在filter上下文中：不参与打分，且可被ES缓存
+        
+        参数:
+            filters: 过滤条件字典，或LlamaIndex的MetadataFilters
+            
+        返回:
+            ES过滤子句列表
+        """
+        if not filters:
+            return []
+        
+        # 兼容LlamaIndex的MetadataFilters
+        if hasattr(filters, "filters"):
+            filters = {f.key: f.value for f in filters.filters}
+        
+        clauses = []
+        for key, value in filters.items():
+            filter_key = f"{self._metadata_field}.{key}"
+            
+            if isinstance(value, list):
+                clauses.append({"terms": {filter_key: value}})
+            else:
+                clauses.append({"term": {filter_key: value}})
+        
+        return clauses
+    
+    def _build_text_body(
+        self,
+        query_text: str,
+        top_k: int,
+        filters: Optional[Any] = None
+    ) -> Dict[str, Any]:
+        """构建BM25全文检索请求体"""
+        return {
+            "query": {
+                "bool": {
+                    "must": [{"match": {self._text_field: {"query": query_text}}}],
+                    "filter": self._build_filter_clauses(filters)
+                }
+            },
+            "size": top_k,
+            "_source": {"excludes": self._source_excludes}
+        }
+    
+    def _build_knn_body(
+        self,
+        query_embedding: List[float],
+        top_k: int,
+        filters: Optional[Any] = None,
+        field: Optional[str] = None,
+        extra_filters: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """构建kNN向量检索请求体，过滤条件作为kNN预过滤"""
+        filter_clauses = self._build_filter_clauses(filters) + (extra_filters or [])
+        knn_query = {
+            "field": field or self._vector_field,
+            "query_vector": query_embedding,
+            "k": top_k,
+            "num_candidates": top_k * self._num_candidates_factor
+        }
+        if filter_clauses:
+            knn_query["filter"] = filter_clauses
+        
+        return {
+            "knn": knn_query,
+            "size": top_k,
+            "_source": {"excludes": self._source_excludes}
+        }
+    
+    def _build_hybrid_body(
+        self,
+        query_str: str,
+        query_embedding: List[float],
+        top_k: int,
+        filters: Optional[Any] = None,
+        text_weight: float = 0.5,
+        use_rrf: bool = True
+    ) -> Dict[str, Any]:
+        """
+        构建原生kNN + BM25混合检索请求体
+        
+        use_rrf为True时使用RRF排名融合，否则按权重对两路分数加权求和
+        """
+        filter_clauses = self._build_filter_clauses(filters)
+        body = self._build_knn_body(query_embedding, top_k, filters)
+        body["query"] = {
+            "bool": {
+                "must": [{"match": {self._text_field: {"query": query_str}}}],
+                "filter": filter_clauses
+            }
+        }
+        
+        if use_rrf:
+            body["rank"] = {"rrf": {"window_size": max(top_k, body["knn"]["num_candidates"] // 2)}}
+        else:
+            body["knn"]["boost"] = 1.0 - text_weight
+            body["query"]["bool"]["boost"] = text_weight
+        
+        return body
+    
+    def _is_rrf_unsupported(self, error: Exception) -> bool:
+        """
+        判断错误是否由于ES版本或许可证不支持RRF
+        
+        只认两类确定的错误：旧版本ES解析请求体时不认识rank字段（400解析异常），
+        以及许可证不包含RRF功能（403安全异常且原因指向RRF）。其他错误照常抛出，
+        不会因为错误信息里碰巧出现相关字样而永久关闭RRF
+        """
+        status = getattr(error, "status_code", None)
+        if status is None:
+            status = getattr(getattr(error, "meta", None), "status", None)
+        
+        body = getattr(error, "body", None)
+        if not isinstance(body, dict):
+            body = getattr(error, "info", None)
+        error_info = body.get("error") if isinstance(body, dict) else None
+        if not isinstance(error_info, dict):
+            return False
+        
+        causes = [error_info] + [c for c in error_info.get("root_cause") or [] if isinstance(c, dict)]
+        for cause in causes:
+            error_type = cause.get("type", "")
+            reason = (cause.get("reason") or "").lower()
+            if (status == 400
+                    and error_type in ("parsing_exception", "x_content_parse_exception")
+                    and "[rank]" in reason):
+                return True
+            if (status == 403
+                    and error_type == "security_exception"
+                    and "license" in reason
+                    and ("rrf" in reason or "reciprocal rank fusion" in reason)):
+                return True
+        return False
+    
     def add(
         self,
         nodes: List[BaseNode],
@@ -191,39 +372,12 @@ class ElasticsearchStore(VectorStore):
         if not nodes:
             return []
         
-        node_ids = []
-        actions = []
-        
-        # 准备批量操作
-        for node in nodes:
-            node_id = node.node_id
-            node_ids.append(node_id)
-            
-            # 提取节点信息
-            metadata = node_to_metadata_dict(node)
-            embedding = node.embedding
-            
-            # 构建ES文档
-            doc = {
-                "_index": self._index_name,
-                "_id": node_id,
-                "_source": {
-                    "node_id": node_id,
-                    "document_id": node.ref_doc_id if hasattr(node, 'ref_doc_id') else None,
-                    self._text_field: node.get_content(),
-                    self._metadata_field: metadata,
-                }
-            }
-            
-            # 添加向量嵌入
-            if embedding is not None:
-                doc["_source"][self._vector_field] = embedding
-            
-            actions.append(doc)
+        node_ids = [node.node_id for node in nodes]
+        actions = [self._node_to_action(node) for node in nodes]
         
         # 批量添加到ES
         if actions:
-            helpers.bulk(self._client, actions)
+            helpers.bulk(self._client, actions, chunk_size=self._bulk_size)
         
         return node_ids
     
@@ -297,31 +451,7 @@ class ElasticsearchStore(VectorStore):
         返回:
             (节点, 分数)元组的列表
         """
-        must_conditions = [
-            {"match": {self._text_field: {"query": query_text}}}
-        ]
-        
-        # 处理过滤条件
-        if filters:
-            for key, value in filters.items():
-                filter_key = f"{self._metadata_field}.{key}"
-                
-                if isinstance(value, list):
-                    terms_query = {"terms": {filter_key: value}}
-                    must_conditions.append(terms_query)
-                else:
-                    term_query = {"term": {filter_key: value}}
-                    must_conditions.append(term_query)
-        
-        # 构建查询
-        search_query = {
-            "query": {
-                "bool": {
-                    "must": must_conditions
-                }
-            },
-            "size": top_k
-        }
+        search_query = self._build_text_body(query_text, top_k, filters)
         
         # 执行搜索
         response = self._client.search(
@@ -348,34 +478,7 @@ class ElasticsearchStore(VectorStore):
         返回:
             (节点, 分数)元组的列表
         """
-        # 构建kNN查询
-        knn_query = {
-            "field": self._vector_field,
-            "query_vector": query_embedding,
-            "k": top_k,
-            "num_candidates": top_k * 2
-        }
-        
-        search_query = {
-            "knn": knn_query,
-            "size": top_k
-        }
-        
-        # 添加过滤条件
-        if filters:
-            filter_clauses = []
-            for key, value in filters.items():
-                filter_key = f"{self._metadata_field}.{key}"
-                
-                if isinstance(value, list):
-                    filter_clauses.append({"terms": {filter_key: value}})
-                else:
-                    filter_clauses.append({"term": {filter_key: value}})
-            
-            if filter_clauses:
-                search_query["query"] = {
-                    "bool": {"filter": filter_clauses}
-                }
+        search_query = self._build_knn_body(query_embedding, top_k, filters)
         
         # 执行搜索
         response = self._client.search(
@@ -402,42 +505,13 @@ class ElasticsearchStore(VectorStore):
         返回:
             (节点, 分数)元组的列表
         """
-        # 构建kNN查询
-        knn_query = {
-            "field": self._image_vector_field,
-            "query_vector": query_embedding,
-            "k": top_k,
-            "num_candidates": top_k * 2
-        }
-        
-        search_query = {
-            "knn": knn_query,
-            "size": top_k
-        }
-        
-        # 添加过滤条件
-        if filters:
-            filter_clauses = []
-            for key, value in filters.items():
-                filter_key = f"{self._metadata_field}.{key}"
-                
-                if isinstance(value, list):
-                    filter_clauses.append({"terms": {filter_key: value}})
-                else:
-                    filter_clauses.append({"term": {filter_key: value}})
-            
-            # 添加图像存在条件
-            filter_clauses.append({"term": {"has_image": True}})
-            
-            if filter_clauses:
-                search_query["query"] = {
-                    "bool": {"filter": filter_clauses}
-                }
-        # 如果没有其他过滤条件，仅添加图像存在条件
-        else:
-            search_query["query"] = {
-                "bool": {"filter": [{"term": {"has_image": True}}]}
-            }
+        search_query = self._build_knn_body(
+            query_embedding,
+            top_k,
+            filters,
+            field=self._image_vector_field,
+            extra_filters=[{"term": {"has_image": True}}]
+        )
         
         # 执行搜索
         response = self._client.search(
@@ -458,6 +532,8 @@ class ElasticsearchStore(VectorStore):
         """
         执行混合搜索（同时使用BM25和向量搜索）
         
+        使用原生kNN与BM25查询，优先以RRF融合两路结果，不支持时按权重加权求和
+        
         参数:
             query_str: 查询文本
             query_embedding: 查询向量
@@ -468,45 +544,27 @@ class ElasticsearchStore(VectorStore):
         返回:
             (节点, 分数)元组的列表
         """
-        vector_weight = 1.0 - text_weight
-        
-        # 构建混合查询
-        must_conditions = []
-        
-        # 处理过滤条件
-        if filters:
-            for key, value in filters.items():
-                filter_key = f"{self._metadata_field}.{key}"
-                
-                if isinstance(value, list):
-                    must_conditions.append({"terms": {filter_key: value}})
-                else:
-                    must_conditions.append({"term": {filter_key: value}})
-        
-        # 构建查询
-        search_query = {
-            "query": {
-                "script_score": {
-                    "query": {
-                        "bool": {
-                            "must": [
-                                {"match": {self._text_field: {"query": query_str}}}
-                            ] + must_conditions
-                        }
-                    },
-                    "script": {
-                        "source": f"cosineSimilarity(params.query_vector, '{self._vector_field}') * {vector_weight} + _score * {text_weight}",
-                        "params": {"query_vector": query_embedding}
-                    }
-                }
-            },
-            "size": top_k
-        }
-        
-        # 执行搜索
+        if self._use_rrf:
+            try:
+                response = self._client.search(
+                    index=self._index_name,
+                    body=self._build_hybrid_body(
+                        query_str, query_embedding, top_k, filters, text_weight, use_rrf=True
+                    )
+                )
+                return self._parse_response(response)
+            except (BadRequestError, AuthorizationException) as e:
+                if not self._is_rrf_unsupported(e):
+                    raise
+                logger.warning(f"Elasticsearch不支持RRF融合，回退为加权混合检索: {str(e)}")
+                self._use_rrf = False
+        
+        # 原生kNN + BM25加权混合，不再对每个BM25命中做脚本打分
         response = self._client.search(
             index=self._index_name,
-            body=search_query
+            body=self._build_hybrid_body(
+                query_str, query_embedding, top_k, filters, text_weight, use_rrf=False
+            )
         )
         
         return self._parse_response(response)
@@ -546,54 +604,27 @@ class ElasticsearchStore(VectorStore):
             image_weight /= total_weight
             semantic_weight /= total_weight
         
-        # 构建混合查询
-        must_conditions = []
-        should_conditions = []
-        
-        # 处理过滤条件
-        if filters:
-            for key, value in filters.items():
-                filter_key = f"{self._metadata_field}.{key}"
-                
-                if isinstance(value, list):
-                    must_conditions.append({"terms": {filter_key: value}})
-                else:
-                    must_conditions.append({"term": {filter_key: value}})
+        # 原生多路kNN（文本向量、图像向量）与BM25按权重加权求和，
+        # 不再对每个BM25命中执行脚本打分，也不会漏掉只在向量上相似的文档
+        text_knn = self._build_knn_body(text_embedding, top_k, filters)["knn"]
+        text_knn["boost"] = semantic_weight
+        image_knn = self._build_knn_body(
+            image_embedding,
+            top_k,
+            filters,
+            field=self._image_vector_field,
+            extra_filters=[{"term": {"has_image": True}}]
+        )["knn"]
+        image_knn["boost"] = image_weight
         
-        # 构建查询
         search_query = {
+            "_source": {"excludes": self._source_excludes},
+            "knn": [text_knn, image_knn],
             "query": {
-                "script_score": {
-                    "query": {
-                        "bool": {
-                            "must": [{
-                                "match": {self._text_field: {"query": query_str}}
-                            }] + must_conditions
-                        }
-                    },
-                    "script": {
-                        "source": f"""
-                            float text_score = _score * {text_weight};
-                            float text_vec_score = 0.0;
-                            float image_vec_score = 0.0;
-                            
-                            // 文本向量分数
-                            if (doc.containsKey('{self._vector_field}')) {{  
-                                text_vec_score = cosineSimilarity(params.text_vector, '{self._vector_field}') * {semantic_weight};
-                            }}
-                            
-                            // 图像向量分数
-                            if (doc.containsKey('{self._image_vector_field}') && doc.containsKey('has_image') && doc['has_image'].value) {{
-                                image_vec_score = cosineSimilarity(params.image_vector, '{self._image_vector_field}') * {image_weight};
-                            }}
-                            
-                            return text_score + text_vec_score + image_vec_score;
-                        """,
-                        "params": {
-                            "text_vector": text_embedding,
-                            "image_vector": image_embedding
-                        }
-                    }
+                "bool": {
+                    "must": [{"match": {self._text_field: {"query": query_str}}}],
+                    "filter": self._build_filter_clauses(filters),
+                    "boost": text_weight
                 }
             },
             "size": top_k
@@ -661,6 +692,149 @@ class ElasticsearchStore(VectorStore):
         
         return results
     
+    async def aquery(
+        self,
+        query: VectorStoreQuery,
+        **kwargs: Any,
+    ) -> List[Tuple[BaseNode, float]]:
+        """
+        异步查询Elasticsearch
+        
+        同时提供查询文本和向量且hybrid=True时执行混合检索
+        
+        参数:
+            query: 向量存储查询对象
+            **kwargs: 额外参数，支持hybrid(bool)和text_weight(float)
+            
+        返回:
+            (节点, 分数)元组的列表
+        """
+        query_embedding = query.query_embedding
+        similarity_top_k = query.similarity_top_k or 10
+        filters = query.filters or {}
+        
+        if query_embedding is None and query.query_str:
+            body = self._build_text_body(query.query_str, similarity_top_k, filters)
+        elif query_embedding is not None and query.query_str and kwargs.get("hybrid"):
+            return await self.ahybrid_search(
+                query_str=query.query_str,
+                query_embedding=query_embedding,
+                top_k=similarity_top_k,
+                filters=filters,
+                text_weight=kwargs.get("text_weight", 0.5)
+            )
+        else:
+            body = self._build_knn_body(query_embedding, similarity_top_k, filters)
+        
+        response = await self._get_async_client().search(index=self._index_name, body=body)
+        return self._parse_response(response)
+    
+    async def ahybrid_search(
+        self,
+        query_str: str,
+        query_embedding: List[float],
+        top_k: int = 10,
+        filters: Optional[Dict[str, Any]] = None,
+        text_weight: float = 0.5
+    ) -> List[Tuple[BaseNode, float]]:
+        """
+        异步执行混合搜索（原生kNN + BM25）
+        
+        参数:
+            query_str: 查询文本
+            query_embedding: 查询向量
+            top_k: 返回结果数量
+            filters: 可选过滤条件
+            text_weight: BM25权重 (0-1 之间)，仅在加权融合时使用
+            
+        返回:
+            (节点, 分数)元组的列表
+        """
+        client = self._get_async_client()
+        
+        if self._use_rrf:
+            try:
+                response = await client.search(
+                    index=self._index_name,
+                    body=self._build_hybrid_body(
+                        query_str, query_embedding, top_k, filters, text_weight, use_rrf=True
+                    )
+                )
+                return self._parse_response(response)
+            except (BadRequestError, AuthorizationException) as e:
+                if not self._is_rrf_unsupported(e):
+                    raise
+                logger.warning(f"Elasticsearch不支持RRF融合，回退为加权混合检索: {str(e)}")
+                self._use_rrf = False
+        
+        response = await client.search(
+            index=self._index_name,
+            body=self._build_hybrid_body(
+                query_str, query_embedding, top_k, filters, text_weight, use_rrf=False
+            )
+        )
+        return self._parse_response(response)
+    
+    async def async_add(
+        self,
+        nodes: List[BaseNode],
+        chunk_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        **add_kwargs: Any,
+    ) -> List[str]:
+        """
+        异步批量添加节点到Elasticsearch
+        
+        按chunk_size切分批次，最多concurrency个批次并发写入
+        
+        参数:
+            nodes: 要添加的节点列表
+            chunk_size: 每批文档数，默认使用bulk_size
+            concurrency: 并发批次数，默认使用bulk_concurrency
+            **add_kwargs: 额外参数
+            
+        返回:
+            添加的节点ID列表
+        """
+        if not nodes:
+            return []
+        
+        chunk_size = chunk_size or self._bulk_size
+        semaphore = asyncio.Semaphore(concurrency or self._bulk_concurrency)
+        client = self._get_async_client()
+        
+        node_ids = [node.node_id for node in nodes]
+        actions = [self._node_to_action(node) for node in nodes]
+        
+        async def write_chunk(chunk: List[Dict[str, Any]]) -> None:
+            async with semaphore:
+                await async_bulk(client, chunk, chunk_size=chunk_size, refresh=False)
+        
+        await asyncio.gather(*[
+            write_chunk(actions[start:start + chunk_size])
+            for start in range(0, len(actions), chunk_size)
+        ])
+        
+        return node_ids
+    
+    def _node_to_action(self, node: BaseNode) -> Dict[str, Any]:
+        """将节点转换为ES批量写入动作"""
+        doc = {
+            "_index": self._index_name,
+            "_id": node.node_id,
+            "_source": {
+                "node_id": node.node_id,
+                "document_id": node.ref_doc_id if hasattr(node, 'ref_doc_id') else None,
+                self._text_field: node.get_content(),
+                self._metadata_field: node_to_metadata_dict(node),
+            }
+        }
+        
+        if node.embedding is not None:
+            doc["_source"][self._vector_field] = node.embedding
+        
+        return doc
+    
     def update_index_settings(self, new_settings: Dict[str, Any]) -> None:
         """
         更新索引设置
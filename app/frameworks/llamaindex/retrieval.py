@@ -5,9 +5,11 @@ LlamaIndex检索模块: 处理高级上下文感知文档检索
 与Agno框架无缝集成
 """
 
-from typing import List, Dict, Any, Optional, Union, Tuple, Callable
+from typing import List, Dict, Any, Optional, Union, Tuple, Callable, Awaitable, Coroutine
+import asyncio
 import json
 import logging
+import threading
 
 from llama_index.core import (
     VectorStoreIndex, 
@@ -18,7 +20,8 @@ from llama_index.core.retrievers import VectorIndexRetriever, BaseRetriever
 from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.postprocessor import SimilarityPostprocessor
 from llama_index.core.prompts import PromptTemplate
-from llama_index.core.schema import NodeWithScore
+from llama_index.core.schema import NodeWithScore, TextNode
+from llama_index.core.vector_stores.types import VectorStoreQuery
 from app.config import settings
 from app.frameworks.llamaindex.elasticsearch_store import get_elasticsearch_store
 from app.frameworks.agno.knowledge_base import KnowledgeBaseProcessor
@@ -49,6 +52,120 @@ DEFAULT_REFINE_PROMPT_TMPL = (
     "否则，使用新上下文完善现有答案。"
 )
 
+# 同步检索共用的常驻后台事件循环
+_sync_loop: Optional[asyncio.AbstractEventLoop] = None
+_sync_loop_lock = threading.Lock()
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    """获取同步检索用的后台事件循环，首次使用时在守护线程中启动"""
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None or _sync_loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llamaindex-sync-retrieval", daemon=True).start()
+            _sync_loop = loop
+        return _sync_loop
+
+def _run_sync(coro: Coroutine) -> Any:
+    """
+    在同步调用方中运行检索协程
+    
+    所有同步调用都提交到同一个常驻后台事件循环，循环内缓存的异步客户端（如ES存储的
+    AsyncElasticsearch）在多次调用之间保持可用。在运行中的事件循环里同步等待会阻塞
+    该循环，因此这种情况下直接报错，调用方应改用aretrieve/aquery
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run_coroutine_threadsafe(coro, _get_sync_loop()).result()
+    
+    coro.close()
+    raise RuntimeError("不能在运行中的事件循环内同步检索，请使用aretrieve或aquery")
+
+async def _with_timeout(aw: Awaitable, timeout: Optional[float]) -> Any:
+    """按需为单路检索加超时"""
+    if timeout:
+        return await asyncio.wait_for(aw, timeout)
+    return await aw
+
+async def _gather_legs(
+    legs: Dict[str, Awaitable],
+    timeout: Optional[float]
+) -> Dict[str, Union[List[NodeWithScore], BaseException]]:
+    """
+    并发执行多路检索
+    
+    单路失败或超时不影响其他路，结果中以异常对象表示；
+    外层任务被取消时，所有尚未完成的检索会一并取消
+    """
+    names = list(legs)
+    results = await asyncio.gather(
+        *(_with_timeout(legs[name], timeout) for name in names),
+        return_exceptions=True
+    )
+    
+    outcome = {}
+    for name, result in zip(names, results):
+        if isinstance(result, asyncio.TimeoutError):
+            logger.error(f"{name}检索超时({timeout}秒)")
+        elif isinstance(result, BaseException):
+            logger.error(f"{name}检索失败: {str(result)}")
+        outcome[name] = result
+    return outcome
+
+def _leg_nodes(results: Dict[str, Any], name: str) -> List[NodeWithScore]:
+    """取出某一路的检索结果，失败或未执行时返回空列表"""
+    result = results.get(name)
+    if result is None or isinstance(result, BaseException):
+        return []
+    return result
+
+def _merge_nodes(
+    primary: List[NodeWithScore],
+    extra: List[NodeWithScore],
+    top_k: int
+) -> List[NodeWithScore]:
+    """合并两路结果，按分数排序后截取前K个"""
+    if not extra:
+        return primary
+    combined_results = primary + extra
+    combined_results.sort(key=lambda x: x.score or 0.0, reverse=True)
+    return combined_results[:top_k]
+
+async def _aretrieve_agno(agno_kb: KnowledgeBaseProcessor, query_text: str, top_k: int) -> List[NodeWithScore]:
+    """从Agno知识库检索并转换成NodeWithScore格式"""
+    agno_results_raw = await agno_kb.retrieve(query_text, top_k=top_k)
+    return [
+        NodeWithScore(
+            node=TextNode(text=result["content"], metadata=result.get("metadata", {})),
+            score=result.get("score", 1.0)
+        )
+        for result in agno_results_raw
+    ]
+
+async def _aretrieve_es(
+    es_store,
+    query_bundle: QueryBundle,
+    top_k: int,
+    hybrid: bool,
+    hybrid_weight: float = 0.5
+) -> List[NodeWithScore]:
+    """
+    异步查询ES
+    
+    hybrid为True且有查询向量时执行混合检索，否则按是否有向量执行向量检索或全文检索
+    """
+    results = await es_store.aquery(
+        VectorStoreQuery(
+            query_str=query_bundle.query_str,
+            query_embedding=query_bundle.embedding,
+            similarity_top_k=top_k
+        ),
+        hybrid=hybrid,
+        text_weight=1.0 - hybrid_weight
+    )
+    return [NodeWithScore(node=node, score=score) for node, score in results]
+
 class HybridRetriever(BaseRetriever):
     """混合检索器，结合向量检索和全文检索"""
     
@@ -59,7 +176,8 @@ class HybridRetriever(BaseRetriever):
         es_index_name: Optional[str] = None,
         hybrid_weight: float = 0.5,
         use_hybrid: bool = True,
-        agno_kb_id: Optional[str] = None
+        agno_kb_id: Optional[str] = None,
+        leg_timeout: Optional[float] = None
     ):
         """
         初始化混合检索器
@@ -71,6 +189,7 @@ class HybridRetriever(BaseRetriever):
             hybrid_weight: 向量搜索在混合搜索中的权重 (0.0-1.0)
             use_hybrid: 是否使用混合搜索（否则仅使用向量搜索）
             agno_kb_id: 可选的Agno知识库ID，如提供则结合Agno检索
+            leg_timeout: 单路检索超时(秒)，默认使用配置值，0表示不限制
         """
         self.vector_retriever = vector_retriever
         self.similarity_top_k = similarity_top_k
@@ -79,6 +198,10 @@ class HybridRetriever(BaseRetriever):
         self.use_hybrid = use_hybrid
         self.agno_kb_id = agno_kb_id
         self.agno_kb = None
+        self.leg_timeout = (
+            leg_timeout if leg_timeout is not None
+            else getattr(settings, "RETRIEVAL_LEG_TIMEOUT", 10.0)
+        )
         
         # 如果提供了Agno知识库ID，初始化知识库处理器
         if agno_kb_id:
@@ -90,63 +213,44 @@ class HybridRetriever(BaseRetriever):
         super().__init__()
     
     def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
-        """实现检索方法"""
-        query_text = query_bundle.query_str
-        query_embedding = query_bundle.embedding
-        
-        # 尝试使用Agno检索
-        agno_results = []
+        """同步检索，供旧调用方使用"""
+        return _run_sync(self._aretrieve(query_bundle))
+    
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        """实现异步检索方法，各路检索并发执行"""
+        legs = {}
+        if self.use_hybrid:
+            legs["hybrid"] = _aretrieve_es(
+                self.es_store, query_bundle, self.similarity_top_k,
+                hybrid=True, hybrid_weight=self.hybrid_weight
+            )
+        else:
+            legs["vector"] = self.vector_retriever.aretrieve(query_bundle)
         if self.agno_kb:
-            try:
-                import asyncio
-                agno_results_raw = asyncio.run(self.agno_kb.retrieve(query_text, top_k=self.similarity_top_k))
-                
-                # 转换成NodeWithScore格式
-                for result in agno_results_raw:
-                    from llama_index.core.schema import TextNode
-                    node = TextNode(
-                        text=result["content"],
-                        metadata=result.get("metadata", {})
-                    )
-                    agno_results.append(NodeWithScore(
-                        node=node, 
-                        score=result.get("score", 1.0)
-                    ))
-            except Exception as e:
-                logger.error(f"Agno检索失败: {str(e)}")
+            legs["agno"] = _aretrieve_agno(self.agno_kb, query_bundle.query_str, self.similarity_top_k)
         
-        # 如果不使用混合搜索或Agno检索成功，直接返回结果
+        results = await _gather_legs(legs, self.leg_timeout)
+        agno_results = _leg_nodes(results, "agno")
+        
+        # 不使用混合搜索时，Agno检索成功则直接返回其结果
         if not self.use_hybrid:
             if agno_results:
                 return agno_results
-            return self.vector_retriever.retrieve(query_bundle)
+            if isinstance(results["vector"], BaseException):
+                raise results["vector"]
+            return results["vector"]
         
-        # 使用混合检索
-        try:
-            # 执行混合搜索
-            es_results = self.es_store.hybrid_search(
-                query_text=query_text,
-                query_embedding=query_embedding,
-                top_k=self.similarity_top_k,
-                vector_weight=self.hybrid_weight
-            )
-            
+        es_results = results["hybrid"]
+        if not isinstance(es_results, BaseException):
             # 如果有Agno结果，合并并排序
-            if agno_results:
-                combined_results = es_results + agno_results
-                # 按分数排序
-                combined_results.sort(key=lambda x: x.score, reverse=True)
-                # 截取前K个
-                return combined_results[:self.similarity_top_k]
-            
-            return es_results
-        except Exception as e:
-            logger.error(f"混合检索失败: {str(e)}，回退到向量检索")
-            # 如果有Agno结果，返回Agno结果
-            if agno_results:
-                return agno_results
-            # 否则回退到向量检索
-            return self.vector_retriever.retrieve(query_bundle)
+            return _merge_nodes(es_results, agno_results, self.similarity_top_k)
+        
+        logger.error("混合检索失败，回退到向量检索")
+        # 如果有Agno结果，返回Agno结果
+        if agno_results:
+            return agno_results
+        # 否则回退到向量检索
+        return await _with_timeout(self.vector_retriever.aretrieve(query_bundle), self.leg_timeout)
 
 def get_retriever(
     index: Optional[VectorStoreIndex] = None,
@@ -170,6 +274,15 @@ def get_retriever(
     返回：
         检索器实例
     """
+    leg_timeout = getattr(settings, "RETRIEVAL_LEG_TIMEOUT", 10.0)
+    
+    def agno_leg(query_bundle: QueryBundle) -> Dict[str, Awaitable]:
+        """构造Agno检索分支"""
+        if not agno_kb_id:
+            return {}
+        agno_kb = KnowledgeBaseProcessor(kb_id=agno_kb_id)
+        return {"agno": _aretrieve_agno(agno_kb, query_bundle.query_str, similarity_top_k)}
+    
     # 如果提供了索引，则使用其向量检索器
     if index:
         vector_retriever = VectorIndexRetriever(
@@ -197,46 +310,22 @@ def get_retriever(
             # 如果没有向量检索器，但有ES，使用ES的混合搜索
             class ESHybridRetriever(BaseRetriever):
                 def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
-                    results = es_store.hybrid_search(
-                        query_text=query_bundle.query_str,
-                        query_embedding=query_bundle.embedding,
-                        top_k=similarity_top_k,
-                        vector_weight=hybrid_weight
-                    )
-                    
-                    # 如果提供了Agno知识库ID，尝试获取Agno结果
-                    if agno_kb_id:
-                        try:
-                            import asyncio
-                            agno_kb = KnowledgeBaseProcessor(kb_id=agno_kb_id)
-                            agno_results_raw = asyncio.run(agno_kb.retrieve(
-                                query_bundle.query_str, 
-                                top_k=similarity_top_k
-                            ))
-                            
-                            # 转换成NodeWithScore格式
-                            agno_results = []
-                            for result in agno_results_raw:
-                                from llama_index.core.schema import TextNode
-                                node = TextNode(
-                                    text=result["content"],
-                                    metadata=result.get("metadata", {})
-                                )
-                                agno_results.append(NodeWithScore(
-                                    node=node, 
-                                    score=result.get("score", 1.0)
-                                ))
-                            
-                            # 合并结果
-                            combined_results = results + agno_results
-                            # 按分数排序
-                            combined_results.sort(key=lambda x: x.score, reverse=True)
-                            # 截取前K个
-                            return combined_results[:similarity_top_k]
-                        except Exception as e:
-                            logger.error(f"Agno检索失败: {str(e)}")
+                    return _run_sync(self._aretrieve(query_bundle))
+                
+                async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+                    legs = {"es": _aretrieve_es(
+                        es_store, query_bundle, similarity_top_k,
+                        hybrid=True, hybrid_weight=hybrid_weight
+                    )}
+                    try:
+                        legs.update(agno_leg(query_bundle))
+                    except Exception as e:
+                        logger.error(f"Agno检索失败: {str(e)}")
                     
-                    return results
+                    results = await _gather_legs(legs, leg_timeout)
+                    if isinstance(results["es"], BaseException):
+                        raise results["es"]
+                    return _merge_nodes(results["es"], _leg_nodes(results, "agno"), similarity_top_k)
             
             return ESHybridRetriever()
     
@@ -245,90 +334,39 @@ def get_retriever(
         if agno_kb_id:  # 如果提供了Agno知识库ID，使用包装器结合Agno结果
             class AgnoVectorRetriever(BaseRetriever):
                 def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
-                    # 先获取向量检索结果
-                    vector_results = vector_retriever.retrieve(query_bundle)
-                    
-                    # 尝试获取Agno结果
+                    return _run_sync(self._aretrieve(query_bundle))
+                
+                async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+                    legs = {"vector": vector_retriever.aretrieve(query_bundle)}
                     try:
-                        import asyncio
-                        agno_kb = KnowledgeBaseProcessor(kb_id=agno_kb_id)
-                        agno_results_raw = asyncio.run(agno_kb.retrieve(
-                            query_bundle.query_str, 
-                            top_k=similarity_top_k
-                        ))
-                        
-                        # 转换成NodeWithScore格式
-                        agno_results = []
-                        for result in agno_results_raw:
-                            from llama_index.core.schema import TextNode
-                            node = TextNode(
-                                text=result["content"],
-                                metadata=result.get("metadata", {})
-                            )
-                            agno_results.append(NodeWithScore(
-                                node=node, 
-                                score=result.get("score", 1.0)
-                            ))
-                        
-                        # 合并结果
-                        combined_results = vector_results + agno_results
-                        # 按分数排序
-                        combined_results.sort(key=lambda x: x.score, reverse=True)
-                        # 截取前K个
-                        return combined_results[:similarity_top_k]
+                        legs.update(agno_leg(query_bundle))
                     except Exception as e:
                         logger.error(f"Agno检索失败: {str(e)}")
-                        return vector_results
+                    
+                    results = await _gather_legs(legs, leg_timeout)
+                    if isinstance(results["vector"], BaseException):
+                        raise results["vector"]
+                    return _merge_nodes(results["vector"], _leg_nodes(results, "agno"), similarity_top_k)
             
             return AgnoVectorRetriever()
         return vector_retriever
     else:
         class ESVectorRetriever(BaseRetriever):
             def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
-                if query_bundle.embedding:
-                    results = es_store._vector_search(
-                        query_embedding=query_bundle.embedding,
-                        top_k=similarity_top_k
-                    )
-                else:
-                    results = es_store._text_search(
-                        query_text=query_bundle.query_str,
-                        top_k=similarity_top_k
-                    )
-                
-                # 如果提供了Agno知识库ID，尝试获取Agno结果
-                if agno_kb_id:
-                    try:
-                        import asyncio
-                        agno_kb = KnowledgeBaseProcessor(kb_id=agno_kb_id)
-                        agno_results_raw = asyncio.run(agno_kb.retrieve(
-                            query_bundle.query_str, 
-                            top_k=similarity_top_k
-                        ))
-                        
-                        # 转换成NodeWithScore格式
-                        agno_results = []
-                        for result in agno_results_raw:
-                            from llama_index.core.schema import TextNode
-                            node = TextNode(
-                                text=result["content"],
-                                metadata=result.get("metadata", {})
-                            )
-                            agno_results.append(NodeWithScore(
-                                node=node, 
-                                score=result.get("score", 1.0)
-                            ))
-                        
-                        # 合并结果
-                        combined_results = results + agno_results
-                        # 按分数排序
-                        combined_results.sort(key=lambda x: x.score, reverse=True)
-                        # 截取前K个
-                        return combined_results[:similarity_top_k]
-                    except Exception as e:
-                        logger.error(f"Agno检索失败: {str(e)}")
+                return _run_sync(self._aretrieve(query_bundle))
+            
+            async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+                # 有查询向量时执行向量检索，否则执行全文检索
+                legs = {"es": _aretrieve_es(es_store, query_bundle, similarity_top_k, hybrid=False)}
+                try:
+                    legs.update(agno_leg(query_bundle))
+                except Exception as e:
+                    logger.error(f"Agno检索失败: {str(e)}")
                 
-                return results
+                results = await _gather_legs(legs, leg_timeout)
+                if isinstance(results["es"], BaseException):
+                    raise results["es"]
+                return _merge_nodes(results["es"], _leg_nodes(results, "agno"), similarity_top_k)
         
         return ESVectorRetriever()
 
@@ -433,7 +471,7 @@ async def retrieve_documents(
     query_bundle = QueryBundle(query)
     
     # 执行检索
-    nodes = retriever.retrieve(query_bundle)
+    nodes = await retriever.aretrieve(query_bundle)
     
     # 应用后处理
     if similarity_cutoff is not None:
@@ -491,7 +529,7 @@ async def query_documents(
     )
     
     # 执行查询
-    response = query_engine.query(query)
+    response = await query_engine.aquery(query)
     
     # 提取结果
     result = {
@@ -7,6 +7,7 @@ from typing import Any, Dict, List, Optional, Union, AsyncGenerator
 import logging
 import uuid
 import json
+import hashlib
 import asyncio
 from datetime import datetime
 
@@ -17,6 +18,7 @@ from app.frameworks.owl.agents.interfaces import (
 from app.frameworks.owl.utils.decorators import AgentInput, AgentOutput
 from app.frameworks.owl.utils.chain_transformer import ChainDataTransformer
 from app.frameworks.owl.utils.message_adapter import AgentMessageAdapter, AgentChainMessageAdapter
+from app.utils.core.cache.memory_cache import LRUCache
 
 from app.messaging.core.models import (
     Message, MessageType, MessageRole, TextMessage, 
@@ -37,18 +39,23 @@ class AgentChainExecutor:
     def __init__(
         self, 
         message_service: Optional[MessageService] = None,
-        stream_service: Optional[StreamService] = None
+        stream_service: Optional[StreamService] = None,
+        agent_cache_size: int = 64,
+        step_cache_size: int = 256
     ):
         """初始化链执行器
         
         Args:
             message_service: 消息服务
             stream_service: 流服务
+            agent_cache_size: Agent实例缓存的最大数量
+            step_cache_size: 步骤输出缓存的最大数量（dag模式）
         """
         self.transformer = ChainDataTransformer()
         self.message_service = message_service
         self.stream_service = stream_service
-        self.agent_registry = {}  # 用于缓存已创建的Agent实例
+        self.agent_registry = LRUCache(max_size=agent_cache_size)  # 用于缓存已创建的Agent实例
+        self.step_output_cache = LRUCache(max_size=step_cache_size)  # 按(Agent, 输入)缓存步骤输出
     
     async def execute_chain(
         self,
@@ -140,6 +147,13 @@ class AgentChainExecutor:
                     trace_id=trace_id,
                     context=context
                 )
+            elif chain_def.mode == "dag":
+                result = await self._execute_dag(
+                    chain_def=chain_def,
+                    input_message=input_message,
+                    trace_id=trace_id,
+                    context=context
+                )
             else:
                 # 默认顺序执行
                 result = await self._execute_sequential(
@@ -239,30 +253,7 @@ class AgentChainExecutor:
                 # 执行Agent
                 logger.info(f"执行Agent链步骤 {i+1}/{len(chain_def.steps)}: {step.agent_name}")
                 
-                if hasattr(agent, "process"):
-                    output = await agent.process(agent_input)
-                else:
-                    # 尝试兼容不同的Agent接口
-                    if hasattr(agent, "run_task"):
-                        output_content, _, metadata = await agent.run_task(agent_input.query)
-                        output = AgentOutputSchema(
-                            content=output_content,
-                            metadata=metadata or {}
-                        )
-                    elif hasattr(agent, "aquery"):
-                        output_content = await agent.aquery(agent_input.query)
-                        output = AgentOutputSchema(
-                            content=output_content,
-                            metadata={}
-                        )
-                    elif hasattr(agent, "query"):
-                        output_content = agent.query(agent_input.query)
-                        output = AgentOutputSchema(
-                            content=output_content,
-                            metadata={}
-                        )
-                    else:
-                        raise ValueError(f"Agent {step.agent_name} 不支持任何已知的处理方法")
+                output = await self._invoke_agent(agent, step, agent_input)
                 
                 # 转换输出
                 transformed_output = self.transformer.transform_agent_output(
@@ -489,14 +480,8 @@ class AgentChainExecutor:
             # 检查条件
             should_execute = True
             if step.condition:
-                # 简单条件检查，实际应该解析表达式
                 try:
-                    condition_met = eval(
-                        step.condition, 
-                        {"__builtins__": {}}, 
-                        {**data, "context": context}
-                    )
-                    should_execute = bool(condition_met)
+                    should_execute = self._evaluate_condition(step, data)
                 except Exception as e:
                     logger.error(f"评估条件时出错: {str(e)}")
                     step_data["status"] = "skipped"
@@ -531,30 +516,7 @@ class AgentChainExecutor:
                 # 执行Agent
                 logger.info(f"执行Agent链步骤 {i+1}/{len(chain_def.steps)}: {step.agent_name}")
                 
-                if hasattr(agent, "process"):
-                    output = await agent.process(agent_input)
-                else:
-                    # 尝试兼容不同的Agent接口
-                    if hasattr(agent, "run_task"):
-                        output_content, _, metadata = await agent.run_task(agent_input.query)
-                        output = AgentOutputSchema(
-                            content=output_content,
-                            metadata=metadata or {}
-                        )
-                    elif hasattr(agent, "aquery"):
-                        output_content = await agent.aquery(agent_input.query)
-                        output = AgentOutputSchema(
-                            content=output_content,
-                            metadata={}
-                        )
-                    elif hasattr(agent, "query"):
-                        output_content = agent.query(agent_input.query)
-                        output = AgentOutputSchema(
-                            content=output_content,
-                            metadata={}
-                        )
-                    else:
-                        raise ValueError(f"Agent {step.agent_name} 不支持任何已知的处理方法")
+                output = await self._invoke_agent(agent, step, agent_input)
                 
                 # 转换输出
                 transformed_output = self.transformer.transform_agent_output(
@@ -609,6 +571,369 @@ class AgentChainExecutor:
         
         return result
     
+    async def _execute_dag(
+        self,
+        chain_def: AgentChainDefinition,
+        input_message: str,
+        trace_id: str,
+        context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """按依赖图执行链
+        
+        每个步骤在其全部依赖完成后立即启动，同时运行的步骤数不超过
+        chain_def.max_concurrency；步骤失败时取消其所有下游步骤
+        
+        Args:
+            chain_def: 链定义
+            input_message: 输入消息
+            trace_id: 追踪ID
+            context: 上下文
+            
+        Returns:
+            执行结果
+        """
+        result = {
+            "execution_id": trace_id,
+            "chain_id": chain_def.id or "",
+            "chain_name": chain_def.name,
+            "status": "running",
+            "start_time": context["start_time"],
+            "steps": [],
+            "result": None
+        }
+        
+        graph = chain_def.dependency_graph()
+        steps = {step.key: step for step in chain_def.steps}
+        dependents: Dict[str, List[str]] = {key: [] for key in graph}
+        for key, deps in graph.items():
+            for dep in deps:
+                dependents[dep].append(key)
+        
+        base_data = {
+            "input": input_message,
+            "context": context
+        }
+        step_data_map: Dict[str, Dict[str, Any]] = {}
+        outputs: Dict[str, AgentOutputSchema] = {}
+        transformed: Dict[str, Dict[str, Any]] = {}
+        pending = set(graph)
+        skipped = set()
+        running: Dict[asyncio.Task, str] = {}
+        max_concurrency = max(1, chain_def.max_concurrency)
+        
+        def new_step_data(step: AgentChainStep, status: str) -> Dict[str, Any]:
+            return {
+                "agent_id": step.agent_id,
+                "agent_name": step.agent_name,
+                "position": step.position,
+                "role": step.role,
+                "step_id": step.key,
+                "status": status,
+                "start_time": datetime.now().isoformat(),
+                "output": None,
+                "error": None
+            }
+        
+        def cancel_downstream(key: str) -> None:
+            stack = list(dependents[key])
+            while stack:
+                child = stack.pop()
+                if child not in pending:
+                    continue
+                pending.discard(child)
+                step_data = new_step_data(steps[child], "cancelled")
+                step_data["error"] = f"上游步骤 {key} 执行失败"
+                step_data["end_time"] = step_data["start_time"]
+                step_data_map[child] = step_data
+                stack.extend(dependents[child])
+        
+        try:
+            while pending or running:
+                # 启动所有依赖已满足的步骤，被条件跳过的依赖视为已满足但不提供输出
+                ready = sorted(
+                    (key for key in pending
+                     if all(dep in outputs or dep in skipped for dep in graph[key])),
+                    key=lambda k: steps[k].position
+                )
+                newly_skipped = False
+                for key in ready:
+                    if len(running) >= max_concurrency:
+                        break
+                    pending.discard(key)
+                    step = steps[key]
+                    
+                    # 合并依赖步骤的输出作为输入数据
+                    completed_deps = [dep for dep in graph[key] if dep in outputs]
+                    data = dict(base_data)
+                    for dep in completed_deps:
+                        data.update(transformed[dep])
+                    
+                    if step.condition:
+                        try:
+                            should_execute = self._evaluate_condition(step, data)
+                            error = None
+                        except Exception as e:
+                            logger.error(f"评估条件时出错: {str(e)}")
+                            should_execute = False
+                            error = f"条件评估错误: {str(e)}"
+                        if not should_execute:
+                            step_data = new_step_data(step, "skipped")
+                            step_data["error"] = error
+                            step_data["end_time"] = step_data["start_time"]
+                            step_data_map[key] = step_data
+                            skipped.add(key)
+                            newly_skipped = True
+                            continue
+                    
+                    prev_output = self._merge_outputs(
+                        [steps[dep] for dep in completed_deps],
+                        [outputs[dep] for dep in completed_deps]
+                    )
+                    
+                    step_data_map[key] = new_step_data(step, "running")
+                    task = asyncio.create_task(self._run_dag_step(
+                        step=step,
+                        data=data,
+                        prev_output=prev_output,
+                        trace_id=trace_id,
+                        use_cache=chain_def.enable_step_cache
+                    ))
+                    running[task] = key
+                
+                if newly_skipped:
+                    # 跳过的步骤可能使下游步骤就绪
+                    continue
+                if not running:
+                    # 剩余步骤的依赖均无法满足
+                    break
+                
+                done, _ = await asyncio.wait(running.keys(), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    key = running.pop(task)
+                    step_data = step_data_map[key]
+                    step_data["end_time"] = datetime.now().isoformat()
+                    
+                    try:
+                        step_result = task.result()
+                    except Exception as e:
+                        if isinstance(e, asyncio.TimeoutError):
+                            error = f"步骤执行超时（{steps[key].timeout}秒）"
+                        else:
+                            error = str(e)
+                        logger.error(f"执行Agent链步骤 {steps[key].agent_name} 时出错: {error}")
+                        step_data["status"] = "failed"
+                        step_data["error"] = error
+                        cancel_downstream(key)
+                        continue
+                    
+                    outputs[key] = step_result["output"]
+                    transformed[key] = step_result["transformed"]
+                    step_data["status"] = "completed"
+                    step_data["output"] = step_result["output"]
+                    step_data["cached"] = step_result.get("cached", False)
+        finally:
+            for task in running:
+                task.cancel()
+        
+        result["steps"] = [
+            step_data_map[step.key] for step in chain_def.steps if step.key in step_data_map
+        ]
+        
+        # 以没有下游的已完成步骤作为链的最终输出
+        sink_keys = [key for key in graph if not dependents[key] and key in outputs]
+        if sink_keys:
+            result["result"] = self._merge_outputs(
+                [steps[key] for key in sink_keys],
+                [outputs[key] for key in sink_keys]
+            )
+        
+        failed = [data for data in result["steps"] if data["status"] == "failed"]
+        if failed:
+            result["status"] = "failed"
+            result["error"] = "; ".join(
+                f"步骤 {data['agent_name']} 执行失败: {data['error']}" for data in failed
+            )
+        else:
+            result["status"] = "completed"
+        result["end_time"] = datetime.now().isoformat()
+        
+        return result
+    
+    async def _run_dag_step(
+        self,
+        step: AgentChainStep,
+        data: Dict[str, Any],
+        prev_output: Optional[AgentOutputSchema],
+        trace_id: str,
+        use_cache: bool = False
+    ) -> Dict[str, Any]:
+        """执行依赖图中的单个步骤，支持超时和输出缓存
+        
+        Args:
+            step: 步骤定义
+            data: 输入数据
+            prev_output: 依赖步骤的（合并）输出
+            trace_id: 追踪ID
+            use_cache: 是否使用步骤输出缓存
+            
+        Returns:
+            步骤执行结果
+        """
+        agent_input = self.transformer.transform_to_agent_input(
+            data=data,
+            step=step,
+            prev_output=prev_output,
+            trace_id=trace_id
+        )
+        
+        cache_key = self._step_cache_key(step, agent_input, data.get("context")) if use_cache else None
+        if cache_key:
+            output = self.step_output_cache.get(cache_key)
+            if output is not None:
+                logger.info(f"复用缓存的Agent链步骤输出: {step.agent_name}")
+                cached = True
+            else:
+                cached = False
+        else:
+            output = None
+            cached = False
+        
+        if output is None:
+            agent = await self._get_agent(step.agent_id, step.agent_name)
+            if not agent:
+                raise ValueError(f"无法找到Agent: {step.agent_name} (ID: {step.agent_id})")
+            
+            logger.info(f"执行Agent链步骤: {step.agent_name}")
+            invocation = self._invoke_agent(agent, step, agent_input)
+            if step.timeout:
+                output = await asyncio.wait_for(invocation, timeout=step.timeout)
+            else:
+                output = await invocation
+            
+            if cache_key:
+                self.step_output_cache.set(cache_key, output)
+        
+        transformed_output = self.transformer.transform_agent_output(
+            output=output,
+            step=step,
+            trace_id=trace_id
+        )
+        
+        return {
+            "status": "completed",
+            "output": output,
+            "transformed": transformed_output.get("transformed", {}),
+            "cached": cached
+        }
+    
+    async def _invoke_agent(
+        self,
+        agent: Any,
+        step: AgentChainStep,
+        agent_input: AgentInputSchema
+    ) -> AgentOutputSchema:
+        """调用Agent，兼容不同的Agent接口
+        
+        Args:
+            agent: Agent实例
+            step: 步骤定义
+            agent_input: Agent输入
+            
+        Returns:
+            Agent输出
+        """
+        if hasattr(agent, "process"):
+            return await agent.process(agent_input)
+        if hasattr(agent, "run_task"):
+            output_content, _, metadata = await agent.run_task(agent_input.query)
+            return AgentOutputSchema(content=output_content, metadata=metadata or {})
+        if hasattr(agent, "aquery"):
+            output_content = await agent.aquery(agent_input.query)
+            return AgentOutputSchema(content=output_content, metadata={})
+        if hasattr(agent, "query"):
+            output_content = await asyncio.to_thread(agent.query, agent_input.query)
+            return AgentOutputSchema(content=output_content, metadata={})
+        raise ValueError(f"Agent {step.agent_name} 不支持任何已知的处理方法")
+    
+    def _step_cache_key(
+        self,
+        step: AgentChainStep,
+        agent_input: AgentInputSchema,
+        context: Optional[Dict[str, Any]] = None
+    ) -> Optional[str]:
+        """计算步骤输出缓存键
+        
+        使用决定Agent行为的输入部分（查询、参数、上游输出）以及调用方的用户和会话，
+        忽略时间戳和追踪ID等每次执行都会变化的字段；缓存只在同一用户同一会话内复用
+        
+        Args:
+            step: 步骤定义
+            agent_input: Agent输入
+            context: 链上下文
+            
+        Returns:
+            缓存键，输入无法序列化时返回None
+        """
+        context = context or {}
+        try:
+            payload = json.dumps(
+                {
+                    "scope": [context.get("user_id"), context.get("session_id")],
+                    "agent": [step.agent_id, step.agent_name],
+                    "query": agent_input.query,
+                    "parameters": agent_input.parameters or {},
+                    "prev": (agent_input.metadata or {}).get("prev_agent_output")
+                },
+                sort_keys=True,
+                ensure_ascii=False
+            )
+        except (TypeError, ValueError):
+            return None
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def _evaluate_condition(self, step: AgentChainStep, data: Dict[str, Any]) -> bool:
+        """评估步骤的执行条件
+        
+        Args:
+            step: 步骤定义
+            data: 当前输入数据，包含input、context和上游步骤的转换输出
+            
+        Returns:
+            条件是否满足
+        """
+        # 简单条件检查，实际应该解析表达式
+        return bool(eval(step.condition, {"__builtins__": {}}, dict(data)))
+    
+    def _merge_outputs(
+        self,
+        steps: List[AgentChainStep],
+        outputs: List[AgentOutputSchema]
+    ) -> Optional[AgentOutputSchema]:
+        """合并多个步骤的输出
+        
+        Args:
+            steps: 步骤定义列表
+            outputs: 对应的输出列表
+            
+        Returns:
+            单个输出原样返回，多个输出合并为一个，没有输出返回None
+        """
+        if not outputs:
+            return None
+        if len(outputs) == 1:
+            return outputs[0]
+        
+        combined_content = "\n\n".join(
+            f"{step.agent_name}: {output.content}" for step, output in zip(steps, outputs)
+        )
+        return AgentOutputSchema(
+            content=combined_content,
+            metadata={
+                "combined_from": len(outputs),
+                "source": "dag_chain"
+            }
+        )
+    
     async def _execute_step(
         self, 
         step: AgentChainStep, 
@@ -642,30 +967,7 @@ class AgentChainExecutor:
             # 执行Agent
             logger.info(f"执行Agent链步骤: {step.agent_name}")
             
-            if hasattr(agent, "process"):
-                output = await agent.process(agent_input)
-            else:
-                # 尝试兼容不同的Agent接口
-                if hasattr(agent, "run_task"):
-                    output_content, _, metadata = await agent.run_task(agent_input.query)
-                    output = AgentOutputSchema(
-                        content=output_content,
-                        metadata=metadata or {}
-                    )
-                elif hasattr(agent, "aquery"):
-                    output_content = await agent.aquery(agent_input.query)
-                    output = AgentOutputSchema(
-                        content=output_content,
-                        metadata={}
-                    )
-                elif hasattr(agent, "query"):
-                    output_content = agent.query(agent_input.query)
-                    output = AgentOutputSchema(
-                        content=output_content,
-                        metadata={}
-                    )
-                else:
-                    raise ValueError(f"Agent {step.agent_name} 不支持任何已知的处理方法")
+            output = await self._invoke_agent(agent, step, agent_input)
             
             # 转换输出
             transformed_output = self.transformer.transform_agent_output(
@@ -773,6 +1075,13 @@ class AgentChainExecutor:
                     trace_id=trace_id,
                     context=context
                 )
+            elif chain_def.mode == "dag":
+                result = await self._execute_dag(
+                    chain_def=chain_def,
+                    input_message=input_message,
+                    trace_id=trace_id,
+                    context=context
+                )
             else:
                 # 默认顺序执行
                 result = await self._execute_sequential(
@@ -819,8 +1128,9 @@ class AgentChainExecutor:
         """
         # 检查缓存
         cache_key = f"{agent_id}:{agent_name}"
-        if cache_key in self.agent_registry:
-            return self.agent_registry[cache_key]
+        agent = self.agent_registry.get(cache_key)
+        if agent is not None:
+            return agent
         
         # 从工厂获取，实际实现应根据系统架构定制
         try:
@@ -830,7 +1140,7 @@ class AgentChainExecutor:
             
             # 缓存Agent
             if agent:
-                self.agent_registry[cache_key] = agent
+                self.agent_registry.set(cache_key, agent)
                 
             return agent
             
@@ -87,6 +87,14 @@ class AgentChainStep(BaseModel):
     output_mapping: Dict[str, str] = Field({}, description="输出映射")
     condition: Optional[str] = Field(None, description="执行条件")
     fallback: Optional[Dict[str, Any]] = Field(None, description="失败时的后备操作")
+    step_id: Optional[str] = Field(None, description="步骤标识，默认使用position")
+    depends_on: List[str] = Field([], description="依赖的步骤标识列表（dag模式）")
+    timeout: Optional[float] = Field(None, description="步骤超时时间（秒）")
+    
+    @property
+    def key(self) -> str:
+        """步骤在依赖图中的唯一标识"""
+        return self.step_id or str(self.position)
 
 
 class AgentChainDefinition(BaseModel):
@@ -95,10 +103,49 @@ class AgentChainDefinition(BaseModel):
     name: str = Field(..., description="链名称")
     description: Optional[str] = Field(None, description="链描述")
     steps: List[AgentChainStep] = Field(..., description="链步骤")
-    mode: str = Field("sequential", description="执行模式: sequential, parallel, conditional")
+    mode: str = Field("sequential", description="执行模式: sequential, parallel, conditional, dag")
+    max_concurrency: int = Field(4, description="dag模式下的最大并发步骤数")
+    enable_step_cache: bool = Field(False, description="dag模式下是否在同一用户会话内复用相同输入的步骤输出")
     metadata: Optional[Dict[str, Any]] = Field(None, description="元数据")
     created_at: Optional[str] = Field(None, description="创建时间")
     updated_at: Optional[str] = Field(None, description="更新时间")
+    
+    def dependency_graph(self) -> Dict[str, List[str]]:
+        """构建步骤依赖图
+        
+        Returns:
+            步骤标识到其依赖步骤标识列表的映射
+            
+        Raises:
+            ValueError: 存在重复步骤、未知依赖或循环依赖时
+        """
+        graph: Dict[str, List[str]] = {}
+        for step in self.steps:
+            if step.key in graph:
+                raise ValueError(f"重复的步骤标识: {step.key}")
+            graph[step.key] = list(step.depends_on)
+        
+        for key, deps in graph.items():
+            for dep in deps:
+                if dep not in graph:
+                    raise ValueError(f"步骤 {key} 依赖未知步骤: {dep}")
+        
+        # 检测循环依赖（Kahn算法）
+        indegree = {key: len(deps) for key, deps in graph.items()}
+        ready = [key for key, degree in indegree.items() if degree == 0]
+        visited = 0
+        while ready:
+            current = ready.pop()
+            visited += 1
+            for key, deps in graph.items():
+                if current in deps:
+                    indegree[key] -= 1
+                    if indegree[key] == 0:
+                        ready.append(key)
+        if visited != len(graph):
+            raise ValueError("链步骤存在循环依赖")
+        
+        return graph
 
 
 class IAgent(Protocol):
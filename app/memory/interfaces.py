@@ -30,8 +30,9 @@ class MemoryConfig:
         max_tokens: Optional[int] = None, # 最大记忆token数
         max_items: Optional[int] = None,  # 最大记忆项数
         retrieval_strategy: str = "recency", # 检索策略：recency, relevance
-        storage_backend: str = "in_memory", # 存储后端：in_memory, redis, postgres
-        vector_backend: Optional[str] = None, # 向量后端：milvus, elasticsearch, pgvector
+        storage_backend: str = "in_memory", # 存储后端：in_memory, redis
+        vector_backend: Optional[str] = None, # 向量后端：为空或in_memory（进程内索引）
+        time_decay_half_life: Optional[float] = None, # 时间衰减半衰期(秒)，为None时不衰减
     ):
         self.memory_type = memory_type
         self.ttl = ttl
@@ -40,6 +41,7 @@ class MemoryConfig:
         self.retrieval_strategy = retrieval_strategy
         self.storage_backend = storage_backend
         self.vector_backend = vector_backend
+        self.time_decay_half_life = time_decay_half_life
 
 class IMemory(ABC, Generic[T]):
     """记忆接口抽象类"""
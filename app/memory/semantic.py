@@ -1,15 +1,139 @@
 """
 智能体记忆系统 - 语义记忆实现
 
-实现基于向量相似度检索的语义记忆。
+实现基于向量相似度检索的语义记忆。每个记忆在进程内维护一个NumPy索引，
+查询只需一次矩阵乘法加top-k选择；配置了存储后端时，记忆项(含嵌入向量)
+同步写入后端，索引在首次访问和定期同步时从后端加载。
 """
 
 from .base import BaseMemory
-from .interfaces import MemoryConfig, MemoryType
+from .interfaces import MemoryConfig
 from typing import Any, Dict, List, Optional, Tuple
+import asyncio
 import json
+import time
 from datetime import datetime
-from app.utils.core.database import get_db_engine
+import numpy as np
+
+# 从存储后端重新加载索引的间隔(秒)，用于感知其他实例的写入和后端过期
+_SYNC_INTERVAL = 60.0
+
+# 支持的存储后端；向量检索始终使用进程内索引
+SUPPORTED_STORAGE_BACKENDS = ("in_memory", "redis")
+SUPPORTED_VECTOR_BACKENDS = (None, "in_memory")
+
+
+class _SemanticIndex:
+    """进程内向量索引，行向量预先归一化，余弦相似度即点积"""
+    
+    def __init__(self, initial_capacity: int = 64):
+        self.keys: List[str] = []
+        self.positions: Dict[str, int] = {}  # 键到行号的映射
+        self._capacity = initial_capacity
+        self._matrix: Optional[np.ndarray] = None
+        self._created = np.zeros(initial_capacity, dtype=np.float64)
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    def _ensure_capacity(self, dimension: int, needed: int) -> None:
+        """按倍数扩容，均摊后单次写入为O(d)"""
+        if self._matrix is None:
+            self._capacity = max(self._capacity, needed)
+            self._matrix = np.zeros((self._capacity, dimension), dtype=np.float32)
+            self._created = np.zeros(self._capacity, dtype=np.float64)
+            return
+        
+        if self._matrix.shape[1] != dimension:
+            raise ValueError(f"嵌入维度不一致: 期望 {self._matrix.shape[1]}, 实际 {dimension}")
+        
+        if needed > self._capacity:
+            while self._capacity < needed:
+                self._capacity *= 2
+            matrix = np.zeros((self._capacity, dimension), dtype=np.float32)
+            matrix[:len(self.keys)] = self._matrix[:len(self.keys)]
+            created = np.zeros(self._capacity, dtype=np.float64)
+            created[:len(self.keys)] = self._created[:len(self.keys)]
+            self._matrix = matrix
+            self._created = created
+    
+    def upsert(self, key: str, vector: List[float], created: float) -> None:
+        """插入或覆盖一行"""
+        row = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(row))
+        if norm > 0:
+            row = row / norm
+        
+        position = self.positions.get(key)
+        if position is None:
+            self._ensure_capacity(row.shape[0], len(self.keys) + 1)
+            position = len(self.keys)
+            self.keys.append(key)
+            self.positions[key] = position
+        
+        self._matrix[position] = row
+        self._created[position] = created
+    
+    def remove(self, key: str) -> bool:
+        """删除一行，用最后一行填补空位"""
+        position = self.positions.pop(key, None)
+        if position is None:
+            return False
+        
+        last = len(self.keys) - 1
+        if position != last:
+            last_key = self.keys[last]
+            self._matrix[position] = self._matrix[last]
+            self._created[position] = self._created[last]
+            self.keys[position] = last_key
+            self.positions[last_key] = position
+        self.keys.pop()
+        
+        return True
+    
+    def clear(self) -> None:
+        """清空索引，保留已分配的矩阵"""
+        self.keys.clear()
+        self.positions.clear()
+    
+    def search(
+        self,
+        query_vector: List[float],
+        top_k: int,
+        half_life: Optional[float] = None
+    ) -> List[Tuple[str, float]]:
+        """检索最相似的top_k个键
+        
+        Args:
+            query_vector: 查询向量
+            top_k: 返回数量
+            half_life: 时间衰减半衰期(秒)，为None时不衰减
+        
+        Returns:
+            (键, 分数)列表，按分数降序
+        """
+        size = len(self.keys)
+        if size == 0 or top_k <= 0:
+            return []
+        
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if norm > 0:
+            query = query / norm
+        
+        scores = self._matrix[:size] @ query
+        if half_life:
+            ages = np.maximum(time.time() - self._created[:size], 0.0)
+            scores = scores * np.power(0.5, ages / half_life).astype(np.float32)
+        
+        if top_k < size:
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(size)
+        ordered = candidates[np.argsort(-scores[candidates], kind="stable")]
+        
+        return [(self.keys[i], float(scores[i])) for i in ordered]
+
 
 class SemanticMemory(BaseMemory[Dict[str, Any]]):
     """语义记忆实现，基于向量相似度检索"""
@@ -17,133 +141,204 @@ class SemanticMemory(BaseMemory[Dict[str, Any]]):
     def __init__(self, memory_id: str, owner_id: str, config: MemoryConfig):
         super().__init__(memory_id, owner_id, config)
         self.items = {}  # 键到记忆项的映射
+        self.index = _SemanticIndex()
+        self._half_life = getattr(config, "time_decay_half_life", None)
         
-        # 初始化向量存储
-        self.vector_store = self._initialize_vector_store(config.vector_backend)
-        
-    def _initialize_vector_store(self, vector_backend: Optional[str]):
-        """初始化向量存储"""
-        if vector_backend == "milvus":
-            from app.utils.milvus_client import get_milvus_client
-            return get_milvus_client()
-        elif vector_backend == "elasticsearch":
-            from app.utils.elasticsearch_client import get_elasticsearch_client
-            return get_elasticsearch_client()
-        elif vector_backend == "pgvector":
-            return get_db_engine()
-        else:
-            # 默认使用内存向量存储
-            # 使用新的标准化向量存储组件
-            from app.utils.storage.vector_storage import InMemoryVectorStore
-            return InMemoryVectorStore()
+        # 初始化存储后端
+        vector_backend = getattr(config, "vector_backend", None)
+        if vector_backend not in SUPPORTED_VECTOR_BACKENDS:
+            raise ValueError(f"语义记忆不支持向量后端: {vector_backend}，向量检索使用进程内索引")
+        self.storage = self._initialize_storage(config.storage_backend)
+        self._synced_at: Optional[float] = None
+        self._load_lock = asyncio.Lock()
+        # 从存储后端加载期间本地发生的变更：键 -> 记忆项（None表示删除）
+        self._changes_during_load: Optional[Dict[str, Optional[Dict[str, Any]]]] = None
+        self._cleared_during_load = False
     
-    async def _get_embedding(self, text: str) -> List[float]:
-        """获取文本嵌入向量"""
-        from app.utils.embedding import get_embedding
-        return await get_embedding(text)
+    def _initialize_storage(self, storage_backend: Optional[str]):
+        """初始化存储后端，in_memory时只使用进程内索引"""
+        if storage_backend in (None, "in_memory"):
+            return None
+        if storage_backend == "redis":
+            from .storage.redis import RedisMemoryStorage
+            return RedisMemoryStorage(self.memory_id, ttl=self.config.ttl, serializer="msgpack")
+        raise ValueError(
+            f"语义记忆不支持存储后端: {storage_backend}，可选: {', '.join(SUPPORTED_STORAGE_BACKENDS)}"
+        )
     
-    async def add(self, key: str, value: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None) -> bool:
-        """添加记忆项"""
-        await super().add(key, value, metadata)
+    def _is_synced(self) -> bool:
+        return self._synced_at is not None and time.time() - self._synced_at < _SYNC_INTERVAL
+    
+    async def _ensure_loaded(self) -> None:
+        """首次访问或同步间隔到期时从存储后端重建索引
+        
+        读取后端期间本地发生的写入和删除会合并到重建结果上，不会丢失
+        """
+        if self.storage is None or self._is_synced():
+            return
         
-        # 提取文本内容
+        async with self._load_lock:
+            if self._is_synced():
+                return
+            
+            self._changes_during_load = {}
+            self._cleared_during_load = False
+            try:
+                records = await self.storage.get_all()
+            finally:
+                changes = self._changes_during_load
+                cleared = self._cleared_during_load
+                self._changes_during_load = None
+            
+            if cleared:
+                records = {}
+            self.items = {}
+            self.index.clear()
+            for key, item in records.items():
+                if not item.get("embedding") or key in changes:
+                    continue
+                self.items[key] = item
+                self.index.upsert(key, item["embedding"], item.get("timestamp", time.time()))
+            for key, item in changes.items():
+                if item is not None:
+                    self.items[key] = item
+                    self.index.upsert(key, item["embedding"], item["timestamp"])
+            self._synced_at = time.time()
+    
+    def _track_change(self, key: str, item: Optional[Dict[str, Any]]) -> None:
+        """加载进行中时记录本地变更，供加载完成后合并"""
+        if self._changes_during_load is not None:
+            self._changes_during_load[key] = item
+    
+    @staticmethod
+    def _extract_text(value: Dict[str, Any]) -> str:
+        """提取用于嵌入的文本内容"""
         text = value.get("text", "")
         if not text and "content" in value:
             text = value["content"]
-            
-        if not text:
-            text = json.dumps(value)
         
-        # 获取嵌入向量
-        embedding = await self._get_embedding(text)
+        if not text:
+            text = json.dumps(value, ensure_ascii=False)
         
-        # 创建记忆项
+        return text
+    
+    async def _get_embedding(self, text: str) -> List[float]:
+        """获取文本嵌入向量"""
+        from app.utils.text.embedding_utils import get_embedding
+        return await get_embedding(text)
+    
+    async def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """批量获取文本嵌入向量"""
+        from app.utils.text.embedding_utils import batch_get_embeddings
+        return await batch_get_embeddings(texts)
+    
+    def _put(self, key: str, value: Dict[str, Any], metadata: Optional[Dict[str, Any]], embedding: List[float]) -> Dict[str, Any]:
+        """写入本地记忆项和索引"""
+        now = time.time()
         memory_item = {
             "key": key,
             "value": value,
             "metadata": metadata or {},
-            "embedding": embedding,
-            "created_at": datetime.now().isoformat()
+            "embedding": list(embedding),
+            "created_at": datetime.fromtimestamp(now).isoformat(),
+            "timestamp": now
         }
-        
-        # 存储记忆项
         self.items[key] = memory_item
+        self.index.upsert(key, memory_item["embedding"], now)
+        self._track_change(key, memory_item)
+        return memory_item
+    
+    async def add(self, key: str, value: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """添加记忆项"""
+        await super().add(key, value, metadata)
+        await self._ensure_loaded()
         
-        # 添加到向量存储
-        await self.vector_store.add_vector(
-            id=key,
-            vector=embedding,
-            metadata={
-                "memory_id": self.memory_id,
-                "owner_id": self.owner_id,
-                "key": key,
-                **metadata or {}
-            }
-        )
+        # 获取嵌入向量
+        embedding = await self._get_embedding(self._extract_text(value))
+        
+        memory_item = self._put(key, value, metadata, embedding)
+        
+        if self.storage is not None:
+            await self.storage.add(key, memory_item)
+        
+        return True
+    
+    async def add_many(self, items: List[Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]]) -> bool:
+        """批量添加记忆项，嵌入向量批量计算，存储后端一次写入
+        
+        Args:
+            items: (键, 值, 元数据)列表
+        
+        Returns:
+            是否添加成功
+        """
+        self.last_accessed = datetime.now()
+        if not items:
+            return True
+        await self._ensure_loaded()
+        
+        embeddings = await self._get_embeddings([self._extract_text(value) for _, value, _ in items])
+        
+        records = []
+        for (key, value, metadata), embedding in zip(items, embeddings):
+            records.append((key, self._put(key, value, metadata, embedding), None))
+        
+        if self.storage is not None:
+            await self.storage.add_many(records)
         
         return True
     
     async def query(self, query: str, top_k: int = 5) -> List[Tuple[str, Dict[str, Any], float]]:
-        """查询最相关记忆"""
+        """查询最相关记忆
+        
+        配置了time_decay_half_life时，相似度按记忆年龄指数衰减
+        """
         await super().query(query)
+        await self._ensure_loaded()
         
         # 空查询时返回最近的项
         if not query:
-            items = list(self.items.values())
-            items.sort(key=lambda x: x["created_at"], reverse=True)
+            items = sorted(self.items.values(), key=lambda x: x["timestamp"], reverse=True)
             return [(item["key"], item["value"], 1.0) for item in items[:top_k]]
         
         # 获取查询嵌入向量
         query_embedding = await self._get_embedding(query)
         
         # 向量检索
-        results = await self.vector_store.search_vectors(
-            query_vector=query_embedding,
-            filter={"memory_id": self.memory_id},
-            top_k=top_k
-        )
-        
-        # 整理结果
-        memory_results = []
-        for result in results:
-            key = result["id"]
-            if key in self.items:
-                memory_results.append(
-                    (key, self.items[key]["value"], result["score"])
-                )
-                
-        return memory_results
+        return [
+            (key, self.items[key]["value"], score)
+            for key, score in self.index.search(query_embedding, top_k, self._half_life)
+        ]
     
     async def get(self, key: str) -> Optional[Dict[str, Any]]:
         """获取记忆项"""
         await super().get(key)
+        await self._ensure_loaded()
         
         if key not in self.items:
             return None
-            
+        
         return self.items[key]["value"]
     
     async def update(self, key: str, value: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None) -> bool:
-        """更新记忆项"""
-        # 删除旧项
-        if key in self.items:
-            await self.delete(key)
-            
-        # 添加新项
+        """更新记忆项，索引按键原地覆盖"""
         return await self.add(key, value, metadata)
     
     async def delete(self, key: str) -> bool:
         """删除记忆项"""
         await super().delete(key)
+        await self._ensure_loaded()
         
         if key not in self.items:
             return False
-            
-        # 从向量存储删除
-        await self.vector_store.delete_vector(key)
         
-        # 从本地存储删除
+        # 从索引和本地存储删除
+        self.index.remove(key)
         del self.items[key]
+        self._track_change(key, None)
+        
+        if self.storage is not None:
+            await self.storage.delete(key)
         
         return True
     
@@ -151,8 +346,14 @@ class SemanticMemory(BaseMemory[Dict[str, Any]]):
         """清空所有记忆"""
         await super().clear()
         
-        # 删除所有向量
-        for key in list(self.items.keys()):
-            await self.delete(key)
-            
+        self.items = {}
+        self.index.clear()
+        if self._changes_during_load is not None:
+            self._changes_during_load.clear()
+            self._cleared_during_load = True
+        
+        if self.storage is not None:
+            await self.storage.clear()
+            self._synced_at = time.time()
+        
         return True
@@ -1,14 +1,17 @@
 """
 智能体记忆系统 - 短期记忆实现
 
-实现基于最近N轮对话的短期记忆。
+实现基于最近N轮对话的短期记忆。记忆项保存在固定容量的环形缓冲区中，
+追加写入、淘汰最旧项和读取最近k项都不需要遍历全部记忆；覆盖和删除会把
+其后的项前移，保持缓冲区连续，被删除的项不再占用容量。
 """
 
 from .base import BaseMemory
-from .interfaces import MemoryConfig, MemoryType
+from .interfaces import MemoryConfig
 from typing import Any, Dict, List, Optional, Tuple
-from collections import deque
 from datetime import datetime
+import math
+import time
 
 class ShortTermMemory(BaseMemory[Dict[str, Any]]):
     """短期记忆实现，基于最近N轮对话"""
@@ -16,49 +19,85 @@ class ShortTermMemory(BaseMemory[Dict[str, Any]]):
     def __init__(self, memory_id: str, owner_id: str, config: MemoryConfig):
         super().__init__(memory_id, owner_id, config)
         self.max_items = config.max_items or 10
-        self.items = deque(maxlen=self.max_items)
-        self.key_index = {}  # 键到索引的映射
+        self.items: List[Optional[Dict[str, Any]]] = [None] * self.max_items  # 环形缓冲区
+        self.key_index = {}  # 键到槽位的映射
+        self._head = 0  # 下一次写入的槽位
+        self._count = 0  # 有效记忆项数量
+        self._half_life = getattr(config, "time_decay_half_life", None)
+    
+    def _remove_slot(self, slot: int) -> None:
+        """移除槽位上的项，其后较新的项依次前移一格，缓冲区中不留空洞"""
+        last = (self._head - 1) % self.max_items
+        while slot != last:
+            following = (slot + 1) % self.max_items
+            item = self.items[following]
+            self.items[slot] = item
+            if item is not None:
+                self.key_index[item["key"]] = slot
+            slot = following
+        self.items[last] = None
+        self._head = last
+        self._count -= 1
+    
+    def _write(self, key: str, value: Dict[str, Any], metadata: Optional[Dict[str, Any]]) -> None:
+        """写入一项到环形缓冲区"""
+        # 如果键已存在，先移除旧项，新值作为最新的一项写入
+        old_slot = self.key_index.pop(key, None)
+        if old_slot is not None:
+            self._remove_slot(old_slot)
         
-    async def add(self, key: str, value: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None) -> bool:
-        """添加记忆项"""
-        await super().add(key, value, metadata)
+        # 写入槽位上的旧项是最早的记忆，直接淘汰
+        evicted = self.items[self._head]
+        if evicted is not None:
+            del self.key_index[evicted["key"]]
+            self._count -= 1
         
-        # 创建记忆项
-        memory_item = {
+        self.items[self._head] = {
             "key": key,
             "value": value,
             "metadata": metadata or {},
-            "created_at": datetime.now().isoformat()
+            "created_at": datetime.now().isoformat(),
+            "timestamp": time.time()
         }
-        
-        # 如果键已存在，先删除旧项
-        if key in self.key_index:
-            old_index = self.key_index[key]
-            self.items[old_index] = None  # 标记为删除
-        
-        # 添加新项
-        self.items.append(memory_item)
-        self.key_index[key] = len(self.items) - 1
-        
+        self.key_index[key] = self._head
+        self._count += 1
+        self._head = (self._head + 1) % self.max_items
+    
+    def _recent(self, k: int) -> List[Dict[str, Any]]:
+        """从新到旧返回最近k项"""
+        results = []
+        slot = self._head
+        for _ in range(self.max_items):
+            if len(results) >= k:
+                break
+            slot = (slot - 1) % self.max_items
+            item = self.items[slot]
+            if item is not None:
+                results.append(item)
+        return results
+    
+    async def add(self, key: str, value: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None) -> bool:
+        """添加记忆项"""
+        await super().add(key, value, metadata)
+        self._write(key, value, metadata)
+        return True
+    
+    async def add_many(self, items: List[Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]]) -> bool:
+        """批量添加记忆项，items为(键, 值, 元数据)列表"""
+        self.last_accessed = datetime.now()
+        for key, value, metadata in items:
+            self._write(key, value, metadata)
         return True
     
     async def get(self, key: str) -> Optional[Dict[str, Any]]:
         """获取记忆项"""
         await super().get(key)
         
-        if key not in self.key_index:
-            return None
-        
-        index = self.key_index[key]
-        if index >= len(self.items):
+        slot = self.key_index.get(key)
+        if slot is None:
             return None
-            
-        item = self.items[index]
         
-        if item is None:  # 已删除
-            return None
-            
-        return item["value"]
+        return self.items[slot]["value"]
     
     async def update(self, key: str, value: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None) -> bool:
         """更新记忆项"""
@@ -68,13 +107,11 @@ class ShortTermMemory(BaseMemory[Dict[str, Any]]):
         """删除记忆项"""
         await super().delete(key)
         
-        if key not in self.key_index:
+        slot = self.key_index.pop(key, None)
+        if slot is None:
             return False
         
-        index = self.key_index[key]
-        if index < len(self.items):
-            self.items[index] = None  # 标记为删除
-        del self.key_index[key]
+        self._remove_slot(slot)
         
         return True
     
@@ -82,21 +119,30 @@ class ShortTermMemory(BaseMemory[Dict[str, Any]]):
         """清空所有记忆"""
         await super().clear()
         
-        self.items.clear()
+        self.items = [None] * self.max_items
         self.key_index.clear()
+        self._head = 0
+        self._count = 0
         
         return True
     
     async def query(self, query: str, top_k: int = 5) -> List[Tuple[str, Dict[str, Any], float]]:
-        """查询最相关记忆，短期记忆简单返回最近的几项"""
-        await super().query(query)
+        """查询最相关记忆，短期记忆返回最近的几项
         
-        # 收集非空项
-        valid_items = [item for item in self.items if item is not None]
+        配置了time_decay_half_life时，分数按记忆年龄指数衰减，否则所有项权重相同
+        """
+        await super().query(query)
         
-        # 按最近顺序返回
+        now = time.time()
         results = []
-        for item in reversed(valid_items[-top_k:]):
-            results.append((item["key"], item["value"], 1.0))  # 简单实现，所有项权重相同
-            
+        for item in self._recent(top_k):
+            if self._half_life:
+                score = math.pow(0.5, (now - item["timestamp"]) / self._half_life)
+            else:
+                score = 1.0
+            results.append((item["key"], item["value"], score))
+        
         return results
+    
+    def __len__(self) -> int:
+        return self._count
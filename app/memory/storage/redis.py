@@ -1,105 +1,186 @@
 """
 智能体记忆系统 - Redis存储后端
 
-实现基于Redis的记忆存储。
+实现基于Redis的记忆存储。每个记忆的所有项保存在一个哈希中，
+单项过期通过有序集合索引模拟，读取全部记忆只需一次往返。
 """
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple
 import json
-import hashlib
+import time
 from datetime import datetime
-from app.utils.core.cache import get_redis_client
+import redis.asyncio as aioredis
+from app.config import settings
+
+try:
+    import msgpack
+except ImportError:  # msgpack为可选依赖
+    msgpack = None
+
+# 清理已过期的项后返回整个哈希
+_GET_ALL_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for i = 1, #expired, 5000 do
+    local batch = {unpack(expired, i, math.min(i + 4999, #expired))}
+    redis.call('HDEL', KEYS[1], unpack(batch))
+    redis.call('ZREM', KEYS[2], unpack(batch))
+end
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# 记忆存储使用的Redis连接池，不解码响应以支持msgpack
+_memory_redis_pool = None
+
+
+def _get_memory_redis_client() -> aioredis.Redis:
+    """获取记忆存储的异步Redis客户端"""
+    global _memory_redis_pool
+    if _memory_redis_pool is None:
+        _memory_redis_pool = aioredis.ConnectionPool(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD or None,
+            decode_responses=False
+        )
+    return aioredis.Redis(connection_pool=_memory_redis_pool)
+
 
 class RedisMemoryStorage:
     """Redis记忆存储后端"""
     
-    def __init__(self, memory_id: str, redis_client=None, ttl: Optional[int] = None):
+    def __init__(
+        self,
+        memory_id: str,
+        redis_client=None,
+        ttl: Optional[int] = None,
+        serializer: str = "json"
+    ):
         """初始化Redis存储
         
         Args:
             memory_id: 记忆ID
-            redis_client: Redis客户端实例，如果为None则创建新客户端
+            redis_client: redis.asyncio客户端实例，如果为None则创建新客户端
             ttl: 记忆生存时间(秒)
+            serializer: 序列化方式，json或msgpack（需要安装msgpack）
         """
-        self.redis = redis_client or get_redis_client()
+        self.redis = redis_client or _get_memory_redis_client()
         self.memory_id = memory_id
         self.ttl = ttl
+        self.serializer = "msgpack" if serializer == "msgpack" and msgpack is not None else "json"
         self._prefix = f"memory:{memory_id}:"
+        self._items_key = f"{self._prefix}items"
+        self._expiry_key = f"{self._prefix}expiry"
+        self._get_all_script = self.redis.register_script(_GET_ALL_SCRIPT)
+    
+    def _serialize(self, data: Dict[str, Any]) -> bytes:
+        """序列化记忆项"""
+        if self.serializer == "msgpack":
+            return msgpack.packb(data, use_bin_type=True, default=str)
+        return json.dumps(data, ensure_ascii=False, default=str).encode("utf-8")
+    
+    @staticmethod
+    def _deserialize(raw) -> Optional[Dict[str, Any]]:
+        """反序列化记忆项，按首字节识别格式，兼容两种序列化方式混存"""
+        if raw is None:
+            return None
+        if isinstance(raw, str):
+            raw = raw.encode("utf-8")
+        try:
+            if raw[:1] == b"{" or msgpack is None:
+                return json.loads(raw)
+            return msgpack.unpackb(raw, raw=False)
+        except Exception:
+            return None
+    
+    @staticmethod
+    def _decode_key(key) -> str:
+        return key.decode("utf-8") if isinstance(key, bytes) else key
+    
+    def _write(self, pipe, items: List[Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]]) -> None:
+        """向流水线写入记忆项"""
+        created_at = datetime.now().isoformat()
+        pipe.hset(self._items_key, mapping={
+            key: self._serialize({
+                "value": value,
+                "metadata": metadata or {},
+                "created_at": created_at
+            })
+            for key, value, metadata in items
+        })
         
+        if self.ttl:
+            expire_at = time.time() + self.ttl
+            pipe.zadd(self._expiry_key, {key: expire_at for key, _, _ in items})
+            # 整体过期时间随最近一次写入顺延，长期不用的记忆会被Redis回收
+            pipe.expire(self._items_key, self.ttl)
+            pipe.expire(self._expiry_key, self.ttl)
+    
     async def add(self, key: str, value: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None) -> bool:
         """添加记忆项到Redis"""
-        # 组合数据
-        data = {
-            "value": value,
-            "metadata": metadata or {},
-            "created_at": datetime.now().isoformat()
-        }
+        return await self.add_many([(key, value, metadata)])
+    
+    async def add_many(self, items: List[Tuple[str, Dict[str, Any], Optional[Dict[str, Any]]]]) -> bool:
+        """批量添加记忆项
         
-        # 序列化
-        serialized = json.dumps(data)
+        Args:
+            items: (键, 值, 元数据)列表
         
-        # 存储到Redis
-        redis_key = f"{self._prefix}item:{key}"
-        await self.redis.set(redis_key, serialized, ex=self.ttl)
+        Returns:
+            是否添加成功
+        """
+        if not items:
+            return True
         
-        # 添加到索引
-        index_key = f"{self._prefix}index"
-        await self.redis.sadd(index_key, key)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            self._write(pipe, items)
+            await pipe.execute()
         
         return True
-        
+    
     async def get(self, key: str) -> Optional[Dict[str, Any]]:
         """从Redis获取记忆项"""
-        redis_key = f"{self._prefix}item:{key}"
-        data = await self.redis.get(redis_key)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hget(self._items_key, key)
+            pipe.zscore(self._expiry_key, key)
+            data, expire_at = await pipe.execute()
         
         if not data:
             return None
-            
-        try:
-            parsed = json.loads(data)
-            return parsed.get("value")
-        except json.JSONDecodeError:
+        
+        if expire_at is not None and float(expire_at) <= time.time():
+            await self.delete(key)
             return None
-            
+        
+        parsed = self._deserialize(data)
+        return parsed.get("value") if parsed else None
+    
     async def delete(self, key: str) -> bool:
         """从Redis删除记忆项"""
-        # 删除项
-        redis_key = f"{self._prefix}item:{key}"
-        await self.redis.delete(redis_key)
-        
-        # 从索引删除
-        index_key = f"{self._prefix}index"
-        await self.redis.srem(index_key, key)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hdel(self._items_key, key)
+            pipe.zrem(self._expiry_key, key)
+            await pipe.execute()
         
         return True
-        
+    
     async def clear(self) -> bool:
         """清空所有记忆"""
-        # 获取所有键
-        index_key = f"{self._prefix}index"
-        keys = await self.redis.smembers(index_key)
-        
-        # 删除所有项
-        for key in keys:
-            await self.delete(key)
-            
-        # 删除索引
-        await self.redis.delete(index_key)
-        
+        await self.redis.delete(self._items_key, self._expiry_key)
         return True
-        
+    
     async def get_all(self) -> Dict[str, Dict[str, Any]]:
-        """获取所有记忆项"""
-        # 获取所有键
-        index_key = f"{self._prefix}index"
-        keys = await self.redis.smembers(index_key)
+        """获取所有记忆项（一次往返，同时清理已过期的项）"""
+        raw = await self._get_all_script(
+            keys=[self._items_key, self._expiry_key],
+            args=[time.time()]
+        )
         
-        # 获取所有项
+        # HGETALL在Lua中返回扁平的[字段, 值, 字段, 值, ...]
         result = {}
-        for key in keys:
-            value = await self.get(key)
-            if value:
-                result[key] = value
-                
+        for i in range(0, len(raw), 2):
+            parsed = self._deserialize(raw[i + 1])
+            if parsed and parsed.get("value"):
+                result[self._decode_key(raw[i])] = parsed["value"]
+        
         return result
@@ -0,0 +1,378 @@
+"""
+WebSocket扇出模块
+每条消息只序列化一次，通过发布订阅总线转发到所有工作进程；各进程把同一帧文本
+放入本地连接的发送队列，由每个连接自己的发送协程写出，慢客户端只会积压自己的队列
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import WebSocket
+
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，缺失时退回标准库
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# 广播目标
+BROADCAST = "*"
+
+MessageHandler = Callable[[str], Awaitable[None]]
+
+
+def encode_frame(message: Any) -> str:
+    """把消息编码为WebSocket文本帧，字符串原样发送"""
+    if isinstance(message, str):
+        return message
+    if orjson is not None:
+        try:
+            return orjson.dumps(message, default=str, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        except TypeError:
+            # orjson不支持的输入（如超出64位的整数）交给标准库处理
+            pass
+    return json.dumps(message, ensure_ascii=False, default=str)
+
+
+class PubSubBus:
+    """发布订阅总线接口"""
+    
+    async def publish(self, channel: str, data: str) -> None:
+        """向频道发布一条文本消息"""
+        raise NotImplementedError
+    
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        """订阅频道，收到的每条消息交给handler处理"""
+        raise NotImplementedError
+    
+    async def close(self) -> None:
+        """释放订阅资源"""
+
+
+class InProcessPubSubBus(PubSubBus):
+    """进程内总线，用于单进程部署和测试"""
+    
+    def __init__(self):
+        self._handlers: Dict[str, list] = {}
+    
+    async def publish(self, channel: str, data: str) -> None:
+        for handler in list(self._handlers.get(channel, ())):
+            try:
+                await handler(data)
+            except Exception as e:
+                logger.error(f"处理频道 {channel} 的消息失败: {str(e)}")
+        # 让出事件循环，使发送协程能在连续发布之间写出队列，避免突发消息把队列挤满
+        await asyncio.sleep(0)
+    
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        self._handlers.setdefault(channel, []).append(handler)
+    
+    async def close(self) -> None:
+        self._handlers.clear()
+
+
+class RedisPubSubBus(PubSubBus):
+    """基于Redis发布订阅的跨进程总线，监听协程出错后按指数退避重连并重新订阅"""
+    
+    def __init__(self, reconnect_backoff: float = 1.0, max_reconnect_backoff: float = 30.0):
+        self._client = None
+        self._pubsub = None
+        self._listener: Optional[asyncio.Task] = None
+        self._handlers: Dict[str, MessageHandler] = {}
+        self._closed = False
+        self._failures = 0
+        self.reconnect_backoff = reconnect_backoff
+        self.max_reconnect_backoff = max_reconnect_backoff
+    
+    async def _get_client(self):
+        if self._client is None:
+            import redis.asyncio as aioredis
+            from app.utils.core.cache.async_redis import get_async_redis_pool
+            self._client = aioredis.Redis(connection_pool=await get_async_redis_pool())
+        return self._client
+    
+    async def publish(self, channel: str, data: str) -> None:
+        client = await self._get_client()
+        await client.publish(channel, data)
+    
+    async def subscribe(self, channel: str, handler: MessageHandler) -> None:
+        client = await self._get_client()
+        if self._pubsub is None:
+            self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(channel)
+        self._handlers[channel] = handler
+        self._closed = False
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._supervise())
+    
+    async def _resubscribe(self) -> None:
+        """用新的订阅连接重新订阅所有频道"""
+        client = await self._get_client()
+        pubsub = client.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(*self._handlers)
+        self._pubsub = pubsub
+    
+    async def _supervise(self) -> None:
+        """运行监听协程，Redis出错时按指数退避重连，直到总线关闭"""
+        while not self._closed:
+            try:
+                if self._pubsub is None:
+                    await self._resubscribe()
+                    logger.info("扇出总线已重新订阅Redis频道")
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"扇出总线监听失败，准备重连: {str(e)}")
+            if self._closed:
+                break
+            if self._pubsub is not None:
+                try:
+                    await self._pubsub.close()
+                except Exception:
+                    pass
+                self._pubsub = None
+            self._failures += 1
+            await asyncio.sleep(min(self.reconnect_backoff * 2 ** (self._failures - 1), self.max_reconnect_backoff))
+    
+    async def _listen(self) -> None:
+        """读取订阅消息并分发"""
+        async for message in self._pubsub.listen():
+            # 收到消息说明连接已恢复，重置退避
+            self._failures = 0
+            if message.get("type") != "message":
+                continue
+            channel = message["channel"]
+            data = message["data"]
+            if isinstance(channel, bytes):
+                channel = channel.decode("utf-8")
+            if isinstance(data, bytes):
+                data = data.decode("utf-8")
+            
+            handler = self._handlers.get(channel)
+            if handler is None:
+                continue
+            try:
+                await handler(data)
+            except Exception as e:
+                logger.error(f"处理频道 {channel} 的消息失败: {str(e)}")
+    
+    async def close(self) -> None:
+        self._closed = True
+        if self._listener is not None:
+            self._listener.cancel()
+            self._listener = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+            self._pubsub = None
+
+
+class _Connection:
+    """一个WebSocket连接及其有界发送队列"""
+    
+    __slots__ = ("websocket", "user_id", "queue", "sender", "dropped")
+    
+    def __init__(self, websocket: WebSocket, user_id: Any, queue_size: int):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sender: Optional[asyncio.Task] = None
+        self.dropped = 0
+    
+    def offer(self, frame: str) -> bool:
+        """放入一帧，队列满时丢弃最旧的一帧"""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            self.dropped += 1
+            self.queue.put_nowait(frame)
+            return False
+
+
+class FanoutHub:
+    """
+    WebSocket扇出中心
+    
+    发送接口把(目标, 帧)发布到总线；每个进程收到后只做入队，不等待任何网络写入，
+    因此一次广播的耗时只与本进程连接数的入队开销相关。实际发送由各连接的
+    发送协程完成，max_concurrent_sends限制同时进行的发送数
+    """
+    
+    def __init__(
+        self,
+        bus: Optional[PubSubBus] = None,
+        channel: str = "websocket:fanout",
+        queue_size: int = 256,
+        max_concurrent_sends: int = 1000,
+        send_timeout: float = 10.0
+    ):
+        """
+        初始化扇出中心
+        
+        参数:
+            bus: 发布订阅总线，默认使用进程内总线
+            channel: 总线频道
+            queue_size: 每个连接的发送队列容量，满时丢弃最旧的帧
+            max_concurrent_sends: 本进程同时进行的发送数上限
+            send_timeout: 单次写出积压帧的超时(秒)，超时的连接会被关闭
+        """
+        self.bus = bus or InProcessPubSubBus()
+        self.channel = channel
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.max_concurrent_sends = max_concurrent_sends
+        
+        # 用户ID(字符串) -> {websocket: 连接}
+        self.connections: Dict[Any, Dict[WebSocket, _Connection]] = {}
+        self._send_slots: Optional[asyncio.Semaphore] = None
+        self._subscribed = False
+        self._subscribe_lock: Optional[asyncio.Lock] = None
+        
+        self.stats = {"published": 0, "delivered": 0, "dropped": 0, "send_errors": 0, "bus_errors": 0}
+    
+    async def start(self) -> None:
+        """订阅总线频道（幂等）"""
+        if self._subscribed:
+            return
+        if self._subscribe_lock is None:
+            self._subscribe_lock = asyncio.Lock()
+        async with self._subscribe_lock:
+            if not self._subscribed:
+                try:
+                    await self.bus.subscribe(self.channel, self._on_bus_message)
+                except Exception as e:
+                    # 总线不可用时退回进程内总线，只能送达本进程的连接
+                    logger.warning(f"订阅扇出总线失败，退回进程内总线: {str(e)}")
+                    self.bus = InProcessPubSubBus()
+                    await self.bus.subscribe(self.channel, self._on_bus_message)
+                self._subscribed = True
+    
+    @property
+    def connection_count(self) -> int:
+        """本进程的连接数"""
+        return sum(len(conns) for conns in self.connections.values())
+    
+    async def connect(self, websocket: WebSocket, user_id: Any) -> None:
+        """接受连接并启动其发送协程"""
+        await self.start()
+        await websocket.accept()
+        if self._send_slots is None:
+            self._send_slots = asyncio.Semaphore(self.max_concurrent_sends)
+        
+        connection = _Connection(websocket, user_id, self.queue_size)
+        connection.sender = asyncio.create_task(self._send_loop(connection))
+        self.connections.setdefault(str(user_id), {})[websocket] = connection
+    
+    def disconnect(self, websocket: WebSocket, user_id: Any) -> None:
+        """移除连接并停止其发送协程"""
+        key = str(user_id)
+        conns = self.connections.get(key)
+        if not conns:
+            return
+        connection = conns.pop(websocket, None)
+        if not conns:
+            self.connections.pop(key, None)
+        if connection is not None and connection.sender is not None:
+            if connection.sender is not asyncio.current_task():
+                connection.sender.cancel()
+    
+    def send_local(self, websocket: WebSocket, user_id: Any, message: Any) -> bool:
+        """通过连接的发送队列向本进程的单个连接发送消息"""
+        connection = self.connections.get(str(user_id), {}).get(websocket)
+        if connection is None:
+            return False
+        if connection.offer(encode_frame(message)):
+            return True
+        self.stats["dropped"] += 1
+        return False
+    
+    async def send_to_user(self, user_id: Any, message: Any) -> None:
+        """向用户在所有进程中的连接发送消息"""
+        await self._publish(str(user_id), encode_frame(message))
+    
+    async def broadcast(self, message: Any) -> None:
+        """向所有进程中的所有连接广播消息"""
+        await self._publish(BROADCAST, encode_frame(message))
+    
+    async def _publish(self, target: str, frame: str) -> None:
+        await self.start()
+        self.stats["published"] += 1
+        # 包格式: 目标 + 换行 + 已编码的帧，接收端无需再次解析或序列化消息体
+        packet = f"{target}\n{frame}"
+        try:
+            await self.bus.publish(self.channel, packet)
+        except Exception as e:
+            # 总线不可用时至少送达本进程的连接
+            self.stats["bus_errors"] += 1
+            logger.warning(f"发布到扇出总线失败，仅投递本进程连接: {str(e)}")
+            await self._on_bus_message(packet)
+    
+    async def _on_bus_message(self, data: str) -> None:
+        """把总线消息放入本进程目标连接的发送队列"""
+        target, _, frame = data.partition("\n")
+        if target == BROADCAST:
+            groups = list(self.connections.values())
+        else:
+            conns = self.connections.get(target)
+            groups = [conns] if conns else []
+        
+        for conns in groups:
+            for connection in list(conns.values()):
+                if not connection.offer(frame):
+                    self.stats["dropped"] += 1
+    
+    async def _send_frames(self, connection: _Connection, frames: list) -> None:
+        for frame in frames:
+            await connection.websocket.send_text(frame)
+            self.stats["delivered"] += 1
+    
+    async def _send_loop(self, connection: _Connection) -> None:
+        """写出连接队列中已积压的全部帧，发送失败或超时时关闭连接"""
+        while True:
+            frames = [await connection.queue.get()]
+            while not connection.queue.empty():
+                frames.append(connection.queue.get_nowait())
+            try:
+                async with self._send_slots:
+                    await asyncio.wait_for(self._send_frames(connection, frames), self.send_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["send_errors"] += 1
+                logger.warning(f"WebSocket发送失败，关闭连接: user_id={connection.user_id}, error={str(e)}")
+                self.disconnect(connection.websocket, connection.user_id)
+                try:
+                    await connection.websocket.close(code=1011)
+                except Exception:
+                    pass
+                return
+    
+    async def close(self) -> None:
+        """停止所有发送协程并关闭总线"""
+        for user_id, conns in list(self.connections.items()):
+            for websocket in list(conns):
+                self.disconnect(websocket, user_id)
+        await self.bus.close()
+        self._subscribed = False
+
+
+def create_pubsub_bus(backend: str) -> PubSubBus:
+    """
+    按名称创建发布订阅总线
+    
+    参数:
+        backend: redis或memory
+    """
+    if backend == "redis":
+        return RedisPubSubBus()
+    if backend == "memory":
+        return InProcessPubSubBus()
+    raise ValueError(f"不支持的发布订阅后端: {backend}")
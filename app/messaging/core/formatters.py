@@ -37,7 +37,7 @@ def format_to_sse(message: Message, event_name: Optional[str] = None) -> str:
     返回:
         SSE格式字符串
     """
-    event = event_name or message.type
+    event = event_name or message.type.value
     return f"event: {event}\ndata: {message.to_json()}\n\n"
 
 
@@ -6,9 +6,15 @@
 import asyncio
 import json
 import logging
+import time
 from typing import Dict, Any, List, Optional, Union, AsyncGenerator
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:  # orjson为可选依赖，缺失时退回标准库
+    orjson = None
+
 from app.messaging.core.models import (
     Message, MessageType, MessageRole, TextMessage, 
     FunctionCallMessage, FunctionReturnMessage, ThinkingMessage, 
@@ -19,14 +25,94 @@ from app.messaging.core.formatters import format_to_sse
 logger = logging.getLogger(__name__)
 
 
+def _json_dumps(data: Dict[str, Any]) -> str:
+    """快速JSON序列化，输出与json.dumps(ensure_ascii=False)兼容"""
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False)
+
+
+class SSEFrame:
+    """
+    预先序列化的文本块帧
+
+    流式文本只在合并后序列化一次，SSE输出直接使用frame字段，
+    只有按消息对象消费时才转换为TextMessage
+    """
+    
+    __slots__ = ("id", "content", "timestamp", "metadata", "frame")
+    
+    type = MessageType.TEXT
+    
+    def __init__(self, id: str, content: str, metadata: Dict[str, Any]):
+        self.id = id
+        self.content = content
+        self.timestamp = datetime.now().isoformat()
+        self.metadata = metadata
+        self.frame = f"event: {MessageType.TEXT.value}\ndata: " + _json_dumps({
+            "id": id,
+            "type": MessageType.TEXT.value,
+            "role": MessageRole.ASSISTANT.value,
+            "content": content,
+            "timestamp": self.timestamp,
+            "metadata": metadata
+        }) + "\n\n"
+    
+    def to_message(self) -> TextMessage:
+        """转换为TextMessage"""
+        return TextMessage(
+            id=self.id,
+            content=self.content,
+            timestamp=self.timestamp,
+            metadata=self.metadata
+        )
+
+
 class MessageStream:
     """消息流处理器"""
     
-    def __init__(self):
-        """初始化消息流处理器"""
+    def __init__(
+        self,
+        max_queue_size: int = 0,
+        keep_history: bool = True,
+        put_timeout: Optional[float] = 30.0
+    ):
+        """
+        初始化消息流处理器
+        
+        参数:
+            max_queue_size: 待发送队列上限，队列满时生产者等待消费者(背压)，0表示不限制；
+                只有生产者与消费者并发运行时才能设置上限，先写完再返回流的调用方必须不限制
+            keep_history: 是否在messages中保留已发送的消息
+            put_timeout: 队列满时生产者最长等待时间(秒)，超时视为消费者已断开并关闭流，None表示一直等待
+        """
         self.messages = []
-        self.queue = asyncio.Queue()
+        self.keep_history = keep_history
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        self.put_timeout = put_timeout
+        self.is_streaming = False
+        self.closed = False
+    
+    async def _enqueue(self, item) -> None:
+        """放入待发送队列；流已关闭时丢弃，消费者长时间不取时关闭流"""
+        if self.closed:
+            return
+        try:
+            await asyncio.wait_for(self.queue.put(item), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"消息流消费者 {self.put_timeout} 秒未读取，关闭流")
+            self.close()
+    
+    def close(self) -> None:
+        """
+        关闭流：消费者断开时调用，之后添加的消息直接丢弃，
+        清空队列以唤醒等待中的生产者
+        """
+        self.closed = True
         self.is_streaming = False
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
     
     async def add_message(self, message: Message):
         """
@@ -35,8 +121,11 @@ class MessageStream:
         参数:
             message: 要添加的消息
         """
-        self.messages.append(message)
-        await self.queue.put(message)
+        if self.closed:
+            return
+        if self.keep_history:
+            self.messages.append(message)
+        await self._enqueue(message)
     
     async def start_stream(self):
         """开始流式处理"""
@@ -190,14 +279,20 @@ class MessageStream:
         返回:
             消息流异步生成器
         """
-        while True:
-            message = await self.queue.get()
-            yield message
-            self.queue.task_done()
-            
-            # 如果是完成消息，结束流
-            if message.type == MessageType.DONE:
-                break
+        try:
+            while not self.closed:
+                message = await self.queue.get()
+                if isinstance(message, SSEFrame):
+                    message = message.to_message()
+                yield message
+                self.queue.task_done()
+                
+                # 如果是完成消息，结束流
+                if message.type == MessageType.DONE:
+                    break
+        finally:
+            # 正常结束或消费者断开(生成器被关闭)都释放等待中的生产者
+            self.close()
     
     async def get_sse_stream(self) -> AsyncGenerator[str, None]:
         """
@@ -206,18 +301,128 @@ class MessageStream:
         返回:
             SSE格式字符串的异步生成器
         """
-        async for message in self.get_message_stream():
-            yield format_to_sse(message)
+        try:
+            while not self.closed:
+                message = await self.queue.get()
+                self.queue.task_done()
+                
+                if isinstance(message, SSEFrame):
+                    yield message.frame
+                    continue
+                
+                yield format_to_sse(message)
+                
+                # 如果是完成消息，结束流
+                if message.type == MessageType.DONE:
+                    break
+        finally:
+            # 客户端断开时StreamingResponse关闭生成器，生产者不会再阻塞
+            self.close()
 
 
 class ChunkMessageStream(MessageStream):
-    """块状消息流处理器，用于处理LLM的分块输出"""
+    """
+    块状消息流处理器，用于处理LLM的分块输出
+    
+    文本块累积在列表中，结束时只拼接一次；相邻文本块按时间或字节数合并成一个
+    预序列化的SSE帧，避免每个token都创建消息对象和序列化
+    """
     
-    def __init__(self):
-        """初始化块状消息流处理器"""
-        super().__init__()
-        self.current_text = ""
+    def __init__(
+        self,
+        max_queue_size: int = 0,
+        keep_history: bool = False,
+        flush_interval: float = 0.05,
+        flush_bytes: int = 1024,
+        put_timeout: Optional[float] = 30.0
+    ):
+        """
+        初始化块状消息流处理器
+        
+        参数:
+            max_queue_size: 待发送队列上限，队列满时生产者等待消费者(背压)，0表示不限制
+            keep_history: 是否保留已发送的消息，文本块数量大，默认不保留
+            flush_interval: 文本块最长合并时间(秒)，0表示每个块立即发送
+            flush_bytes: 合并文本达到该字节数时立即发送
+            put_timeout: 队列满时生产者最长等待时间(秒)
+        """
+        super().__init__(max_queue_size=max_queue_size, keep_history=keep_history, put_timeout=put_timeout)
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
         self.last_message_id = None
+        self._chunks: List[str] = []  # 本轮完整文本
+        self._pending: List[str] = []  # 尚未发送的文本块
+        self._pending_bytes = 0
+        self._pending_since = 0.0
+        self._sequence = 0
+        self._id_prefix = f"chunk-{int(time.time() * 1000)}"
+        self._emit_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_due = asyncio.Event()  # 同步追加的文本达到flush_bytes时提前发送
+    
+    @property
+    def current_text(self) -> str:
+        """当前已累积的完整文本"""
+        return "".join(self._chunks)
+    
+    async def _put(self, item) -> None:
+        if self.closed:
+            return
+        if self.keep_history:
+            self.messages.append(item)
+        await self._enqueue(item)
+    
+    def close(self) -> None:
+        """关闭流并取消尚未到期的合并发送"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        self._pending.clear()
+        self._pending_bytes = 0
+        super().close()
+    
+    async def _flush_pending(self) -> None:
+        """把待发送文本块合并成一帧，需持有_emit_lock"""
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+        self._flush_task = None
+        
+        if not self._pending:
+            return
+        
+        content = "".join(self._pending)
+        self._pending.clear()
+        self._pending_bytes = 0
+        self._flush_due.clear()
+        
+        self._sequence += 1
+        metadata = {"is_chunk": True, "timestamp": datetime.now().isoformat()}
+        if self.last_message_id:
+            metadata["previous_id"] = self.last_message_id
+        frame = SSEFrame(f"{self._id_prefix}-{self._sequence}", content, metadata)
+        self.last_message_id = frame.id
+        await self._put(frame)
+    
+    async def _delayed_flush(self) -> None:
+        """合并窗口到期或同步追加的文本达到flush_bytes后发送剩余文本块"""
+        try:
+            await asyncio.wait_for(self._flush_due.wait(), timeout=max(self.flush_interval, 0))
+        except asyncio.TimeoutError:
+            pass
+        async with self._emit_lock:
+            if self._flush_task is asyncio.current_task():
+                await self._flush_pending()
+    
+    async def add_message(self, message: Message):
+        """
+        添加消息到流中，先发送尚未合并发送的文本块以保持顺序
+        
+        参数:
+            message: 要添加的消息
+        """
+        async with self._emit_lock:
+            await self._flush_pending()
+            await self._put(message)
     
     async def add_text_chunk(self, chunk: str):
         """
@@ -226,32 +431,66 @@ class ChunkMessageStream(MessageStream):
         参数:
             chunk: 文本块内容
         """
-        self.current_text += chunk
+        if not chunk or self.closed:
+            return
         
-        message = TextMessage(
-            content=chunk,
-            metadata={
-                "is_chunk": True,
-                "timestamp": datetime.now().isoformat()
-            }
-        )
+        self._chunks.append(chunk)
         
-        if self.last_message_id:
-            message.metadata["previous_id"] = self.last_message_id
+        async with self._emit_lock:
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending.append(chunk)
+            self._pending_bytes += len(chunk.encode("utf-8"))
             
-        self.last_message_id = message.id
-        await self.add_message(message)
+            if (
+                self.flush_interval <= 0
+                or self._pending_bytes >= self.flush_bytes
+                or time.monotonic() - self._pending_since >= self.flush_interval
+            ):
+                await self._flush_pending()
+            elif self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._delayed_flush())
+    
+    def push_text_chunk(self, chunk: str) -> None:
+        """
+        同步追加文本块，供LlamaIndex回调等不能await的生产者调用
+        
+        文本块只追加到待发送缓冲，合并和发送由流的单个发送任务负责，
+        不会为每个token创建任务；发送任务在队列满时等待消费者
+        
+        参数:
+            chunk: 文本块内容
+        """
+        if not chunk or self.closed:
+            return
+        
+        self._chunks.append(chunk)
+        if not self._pending:
+            self._pending_since = time.monotonic()
+        self._pending.append(chunk)
+        self._pending_bytes += len(chunk.encode("utf-8"))
+        
+        if self.flush_interval <= 0 or self._pending_bytes >= self.flush_bytes:
+            self._flush_due.set()
+        if self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._delayed_flush())
+    
+    async def flush(self):
+        """立即发送尚未合并发送的文本块"""
+        async with self._emit_lock:
+            await self._flush_pending()
     
     async def finalize_text(self):
         """完成文本流，发送完整文本"""
-        if self.current_text:
+        if self._chunks:
+            text = "".join(self._chunks)
+            self._chunks.clear()
             message = TextMessage(
-                content=self.current_text,
+                content=text,
                 metadata={
                     "is_final": True,
                     "timestamp": datetime.now().isoformat()
                 }
             )
             await self.add_message(message)
-            self.current_text = ""
             self.last_message_id = None
@@ -85,7 +85,8 @@ class MessageCallbackHandler(BaseCallbackHandler):
             # 处理LLM文本块
             chunk = payload.get(EventPayload.CHUNK, "")
             if chunk and isinstance(self.message_stream, ChunkMessageStream):
-                asyncio.create_task(self.message_stream.add_text_chunk(chunk))
+                # 同步追加到流的待发送缓冲，由流合并发送，避免每个token创建一个任务
+                self.message_stream.push_text_chunk(chunk)
             elif chunk:
                 asyncio.create_task(self.message_stream.add_text(chunk))
                 
@@ -122,19 +123,28 @@ class MessageService:
         self._callback_managers = {}
         self._message_streams = {}
     
-    def create_message_stream(self, stream_id: Optional[str] = None, chunk_mode: bool = True) -> MessageStream:
+    def create_message_stream(
+        self,
+        stream_id: Optional[str] = None,
+        chunk_mode: bool = True,
+        max_queue_size: int = 0
+    ) -> MessageStream:
         """
         创建消息流
         
         参数:
             stream_id: 可选的流ID，如果为None则自动生成
             chunk_mode: 是否使用块模式(用于LLM流式输出)
+            max_queue_size: 待发送队列上限，0表示不限制；只有生产者在后台与消费者并发运行时才能设置
             
         返回:
             消息流对象
         """
         stream_id = stream_id or f"stream-{datetime.now().timestamp()}"
-        stream = ChunkMessageStream() if chunk_mode else MessageStream()
+        if chunk_mode:
+            stream = ChunkMessageStream(max_queue_size=max_queue_size)
+        else:
+            stream = MessageStream(max_queue_size=max_queue_size)
         self._message_streams[stream_id] = stream
         return stream
     
@@ -23,9 +23,14 @@ from app.messaging.core.models import (
 from app.messaging.core.stream import MessageStream, ChunkMessageStream
 from app.messaging.services.message_service import MessageService, get_message_service
 from app.frameworks.llamaindex.core import get_llm, get_service_context
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# 生产者在后台任务中运行的流设置队列上限，慢消费者对生产者形成背压；
+# 先写完全部消息再返回的流(函数调用、知识库搜索)不能设置上限，否则写满后无人读取而死锁
+LIVE_STREAM_QUEUE_SIZE = settings.MESSAGE_STREAM_MAX_QUEUE
+
 
 class StreamService:
     """流服务，提供流式消息处理能力"""
@@ -61,7 +66,9 @@ class StreamService:
             消息流生成器
         """
         # 创建消息流
-        stream = self.message_service.create_message_stream(stream_id, chunk_mode=True)
+        stream = self.message_service.create_message_stream(
+            stream_id, chunk_mode=True, max_queue_size=LIVE_STREAM_QUEUE_SIZE
+        )
         
         # 获取回调管理器
         callback_manager = self.message_service.create_callback_manager(stream)
@@ -119,7 +126,9 @@ class StreamService:
             StreamingResponse
         """
         # 创建消息流
-        stream = self.message_service.create_message_stream(stream_id, chunk_mode=True)
+        stream = self.message_service.create_message_stream(
+            stream_id, chunk_mode=True, max_queue_size=LIVE_STREAM_QUEUE_SIZE
+        )
         
         # 获取回调管理器
         callback_manager = self.message_service.create_callback_manager(stream)
@@ -210,7 +219,9 @@ class StreamService:
             消息流生成器
         """
         # 创建消息流
-        stream = self.message_service.create_message_stream(stream_id, chunk_mode=True)
+        stream = self.message_service.create_message_stream(
+            stream_id, chunk_mode=True, max_queue_size=LIVE_STREAM_QUEUE_SIZE
+        )
         
         # 获取回调管理器
         callback_manager = self.message_service.create_callback_manager(stream)
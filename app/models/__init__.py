@@ -9,7 +9,7 @@ from .user import User, Role, Permission, UserRole, RolePermission, UserSettings
 from .resource_permission import ResourcePermission, KnowledgeBaseAccess, AssistantAccess, ModelConfigAccess, MCPConfigAccess, UserResourceQuota
 
 # 知识库系统
-from .knowledge import KnowledgeBase, Document, DocumentChunk, AssistantKnowledgeBase
+from .knowledge import KnowledgeBase, Document, DocumentChunk, AssistantKnowledgeBase, DocumentIndexState, VectorRebuildRun
 
 # 助手系统
 from .assistant import Assistant
@@ -68,6 +68,9 @@ from .memory import Memory
 # MCP集成
 from .mcp_integration import MCPIntegration
 
+# 监控系统
+from .monitoring import RequestLog, RequestLogRollup
+
 __all__ = [
     # 基础模型
     "Base", "User", "Role", "Permission", "UserRole", "RolePermission", "UserSettings", "ApiKey",
@@ -78,6 +81,7 @@ __all__ = [
     
     # 知识库系统
     "KnowledgeBase", "Document", "DocumentChunk", "AssistantKnowledgeBase",
+    "DocumentIndexState", "VectorRebuildRun",
     
     # 助手系统
     "Assistant", "AssistantV2", "AssistantKnowledgeGraph",
@@ -125,4 +129,7 @@ __all__ = [
     
     # MCP集成
     "MCPIntegration",
+    
+    # 监控系统
+    "RequestLog", "RequestLogRollup",
 ] 
\ No newline at end of file
@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON, Float
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, JSON, Float, Index
 from sqlalchemy.orm import relationship
 
 from app.models.database import Base
@@ -38,7 +38,7 @@ class Document(Base):
     title = Column(String(255), nullable=False)
     content = Column(Text)
     mime_type = Column(String(100), default="text/plain")
-    metadata = Column(JSON, default={})
+    meta_data = Column("metadata", JSON, default={})  # metadata为Declarative保留属性名
     file_path = Column(String(255))
     file_size = Column(Integer, default=0)  # 大小（字节）
     status = Column(String(50), default="pending")  # pending, processing, indexed, error
@@ -59,7 +59,7 @@ class DocumentChunk(Base):
     id = Column(Integer, primary_key=True, index=True)
     document_id = Column(Integer, ForeignKey("documents.id"))
     content = Column(Text)
-    metadata = Column(JSON, default={})
+    meta_data = Column("metadata", JSON, default={})  # metadata为Declarative保留属性名
     embedding_id = Column(String(255))
     token_count = Column(Integer, default=0)
     created_at = Column(DateTime, default=datetime.now)
@@ -67,6 +67,42 @@ class DocumentChunk(Base):
     # 关系
     document = relationship("Document", back_populates="chunks")
 
+class DocumentIndexState(Base):
+    """
+    文档索引状态模型，记录文档最近一次成功写入向量存储时的内容指纹和嵌入模型，
+    重建向量存储时两者都未变化的文档会被跳过
+    """
+    __tablename__ = "document_index_states"
+    
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
+    content_hash = Column(String(64), nullable=False)  # 内容指纹
+    embedding_model = Column(String(100), nullable=False)  # 建立索引时使用的嵌入模型
+    indexed_at = Column(DateTime, default=datetime.now)
+
+class VectorRebuildRun(Base):
+    """
+    向量存储重建运行模型，保存流式扫描的检查点和批次进度，中断的重建从检查点继续
+    """
+    __tablename__ = "vector_rebuild_runs"
+    __table_args__ = (
+        Index('ix_vector_rebuild_runs_status', 'status', 'knowledge_base_id'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    knowledge_base_id = Column(Integer, ForeignKey("knowledge_bases.id", ondelete="CASCADE"), nullable=True)  # 为空表示全部知识库
+    force = Column(Boolean, default=False)  # 是否忽略索引状态全部重建
+    status = Column(String(20), default="running")  # running, dispatched, completed
+    last_document_id = Column(Integer, default=0)  # 检查点: 已扫描且已派发的最大文档ID
+    scanned_documents = Column(Integer, default=0)
+    skipped_documents = Column(Integer, default=0)
+    dispatched_batches = Column(Integer, default=0)
+    completed_batches = Column(Integer, default=0)
+    indexed_documents = Column(Integer, default=0)
+    failed_documents = Column(Integer, default=0)
+    started_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+
 class AssistantKnowledgeBase(Base):
     """
     助手-知识库关联模型，表示助手和知识库之间的多对多关系
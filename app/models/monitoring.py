@@ -0,0 +1,88 @@
+"""
+监控数据模型模块
+API请求日志及其按分钟/小时预聚合的统计表
+"""
+
+from sqlalchemy import Column, String, JSON, Integer, Float, DateTime, BigInteger, UniqueConstraint, Index
+from sqlalchemy.sql import func
+from app.utils.core.database import Base
+from typing import Dict, Any
+
+
+class RequestLog(Base):
+    """API请求日志模型"""
+    __tablename__ = 'request_logs'
+    __table_args__ = (
+        Index('ix_request_logs_timestamp', 'timestamp'),
+        Index('ix_request_logs_endpoint_timestamp', 'endpoint', 'timestamp'),
+    )
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    timestamp = Column(DateTime, nullable=False)  # 请求时间
+    endpoint = Column(String(255), nullable=False)  # API端点
+    method = Column(String(10), nullable=False)  # HTTP方法
+    user_id = Column(String(36))  # 用户ID
+    status_code = Column(Integer, nullable=False)  # HTTP状态码
+    response_time = Column(Float, nullable=False)  # 响应时间(毫秒)
+    request_data = Column(JSON)  # 请求数据
+    response_data = Column(JSON)  # 响应数据
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典表示
+        
+        Returns:
+            Dict[str, Any]: 字典表示
+        """
+        return {
+            "id": self.id,
+            "timestamp": self.timestamp.isoformat() if self.timestamp else None,
+            "endpoint": self.endpoint,
+            "method": self.method,
+            "user_id": self.user_id,
+            "status_code": self.status_code,
+            "response_time": self.response_time,
+            "request_data": self.request_data,
+            "response_data": self.response_data
+        }
+
+
+class RequestLogRollup(Base):
+    """请求日志预聚合统计模型
+    
+    每行是一个时间桶(分钟或小时)内某个端点和方法的请求统计，
+    latency_sketch保存可合并的响应时间分位数草图
+    """
+    __tablename__ = 'request_log_rollups'
+    __table_args__ = (
+        UniqueConstraint('granularity', 'bucket_start', 'endpoint', 'method', name='uq_request_log_rollup_bucket'),
+        Index('ix_request_log_rollups_granularity_bucket', 'granularity', 'bucket_start'),
+    )
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    granularity = Column(String(10), nullable=False)  # 粒度: minute, hour
+    bucket_start = Column(DateTime, nullable=False)  # 时间桶起点
+    endpoint = Column(String(255), nullable=False)  # API端点
+    method = Column(String(10), nullable=False)  # HTTP方法
+    request_count = Column(Integer, nullable=False, default=0)  # 请求数
+    error_count = Column(Integer, nullable=False, default=0)  # 错误数(状态码>=400)
+    total_response_time = Column(Float, nullable=False, default=0.0)  # 响应时间总和(毫秒)
+    max_response_time = Column(Float, nullable=False, default=0.0)  # 最大响应时间(毫秒)
+    latency_sketch = Column(JSON)  # 响应时间分位数草图
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典表示
+        
+        Returns:
+            Dict[str, Any]: 字典表示
+        """
+        return {
+            "granularity": self.granularity,
+            "bucket_start": self.bucket_start.isoformat() if self.bucket_start else None,
+            "endpoint": self.endpoint,
+            "method": self.method,
+            "request_count": self.request_count,
+            "error_count": self.error_count,
+            "total_response_time": self.total_response_time,
+            "max_response_time": self.max_response_time
+        }
@@ -5,7 +5,7 @@
 """
 
 from typing import Dict, List, Optional, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from datetime import datetime
 
 class MemoryConfigSchema(BaseModel):
@@ -15,8 +15,21 @@ class MemoryConfigSchema(BaseModel):
     max_items: Optional[int] = Field(None, description="最大记忆项数")
     max_tokens: Optional[int] = Field(None, description="最大记忆token数")
     retrieval_strategy: str = Field("recency", description="检索策略: recency, relevance")
-    storage_backend: str = Field("in_memory", description="存储后端: in_memory, redis, postgres")
-    vector_backend: Optional[str] = Field(None, description="向量后端: milvus, elasticsearch, pgvector")
+    storage_backend: str = Field("in_memory", description="存储后端: in_memory, redis")
+    vector_backend: Optional[str] = Field(None, description="向量后端: 为空或in_memory，语义记忆使用进程内向量索引")
+    time_decay_half_life: Optional[float] = Field(None, description="检索分数时间衰减半衰期(秒)，为空时不衰减")
+    
+    @validator("storage_backend")
+    def validate_storage_backend(cls, v):
+        if v not in ("in_memory", "redis"):
+            raise ValueError(f"不支持的存储后端: {v}，可选: in_memory, redis")
+        return v
+    
+    @validator("vector_backend")
+    def validate_vector_backend(cls, v):
+        if v not in (None, "in_memory"):
+            raise ValueError(f"不支持的向量后端: {v}，语义记忆使用进程内向量索引")
+        return v
     
     class Config:
         schema_extra = {
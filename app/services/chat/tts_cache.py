@@ -0,0 +1,213 @@
+"""
+语音合成结果缓存模块
+按 (文本哈希, 语音配置, 提供商, 音频格式) 缓存合成后的音频。音频保存在对象存储中，
+由存储桶生命周期规则按天过期；进程内另有按字节数限制的热点副本，命中时不必访问对象存储
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from app.utils.core.cache.memory_cache import MemoryCache
+
+logger = logging.getLogger(__name__)
+
+# 缓存对象在对象存储中的前缀
+TTS_CACHE_PREFIX = "tts-cache"
+
+
+class TTSCache:
+    """
+    语音合成结果缓存
+
+    对象存储中的音频由所有工作进程共享，因此不在进程内做LRU删除（一个进程淘汰的对象
+    可能正被其他进程依赖），而是在首次写入时为缓存前缀配置生命周期过期规则，
+    由对象存储统一清理。进程内热点副本只是读取加速，淘汰时不影响对象存储。
+    """
+
+    def __init__(
+        self,
+        expire_days: int = 30,
+        local_max_entries: int = 256,
+        local_max_bytes: int = 64 * 1024 * 1024,
+        max_object_bytes: int = 50 * 1024 * 1024,
+        uploader: Optional[Callable[..., Any]] = None,
+        downloader: Optional[Callable[..., Optional[bytes]]] = None,
+        lifecycle_configurer: Optional[Callable[[str, int], bool]] = None
+    ):
+        """
+        初始化语音合成缓存
+
+        Args:
+            expire_days: 对象存储中缓存音频的过期天数
+            local_max_entries: 进程内热点副本的最大条目数
+            local_max_bytes: 进程内热点副本的最大字节数
+            max_object_bytes: 单个可缓存音频的最大字节数
+            uploader: 上传函数 (file_data, object_name, content_type)，默认使用MinIO
+            downloader: 下载函数 (object_name) -> bytes，默认使用MinIO
+            lifecycle_configurer: 生命周期配置函数 (prefix, days) -> bool，默认使用MinIO
+        """
+        if uploader is None or downloader is None or lifecycle_configurer is None:
+            from app.utils.storage.object_storage import upload_file, download_file, set_prefix_expiration
+            uploader = uploader or upload_file
+            downloader = downloader or download_file
+            lifecycle_configurer = lifecycle_configurer or set_prefix_expiration
+
+        self.expire_days = expire_days
+        self.max_object_bytes = max_object_bytes
+        self._upload = uploader
+        self._download = downloader
+        self._configure_lifecycle = lifecycle_configurer
+        self._lifecycle_ready = False
+
+        self._local = MemoryCache(
+            max_size=local_max_entries,
+            default_ttl=expire_days * 86400,
+            max_bytes=local_max_bytes,
+            size_estimator=len
+        )
+        self._lock = threading.Lock()
+        self._local_hits = 0
+        self._remote_hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_key(
+        text: str,
+        provider_type: str,
+        model_config: Optional[Dict[str, Any]],
+        audio_format: str = "mp3"
+    ) -> str:
+        """
+        生成缓存键
+
+        Args:
+            text: 合成文本
+            provider_type: 提供商类型
+            model_config: 语音配置（音色、语速等）
+            audio_format: 音频格式，不同格式的合成结果不能互相复用
+
+        Returns:
+            str: 缓存键
+        """
+        config_str = json.dumps(model_config or {}, sort_keys=True, ensure_ascii=False, default=str)
+        text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        raw = f"{provider_type}\n{audio_format}\n{config_str}\n{text_hash}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str, audio_format: str = "mp3") -> Optional[bytes]:
+        """
+        获取缓存的音频，先查进程内热点副本，再查对象存储
+
+        Args:
+            key: 缓存键
+            audio_format: 音频格式
+
+        Returns:
+            Optional[bytes]: 音频数据，未命中返回None
+        """
+        object_name = self._object_name(key, audio_format)
+        data = self._local.get(object_name)
+        if data is not None:
+            with self._lock:
+                self._local_hits += 1
+            return data
+
+        try:
+            data = await asyncio.to_thread(self._download, object_name)
+        except Exception as e:
+            logger.warning(f"读取语音缓存失败: {str(e)}")
+            data = None
+
+        with self._lock:
+            if data is None:
+                self._misses += 1
+                return None
+            self._remote_hits += 1
+        self._local.set(object_name, data)
+        return data
+
+    async def put(self, key: str, data: bytes, audio_format: str = "mp3") -> None:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            data: 音频数据
+            audio_format: 音频格式
+        """
+        if not data or len(data) > self.max_object_bytes:
+            return
+
+        await self._ensure_lifecycle()
+
+        object_name = self._object_name(key, audio_format)
+        try:
+            await asyncio.to_thread(
+                self._upload, io.BytesIO(data), object_name, f"audio/{audio_format}"
+            )
+        except Exception as e:
+            logger.warning(f"写入语音缓存失败: {str(e)}")
+            return
+
+        self._local.set(object_name, data)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        Returns:
+            Dict[str, Any]: 统计信息
+        """
+        with self._lock:
+            hits = self._local_hits + self._remote_hits
+            total = hits + self._misses
+            stats = {
+                "local_hits": self._local_hits,
+                "remote_hits": self._remote_hits,
+                "misses": self._misses,
+                "hit_rate": (hits / total) if total else 0.0,
+                "expire_days": self.expire_days,
+                "lifecycle_configured": self._lifecycle_ready
+            }
+        stats["local"] = self._local.stats()
+        return stats
+
+    def _object_name(self, key: str, audio_format: str) -> str:
+        """缓存键对应的对象名"""
+        return f"{TTS_CACHE_PREFIX}/{key[:2]}/{key}.{audio_format}"
+
+    async def _ensure_lifecycle(self) -> None:
+        """为缓存前缀配置过期规则，成功一次后不再重复配置"""
+        if self._lifecycle_ready or self.expire_days <= 0:
+            return
+        try:
+            self._lifecycle_ready = bool(await asyncio.to_thread(
+                self._configure_lifecycle, f"{TTS_CACHE_PREFIX}/", self.expire_days
+            ))
+        except Exception as e:
+            logger.warning(f"配置语音缓存过期规则失败: {str(e)}")
+
+
+# 全局语音合成缓存实例
+_tts_cache = None
+
+
+def get_tts_cache() -> TTSCache:
+    """
+    获取全局语音合成缓存实例
+
+    Returns:
+        TTSCache: 语音合成缓存
+    """
+    global _tts_cache
+
+    if _tts_cache is None:
+        from app.config import settings
+        _tts_cache = TTSCache(expire_days=getattr(settings, "TTS_CACHE_EXPIRE_DAYS", 30))
+
+    return _tts_cache
@@ -5,12 +5,13 @@
 
 from app.utils.service_decorators import register_service
 
-from typing import List, Dict, Any, Optional, BinaryIO
+from typing import List, Dict, Any, Optional, BinaryIO, AsyncIterator
 from fastapi import Depends, HTTPException, status, UploadFile
 from sqlalchemy.orm import Session
 import uuid
 import os
 import tempfile
+import asyncio
 from datetime import datetime
 
 from app.utils.core.database import get_db
@@ -18,6 +19,12 @@ from app.models.voice import VoiceConfig, VoiceTask
 from app.repositories.voice_repository import VoiceConfigRepository, VoiceTaskRepository
 from app.services.resource_permission_service import ResourcePermissionService
 from app.services.model_provider_service import ModelProviderService
+from app.services.chat.tts_cache import TTSCache, get_tts_cache
+
+# 上传音频分块写盘的块大小
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# 流式合成时每个音频块的大小
+AUDIO_STREAM_CHUNK_SIZE = 32 * 1024
 
 @register_service(service_type="voice", priority="medium", description="语音识别和合成服务")
 class VoiceService:
@@ -40,6 +47,7 @@ class VoiceService:
         self.permission_service = permission_service
         self.model_provider_service = model_provider_service
         self.temp_dir = tempfile.gettempdir()
+        self.tts_cache: TTSCache = get_tts_cache()
     
     async def create_voice_config(self, config_data: Dict[str, Any], user_id: str) -> VoiceConfig:
         """创建语音配置
@@ -268,11 +276,9 @@ class VoiceService:
                 detail=f"不支持的音频格式: {audio_file.content_type}"
             )
         
-        # 保存文件
+        # 分块保存文件，避免把整个上传内容读入内存
         temp_file_path = os.path.join(self.temp_dir, f"{uuid.uuid4()}-{audio_file.filename}")
-        with open(temp_file_path, "wb") as temp_file:
-            content = await audio_file.read()
-            temp_file.write(content)
+        file_size = await self._save_upload(audio_file, temp_file_path)
         
         try:
             # 创建任务记录
@@ -282,7 +288,7 @@ class VoiceService:
                 "task_type": "speech_to_text",
                 "status": "processing",
                 "input_file": audio_file.filename,
-                "file_size": len(content)
+                "file_size": file_size
             }
             task = await self.task_repository.create(task_data, self.db)
             
@@ -379,12 +385,30 @@ class VoiceService:
             task = await self.task_repository.create(task_data, self.db)
             
             # 生成输出文件名
-            output_file = f"{uuid.uuid4()}.mp3"
+            audio_format = (config.model_config or {}).get("format", "mp3")
+            output_file = f"{uuid.uuid4()}.{audio_format}"
             output_path = os.path.join(self.temp_dir, output_file)
             
-            # 根据提供商类型选择不同的处理逻辑
+            # 相同文本、语音配置和音频格式的合成结果直接复用缓存
             provider_type = config.provider_type
-            result = await self._process_text_to_speech(text, output_path, provider_type, config.model_config)
+            cache_key = self.tts_cache.make_key(text, provider_type, config.model_config, audio_format)
+            cached_audio = await self.tts_cache.get(cache_key, audio_format)
+            
+            if cached_audio is not None:
+                await asyncio.to_thread(self._write_file, output_path, cached_audio)
+                result = {
+                    "success": True,
+                    "format": audio_format,
+                    "file_size": len(cached_audio),
+                    "cached": True
+                }
+            else:
+                # 根据提供商类型选择不同的处理逻辑
+                result = await self._process_text_to_speech(text, output_path, provider_type, config.model_config)
+                if result.get("success", False) and os.path.exists(output_path):
+                    audio = await asyncio.to_thread(self._read_file, output_path)
+                    if result.get("format", audio_format) == audio_format:
+                        await self.tts_cache.put(cache_key, audio, audio_format)
             
             # 更新任务状态
             if result.get("success", False):
@@ -409,7 +433,8 @@ class VoiceService:
                     "file_path": output_path,
                     "duration": result.get("duration"),
                     "format": result.get("format", "mp3"),
-                    "file_size": result.get("file_size")
+                    "file_size": result.get("file_size"),
+                    "cached": result.get("cached", False)
                 }
             else:
                 await self.task_repository.update(
@@ -444,6 +469,76 @@ class VoiceService:
                 "error": f"文本转语音失败: {str(e)}"
             }
     
+    async def text_to_speech_stream(self, text: str, config_id: str, user_id: str) -> AsyncIterator[bytes]:
+        """流式将文本转换为语音
+        
+        命中缓存时直接分块返回缓存音频；未命中时边合成边返回音频块，
+        合成完成后写入缓存。
+        
+        Args:
+            text: 文本内容
+            config_id: 语音配置ID
+            user_id: 用户ID
+            
+        Returns:
+            AsyncIterator[bytes]: 音频数据块的异步迭代器
+            
+        Raises:
+            HTTPException: 如果没有权限或语音配置不存在
+        """
+        # 在开始流式输出之前完成权限检查，使错误能以正常HTTP响应返回
+        config = await self.get_voice_config(config_id, user_id)
+        if not config:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="语音配置不存在"
+            )
+        
+        provider_type = config.provider_type
+        audio_format = (config.model_config or {}).get("format", "mp3")
+        cache_key = self.tts_cache.make_key(text, provider_type, config.model_config, audio_format)
+        cached_audio = await self.tts_cache.get(cache_key, audio_format)
+        
+        async def generate() -> AsyncIterator[bytes]:
+            if cached_audio is not None:
+                for start in range(0, len(cached_audio), AUDIO_STREAM_CHUNK_SIZE):
+                    yield cached_audio[start:start + AUDIO_STREAM_CHUNK_SIZE]
+                return
+            
+            chunks = []
+            async for chunk in self._stream_text_to_speech(text, provider_type, config.model_config):
+                chunks.append(chunk)
+                yield chunk
+            
+            # 完整合成后才写入缓存，中途断开的结果不缓存
+            await self.tts_cache.put(cache_key, b"".join(chunks), audio_format)
+        
+        return generate()
+    
+    async def _stream_text_to_speech(self, text: str, provider_type: str, model_config: Dict[str, Any]) -> AsyncIterator[bytes]:
+        """按提供商流式合成语音
+        
+        Args:
+            text: 文本内容
+            provider_type: 提供商类型
+            model_config: 模型配置
+            
+        Returns:
+            AsyncIterator[bytes]: 音频数据块
+        """
+        if provider_type == "openai":
+            stream = self._stream_openai_text_to_speech(text, model_config)
+        elif provider_type == "local":
+            stream = self._stream_local_text_to_speech(text, model_config)
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"不支持的提供商类型: {provider_type}"
+            )
+        
+        async for chunk in stream:
+            yield chunk
+    
     async def get_task_status(self, task_id: str, user_id: str) -> Dict[str, Any]:
         """获取任务状态
         
@@ -721,6 +816,68 @@ class VoiceService:
             "file_size": file_size
         }
     
+    async def _stream_openai_text_to_speech(self, text: str, model_config: Dict[str, Any]) -> AsyncIterator[bytes]:
+        """流式处理OpenAI文本转语音
+        
+        Args:
+            text: 文本内容
+            model_config: 模型配置
+            
+        Returns:
+            AsyncIterator[bytes]: 音频数据块
+        """
+        # 这里应该实现调用OpenAI TTS流式API的逻辑
+        # 简化示例：按句子模拟逐块产出音频
+        for sentence in filter(None, text.replace("。", "。\n").splitlines()):
+            yield b"demo audio data"
+    
+    async def _stream_local_text_to_speech(self, text: str, model_config: Dict[str, Any]) -> AsyncIterator[bytes]:
+        """流式处理本地文本转语音
+        
+        Args:
+            text: 文本内容
+            model_config: 模型配置
+            
+        Returns:
+            AsyncIterator[bytes]: 音频数据块
+        """
+        # 这里应该实现调用本地语音合成服务流式接口的逻辑
+        # 简化示例：按句子模拟逐块产出音频
+        for sentence in filter(None, text.replace("。", "。\n").splitlines()):
+            yield b"demo audio data"
+    
+    async def _save_upload(self, upload: UploadFile, file_path: str) -> int:
+        """将上传文件分块写入磁盘
+        
+        Args:
+            upload: 上传文件
+            file_path: 目标路径
+            
+        Returns:
+            int: 写入的字节数
+        """
+        size = 0
+        with open(file_path, "wb") as temp_file:
+            while True:
+                chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await asyncio.to_thread(temp_file.write, chunk)
+                size += len(chunk)
+        return size
+    
+    @staticmethod
+    def _read_file(file_path: str) -> bytes:
+        """读取文件内容"""
+        with open(file_path, "rb") as f:
+            return f.read()
+    
+    @staticmethod
+    def _write_file(file_path: str, data: bytes) -> None:
+        """写入文件内容"""
+        with open(file_path, "wb") as f:
+            f.write(data)
+    
     async def _check_admin_permission(self, user_id: str) -> bool:
         """检查用户是否为管理员
         
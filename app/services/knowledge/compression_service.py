@@ -21,7 +21,6 @@ from app.models.context_compression import (
 )
 from app.schemas.context_compression import (
     CompressionConfig,
-    CompressionMethod,
     CompressionPhase,
     CompressedContextResult
 )
@@ -92,33 +91,16 @@ class ContextCompressionService:
                 status="success"
             )
         
-        # 创建压缩器实例
-        compressor = ContextCompressor(
-            model_name=model_name,
-            method=config.method,
-            max_tokens=config.max_tokens,
-            temperature=config.temperature
-        )
+        # 创建压缩器实例（重排序模型为进程级共享，创建开销很小）
+        llm = None
+        if model_name:
+            from app.frameworks.llamaindex.core import get_llm
+            llm = get_llm(model_name, temperature=config.temperature)
+        compressor = ContextCompressor(llm=llm, config=config)
         
         # 执行压缩
         try:
-            if config.method == CompressionMethod.TREE_SUMMARIZE:
-                compressed_text = await compressor.tree_summarize(
-                    content,
-                    query=query,
-                    num_children=config.num_children
-                )
-            elif config.method == CompressionMethod.COMPACT_AND_REFINE:
-                compressed_text = await compressor.compact_and_refine(
-                    content,
-                    query=query
-                )
-            else:
-                # 默认使用树状压缩
-                compressed_text = await compressor.tree_summarize(
-                    content,
-                    query=query
-                )
+            compressed_text = await compressor.acompress_text(content, query or "", config)
             
             # 计算压缩比例
             original_length = len(content)
@@ -314,7 +314,7 @@ class AdvancedRetrievalService:
             return results
         
         try:
-            from app.services.rerank.rerank_adapter import UniversalRerankAdapter
+            from app.services.rerank.rerank_adapter import get_rerank_adapter
             
             # 限制重排序的文档数量
             top_n = min(rerank_config.top_n, len(results))
@@ -324,8 +324,8 @@ class AdvancedRetrievalService:
             for result in results[:top_n]:
                 documents.append(result.get("content", ""))
             
-            # 创建重排序适配器
-            adapter = UniversalRerankAdapter(model_name=rerank_config.model_name)
+            # 获取重排序适配器（进程内复用）
+            adapter = await get_rerank_adapter(rerank_config.model_name)
             
             # 执行重排序
             scores = await adapter.rerank(query, documents)
@@ -16,7 +16,7 @@ from app.utils.core.database import get_db
 from core.monitoring import MonitoringManager, MetricsCollector, AlertManager
 
 # 导入模型类型（仅用于类型提示和API兼容性）
-from app.models.monitoring import SystemMetric, ServiceStatus, RequestLog, ErrorLog
+from app.models.monitoring import RequestLog
 
 logger = logging.getLogger(__name__)
 
@@ -233,7 +233,7 @@ class MonitoringService:
             response_data: 响应数据（可选）
             
         Returns:
-            Dict[str, Any]: 创建的请求日志信息
+            Dict[str, Any]: 已入队的请求日志信息，日志由后台批量写入
         """
         try:
             result = await self.monitoring_manager.log_request(
@@ -324,13 +324,15 @@ class MonitoringService:
     async def get_request_analytics(self, 
                                  start_time: datetime, 
                                  end_time: datetime,
-                                 admin_id: str) -> Dict[str, Any]:
+                                 admin_id: str,
+                                 granularity: Optional[str] = None) -> Dict[str, Any]:
         """获取请求统计分析
         
         Args:
             start_time: 开始时间
             end_time: 结束时间
             admin_id: 请求者的用户ID（需要管理员权限）
+            granularity: 统计粒度（minute或hour，默认按时间范围选择）
             
         Returns:
             Dict[str, Any]: 请求统计分析
@@ -347,7 +349,7 @@ class MonitoringService:
                     detail="只有管理员可以查看请求统计分析"
                 )
             
-            result = await self.monitoring_manager.get_request_analytics(start_time, end_time)
+            result = await self.monitoring_manager.get_request_analytics(start_time, end_time, granularity)
             
             if result["success"]:
                 return result["data"]
@@ -0,0 +1,245 @@
+"""
+常驻跨编码器重排序服务
+每个进程每个模型只加载一次；并发的重排序请求在短时间窗口内合并成一个批次，
+在线程池中做一次前向计算，避免阻塞事件循环；(查询, 文档哈希)的分数缓存在LRU中
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.utils.core.cache.memory_cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# 模型路径 -> 已加载的CrossEncoder
+_models: Dict[str, Any] = {}
+_models_lock = threading.Lock()
+
+
+def load_cross_encoder(model_path: str):
+    """加载跨编码器模型，同一进程内每个模型只加载一次"""
+    model = _models.get(model_path)
+    if model is not None:
+        return model
+    
+    with _models_lock:
+        model = _models.get(model_path)
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            model = CrossEncoder(model_path)
+            _models[model_path] = model
+            logger.info(f"跨编码器模型已加载: {model_path}")
+    
+    return model
+
+
+def document_hash(document: str) -> str:
+    """文档内容哈希，用作缓存键"""
+    return hashlib.blake2b(document.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class _RerankJob:
+    """一次重排序请求中未命中缓存的文档对"""
+    
+    __slots__ = ("query", "documents", "future")
+    
+    def __init__(self, query: str, documents: List[str], future: asyncio.Future):
+        self.query = query
+        self.documents = documents
+        self.future = future
+
+
+class CrossEncoderRerankService:
+    """
+    跨编码器重排序服务
+    
+    请求先查分数缓存，未命中的文档对进入队列；批处理协程收集max_wait_ms内的请求，
+    合并后一次调用predict，再把分数拆回各请求
+    """
+    
+    def __init__(
+        self,
+        model_path: str,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        max_workers: int = 1,
+        cache_size: int = 10000
+    ):
+        """
+        初始化重排序服务
+        
+        参数:
+            model_path: 模型路径或名称
+            max_batch_size: 单次前向计算的最大文档对数量
+            max_wait_ms: 收集批次的最长等待时间(毫秒)
+            max_workers: 执行前向计算的线程数
+            cache_size: 分数缓存容量
+        """
+        self.model_path = model_path
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.model = None
+        self.score_cache = LRUCache(max_size=cache_size)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="rerank")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop = None
+        self.stats = {"requests": 0, "pairs": 0, "cache_hits": 0, "batches": 0}
+    
+    async def ensure_loaded(self):
+        """在线程池中加载模型，避免阻塞事件循环；并发加载由load_cross_encoder去重"""
+        if self.model is None:
+            loop = asyncio.get_running_loop()
+            self.model = await loop.run_in_executor(
+                self._executor, load_cross_encoder, self.model_path
+            )
+        return self.model
+    
+    def _ensure_worker(self) -> None:
+        """按当前事件循环启动批处理协程"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._batch_loop())
+    
+    async def score(self, query: str, documents: List[str]) -> List[float]:
+        """
+        计算查询与各文档的相关性分数
+        
+        参数:
+            query: 查询文本
+            documents: 文档列表
+        
+        返回:
+            与documents顺序一致的分数列表
+        """
+        if not documents:
+            return []
+        
+        self.stats["requests"] += 1
+        self.stats["pairs"] += len(documents)
+        
+        scores: List[Optional[float]] = [None] * len(documents)
+        missing: Dict[str, List[int]] = {}  # 文档哈希 -> 在documents中的位置
+        missing_docs: List[str] = []
+        for i, doc in enumerate(documents):
+            doc_key = document_hash(doc)
+            cached = self.score_cache.get((query, doc_key))
+            if cached is not None:
+                scores[i] = cached
+                self.stats["cache_hits"] += 1
+            elif doc_key in missing:
+                missing[doc_key].append(i)
+            else:
+                missing[doc_key] = [i]
+                missing_docs.append(doc)
+        
+        if missing_docs:
+            await self.ensure_loaded()
+            self._ensure_worker()
+            
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put(_RerankJob(query, missing_docs, future))
+            computed = await future
+            
+            for (doc_key, positions), value in zip(missing.items(), computed):
+                self.score_cache.set((query, doc_key), value)
+                for i in positions:
+                    scores[i] = value
+        
+        return scores
+    
+    async def _batch_loop(self) -> None:
+        """收集并执行批次"""
+        while True:
+            jobs = [await self._queue.get()]
+            pair_count = len(jobs[0].documents)
+            deadline = time.monotonic() + self.max_wait
+            
+            while pair_count < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    job = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                jobs.append(job)
+                pair_count += len(job.documents)
+            
+            await self._run_batch(jobs)
+    
+    async def _run_batch(self, jobs: List[_RerankJob]) -> None:
+        """一次前向计算处理多个请求"""
+        pairs: List[Tuple[str, str]] = []
+        for job in jobs:
+            pairs.extend((job.query, doc) for doc in job.documents)
+        
+        try:
+            loop = asyncio.get_running_loop()
+            predicted = await loop.run_in_executor(self._executor, self._predict, pairs)
+            self.stats["batches"] += 1
+        except Exception as e:
+            for job in jobs:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            return
+        
+        offset = 0
+        for job in jobs:
+            size = len(job.documents)
+            if not job.future.done():
+                job.future.set_result(predicted[offset:offset + size])
+            offset += size
+    
+    def _predict(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """在工作线程中执行前向计算，按max_batch_size分块，单个大请求也不会超出批次上限"""
+        results: List[float] = []
+        for start in range(0, len(pairs), self.max_batch_size):
+            chunk = pairs[start:start + self.max_batch_size]
+            scores = self.model.predict(
+                chunk,
+                batch_size=len(chunk),
+                show_progress_bar=False
+            )
+            results.extend(float(s) for s in (scores.tolist() if hasattr(scores, "tolist") else scores))
+        return results
+    
+    async def close(self) -> None:
+        """停止批处理协程并关闭线程池"""
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        self._executor.shutdown(wait=False)
+
+
+# 模型路径 -> 重排序服务
+_services: Dict[str, CrossEncoderRerankService] = {}
+_services_lock = threading.Lock()
+
+
+def get_cross_encoder_service(model_path: str) -> CrossEncoderRerankService:
+    """获取模型对应的进程级重排序服务"""
+    service = _services.get(model_path)
+    if service is not None:
+        return service
+    
+    with _services_lock:
+        service = _services.get(model_path)
+        if service is None:
+            service = CrossEncoderRerankService(
+                model_path,
+                max_batch_size=getattr(settings, "RERANK_MAX_BATCH_SIZE", 64),
+                max_wait_ms=getattr(settings, "RERANK_MAX_WAIT_MS", 5.0),
+                max_workers=getattr(settings, "RERANK_WORKERS", 1),
+                cache_size=getattr(settings, "RERANK_SCORE_CACHE_SIZE", 10000)
+            )
+            _services[model_path] = service
+    return service
@@ -1,4 +1,5 @@
 from typing import List, Dict, Any, Optional, Union
+import asyncio
 import logging
 import httpx
 import os
@@ -6,9 +7,23 @@ from pydantic import BaseModel, Field
 import numpy as np
 
 from app.config import settings
+from app.utils.core.cache.memory_cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
+# BM25分词结果缓存，候选文档在相近查询间大量重复
+_token_cache = LRUCache(max_size=getattr(settings, "RERANK_TOKEN_CACHE_SIZE", 20000))
+
+
+def _tokenize(text: str) -> List[str]:
+    """分词并缓存结果"""
+    tokens = _token_cache.get(text)
+    if tokens is None:
+        import jieba
+        tokens = jieba.lcut(text)
+        _token_cache.set(text, tokens)
+    return tokens
+
 class RerankRequest(BaseModel):
     """重排序请求"""
     query: str
@@ -24,6 +39,7 @@ class UniversalRerankAdapter:
         self.model_config = None
         self.client = None
         self.model = None
+        self.service = None
         self.initialized = False
     
     async def initialize(self) -> bool:
@@ -46,8 +62,9 @@ class UniversalRerankAdapter:
             # 如果模型类型是cross_encoder，初始化本地模型
             if self.model_config.get("type") == "cross_encoder":
                 try:
-                    from sentence_transformers import CrossEncoder
-                    self.model = CrossEncoder(self.model_config.get("model_path"))
+                    from app.services.rerank.cross_encoder_service import get_cross_encoder_service
+                    self.service = get_cross_encoder_service(self.model_config.get("model_path"))
+                    self.model = await self.service.ensure_loaded()
                     logger.info(f"本地跨编码器模型初始化成功: {self.model_name}")
                 except Exception as e:
                     logger.error(f"本地跨编码器模型初始化失败: {str(e)}")
@@ -109,14 +126,8 @@ class UniversalRerankAdapter:
     async def _rerank_with_cross_encoder(self, query: str, documents: List[str]) -> List[float]:
         """使用本地跨编码器模型重排序"""
         try:
-            # 创建查询-文档对
-            pairs = [(query, doc) for doc in documents]
-            
-            # 计算相关性分数
-            scores = self.model.predict(pairs)
-            
-            # 确保返回列表格式
-            return scores.tolist() if hasattr(scores, "tolist") else scores
+            # 由常驻服务合并批次并在线程池中计算，命中缓存的文档对不再计算
+            return await self.service.score(query, documents)
             
         except Exception as e:
             logger.error(f"跨编码器重排序失败: {str(e)}")
@@ -155,11 +166,10 @@ class UniversalRerankAdapter:
         """使用默认BM25方法重排序"""
         try:
             from rank_bm25 import BM25Okapi
-            import jieba
             
-            # 分词
-            tokenized_query = list(jieba.cut(query))
-            tokenized_docs = [list(jieba.cut(doc)) for doc in documents]
+            # 分词（按文本缓存）
+            tokenized_query = _tokenize(query)
+            tokenized_docs = [_tokenize(doc) for doc in documents]
             
             # 创建BM25模型
             bm25 = BM25Okapi(tokenized_docs)
@@ -453,3 +463,26 @@ class UniversalRerankAdapter:
             "name": "BM25重排序",
             "description": "基于BM25的本地重排序实现"
         }
+
+
+# 模型名称 -> 已初始化的适配器
+_adapters: Dict[str, UniversalRerankAdapter] = {}
+# 模型名称 -> 初始化锁，并发的首次请求只初始化一个适配器
+_adapter_locks: Dict[str, asyncio.Lock] = {}
+
+
+async def get_rerank_adapter(model_name: Optional[str] = None) -> UniversalRerankAdapter:
+    """获取已初始化的重排序适配器，复用模型和HTTP客户端"""
+    key = model_name or getattr(settings, "DEFAULT_RERANK_MODEL", "default")
+    adapter = _adapters.get(key)
+    if adapter is not None:
+        return adapter
+    
+    lock = _adapter_locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        adapter = _adapters.get(key)
+        if adapter is None:
+            adapter = UniversalRerankAdapter(model_name=key)
+            if await adapter.initialize():
+                _adapters[key] = adapter
+    return adapter
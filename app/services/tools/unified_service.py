@@ -19,6 +19,14 @@ from core.owl_controller import OwlController
 from app.services.resource_permission_service import ResourcePermissionService
 # 导入核心业务逻辑层
 from core.tools import ToolManager, RegistryManager, ExecutionManager
+from core.mcp_service.tool_catalog import get_tool_catalog
+
+# 统一工具服务在工具目录缓存中的命名空间
+TOOL_CATALOG_NAMESPACE = "unified_tools"
+# 工具列表和元数据的缓存时间（秒），注册表变更时会主动失效（配置Redis时跨进程生效）
+TOOL_CATALOG_TTL = 300
+# 只含启用工具的列表依赖启停状态，缓存时间更短，Redis不可用时也能较快收敛
+TOOL_CATALOG_ENABLED_TTL = 30
 
 @register_service(service_type="unified-tool", priority="high", description="统一工具系统服务")
 class UnifiedToolService:
@@ -44,6 +52,9 @@ class UnifiedToolService:
         self.registry_manager = RegistryManager(db)
         self.execution_manager = ExecutionManager(db)
         
+        # 进程级工具目录缓存
+        self.tool_catalog = get_tool_catalog()
+        
     async def initialize(self):
         """初始化服务"""
         await self.owl_controller.initialize()
@@ -64,6 +75,11 @@ class UnifiedToolService:
         Returns:
             List[Dict[str, Any]]: 工具列表
         """
+        cache_key = f"all:{skip}:{limit}:{include_owl}:{include_standard}:{enabled_only}"
+        cached = self.tool_catalog.get_value(TOOL_CATALOG_NAMESPACE, cache_key)
+        if cached is not None:
+            return [dict(tool) for tool in cached]
+        
         result = []
         
         # 获取OWL工具
@@ -107,7 +123,11 @@ class UnifiedToolService:
                     }
                     result.append(tool_dict)
         
-        return result
+        self.tool_catalog.set_value(
+            TOOL_CATALOG_NAMESPACE, cache_key, result,
+            ttl=TOOL_CATALOG_ENABLED_TTL if enabled_only else TOOL_CATALOG_TTL
+        )
+        return [dict(tool) for tool in result]
         
     async def execute_tool(self, tool_name: str, parameters: Dict[str, Any], user_id: str, tool_id: Optional[str] = None) -> Dict[str, Any]:
         """执行工具，自动判断工具类型并调用相应的服务
@@ -221,29 +241,42 @@ class UnifiedToolService:
         Raises:
             HTTPException: 如果工具不存在
         """
+        entry = self.tool_catalog.get_entry(TOOL_CATALOG_NAMESPACE, tool_name)
+        if entry is not None and entry.metadata is not None:
+            return dict(entry.metadata)
+        
+        metadata = None
+        
         # 首先尝试获取OWL工具
         try:
             owl_tool = await self.owl_tool_service.get_tool_by_name(tool_name)
             if owl_tool:
-                return await self.owl_controller.get_tool_metadata(tool_name)
+                metadata = await self.owl_controller.get_tool_metadata(tool_name)
         except Exception:
             pass
             
         # 尝试获取标准工具
-        try:
-            # 使用核心层获取工具
-            result = await self.tool_manager.get_tool_by_name(tool_name)
-            if result["success"]:
-                tool_data = result["data"]
-                return {
-                    "name": tool_data["name"],
-                    "description": tool_data["description"],
-                    "type": tool_data["tool_type"],
-                    "config": tool_data["config"],
-                    "metadata": tool_data["metadata"]
-                }
-        except Exception:
-            pass
+        if metadata is None:
+            try:
+                # 使用核心层获取工具
+                result = await self.tool_manager.get_tool_by_name(tool_name)
+                if result["success"]:
+                    tool_data = result["data"]
+                    metadata = {
+                        "name": tool_data["name"],
+                        "description": tool_data["description"],
+                        "type": tool_data["tool_type"],
+                        "config": tool_data["config"],
+                        "metadata": tool_data["metadata"]
+                    }
+            except Exception:
+                pass
+        
+        if metadata is not None:
+            self.tool_catalog.put_entry(
+                TOOL_CATALOG_NAMESPACE, tool_name, ttl=TOOL_CATALOG_TTL, metadata=metadata
+            )
+            return dict(metadata)
             
         # 如果都失败，则工具不存在
         raise HTTPException(
@@ -414,6 +447,7 @@ class UnifiedToolService:
             
         try:
             result = await self.owl_controller.toolkit_integrator.load_toolkit(toolkit_name)
+            self.invalidate_tool_catalog()
             
             # 将工具注册到注册器
             for tool in result:
@@ -570,6 +604,7 @@ class UnifiedToolService:
         try:
             # 使用OWL工具服务创建工具
             tool = await self.owl_tool_service.register_tool(tool_data, user_id)
+            self.invalidate_tool_catalog()
             
             # 构造返回数据
             return {
@@ -614,9 +649,18 @@ class UnifiedToolService:
         )
         
         if result["success"]:
+            self.invalidate_tool_catalog(tool_name)
             return result["data"]
         else:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=result["error"]
             )
+    
+    def invalidate_tool_catalog(self, tool_name: Optional[str] = None) -> None:
+        """使工具目录缓存失效
+        
+        Args:
+            tool_name: 工具名称，为None时清除所有工具的缓存
+        """
+        self.tool_catalog.invalidate(TOOL_CATALOG_NAMESPACE, tool_name)
@@ -0,0 +1,37 @@
+"""
+工具目录缓存启动模块
+在应用启动时预热MCP工具Schema缓存，在关闭时释放共享的HTTP会话
+"""
+
+import asyncio
+import logging
+from fastapi import FastAPI
+
+from core.mcp_service.service_manager import get_mcp_service_manager
+
+logger = logging.getLogger(__name__)
+
+
+def register_tool_catalog_startup(app: FastAPI):
+    """
+    注册工具目录缓存的启动和关闭事件处理器
+    
+    参数:
+        app: FastAPI应用实例
+    """
+    @app.on_event("startup")
+    async def prewarm_tool_catalog():
+        """应用启动时在后台预热工具目录缓存，不阻塞启动"""
+        try:
+            manager = get_mcp_service_manager()
+            asyncio.create_task(manager.prewarm_tool_catalog())
+        except Exception as e:
+            logger.error(f"预热工具目录缓存失败: {str(e)}")
+    
+    @app.on_event("shutdown")
+    async def close_tool_catalog_session():
+        """应用关闭时关闭MCP服务管理器的HTTP会话"""
+        try:
+            await get_mcp_service_manager().close()
+        except Exception as e:
+            logger.error(f"关闭MCP服务管理器HTTP会话失败: {str(e)}")
@@ -6,9 +6,11 @@
 2. 紧凑精炼 (CompactAndRefine) - 先用压缩上下文生成初步回答，再用完整上下文精炼
 3. 多种压缩策略可配置
 4. 支持作为装饰器应用于任何Agent方法
+5. 异步压缩: 共享进程级重排序模型，按上下文窗口分组并发总结，可在检索结果流式到达时增量压缩
 """
 
-from typing import List, Dict, Any, Optional, Union, Callable, TypeVar, cast
+from typing import List, Dict, Any, Optional, Union, Callable, TypeVar, Tuple, AsyncIterable, cast
+import asyncio
 import logging
 import functools
 import inspect
@@ -16,10 +18,13 @@ import time
 import uuid
 from pydantic import BaseModel, Field
 
+from llama_index.core.constants import DEFAULT_CONTEXT_WINDOW, DEFAULT_NUM_OUTPUTS
+from llama_index.core.node_parser import TokenTextSplitter
 from llama_index.core.response_synthesizers import TreeSummarize, CompactAndRefine
-from llama_index.core.postprocessor import SentenceTransformerRerank
-from llama_index.core.schema import NodeWithScore, Document, QueryBundle
+from llama_index.core.prompts.default_prompts import DEFAULT_TREE_SUMMARIZE_PROMPT
+from llama_index.core.schema import NodeWithScore, Document
 from llama_index.core.llms import LLM
+from llama_index.core.utils import get_tokenizer
 
 from app.messaging.core.models import Message, MessageType, MessageRole
 from app.messaging.core.formatters import convert_compressed_context_to_internal
@@ -39,7 +44,114 @@ class CompressionConfig(BaseModel):
     store_original: bool = Field(False, description="是否存储原始上下文（消耗内存）")
     use_message_format: bool = Field(True, description="是否使用消息格式传递压缩上下文")
     phase: str = Field("final", description="压缩阶段: retrieval或final")
+    max_concurrency: int = Field(4, description="并发总结的最大LLM调用数")
+
+# 未配置重排序模型时使用的默认模型
+DEFAULT_RERANK_MODEL = "BAAI/bge-reranker-base"
+
+
+# 文本之间"\n\n"分隔符预留的token数
+_SEPARATOR_TOKENS = 2
+# 上下文预算的下限，避免窗口配置过小时无法分块
+_MIN_CONTEXT_BUDGET = 256
+
+
+class _AsyncTreeSummarizer:
+    """
+    分组并发的树状总结，同一层的各组并行调用LLM，并发数受信号量限制
+    
+    每一层分组前按token预算切分：一组最多num_children段且不超过上下文预算，
+    单段超出预算时先按token切块，保证发给LLM的提示词不超过上下文窗口
+    """
+    
+    def __init__(
+        self,
+        llm: LLM,
+        query: str,
+        num_children: int,
+        max_concurrency: int,
+        max_tokens: Optional[int] = None
+    ):
+        self.llm = llm
+        self.query = query
+        self.num_children = max(2, num_children)
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._tokenizer = get_tokenizer()
+        self.budget = self._context_budget(max_tokens)
+        self._splitter = TokenTextSplitter(chunk_size=self.budget, chunk_overlap=0)
+    
+    def _count(self, text: str) -> int:
+        return len(self._tokenizer(text))
+    
+    def _context_budget(self, max_tokens: Optional[int]) -> int:
+        """一次总结可放入的上下文token数：上下文窗口减去输出、提示模板和查询"""
+        metadata = getattr(self.llm, "metadata", None)
+        context_window = getattr(metadata, "context_window", None) or DEFAULT_CONTEXT_WINDOW
+        num_output = max_tokens or getattr(metadata, "num_output", None) or DEFAULT_NUM_OUTPUTS
+        overhead = self._count(DEFAULT_TREE_SUMMARIZE_PROMPT.get_template()) + self._count(self.query)
+        return max(context_window - num_output - overhead, _MIN_CONTEXT_BUDGET)
     
+    def _fit(self, text: str) -> List[str]:
+        """超出预算的单段文本按token切块"""
+        if self._count(text) + _SEPARATOR_TOKENS <= self.budget:
+            return [text]
+        return self._splitter.split_text(text)
+    
+    async def summarize(self, texts: List[str]) -> str:
+        """总结一组文本"""
+        async with self._semaphore:
+            return await self.llm.apredict(
+                DEFAULT_TREE_SUMMARIZE_PROMPT,
+                context_str="\n\n".join(texts),
+                query_str=self.query
+            )
+    
+    def pack(self, text: str, current: List[str], used: int, groups: List[List[str]]) -> Tuple[List[str], int]:
+        """
+        把一段文本放入当前组，当前组放不下时先把它移入groups
+        
+        Returns:
+            (新的当前组, 当前组已用token数)
+        """
+        for piece in self._fit(text):
+            size = self._count(piece) + _SEPARATOR_TOKENS
+            if current and (len(current) >= self.num_children or used + size > self.budget):
+                groups.append(current)
+                current = []
+                used = 0
+            current.append(piece)
+            used += size
+        return current, used
+    
+    def groups(self, texts: List[str]) -> List[List[str]]:
+        """按num_children和token预算分组"""
+        groups: List[List[str]] = []
+        current: List[str] = []
+        used = 0
+        for text in texts:
+            current, used = self.pack(text, current, used, groups)
+        if current:
+            groups.append(current)
+        return groups
+    
+    async def reduce(self, texts: List[str]) -> str:
+        """逐层合并直到只剩一个总结"""
+        level = [text for text in texts if text]
+        if not level:
+            return ""
+        
+        first_level = True
+        while True:
+            groups = self.groups(level)
+            # 第一层可能因切块变多，之后每层必须减少，否则总结本身已超出预算，无法收敛
+            if not first_level and len(groups) >= len(level):
+                raise ValueError(f"总结结果超出上下文预算({self.budget} tokens)，无法继续合并")
+            level = await asyncio.gather(*(self.summarize(group) for group in groups))
+            first_level = False
+            if len(level) == 1:
+                return level[0]
+
+
 class ContextCompressor:
     """上下文压缩工具类"""
     
@@ -91,14 +203,7 @@ class ContextCompressor:
                 # 首先应用重排序（如果启用）
                 filtered_nodes = nodes
                 if compression_config.top_n < len(nodes):
-                    reranker = SentenceTransformerRerank(
-                        top_n=compression_config.top_n,
-                        model=compression_config.rerank_model
-                    )
-                    filtered_nodes = reranker.postprocess_nodes(
-                        nodes, 
-                        query_bundle=QueryBundle(query_str=query)
-                    )
+                    filtered_nodes = self._rerank(nodes, query, compression_config)
                 
                 # 应用树状总结
                 synthesizer = TreeSummarize(
@@ -142,6 +247,199 @@ class ContextCompressor:
             # 出错时返回原始内容
             return "\n\n".join([node.node.text for node in nodes])
     
+    @staticmethod
+    def _select_top(
+        nodes: List[NodeWithScore],
+        scores: List[float],
+        top_n: int
+    ) -> List[NodeWithScore]:
+        """按重排序分数保留前top_n个节点"""
+        ranked = sorted(zip(nodes, scores), key=lambda pair: pair[1], reverse=True)[:top_n]
+        return [NodeWithScore(node=node.node, score=float(score)) for node, score in ranked]
+    
+    def _rerank(self, nodes: List[NodeWithScore], query: str, config: CompressionConfig) -> List[NodeWithScore]:
+        """使用进程级共享的跨编码器重排序"""
+        from app.services.rerank.cross_encoder_service import load_cross_encoder
+        
+        model = load_cross_encoder(config.rerank_model or DEFAULT_RERANK_MODEL)
+        scores = model.predict([(query, node.node.get_content()) for node in nodes], show_progress_bar=False)
+        return self._select_top(nodes, list(scores), config.top_n)
+    
+    async def _arerank(self, nodes: List[NodeWithScore], query: str, config: CompressionConfig) -> List[NodeWithScore]:
+        """异步重排序，与其他请求合并批次并在线程池中计算"""
+        from app.services.rerank.cross_encoder_service import get_cross_encoder_service
+        
+        service = get_cross_encoder_service(config.rerank_model or DEFAULT_RERANK_MODEL)
+        scores = await service.score(query, [node.node.get_content() for node in nodes])
+        return self._select_top(nodes, scores, config.top_n)
+    
+    def _tree_summarizer(self, query: str, config: CompressionConfig) -> _AsyncTreeSummarizer:
+        """创建本次压缩使用的树状总结器"""
+        llm = self.llm
+        if llm is None:
+            from app.frameworks.llamaindex.core import get_llm
+            llm = get_llm()
+        return _AsyncTreeSummarizer(
+            llm=llm,
+            query=query,
+            num_children=config.num_children,
+            max_concurrency=getattr(config, "max_concurrency", 4),
+            max_tokens=config.max_tokens
+        )
+    
+    async def acompress_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query: str,
+        config: Optional[CompressionConfig] = None
+    ) -> str:
+        """
+        异步压缩节点列表并返回摘要文本
+        
+        Args:
+            nodes: 节点列表
+            query: 查询字符串
+            config: 压缩配置，如果为None则使用默认配置
+            
+        Returns:
+            str: 压缩后的文本
+        """
+        try:
+            return await self._acompress_nodes(nodes, query, config or self.config)
+        except Exception as e:
+            logger.error(f"压缩上下文时出错: {str(e)}")
+            return "\n\n".join([node.node.text for node in nodes])
+    
+    async def _acompress_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query: str,
+        compression_config: CompressionConfig
+    ) -> str:
+        """异步压缩节点列表，出错时抛出异常，由调用方决定回退和状态"""
+        if not compression_config.enabled or not nodes:
+            return "\n\n".join([node.node.text for node in nodes])
+        
+        if compression_config.method == "tree_summarize":
+            filtered_nodes = nodes
+            if compression_config.top_n < len(nodes):
+                filtered_nodes = await self._arerank(nodes, query, compression_config)
+            
+            summarizer = self._tree_summarizer(query, compression_config)
+            return await summarizer.reduce([node.node.get_content() for node in filtered_nodes])
+        
+        elif compression_config.method == "compact_and_refine":
+            from app.frameworks.llamaindex.core import get_llm
+            synthesizer = CompactAndRefine(
+                llm=self.llm or get_llm(),
+                streaming=compression_config.streaming,
+                max_tokens=compression_config.max_tokens,
+                temperature=compression_config.temperature
+            )
+            response = await synthesizer.asynthesize(query=query, nodes=nodes)
+            return response.response
+        
+        else:
+            logger.warning(f"未知的压缩方法: {compression_config.method}")
+            return "\n\n".join([node.node.text for node in nodes])
+    
+    async def acompress_stream(
+        self,
+        node_stream: AsyncIterable[Union[NodeWithScore, Document, str]],
+        query: str,
+        config: Optional[CompressionConfig] = None
+    ) -> str:
+        """
+        增量压缩流式到达的检索结果
+        
+        tree_summarize方法下每凑满一组(num_children段且不超过上下文预算)就开始总结这一组，
+        检索结束时只需合并已完成的叶子总结；流式模式不做整体重排序。
+        其他方法收集完结果后调用acompress_nodes
+        
+        Args:
+            node_stream: 节点、文档或文本的异步迭代器
+            query: 查询字符串
+            config: 压缩配置，如果为None则使用默认配置
+            
+        Returns:
+            str: 压缩后的文本，出错时返回已收到的原始内容
+        """
+        nodes: List[NodeWithScore] = []
+        try:
+            return await self._acompress_stream(node_stream, query, config or self.config, nodes)
+        except Exception as e:
+            logger.error(f"增量压缩上下文时出错: {str(e)}")
+            return "\n\n".join([node.node.text for node in nodes])
+    
+    async def _acompress_stream(
+        self,
+        node_stream: AsyncIterable[Union[NodeWithScore, Document, str]],
+        query: str,
+        compression_config: CompressionConfig,
+        nodes: List[NodeWithScore]
+    ) -> str:
+        """增量压缩的实现，收到的节点依次追加到nodes，出错时抛出异常"""
+        if not compression_config.enabled or compression_config.method != "tree_summarize":
+            async for item in node_stream:
+                nodes.append(self._as_node(item))
+            return await self._acompress_nodes(nodes, query, compression_config)
+        
+        summarizer = self._tree_summarizer(query, compression_config)
+        closed: List[List[str]] = []
+        current: List[str] = []
+        used = 0
+        leaf_tasks: List[asyncio.Task] = []
+        try:
+            async for item in node_stream:
+                node = self._as_node(item)
+                nodes.append(node)
+                current, used = summarizer.pack(node.node.get_content(), current, used, closed)
+                for group in closed:
+                    leaf_tasks.append(asyncio.create_task(summarizer.summarize(group)))
+                closed.clear()
+            
+            if current:
+                leaf_tasks.append(asyncio.create_task(summarizer.summarize(current)))
+            if not leaf_tasks:
+                return ""
+            
+            leaves = await asyncio.gather(*leaf_tasks)
+        except BaseException:
+            for task in leaf_tasks:
+                task.cancel()
+            raise
+        
+        if len(leaves) == 1:
+            return leaves[0]
+        return await summarizer.reduce(leaves)
+    
+    @staticmethod
+    def _as_node(item: Union[NodeWithScore, Document, str]) -> NodeWithScore:
+        """把检索结果统一转换为NodeWithScore"""
+        if isinstance(item, NodeWithScore):
+            return item
+        if isinstance(item, str):
+            item = Document(text=item)
+        return NodeWithScore(node=item.to_node() if hasattr(item, "to_node") else item, score=1.0)
+    
+    async def acompress_text(
+        self,
+        text: str,
+        query: str,
+        config: Optional[CompressionConfig] = None
+    ) -> str:
+        """异步压缩文本内容"""
+        return await self.acompress_nodes([self._as_node(text)], query, config)
+    
+    async def acompress_documents(
+        self,
+        documents: List[Document],
+        query: str,
+        config: Optional[CompressionConfig] = None
+    ) -> str:
+        """异步压缩文档列表"""
+        return await self.acompress_nodes([self._as_node(doc) for doc in documents], query, config)
+    
     def compress_text(
         self, 
         text: str, 
@@ -189,82 +487,82 @@ class ContextCompressor:
         # 调用节点压缩方法
         return self.compress_nodes(nodes, query, config)
     
-    def compress_to_message(
+    def _source_info(
         self,
-        query: str,
         documents: Union[List[NodeWithScore], List[Document], str],
-        config: Optional[CompressionConfig] = None
-    ) -> Message:
+        config: CompressionConfig
+    ) -> Tuple[Optional[str], int, int]:
         """
-        压缩内容并返回标准消息格式
+        统计待压缩内容
         
-        Args:
-            query: 查询字符串
-            documents: 要压缩的文档或文本
-            config: 压缩配置，如果为None则使用默认配置
-            
         Returns:
-            Message: 压缩上下文消息
+            (原始文本(未启用store_original时为None), 源文档数量, 原始内容长度)
         """
-        compression_config = config or self.config
-        
-        # 测量开始时间
-        start_time = time.time()
-        
-        # 存储原始内容（如果启用）
         original_text = None
         source_count = 0
         original_length = 0
         
         if isinstance(documents, str):
-            original_text = documents if compression_config.store_original else None
+            original_text = documents if config.store_original else None
             original_length = len(documents)
             source_count = 1
         elif isinstance(documents, list) and len(documents) > 0:
             source_count = len(documents)
             if hasattr(documents[0], "node") and hasattr(documents[0], "score"):
                 # NodeWithScore列表
-                if compression_config.store_original:
+                if config.store_original:
                     original_text = "\n\n".join([node.node.text for node in documents])
                 original_length = sum(len(node.node.text) for node in documents)
             elif hasattr(documents[0], "text"):
                 # Document列表
-                if compression_config.store_original:
+                if config.store_original:
                     original_text = "\n\n".join([doc.text for doc in documents])
                 original_length = sum(len(doc.text) for doc in documents)
         
-        # 执行压缩
-        compressed_text = ""
-        try:
-            if isinstance(documents, str):
-                compressed_text = self.compress_text(documents, query, compression_config)
-            elif isinstance(documents, list) and len(documents) > 0:
-                if hasattr(documents[0], "node") and hasattr(documents[0], "score"):
-                    # NodeWithScore列表
-                    compressed_text = self.compress_nodes(documents, query, compression_config)
-                elif hasattr(documents[0], "text"):
-                    # Document列表
-                    compressed_text = self.compress_documents(documents, query, compression_config)
-                else:
-                    raise ValueError("不支持的文档类型")
-            else:
-                raise ValueError("不支持的输入类型")
-        except Exception as e:
-            logger.error(f"压缩上下文时出错: {str(e)}")
-            status = "failed"
-            error_message = str(e)
-            
-            # 如果压缩失败，使用原始内容
-            if isinstance(documents, str):
-                compressed_text = documents
-            elif isinstance(documents, list) and len(documents) > 0:
-                if hasattr(documents[0], "node") and hasattr(documents[0], "score"):
-                    compressed_text = "\n\n".join([node.node.text for node in documents])
-                elif hasattr(documents[0], "text"):
-                    compressed_text = "\n\n".join([doc.text for doc in documents])
-        else:
-            status = "success"
-            error_message = None
+        return original_text, source_count, original_length
+    
+    @staticmethod
+    def _source_kind(documents: Union[List[NodeWithScore], List[Document], str]) -> str:
+        """识别输入类型: text, nodes或documents"""
+        if isinstance(documents, str):
+            return "text"
+        if isinstance(documents, list) and len(documents) > 0:
+            if hasattr(documents[0], "node") and hasattr(documents[0], "score"):
+                return "nodes"
+            if hasattr(documents[0], "text"):
+                return "documents"
+            raise ValueError("不支持的文档类型")
+        raise ValueError("不支持的输入类型")
+    
+    @staticmethod
+    def _fallback_text(documents: Union[List[NodeWithScore], List[Document], str]) -> str:
+        """压缩失败时使用原始内容"""
+        if isinstance(documents, str):
+            return documents
+        if isinstance(documents, list) and len(documents) > 0:
+            if hasattr(documents[0], "node") and hasattr(documents[0], "score"):
+                return "\n\n".join([node.node.text for node in documents])
+            if hasattr(documents[0], "text"):
+                return "\n\n".join([doc.text for doc in documents])
+        return ""
+    
+    def _finish_message(
+        self,
+        query: str,
+        compressed_text: str,
+        source: Tuple[Optional[str], int, int],
+        start_time: float,
+        status: str,
+        error_message: Optional[str],
+        config: CompressionConfig
+    ) -> Tuple[Message, Dict[str, Any]]:
+        """
+        生成压缩上下文消息
+        
+        Returns:
+            (消息, 执行记录参数)
+        """
+        original_text, source_count, original_length = source
         
         # 计算执行时间
         execution_time = int((time.time() - start_time) * 1000)  # 毫秒
@@ -273,8 +571,7 @@ class ContextCompressor:
         compressed_length = len(compressed_text)
         compression_ratio = compressed_length / original_length if original_length > 0 else 1.0
         
-        # 记录执行
-        self._record_execution(
+        record = dict(
             query=query,
             original_length=original_length,
             compressed_length=compressed_length,
@@ -283,14 +580,13 @@ class ContextCompressor:
             execution_time=execution_time,
             status=status,
             error=error_message,
-            config=compression_config
+            config=config
         )
         
-        # 创建消息
-        return convert_compressed_context_to_internal(
+        message = convert_compressed_context_to_internal(
             compressed_text=compressed_text,
             original_text=original_text,
-            method=compression_config.method,
+            method=config.method,
             compression_ratio=compression_ratio,
             source_count=source_count,
             metadata={
@@ -299,6 +595,134 @@ class ContextCompressor:
                 "status": status
             }
         )
+        return message, record
+    
+    def compress_to_message(
+        self,
+        query: str,
+        documents: Union[List[NodeWithScore], List[Document], str],
+        config: Optional[CompressionConfig] = None
+    ) -> Message:
+        """
+        压缩内容并返回标准消息格式
+        
+        Args:
+            query: 查询字符串
+            documents: 要压缩的文档或文本
+            config: 压缩配置，如果为None则使用默认配置
+            
+        Returns:
+            Message: 压缩上下文消息
+        """
+        compression_config = config or self.config
+        start_time = time.time()
+        source = self._source_info(documents, compression_config)
+        
+        # 执行压缩
+        status = "success"
+        error_message = None
+        try:
+            kind = self._source_kind(documents)
+            if kind == "text":
+                compressed_text = self.compress_text(documents, query, compression_config)
+            elif kind == "nodes":
+                compressed_text = self.compress_nodes(documents, query, compression_config)
+            else:
+                compressed_text = self.compress_documents(documents, query, compression_config)
+        except Exception as e:
+            logger.error(f"压缩上下文时出错: {str(e)}")
+            status = "failed"
+            error_message = str(e)
+            compressed_text = self._fallback_text(documents)
+        
+        message, record = self._finish_message(
+            query, compressed_text, source, start_time, status, error_message, compression_config
+        )
+        self._record_execution(**record)
+        return message
+    
+    async def acompress_to_message(
+        self,
+        query: str,
+        documents: Union[List[NodeWithScore], List[Document], str],
+        config: Optional[CompressionConfig] = None
+    ) -> Message:
+        """
+        异步压缩内容并返回标准消息格式，执行记录在线程池中写入数据库
+        
+        Args:
+            query: 查询字符串
+            documents: 要压缩的文档或文本
+            config: 压缩配置，如果为None则使用默认配置
+            
+        Returns:
+            Message: 压缩上下文消息
+        """
+        compression_config = config or self.config
+        start_time = time.time()
+        source = self._source_info(documents, compression_config)
+        
+        status = "success"
+        error_message = None
+        try:
+            # 直接调用会抛出异常的实现，压缩失败时记录为failed而不是以原文冒充成功
+            kind = self._source_kind(documents)
+            if kind == "text":
+                nodes = [self._as_node(documents)]
+            elif kind == "nodes":
+                nodes = documents
+            else:
+                nodes = [self._as_node(doc) for doc in documents]
+            compressed_text = await self._acompress_nodes(nodes, query, compression_config)
+        except Exception as e:
+            logger.error(f"压缩上下文时出错: {str(e)}")
+            status = "failed"
+            error_message = str(e)
+            compressed_text = self._fallback_text(documents)
+        
+        message, record = self._finish_message(
+            query, compressed_text, source, start_time, status, error_message, compression_config
+        )
+        await asyncio.to_thread(self._record_execution, **record)
+        return message
+    
+    async def acompress_stream_to_message(
+        self,
+        query: str,
+        node_stream: AsyncIterable[Union[NodeWithScore, Document, str]],
+        config: Optional[CompressionConfig] = None
+    ) -> Tuple[Message, List[NodeWithScore]]:
+        """
+        增量压缩流式到达的检索结果并返回标准消息格式
+        
+        Args:
+            query: 查询字符串
+            node_stream: 节点、文档或文本的异步迭代器
+            config: 压缩配置，如果为None则使用默认配置
+            
+        Returns:
+            (压缩上下文消息, 收到的全部节点)
+        """
+        compression_config = config or self.config
+        start_time = time.time()
+        nodes: List[NodeWithScore] = []
+        
+        status = "success"
+        error_message = None
+        try:
+            compressed_text = await self._acompress_stream(node_stream, query, compression_config, nodes)
+        except Exception as e:
+            logger.error(f"增量压缩上下文时出错: {str(e)}")
+            status = "failed"
+            error_message = str(e)
+            compressed_text = self._fallback_text(nodes)
+        
+        source = self._source_info(nodes, compression_config)
+        message, record = self._finish_message(
+            query, compressed_text, source, start_time, status, error_message, compression_config
+        )
+        await asyncio.to_thread(self._record_execution, **record)
+        return message, nodes
     
     def _record_execution(
         self,
@@ -1,7 +1,7 @@
 """
 上下文压缩装饰器 - 用于Agent流程中的上下文压缩
 提供两种装饰器:
-1. compress_retrieval_results - 压缩检索结果
+1. compress_retrieval_results - 压缩检索结果，异步生成器形式的流式检索在结果到达时增量压缩
 2. compress_final_context - 压缩最终提交给LLM的上下文
 """
 
@@ -50,27 +50,7 @@ def compress_retrieval_results(
                 return results
                 
             # 获取查询内容 - 通过检查函数参数
-            query = None
-            sig = inspect.signature(func)
-            param_names = list(sig.parameters.keys())
-            
-            # 检查kwargs中是否有query参数
-            for param_name in ['query', 'question', 'q', 'text', 'content']:
-                if param_name in kwargs:
-                    query = kwargs[param_name]
-                    break
-                    
-            # 如果没有在kwargs中找到，检查args
-            if query is None and len(args) > 1:  # 第一个通常是self
-                for i, param_name in enumerate(param_names):
-                    if param_name in ['query', 'question', 'q', 'text', 'content'] and i < len(args):
-                        query = args[i]
-                        break
-            
-            # 如果没有找到查询，使用空字符串
-            if query is None:
-                query = ""
-                logger.warning("未找到查询参数，使用空字符串")
+            query = _find_query(func, args, kwargs)
             
             # 获取压缩工具
             compressor = get_context_compressor(llm=llm, config=config)
@@ -86,7 +66,7 @@ def compress_retrieval_results(
                     documents.append(Document(text=text, metadata=metadata))
                 
                 # 创建压缩上下文消息
-                compressed_message = compressor.compress_to_message(query, documents, config)
+                compressed_message = await compressor.acompress_to_message(query, documents, config)
                 
                 # 更新结果 - 添加压缩后的消息
                 results["compressed_message"] = compressed_message
@@ -96,7 +76,7 @@ def compress_retrieval_results(
                 # 文档或节点列表
                 if hasattr(results[0], "node") and hasattr(results[0], "score"):
                     # NodeWithScore列表
-                    compressed_message = compressor.compress_to_message(query, results, config)
+                    compressed_message = await compressor.acompress_to_message(query, results, config)
                     # 返回压缩文本和原始结果
                     return {
                         "original_results": results,
@@ -114,7 +94,7 @@ def compress_retrieval_results(
                             metadata = item.get("metadata", {})
                             documents.append(Document(text=text, metadata=metadata))
                     
-                    compressed_message = compressor.compress_to_message(query, documents, config)
+                    compressed_message = await compressor.acompress_to_message(query, documents, config)
                     return {
                         "original_results": results,
                         "compressed_message": compressed_message,
@@ -123,14 +103,39 @@ def compress_retrieval_results(
             
             return results
             
+        @functools.wraps(func)
+        async def stream_wrapper(*args: Any, **kwargs: Any) -> Any:
+            # 流式检索: 结果边到达边分组总结，不等待检索全部结束
+            results = func(*args, **kwargs)
+            if not config or not config.enabled:
+                return [item async for item in results]
+            
+            query = _find_query(func, args, kwargs)
+            compressor = get_context_compressor(llm=llm, config=config)
+            originals = []
+            
+            async def documents():
+                async for item in results:
+                    originals.append(item)
+                    yield _as_document(item)
+            
+            compressed_message, _ = await compressor.acompress_stream_to_message(query, documents(), config)
+            return {
+                "original_results": originals,
+                "compressed_message": compressed_message,
+                "compressed_context": compressed_message.content.get("compressed_context", "")
+            }
+            
         @functools.wraps(func)
         def sync_wrapper(*args: Any, **kwargs: Any) -> Any:
             # 同步版本实现类似的逻辑
             logger.warning("压缩装饰器应用于同步函数，可能无法正常工作")
             return func(*args, **kwargs)
             
-        # 根据原函数是否为异步函数返回相应的包装器
-        if inspect.iscoroutinefunction(func):
+        # 根据原函数是否为异步函数返回相应的包装器，异步生成器按流式检索处理
+        if inspect.isasyncgenfunction(func):
+            return cast(F, stream_wrapper)
+        elif inspect.iscoroutinefunction(func):
             return cast(F, async_wrapper)
         else:
             return cast(F, sync_wrapper)
@@ -138,6 +143,39 @@ def compress_retrieval_results(
     return decorator
 
 
+def _find_query(func: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> str:
+    """从被装饰函数的参数中找出查询内容，找不到时返回空字符串"""
+    query = None
+    param_names = list(inspect.signature(func).parameters.keys())
+    
+    # 检查kwargs中是否有query参数
+    for param_name in ['query', 'question', 'q', 'text', 'content']:
+        if param_name in kwargs:
+            query = kwargs[param_name]
+            break
+            
+    # 如果没有在kwargs中找到，检查args
+    if query is None and len(args) > 1:  # 第一个通常是self
+        for i, param_name in enumerate(param_names):
+            if param_name in ['query', 'question', 'q', 'text', 'content'] and i < len(args):
+                query = args[i]
+                break
+    
+    # 如果没有找到查询，使用空字符串
+    if query is None:
+        query = ""
+        logger.warning("未找到查询参数，使用空字符串")
+    return query
+
+
+def _as_document(item: Any) -> Union[NodeWithScore, Document, str]:
+    """把流式检索结果转换为压缩器接受的类型，检索工具格式的字典转换为Document"""
+    if isinstance(item, dict):
+        text = item.get("content", item.get("text", ""))
+        return Document(text=text, metadata=item.get("metadata", {}))
+    return item
+
+
 def compress_final_context(
     config: Optional[CompressionConfig] = None,
     llm: Optional[LLM] = None
@@ -192,7 +230,7 @@ def compress_final_context(
             # 根据上下文类型进行压缩
             if isinstance(context, str):
                 # 字符串上下文
-                compressed_message = compressor.compress_to_message(query, context, config)
+                compressed_message = await compressor.acompress_to_message(query, context, config)
                 # 更新kwargs - 可以选择传递完整消息或仅压缩内容
                 if config and config.use_message_format:
                     kwargs['context'] = compressed_message
@@ -210,14 +248,14 @@ def compress_final_context(
                 if len(context) > 0:
                     if hasattr(context[0], 'node') and hasattr(context[0], 'score'):
                         # NodeWithScore列表
-                        compressed_message = compressor.compress_to_message(query, context, config)
+                        compressed_message = await compressor.acompress_to_message(query, context, config)
                         if config and config.use_message_format:
                             kwargs['context'] = compressed_message
                         else:
                             kwargs['context'] = compressed_message.content.get("compressed_context", "")
                     elif hasattr(context[0], 'text'):
                         # Document列表
-                        compressed_message = compressor.compress_to_message(query, context, config)
+                        compressed_message = await compressor.acompress_to_message(query, context, config)
                         if config and config.use_message_format:
                             kwargs['context'] = compressed_message
                         else:
@@ -5,6 +5,7 @@
 
 from typing import Dict, Any, Optional, List, Callable, Awaitable
 from fastapi import Request, Response
+import asyncio
 import json
 import time
 from datetime import datetime
@@ -12,7 +13,7 @@ from datetime import datetime
 from app.messaging.core.models import Message, MessageType
 from app.messaging.core.compressed_context import convert_compressed_context_to_internal
 from app.schemas.context_compression import CompressionConfig, CompressedContextResult
-from app.services.context_compression_service import ContextCompressionService
+from app.services.knowledge.compression_service import ContextCompressionService
 
 
 class ContextCompressionMiddleware:
@@ -61,20 +62,18 @@ class ContextCompressionMiddleware:
         if not self.enabled or not self._should_compress_path(request.url.path):
             return await call_next(request)
         
-        # 创建响应拦截器
-        response_interceptor = ResponseInterceptor()
-        
         # 传递给下一个中间件，获取响应
         response = await call_next(request)
         
-        # 如果响应类型不是JSON，则直接返回
+        # 如果响应类型不是JSON（包括SSE流式响应），不读取响应体直接返回
         if not response.headers.get("content-type", "").startswith("application/json"):
             return response
         
-        # 读取响应内容
-        body = await response.body()
+        # 读取响应内容，读取后原响应体迭代器已耗尽，之后都使用body重建响应
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
         if not body:
-            return response
+            return Response(content=body, status_code=response.status_code, headers=headers)
         
         try:
             # 解析响应内容
@@ -89,7 +88,7 @@ class ContextCompressionMiddleware:
                 new_response = Response(
                     content=json.dumps(compressed_data),
                     status_code=response.status_code,
-                    headers=dict(response.headers),
+                    headers=headers,
                     media_type=response.media_type
                 )
                 return new_response
@@ -98,7 +97,12 @@ class ContextCompressionMiddleware:
             print(f"上下文压缩中间件错误: {str(e)}")
         
         # 如果没有需要压缩的内容或发生错误，返回原始响应
-        return response
+        return Response(
+            content=body,
+            status_code=response.status_code,
+            headers=headers,
+            media_type=response.media_type
+        )
     
     def _should_compress_path(self, path: str) -> bool:
         """
@@ -218,28 +222,35 @@ class ContextCompressionMiddleware:
                     # 添加压缩消息到消息列表中
                     response_data["messages"].append(compressed_msg.dict())
         
-        # 如果是OpenAI格式的响应，处理choices中的消息
+        # 如果是OpenAI格式的响应，并发压缩choices中的较长消息
         elif "choices" in response_data and isinstance(response_data["choices"], list):
-            for choice in response_data["choices"]:
-                if "message" in choice and isinstance(choice["message"], dict):
-                    content = choice["message"].get("content", "")
-                    if content and len(content) > 1000:  # 只压缩较长的内容
-                        # 执行压缩
-                        result = await compression_service.compress_context(
-                            content=content,
-                            query=query,
-                            agent_id=agent_id,
-                            config=config
-                        )
-                        
-                        # 如果压缩成功且压缩比小于95%，则替换内容
-                        if result.status == "success" and result.compression_ratio < 0.95:
-                            choice["message"]["original_content"] = content
-                            choice["message"]["content"] = result.compressed_context
-                            choice["message"]["compression_info"] = {
-                                "ratio": result.compression_ratio,
-                                "method": result.method
-                            }
+            semaphore = asyncio.Semaphore(max(1, getattr(config, "max_concurrency", 4)))
+            
+            async def compress_choice(choice: Dict[str, Any]):
+                content = choice["message"].get("content", "")
+                async with semaphore:
+                    result = await compression_service.compress_context(
+                        content=content,
+                        query=query,
+                        agent_id=agent_id,
+                        config=config
+                    )
+                
+                # 如果压缩成功且压缩比小于95%，则替换内容
+                if result.status == "success" and result.compression_ratio < 0.95:
+                    choice["message"]["original_content"] = content
+                    choice["message"]["content"] = result.compressed_context
+                    choice["message"]["compression_info"] = {
+                        "ratio": result.compression_ratio,
+                        "method": result.method
+                    }
+            
+            await asyncio.gather(*(
+                compress_choice(choice)
+                for choice in response_data["choices"]
+                if isinstance(choice.get("message"), dict)
+                and len(choice["message"].get("content") or "") > 1000  # 只压缩较长的内容
+            ))
         
         return response_data
 
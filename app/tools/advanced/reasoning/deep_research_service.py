@@ -6,7 +6,9 @@
 import logging
 import json
 import asyncio
-from typing import Dict, List, Any, Optional, Union, Set
+import inspect
+from dataclasses import dataclass, field
+from typing import Dict, List, Any, Optional, Union, Set, Callable, AsyncIterator
 
 from llama_index.core import VectorStoreIndex, Document, Settings
 from llama_index.core.llms import ChatMessage, MessageRole
@@ -18,9 +20,52 @@ from llama_index.readers.web import SimpleWebPageReader
 
 from app.tools.advanced.reasoning.cot_manager import CoTManager
 from app.tools.base.search.search_tool import get_search_tool
+from app.config import settings
+from app.utils.core.cache.memory_cache import MemoryCache
 
 logger = logging.getLogger(__name__)
 
+# 网页抽取文本缓存（进程内共享，URL -> 文本），按条目数和字节数双重限制
+_web_content_cache = MemoryCache(
+    max_size=getattr(settings, "DEEP_RESEARCH_WEB_CACHE_MAX_ITEMS", 512),
+    default_ttl=1800,
+    max_bytes=getattr(settings, "DEEP_RESEARCH_WEB_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+)
+
+# 正在抓取的URL -> 抓取任务，同一URL的并发请求共享一次抓取
+_web_fetches: Dict[str, asyncio.Task] = {}
+
+# 进度回调类型，接收事件字典，可以是同步或异步函数
+ProgressCallback = Callable[[Dict[str, Any]], Any]
+
+
+@dataclass
+class ResearchContext:
+    """
+    单次研究请求的上下文
+    每次调用run都会创建独立实例，避免共享服务实例上的并发请求互相覆盖状态
+    """
+    topic: str
+    urls_per_query: int = 3
+    language: str = "zh-CN"
+    temperature: float = 0.3
+    sub_questions: List[str] = field(default_factory=list)
+    search_results: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+    web_content: Dict[str, str] = field(default_factory=dict)
+    sub_answers: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    progress_callback: Optional[ProgressCallback] = None
+    
+    async def emit(self, event: str, **data: Any) -> None:
+        """发送进度事件，回调出错不影响研究流程"""
+        if self.progress_callback is None:
+            return
+        try:
+            result = self.progress_callback({"event": event, **data})
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.warning(f"发送研究进度事件时出错: {str(e)}")
+
 class DeepResearchService:
     """
     深度研究服务
@@ -36,7 +81,9 @@ class DeepResearchService:
         cot_manager: Optional[CoTManager] = None,
         max_sub_questions: int = 3,
         max_urls_per_query: int = 3,
-        enable_cot_display: bool = True
+        enable_cot_display: bool = True,
+        max_concurrent_fetches: int = 8,
+        web_cache_ttl: int = 1800
     ):
         """
         初始化深度研究服务
@@ -50,6 +97,8 @@ class DeepResearchService:
             max_sub_questions: 最大子问题数量
             max_urls_per_query: 每个查询最大URL数量
             enable_cot_display: 是否默认启用CoT显示
+            max_concurrent_fetches: 网页抓取的最大并发数
+            web_cache_ttl: 网页内容缓存的生存时间（秒），0表示不缓存
         """
         self.llm = llm or Settings.llm
         self.embed_model = embed_model or Settings.embed_model
@@ -60,13 +109,11 @@ class DeepResearchService:
         self.max_sub_questions = max_sub_questions
         self.max_urls_per_query = max_urls_per_query
         self.enable_cot_display = enable_cot_display
+        self.web_cache_ttl = web_cache_ttl
         
-        # 存储每次执行的信息
-        self.current_topic = ""
-        self.sub_questions = []
-        self.search_results = {}
-        self.web_content = {}
-        self.sub_answers = {}
+        # 所有请求共享的抓取并发限制与网页读取器
+        self._fetch_semaphore = asyncio.Semaphore(max(1, max_concurrent_fetches))
+        self._web_reader = SimpleWebPageReader(html_to_text=True)
     
     async def run(
         self,
@@ -75,11 +122,15 @@ class DeepResearchService:
         urls_per_query: int = 3,
         language: str = "zh-CN",
         show_cot: Optional[bool] = None,
-        temperature: float = 0.3
+        temperature: float = 0.3,
+        progress_callback: Optional[ProgressCallback] = None
     ) -> Dict[str, Any]:
         """
         执行完整的深度研究流程
         
+        每个子问题的 搜索 -> 抓取 -> 回答 作为独立分支并发执行，
+        整体耗时接近最慢的分支而不是所有分支之和
+        
         参数:
             main_topic: 主要研究问题
             num_sub_questions: 子问题数量，不能超过max_sub_questions
@@ -87,6 +138,7 @@ class DeepResearchService:
             language: 搜索语言，默认为zh-CN
             show_cot: 是否在响应中显示CoT过程，默认为None表示使用服务的默认设置
             temperature: 温度参数，控制LLM输出随机性
+            progress_callback: 进度回调，接收形如{"event": ..., ...}的事件字典
             
         返回:
             包含研究结果的字典
@@ -98,65 +150,127 @@ class DeepResearchService:
         num_sub_questions = min(num_sub_questions, self.max_sub_questions)
         urls_per_query = min(urls_per_query, self.max_urls_per_query)
         
-        # 重置执行状态
-        self.current_topic = main_topic
-        self.sub_questions = []
-        self.search_results = {}
-        self.web_content = {}
-        self.sub_answers = {}
+        # 每次执行使用独立的上下文
+        ctx = ResearchContext(
+            topic=main_topic,
+            urls_per_query=urls_per_query,
+            language=language,
+            temperature=temperature,
+            progress_callback=progress_callback
+        )
         
         try:
             # 步骤1: 将主问题分解为子问题
             logger.info(f"分解问题: {main_topic}")
-            self.sub_questions = await self._decompose_question(
+            ctx.sub_questions = await self._decompose_question(
                 main_topic, 
                 num_sub_questions,
                 temperature=temperature
             )
+            await ctx.emit("decomposed", sub_questions=list(ctx.sub_questions))
             
-            # 步骤2: 对每个子问题进行网络搜索
-            logger.info(f"开始搜索子问题: {len(self.sub_questions)}个")
-            for i, question in enumerate(self.sub_questions):
-                logger.info(f"搜索子问题 {i+1}/{len(self.sub_questions)}: {question}")
-                search_results = await self._search_question(
-                    question, 
-                    urls_per_query,
-                    language
-                )
-                self.search_results[question] = search_results
-            
-            # 步骤3: 爬取搜索结果的网页内容
-            logger.info("爬取网页内容")
-            await self._fetch_web_content()
-            
-            # 步骤4: 回答每个子问题
-            logger.info("回答子问题")
-            for i, question in enumerate(self.sub_questions):
-                logger.info(f"回答子问题 {i+1}/{len(self.sub_questions)}: {question}")
-                answer = await self._answer_sub_question(
-                    question, 
-                    temperature=temperature
-                )
-                self.sub_answers[question] = answer
+            # 步骤2-4: 每个子问题独立执行 搜索 -> 抓取 -> 回答
+            logger.info(f"并发研究子问题: {len(ctx.sub_questions)}个")
+            await asyncio.gather(*[
+                self._research_sub_question(ctx, index, question)
+                for index, question in enumerate(ctx.sub_questions)
+            ])
             
             # 步骤5: 合成最终报告
             logger.info("合成最终报告")
+            await ctx.emit("synthesizing")
             final_report = await self._synthesize_report(
-                main_topic,
+                ctx,
                 temperature=temperature
             )
             
             # 整理返回结果
-            return self._format_results(main_topic, final_report, show_cot)
+            result = self._format_results(ctx, final_report, show_cot)
+            await ctx.emit("completed", final_answer=result.get("final_answer", ""))
+            return result
             
         except Exception as e:
             logger.error(f"执行深度研究时出错: {str(e)}")
+            await ctx.emit("error", error=str(e))
             return {
                 "original_query": main_topic,
                 "final_answer": f"执行深度研究时出错: {str(e)}",
                 "show_cot": False
             }
     
+    async def stream_run(
+        self,
+        main_topic: str,
+        **kwargs: Any
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        以事件流的形式执行深度研究
+        
+        参数:
+            main_topic: 主要研究问题
+            **kwargs: 传递给run的其他参数
+            
+        返回:
+            进度事件的异步迭代器，最后一个事件为{"event": "result", "result": ...}
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(
+            self.run(main_topic, progress_callback=queue.put_nowait, **kwargs)
+        )
+        task.add_done_callback(lambda _: queue.put_nowait(None))
+        
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            yield {"event": "result", "result": task.result()}
+        finally:
+            if not task.done():
+                task.cancel()
+    
+    async def _research_sub_question(
+        self,
+        ctx: ResearchContext,
+        index: int,
+        question: str
+    ) -> None:
+        """
+        执行单个子问题的研究分支：搜索 -> 抓取 -> 回答
+        
+        参数:
+            ctx: 研究上下文
+            index: 子问题序号
+            question: 子问题
+        """
+        logger.info(f"搜索子问题 {index+1}/{len(ctx.sub_questions)}: {question}")
+        search_results = await self._search_question(
+            question,
+            ctx.urls_per_query,
+            ctx.language
+        )
+        ctx.search_results[question] = search_results
+        await ctx.emit("searched", index=index, question=question, result_count=len(search_results))
+        
+        urls = [result.get("url") for result in search_results if result.get("url")]
+        ctx.web_content.update(await self._fetch_web_content(urls))
+        await ctx.emit("fetched", index=index, question=question, url_count=len(urls))
+        
+        logger.info(f"回答子问题 {index+1}/{len(ctx.sub_questions)}: {question}")
+        try:
+            answer = await self._answer_sub_question(
+                ctx,
+                question,
+                temperature=ctx.temperature
+            )
+        except Exception as e:
+            # 单个分支失败不影响其他子问题
+            logger.error(f"回答子问题时出错: {str(e)}")
+            answer = {"final_answer": f"回答子问题时出错: {str(e)}"}
+        ctx.sub_answers[question] = answer
+        await ctx.emit("answered", index=index, question=question, answer=answer.get("final_answer", ""))
+    
     async def _decompose_question(
         self, 
         main_question: str, 
@@ -285,52 +399,66 @@ class DeepResearchService:
             logger.error(f"搜索问题时出错: {str(e)}")
             return []
     
-    async def _fetch_web_content(self) -> None:
+    async def _fetch_web_content(self, urls: List[str]) -> Dict[str, str]:
         """
-        抓取搜索结果中的网页内容
+        抓取网页内容
         
-        将内容存储在self.web_content中，键为URL
-        """
-        # 收集所有唯一的URL
-        all_urls = set()
-        for results in self.search_results.values():
-            for result in results:
-                url = result.get("url")
-                if url:
-                    all_urls.add(url)
-        
-        # 批量抓取网页内容
-        try:
-            logger.info(f"开始抓取 {len(all_urls)} 个网页")
+        命中缓存的URL直接返回，其余URL在全局并发限制内抓取
+        
+        参数:
+            urls: 要抓取的URL列表
             
-            # 使用asyncio并发抓取
-            async def fetch_url(url):
+        返回:
+            URL到网页文本的字典，仅包含抓取成功的URL
+        """
+        web_content = {}
+        pending = []
+        for url in dict.fromkeys(urls):
+            cached = _web_content_cache.get(url) if self.web_cache_ttl > 0 else None
+            if cached is not None:
+                web_content[url] = cached
+            else:
+                pending.append(url)
+        
+        if not pending:
+            return web_content
+        
+        async def load_url(url):
+            async with self._fetch_semaphore:
                 try:
-                    # 使用SimpleWebPageReader抓取内容
-                    documents = await SimpleWebPageReader(html_to_text=True).aload_data([url])
-                    if documents and len(documents) > 0:
-                        return url, documents[0].text
-                    return url, ""
+                    documents = await self._web_reader.aload_data([url])
+                    content = documents[0].text if documents else ""
                 except Exception as e:
                     logger.error(f"抓取URL {url} 时出错: {str(e)}")
-                    return url, ""
-            
-            # 并发抓取所有URL
-            tasks = [fetch_url(url) for url in all_urls]
-            results = await asyncio.gather(*tasks)
-            
-            # 存储结果
-            for url, content in results:
-                if content:
-                    self.web_content[url] = content
-            
-            logger.info(f"成功抓取 {len(self.web_content)} 个网页")
-            
-        except Exception as e:
-            logger.error(f"批量抓取网页时出错: {str(e)}")
+                    return ""
+            if content and self.web_cache_ttl > 0:
+                _web_content_cache.set(url, content, ttl=self.web_cache_ttl)
+            return content
+        
+        async def fetch_url(url):
+            loop = asyncio.get_running_loop()
+            task = _web_fetches.get(url)
+            if task is None or task.done() or task.get_loop() is not loop:
+                task = loop.create_task(load_url(url))
+                _web_fetches[url] = task
+                task.add_done_callback(
+                    lambda t, u=url: _web_fetches.pop(u, None) if _web_fetches.get(u) is t else None
+                )
+            # shield: 单个请求被取消时不影响其他等待同一URL的请求
+            return url, await asyncio.shield(task)
+        
+        logger.info(f"开始抓取 {len(pending)} 个网页（缓存命中 {len(web_content)} 个）")
+        results = await asyncio.gather(*[fetch_url(url) for url in pending])
+        
+        for url, content in results:
+            if content:
+                web_content[url] = content
+        
+        return web_content
     
     async def _answer_sub_question(
         self, 
+        ctx: ResearchContext,
         question: str,
         temperature: float = 0.3
     ) -> Dict[str, Any]:
@@ -338,6 +466,7 @@ class DeepResearchService:
         使用搜索结果和网页内容回答子问题
         
         参数:
+            ctx: 研究上下文
             question: 要回答的子问题
             temperature: 温度参数，控制LLM输出随机性
             
@@ -345,7 +474,7 @@ class DeepResearchService:
             包含回答和思维链的字典
         """
         # 获取该问题的搜索结果
-        search_results = self.search_results.get(question, [])
+        search_results = ctx.search_results.get(question, [])
         
         # 构建上下文信息
         context = []
@@ -355,7 +484,7 @@ class DeepResearchService:
             snippet = result.get("snippet", "")
             
             # 获取完整网页内容
-            content = self.web_content.get(url, "")
+            content = ctx.web_content.get(url, "")
             
             if content:
                 context.append(f"标题: {title}\n网址: {url}\n内容: {content[:2000]}...\n")
@@ -391,23 +520,25 @@ class DeepResearchService:
     
     async def _synthesize_report(
         self, 
-        main_question: str,
+        ctx: ResearchContext,
         temperature: float = 0.3
     ) -> Dict[str, Any]:
         """
         合成最终研究报告
         
         参数:
-            main_question: 主要研究问题
+            ctx: 研究上下文
             temperature: 温度参数，控制LLM输出随机性
             
         返回:
             包含报告和思维链的字典
         """
+        main_question = ctx.topic
+        
         # 准备子问题和答案的摘要
         sub_qa_summary = ""
-        for i, question in enumerate(self.sub_questions):
-            answer = self.sub_answers.get(question, {})
+        for i, question in enumerate(ctx.sub_questions):
+            answer = ctx.sub_answers.get(question, {})
             final_answer = answer.get("final_answer", "未获取到答案")
             
             sub_qa_summary += f"子问题 {i+1}: {question}\n"
@@ -446,7 +577,7 @@ class DeepResearchService:
     
     def _format_results(
         self, 
-        original_query: str, 
+        ctx: ResearchContext, 
         final_report: Dict[str, Any],
         show_cot: bool
     ) -> Dict[str, Any]:
@@ -454,7 +585,7 @@ class DeepResearchService:
         格式化最终结果
         
         参数:
-            original_query: 原始查询
+            ctx: 研究上下文
             final_report: 最终报告
             show_cot: 是否显示思维链
             
@@ -463,9 +594,9 @@ class DeepResearchService:
         """
         # 准备返回的数据结构
         result = {
-            "original_query": original_query,
+            "original_query": ctx.topic,
             "final_answer": final_report.get("final_answer", ""),
-            "sub_questions": self.sub_questions,
+            "sub_questions": ctx.sub_questions,
             "show_cot": show_cot
         }
         
@@ -476,8 +607,8 @@ class DeepResearchService:
             
             # 添加每个子问题的思维链和答案
             sub_question_details = []
-            for question in self.sub_questions:
-                answer_data = self.sub_answers.get(question, {})
+            for question in ctx.sub_questions:
+                answer_data = ctx.sub_answers.get(question, {})
                 
                 sub_detail = {
                     "question": question,
@@ -486,7 +617,7 @@ class DeepResearchService:
                 }
                 
                 # 添加搜索结果
-                search_data = self.search_results.get(question, [])
+                search_data = ctx.search_results.get(question, [])
                 sub_detail["search_results"] = [
                     {
                         "title": item.get("title", ""),
@@ -510,7 +641,9 @@ def get_deep_research_service(
     cot_manager: Optional[CoTManager] = None,
     max_sub_questions: int = 3,
     max_urls_per_query: int = 3,
-    enable_cot_display: bool = True
+    enable_cot_display: bool = True,
+    max_concurrent_fetches: int = 8,
+    web_cache_ttl: int = 1800
 ) -> DeepResearchService:
     """
     获取深度研究服务实例
@@ -524,6 +657,8 @@ def get_deep_research_service(
         max_sub_questions: 最大子问题数量
         max_urls_per_query: 每个查询最大URL数量
         enable_cot_display: 是否默认启用CoT显示
+        max_concurrent_fetches: 网页抓取的最大并发数
+        web_cache_ttl: 网页内容缓存的生存时间（秒），0表示不缓存
         
     返回:
         深度研究服务实例
@@ -536,5 +671,7 @@ def get_deep_research_service(
         cot_manager=cot_manager,
         max_sub_questions=max_sub_questions,
         max_urls_per_query=max_urls_per_query,
-        enable_cot_display=enable_cot_display
+        enable_cot_display=enable_cot_display,
+        max_concurrent_fetches=max_concurrent_fetches,
+        web_cache_ttl=web_cache_ttl
     )
@@ -506,7 +506,7 @@ class UnifiedKnowledgeBaseManager:
                 knowledge_base_id=db_kb.id,
                 title=document.get("title", "Untitled"),
                 content=document.get("content", ""),
-                metadata=document.get("metadata", {}),
+                meta_data=document.get("metadata", {}),
                 status="indexed"
             )
             self.db.add(db_doc)
@@ -518,7 +518,7 @@ class UnifiedKnowledgeBaseManager:
                 db_chunk = DBDocumentChunk(
                     document_id=db_doc.id,
                     content=f"Chunk {i+1}",  # 实际内容需要从Agno获取
-                    metadata={"chunk_id": chunk_id, "chunk_index": i}
+                    meta_data={"chunk_id": chunk_id, "chunk_index": i}
                 )
                 self.db.add(db_chunk)
             
@@ -3,6 +3,20 @@
 提供Redis缓存、异步Redis缓存和内存缓存的统一接口
 """
 
+import asyncio
+import copy
+import fnmatch
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
 # 核心组件导入
 from .redis_client import (
     RedisClient,
@@ -26,6 +40,11 @@ except ImportError:
     AsyncRedisClient = None
     get_async_redis_client = None
 
+logger = logging.getLogger(__name__)
+
+# 标记带加载元信息（耗时、过期时间）的缓存值
+_ENVELOPE_MARKER = "__cache_envelope__"
+
 # 导出所有公共接口
 __all__ = [
     # Redis缓存
@@ -72,12 +91,15 @@ def create_cache_manager():
     """
     创建缓存管理器，根据配置自动选择缓存类型
     
+    Redis可用时以Redis为二级缓存，前面加一个进程内一级缓存；否则只使用内存缓存
+    
     Returns:
         缓存管理器实例
     """
     from app.utils.core.config import get_config
     
     cache_config = get_config("cache", default={})
+    l1_config = cache_config.get("l1", {})
     
     # 检查Redis配置
     redis_config = cache_config.get("redis", {})
@@ -86,7 +108,14 @@ def create_cache_manager():
             # 尝试创建Redis客户端
             redis_client = get_redis_client()
             if redis_client.health_check():
-                return CacheManager(primary=redis_client, fallback=get_memory_cache())
+                return CacheManager(
+                    primary=redis_client,
+                    fallback=MemoryCache(
+                        max_size=l1_config.get("max_size", 10000),
+                        default_ttl=l1_config.get("ttl", 60)
+                    ),
+                    l1_ttl=l1_config.get("ttl", 60)
+                )
         except Exception:
             pass
     
@@ -94,19 +123,108 @@ def create_cache_manager():
     return CacheManager(primary=get_memory_cache())
 
 
+class _Frozen:
+    """一级缓存中保存的不可变快照：可JSON序列化的值保存为JSON文本，否则保存深拷贝"""
+    
+    __slots__ = ("text", "obj")
+    
+    def __init__(self, text: Optional[str] = None, obj: Any = None):
+        self.text = text
+        self.obj = obj
+
+
+# 不可变的标量值可以直接共享
+_IMMUTABLE_TYPES = (str, bytes, int, float, bool, type(None))
+
+
+def _freeze(value: Any) -> Any:
+    """把值转换为一级缓存中保存的形式，避免调用方修改返回值后污染缓存"""
+    if isinstance(value, _IMMUTABLE_TYPES):
+        return value
+    try:
+        return _Frozen(text=json.dumps(value, ensure_ascii=False))
+    except (TypeError, ValueError):
+        return _Frozen(obj=copy.deepcopy(value))
+
+
+def _thaw(value: Any) -> Any:
+    """从一级缓存的保存形式还原出调用方独占的值"""
+    if not isinstance(value, _Frozen):
+        return value
+    if value.text is not None:
+        return json.loads(value.text)
+    return copy.deepcopy(value.obj)
+
+
+class _Flight:
+    """一次进行中的加载，供并发的同键请求等待"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
 class CacheManager:
-    """缓存管理器，支持主缓存和备用缓存"""
+    """
+    两级缓存管理器
     
-    def __init__(self, primary, fallback=None):
+    primary为Redis时作为二级缓存(L2)，fallback作为进程内一级缓存(L1)；
+    primary为内存缓存时只有一级缓存。写入和删除通过Redis发布订阅通知其他
+    工作进程失效各自的L1。get_or_set对同一键的并发未命中只加载一次，并按
+    XFetch算法在过期前概率性地提前刷新，避免缓存同时过期导致的击穿。
+    
+    L1中保存的是值的快照（JSON文本或深拷贝），每次读取都返回新的对象，
+    调用方修改返回值不会影响缓存。
+    """
+    
+    def __init__(
+        self,
+        primary,
+        fallback=None,
+        l1_ttl: int = 60,
+        invalidation_channel: str = "cache:invalidate",
+        early_refresh_beta: float = 1.0
+    ):
         """
         初始化缓存管理器
         
         Args:
-            primary: 主缓存客户端
-            fallback: 备用缓存客户端
+            primary: 主缓存客户端（RedisClient或内存缓存）
+            fallback: 一级缓存，primary为Redis时使用
+            l1_ttl: 一级缓存最长保留时间（秒），兜底失效消息丢失的情况
+            invalidation_channel: 失效通知的发布订阅频道
+            early_refresh_beta: 提前刷新系数，越大越早刷新，0表示关闭
         """
         self.primary = primary
         self.fallback = fallback
+        
+        if isinstance(primary, RedisClient):
+            self.l2 = primary
+            self.l1 = fallback if fallback is not None else MemoryCache(default_ttl=l1_ttl)
+        else:
+            self.l2 = None
+            self.l1 = primary
+        
+        self.l1_ttl = l1_ttl
+        self.early_refresh_beta = early_refresh_beta
+        self.invalidation_channel = invalidation_channel
+        
+        self._instance_id = uuid.uuid4().hex
+        self._flights: Dict[str, _Flight] = {}
+        self._async_flights: Dict[str, "asyncio.Future"] = {}
+        self._flights_lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"l1_hits": 0, "l2_hits": 0, "misses": 0, "loads": 0, "early_refreshes": 0}
+        )
+        self._stats_lock = threading.Lock()
+        
+        self._pubsub = None
+        self._pubsub_thread = None
+        if self.l2 is not None:
+            self._start_invalidation_listener()
+    
+    # ---------- 基础读写 ----------
     
     def get(self, key: str):
         """
@@ -118,20 +236,10 @@ class CacheManager:
         Returns:
             缓存值或None
         """
-        try:
-            value = self.primary.get(key)
-            if value is not None:
-                return value
-        except Exception:
-            pass
-        
-        if self.fallback:
-            try:
-                return self.fallback.get(key)
-            except Exception:
-                pass
-        
-        return None
+        found, value = self._lookup(key)
+        if not found:
+            return None
+        return self._unwrap(value)[0]
     
     def set(self, key: str, value, ttl=None):
         """
@@ -147,21 +255,19 @@ class CacheManager:
         """
         success = False
         
-        try:
-            if hasattr(self.primary, 'set_json'):
-                success = self.primary.set_json(key, value, ttl)
-            else:
-                success = self.primary.set(key, value, ttl)
-        except Exception:
-            pass
-        
-        if self.fallback and not success:
+        if self.l2 is not None:
             try:
-                if hasattr(self.fallback, 'set'):
-                    return self.fallback.set(key, value, ttl)
+                success = self.l2.set_json(key, value, ttl)
+                self._publish_invalidation([key])
             except Exception:
                 pass
         
+        try:
+            self.l1.set(key, _freeze(value), self._l1_ttl(ttl))
+            success = success or self.l2 is None
+        except Exception:
+            pass
+        
         return success
     
     def delete(self, key: str):
@@ -176,18 +282,18 @@ class CacheManager:
         """
         success = False
         
-        try:
-            success = bool(self.primary.delete(key))
-        except Exception:
-            pass
-        
-        if self.fallback:
+        if self.l2 is not None:
             try:
-                fallback_success = self.fallback.delete(key)
-                success = success or fallback_success
+                success = bool(self.l2.delete(key))
+                self._publish_invalidation([key])
             except Exception:
                 pass
         
+        try:
+            success = bool(self.l1.delete(key)) or success
+        except Exception:
+            pass
+        
         return success
     
     def exists(self, key: str):
@@ -201,34 +307,277 @@ class CacheManager:
             键是否存在
         """
         try:
-            if self.primary.exists(key):
+            if self.l1.exists(key):
                 return True
         except Exception:
             pass
         
-        if self.fallback:
+        if self.l2 is not None:
             try:
-                return self.fallback.exists(key)
+                return self.l2.exists(key)
             except Exception:
                 pass
         
         return False
     
+    # ---------- 批量操作 ----------
+    
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """
+        批量获取缓存值
+        
+        一级缓存未命中的键通过一次MGET从Redis读取
+        
+        Args:
+            keys: 缓存键列表
+            
+        Returns:
+            命中的键值字典
+        """
+        result = {}
+        missing = []
+        
+        for key in keys:
+            value = _thaw(self.l1.get(key))
+            if value is not None:
+                result[key] = self._unwrap(value)[0]
+                self._record(key, "l1_hits")
+            else:
+                missing.append(key)
+        
+        if missing and self.l2 is not None:
+            for key, raw in zip(missing, self.l2.mget(missing)):
+                if raw is None:
+                    continue
+                value = self._decode(raw)
+                self.l1.set(key, _freeze(value), self.l1_ttl)
+                result[key] = self._unwrap(value)[0]
+                self._record(key, "l2_hits")
+        
+        for key in missing:
+            if key not in result:
+                self._record(key, "misses")
+        
+        return result
+    
+    def set_many(self, mapping: Dict[str, Any], ttl=None) -> bool:
+        """
+        批量设置缓存值
+        
+        Redis写入走一次流水线，失效通知合并为一条消息
+        
+        Args:
+            mapping: 键值字典
+            ttl: 过期时间（秒）
+            
+        Returns:
+            操作是否成功
+        """
+        if not mapping:
+            return True
+        
+        success = self.l2 is None
+        if self.l2 is not None:
+            try:
+                pipe = self.l2.client.pipeline(transaction=False)
+                for key, value in mapping.items():
+                    data = json.dumps(value, ensure_ascii=False)
+                    if ttl:
+                        pipe.setex(key, ttl, data)
+                    else:
+                        pipe.set(key, data)
+                success = all(pipe.execute())
+                self._publish_invalidation(list(mapping))
+            except Exception as e:
+                logger.error(f"批量写入Redis缓存失败: {str(e)}")
+        
+        for key, value in mapping.items():
+            self.l1.set(key, _freeze(value), self._l1_ttl(ttl))
+        
+        return success
+    
+    def iter_keys(self, pattern: str = "*") -> Iterator[str]:
+        """
+        遍历匹配模式的键（Redis使用SCAN）
+        
+        Args:
+            pattern: 匹配模式
+            
+        Returns:
+            键的迭代器
+        """
+        if self.l2 is not None:
+            return self.l2.scan_iter(pattern)
+        return (key for key in self.l1.keys() if fnmatch.fnmatchcase(key, pattern))
+    
+    def delete_pattern(self, pattern: str, batch_size: int = 500) -> int:
+        """
+        删除匹配模式的键
+        
+        Args:
+            pattern: 匹配模式
+            batch_size: 每批删除的键数量
+            
+        Returns:
+            删除的键数量
+        """
+        deleted = 0
+        
+        if self.l2 is not None:
+            batch = []
+            for key in self.l2.scan_iter(pattern):
+                batch.append(key)
+                if len(batch) >= batch_size:
+                    deleted += self.l2.client.unlink(*batch)
+                    batch = []
+            if batch:
+                deleted += self.l2.client.unlink(*batch)
+            self._publish_invalidation([pattern], pattern=True)
+        
+        for key in self.l1.keys():
+            if fnmatch.fnmatchcase(key, pattern) and self.l1.delete(key) and self.l2 is None:
+                # 只有一级缓存时以一级缓存的删除数为准
+                deleted += 1
+        
+        return deleted
+    
+    # ---------- 带加载的读取 ----------
+    
+    def get_or_set(self, key: str, loader: Callable[[], Any], ttl: int = 3600):
+        """
+        读取缓存，未命中时调用loader加载并写入
+        
+        同一进程内对同一键的并发未命中只调用一次loader，其余请求等待加载结果；
+        接近过期时按概率由单个请求提前刷新，刷新期间其余请求直接返回旧值，不等待
+        
+        Args:
+            key: 缓存键
+            loader: 加载函数
+            ttl: 过期时间（秒）
+            
+        Returns:
+            缓存值或加载结果
+        """
+        found, stored = self._lookup(key)
+        if found:
+            value, delta, expire_at = self._unwrap(stored)
+            if not self._should_refresh_early(delta, expire_at):
+                return value
+            self._record(key, "early_refreshes")
+        
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+        
+        if not leader:
+            if found:
+                # 已有请求在提前刷新，继续使用旧值
+                return value
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return _thaw(flight.value)
+        
+        try:
+            started = time.time()
+            value = loader()
+            flight.value = _freeze(value)
+            self._store_loaded(key, value, time.time() - started, ttl)
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+    
+    async def aget_or_set(self, key: str, loader: Callable[[], Awaitable[Any]], ttl: int = 3600):
+        """
+        get_or_set的异步版本，loader为协程函数，Redis访问在线程中执行
+        
+        Args:
+            key: 缓存键
+            loader: 异步加载函数
+            ttl: 过期时间（秒）
+            
+        Returns:
+            缓存值或加载结果
+        """
+        found, stored = await asyncio.to_thread(self._lookup, key)
+        if found:
+            value, delta, expire_at = self._unwrap(stored)
+            if not self._should_refresh_early(delta, expire_at):
+                return value
+            self._record(key, "early_refreshes")
+        
+        future = self._async_flights.get(key)
+        if future is not None:
+            if found:
+                # 已有请求在提前刷新，继续使用旧值
+                return value
+            return _thaw(await asyncio.shield(future))
+        
+        future = asyncio.get_running_loop().create_future()
+        self._async_flights[key] = future
+        try:
+            started = time.time()
+            value = await loader()
+            await asyncio.to_thread(self._store_loaded, key, value, time.time() - started, ttl)
+            future.set_result(_freeze(value))
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # 避免无人等待时出现未获取异常的警告
+            future.exception()
+            raise
+        finally:
+            if not future.done():
+                future.cancel()
+            self._async_flights.pop(key, None)
+    
+    # ---------- 管理 ----------
+    
     def clear(self):
         """清空所有缓存"""
+        if self.l2 is not None:
+            try:
+                self.l2.flushdb()
+                self._publish_invalidation(["*"], pattern=True)
+            except Exception:
+                pass
+        
         try:
-            if hasattr(self.primary, 'flushdb'):
-                self.primary.flushdb()
-            elif hasattr(self.primary, 'clear'):
-                self.primary.clear()
+            self.l1.clear()
         except Exception:
             pass
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取按命名空间（键中第一个冒号之前的部分）统计的命中率
         
-        if self.fallback:
-            try:
-                self.fallback.clear()
-            except Exception:
-                pass
+        Returns:
+            统计信息字典
+        """
+        with self._stats_lock:
+            namespaces = {}
+            for namespace, counters in self._stats.items():
+                hits = counters["l1_hits"] + counters["l2_hits"]
+                total = hits + counters["misses"]
+                namespaces[namespace] = {
+                    **counters,
+                    "hit_rate": (hits / total) if total else 0.0,
+                    "l1_hit_rate": (counters["l1_hits"] / total) if total else 0.0
+                }
+        
+        return {
+            "tiers": 2 if self.l2 is not None else 1,
+            "l1": self.l1.stats() if hasattr(self.l1, "stats") else {},
+            "namespaces": namespaces
+        }
     
     def health_check(self):
         """
@@ -241,7 +590,7 @@ class CacheManager:
         fallback_healthy = False
         
         try:
-            primary_healthy = self.primary.health_check()
+            primary_healthy = self.primary.health_check() if hasattr(self.primary, 'health_check') else True
         except Exception:
             pass
         
@@ -256,6 +605,137 @@ class CacheManager:
             "fallback_healthy": fallback_healthy,
             "overall_healthy": primary_healthy or fallback_healthy
         }
+    
+    def close(self):
+        """停止失效通知监听"""
+        if self._pubsub_thread is not None:
+            self._pubsub_thread.stop()
+            self._pubsub_thread = None
+        if self._pubsub is not None:
+            self._pubsub.close()
+            self._pubsub = None
+    
+    # ---------- 内部方法 ----------
+    
+    def _lookup(self, key: str):
+        """依次查询L1、L2，返回(是否命中, 存储值)"""
+        try:
+            value = _thaw(self.l1.get(key))
+            if value is not None:
+                self._record(key, "l1_hits")
+                return True, value
+        except Exception:
+            pass
+        
+        if self.l2 is not None:
+            try:
+                raw = self.l2.get(key)
+                if raw is not None:
+                    value = self._decode(raw)
+                    self.l1.set(key, _freeze(value), self._l1_ttl(self._remaining_ttl(value)))
+                    self._record(key, "l2_hits")
+                    return True, value
+            except Exception:
+                pass
+        
+        self._record(key, "misses")
+        return False, None
+    
+    def _store_loaded(self, key: str, value: Any, delta: float, ttl: int) -> None:
+        """写入加载结果，附带加载耗时和过期时间用于提前刷新"""
+        self._record(key, "loads")
+        envelope = {_ENVELOPE_MARKER: 1, "v": value, "d": delta, "e": time.time() + ttl}
+        
+        if self.l2 is not None:
+            try:
+                self.l2.set_json(key, envelope, ttl)
+                self._publish_invalidation([key])
+            except Exception:
+                pass
+        self.l1.set(key, _freeze(envelope), self._l1_ttl(ttl))
+    
+    def _should_refresh_early(self, delta: Optional[float], expire_at: Optional[float]) -> bool:
+        """XFetch: now - delta * beta * ln(rand) >= expiry 时提前刷新"""
+        if not delta or not expire_at or self.early_refresh_beta <= 0:
+            return False
+        return time.time() - delta * self.early_refresh_beta * math.log(random.random() or 1e-12) >= expire_at
+    
+    def _l1_ttl(self, ttl) -> Optional[int]:
+        """一级缓存的保留时间，有二级缓存时不超过l1_ttl"""
+        if isinstance(ttl, timedelta):
+            ttl = int(ttl.total_seconds())
+        if self.l2 is None:
+            return ttl
+        return min(ttl, self.l1_ttl) if ttl else self.l1_ttl
+    
+    @staticmethod
+    def _decode(raw):
+        """解码Redis中的值，非JSON时原样返回"""
+        try:
+            return json.loads(raw)
+        except (TypeError, ValueError):
+            return raw
+    
+    @staticmethod
+    def _unwrap(value):
+        """拆出加载结果的值、耗时和过期时间"""
+        if isinstance(value, dict) and value.get(_ENVELOPE_MARKER) == 1:
+            return value.get("v"), value.get("d"), value.get("e")
+        return value, None, None
+    
+    def _remaining_ttl(self, value) -> Optional[int]:
+        """带过期时间的加载结果的剩余秒数"""
+        expire_at = self._unwrap(value)[2]
+        if expire_at:
+            return max(1, int(expire_at - time.time()))
+        return None
+    
+    def _record(self, key: str, counter: str) -> None:
+        """记录命名空间统计"""
+        namespace = key.split(":", 1)[0] if ":" in key else "default"
+        with self._stats_lock:
+            self._stats[namespace][counter] += 1
+    
+    def _publish_invalidation(self, keys: List[str], pattern: bool = False) -> None:
+        """通知其他工作进程失效一级缓存"""
+        message = json.dumps({"sender": self._instance_id, "keys": keys, "pattern": pattern})
+        try:
+            self.l2.client.publish(self.invalidation_channel, message)
+        except Exception as e:
+            logger.warning(f"发布缓存失效通知失败: {str(e)}")
+    
+    def _handle_invalidation(self, message) -> None:
+        """处理其他工作进程发来的失效通知"""
+        try:
+            data = json.loads(message["data"])
+        except (TypeError, ValueError, KeyError):
+            return
+        if data.get("sender") == self._instance_id:
+            return
+        
+        if data.get("pattern"):
+            for pattern in data.get("keys", []):
+                if pattern == "*":
+                    self.l1.clear()
+                    continue
+                for key in self.l1.keys():
+                    if fnmatch.fnmatchcase(key, pattern):
+                        self.l1.delete(key)
+        else:
+            for key in data.get("keys", []):
+                self.l1.delete(key)
+    
+    def _start_invalidation_listener(self) -> None:
+        """在后台线程订阅失效通知"""
+        try:
+            self._pubsub = self.l2.client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{self.invalidation_channel: self._handle_invalidation})
+            self._pubsub_thread = self._pubsub.run_in_thread(sleep_time=0.5, daemon=True)
+        except Exception as e:
+            # 订阅失败时仅依赖l1_ttl兜底
+            logger.warning(f"订阅缓存失效通知失败: {str(e)}")
+            self._pubsub = None
+            self._pubsub_thread = None
 
 
 # 全局缓存管理器实例
@@ -1,11 +1,14 @@
 """
 内存缓存模块
-提供基于内存的缓存功能，支持LRU和TTL
+提供基于内存的缓存功能，支持LRU和TTL；MemoryCache为分段实现，支持TinyLFU准入和字节上限
 """
 
+import sys
 import time
+import heapq
+import weakref
 import threading
-from typing import Any, Optional, Dict, Tuple
+from typing import Any, Callable, Optional, Dict, Tuple
 from collections import OrderedDict
 import logging
 
@@ -244,46 +247,204 @@ class TTLCache:
         return valid_keys
 
 
+class _FrequencySketch:
+    """
+    Count-Min频率估计，用于TinyLFU准入
+    
+    计数达到上限后整体减半，使频率随时间衰减
+    """
+    
+    def __init__(self, width: int, depth: int = 4, max_count: int = 15):
+        self.width = max(16, width)
+        self.depth = depth
+        self.max_count = max_count
+        # 各行首尾相接存放在一个列表中
+        self.table = [0] * (self.width * depth)
+        self.offsets = [row * self.width for row in range(depth)]
+        self.additions = 0
+        self.reset_at = self.width * 10
+    
+    def _indexes(self, key: str):
+        # 用一次哈希的不同位段作为各行的下标
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        width = self.width
+        return [offset + ((h >> (16 * row)) ^ (h >> (16 * row + 7))) % width
+                for row, offset in enumerate(self.offsets)]
+    
+    def increment(self, key: str) -> None:
+        table = self.table
+        for index in self._indexes(key):
+            if table[index] < self.max_count:
+                table[index] += 1
+        self.additions += 1
+        if self.additions >= self.reset_at:
+            self.table = [count >> 1 for count in table]
+            self.additions //= 2
+    
+    def estimate(self, key: str) -> int:
+        table = self.table
+        return min(table[index] for index in self._indexes(key))
+
+
+def estimate_size(value: Any) -> int:
+    """
+    估算缓存值占用的字节数
+    
+    对字符串、字节和常见容器做浅层累加，不递归深层对象
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+class _CacheShard:
+    """
+    缓存分段
+    
+    条目按访问顺序保存在OrderedDict中（头部为最久未使用），
+    过期时间保存在最小堆中，过期清理只弹出堆顶已到期的条目
+    """
+    
+    __slots__ = (
+        "lock", "entries", "expiry_heap", "max_size", "max_bytes", "bytes",
+        "sketch", "hits", "misses", "evictions", "expirations", "rejections"
+    )
+    
+    def __init__(self, max_size: int, max_bytes: Optional[int], admission: str):
+        self.lock = threading.Lock()
+        # key -> (value, expire_time, size)
+        self.entries: "OrderedDict[str, Tuple[Any, float, int]]" = OrderedDict()
+        # (expire_time, key)，覆盖写入后旧记录留在堆中，弹出时与条目比对后丢弃
+        self.expiry_heap: list = []
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.sketch = _FrequencySketch(max_size * 4) if admission == "tinylfu" else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+    
+    def remove(self, key: str) -> None:
+        """删除条目（调用方持有锁）"""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+    
+    def expire(self, now: float, limit: Optional[int] = None) -> int:
+        """弹出已到期的条目（调用方持有锁），limit限制单次处理的堆记录数"""
+        heap = self.expiry_heap
+        expired = 0
+        processed = 0
+        while heap and heap[0][0] <= now and (limit is None or processed < limit):
+            expire_time, key = heapq.heappop(heap)
+            processed += 1
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] == expire_time:
+                self.remove(key)
+                expired += 1
+        self.expirations += expired
+        
+        # 过期记录远多于条目时重建堆，避免覆盖写入导致堆无限增长
+        if len(heap) > 2 * len(self.entries) + 64:
+            self.expiry_heap = [(entry[1], k) for k, entry in self.entries.items()]
+            heapq.heapify(self.expiry_heap)
+        return expired
+    
+    def over_capacity(self, extra_items: int = 0, extra_bytes: int = 0) -> bool:
+        """是否超出条目数或字节数上限"""
+        if len(self.entries) + extra_items > self.max_size:
+            return True
+        return self.max_bytes is not None and self.bytes + extra_bytes > self.max_bytes
+
+
 class MemoryCache:
-    """内存缓存管理器，结合LRU和TTL功能"""
+    """
+    内存缓存管理器，结合LRU和TTL功能
     
-    def __init__(self, max_size: int = 1000, default_ttl: int = 3600):
+    键按哈希分布到多个独立分段，每个分段有自己的锁、LRU顺序和过期堆，
+    不同分段的读写互不阻塞。容量满时按分段内LRU淘汰；admission为tinylfu时，
+    新键只有在估计访问频率高于待淘汰键时才会写入，以减少一次性访问对热点的冲刷。
+    """
+    
+    def __init__(
+        self,
+        max_size: int = 1000,
+        default_ttl: int = 3600,
+        num_shards: int = 16,
+        max_bytes: Optional[int] = None,
+        admission: str = "lru",
+        size_estimator: Optional[Callable[[Any], int]] = None,
+        cleanup_interval: float = 5.0
+    ):
         """
         初始化内存缓存
         
         Args:
             max_size: 最大缓存大小
             default_ttl: 默认TTL（秒）
+            num_shards: 分段数量，会调整为2的幂
+            max_bytes: 最大占用字节数，None表示不限制
+            admission: 准入策略，lru（总是写入）或tinylfu
+            size_estimator: 值大小估算函数，默认使用estimate_size
+            cleanup_interval: 后台过期清理间隔（秒）
         """
         self.max_size = max_size
         self.default_ttl = default_ttl
-        self.cache: Dict[str, Tuple[Any, float]] = {}  # key: (value, expire_time)
-        self.access_order = OrderedDict()  # 用于LRU
-        self.lock = threading.RLock()
+        self.max_bytes = max_bytes
+        self.admission = admission
+        self.size_estimator = size_estimator or estimate_size
+        
+        # 小缓存不宜分得太细，保证每段至少容纳若干条目
+        shard_count = 1
+        while shard_count < num_shards and max_size // (shard_count * 2) >= 8:
+            shard_count *= 2
+        self._shard_mask = shard_count - 1
+        
+        per_shard_size = max(1, max_size // shard_count)
+        per_shard_bytes = max(1, max_bytes // shard_count) if max_bytes else None
+        self._shards = [
+            _CacheShard(per_shard_size, per_shard_bytes, admission)
+            for _ in range(shard_count)
+        ]
         
         # 启动后台清理线程
+        self._cleanup_interval = cleanup_interval
         self._start_cleanup_thread()
     
+    def _shard(self, key: str) -> _CacheShard:
+        return self._shards[hash(key) & self._shard_mask]
+    
     def get(self, key: str) -> Optional[Any]:
         """
         获取缓存值
         
         Args:
             key: 缓存键
-            
+        
         Returns:
             缓存值或None
         """
-        with self.lock:
-            if key in self.cache:
-                value, expire_time = self.cache[key]
-                if time.time() < expire_time:
+        shard = self._shard(key)
+        with shard.lock:
+            if shard.sketch is not None:
+                shard.sketch.increment(key)
+            
+            entry = shard.entries.get(key)
+            if entry is not None:
+                if time.time() < entry[1]:
                     # 更新访问顺序
-                    self.access_order.move_to_end(key)
-                    return value
-                else:
-                    # 过期，删除
-                    self._remove_key(key)
+                    shard.entries.move_to_end(key)
+                    shard.hits += 1
+                    return entry[0]
+                # 过期，删除
+                shard.remove(key)
+                shard.expirations += 1
+            shard.misses += 1
             return None
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
@@ -296,15 +457,43 @@ class MemoryCache:
             ttl: 生存时间（秒），None使用默认值
         """
         ttl = ttl or self.default_ttl
-        expire_time = time.time() + ttl
-        
-        with self.lock:
-            # 如果是新键且已达到最大大小，移除最少使用的项
-            if key not in self.cache and len(self.cache) >= self.max_size:
-                self._evict_lru()
+        now = time.time()
+        expire_time = now + ttl
+        size = self.size_estimator(value) + sys.getsizeof(key)
+        
+        shard = self._shard(key)
+        with shard.lock:
+            if shard.max_bytes is not None and size > shard.max_bytes:
+                # 单个值超过分段容量，不缓存
+                shard.remove(key)
+                shard.rejections += 1
+                return
             
-            self.cache[key] = (value, expire_time)
-            self.access_order[key] = None  # 添加到访问顺序末尾
+            # 顺带清理少量到期条目，把清理成本分摊到写入上
+            shard.expire(now, limit=8)
+            
+            is_new = key not in shard.entries
+            if shard.sketch is not None:
+                shard.sketch.increment(key)
+            
+            if is_new:
+                if shard.over_capacity(1, size) and shard.sketch is not None and shard.entries:
+                    victim = next(iter(shard.entries))
+                    if shard.sketch.estimate(key) <= shard.sketch.estimate(victim):
+                        shard.rejections += 1
+                        return
+            else:
+                shard.remove(key)
+            
+            shard.entries[key] = (value, expire_time, size)
+            shard.bytes += size
+            heapq.heappush(shard.expiry_heap, (expire_time, key))
+            
+            # 淘汰最久未使用的条目直到满足容量限制
+            while shard.over_capacity() and len(shard.entries) > 1:
+                lru_key = next(iter(shard.entries))
+                shard.remove(lru_key)
+                shard.evictions += 1
     
     def delete(self, key: str) -> bool:
         """
@@ -312,13 +501,14 @@ class MemoryCache:
         
         Args:
             key: 缓存键
-            
+        
         Returns:
             是否成功删除
         """
-        with self.lock:
-            if key in self.cache:
-                self._remove_key(key)
+        shard = self._shard(key)
+        with shard.lock:
+            if key in shard.entries:
+                shard.remove(key)
                 return True
             return False
     
@@ -328,11 +518,14 @@ class MemoryCache:
         
         Args:
             key: 缓存键
-            
+        
         Returns:
             键是否存在
         """
-        return self.get(key) is not None
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            return entry is not None and time.time() < entry[1]
     
     def ttl(self, key: str) -> int:
         """
@@ -340,37 +533,40 @@ class MemoryCache:
         
         Args:
             key: 缓存键
-            
+        
         Returns:
             剩余TTL（秒），-1表示不存在或已过期
         """
-        with self.lock:
-            if key in self.cache:
-                _, expire_time = self.cache[key]
-                remaining = int(expire_time - time.time())
-                return max(0, remaining) if remaining > 0 else -1
+        shard = self._shard(key)
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is not None:
+                remaining = int(entry[1] - time.time())
+                return remaining if remaining > 0 else -1
             return -1
     
     def clear(self) -> None:
         """清空缓存"""
-        with self.lock:
-            self.cache.clear()
-            self.access_order.clear()
+        for shard in self._shards:
+            with shard.lock:
+                shard.entries.clear()
+                shard.expiry_heap = []
+                shard.bytes = 0
     
     def size(self) -> int:
         """获取缓存大小"""
-        with self.lock:
-            return len(self.cache)
+        return sum(len(shard.entries) for shard in self._shards)
     
     def keys(self) -> list:
         """获取所有未过期的键"""
         current_time = time.time()
         valid_keys = []
         
-        with self.lock:
-            for key, (_, expire_time) in self.cache.items():
-                if current_time < expire_time:
-                    valid_keys.append(key)
+        for shard in self._shards:
+            with shard.lock:
+                valid_keys.extend(
+                    key for key, entry in shard.entries.items() if current_time < entry[1]
+                )
         
         return valid_keys
     
@@ -378,68 +574,71 @@ class MemoryCache:
         """
         获取缓存统计信息
         
+        按分段计数器汇总，不遍历条目
+        
         Returns:
             统计信息字典
         """
-        with self.lock:
-            total_keys = len(self.cache)
-            current_time = time.time()
-            expired_count = 0
-            
-            for _, expire_time in self.cache.values():
-                if current_time >= expire_time:
-                    expired_count += 1
-            
-            return {
-                "total_keys": total_keys,
-                "valid_keys": total_keys - expired_count,
-                "expired_keys": expired_count,
-                "max_size": self.max_size,
-                "usage_percent": (total_keys / self.max_size * 100) if self.max_size > 0 else 0
-            }
-    
-    def _remove_key(self, key: str) -> None:
-        """删除键（内部方法）"""
-        if key in self.cache:
-            del self.cache[key]
-        if key in self.access_order:
-            del self.access_order[key]
-    
-    def _evict_lru(self) -> None:
-        """移除最少使用的项"""
-        if self.access_order:
-            lru_key = next(iter(self.access_order))
-            self._remove_key(lru_key)
+        totals = {"keys": 0, "bytes": 0, "hits": 0, "misses": 0,
+                  "evictions": 0, "expirations": 0, "rejections": 0}
+        for shard in self._shards:
+            with shard.lock:
+                totals["keys"] += len(shard.entries)
+                totals["bytes"] += shard.bytes
+                totals["hits"] += shard.hits
+                totals["misses"] += shard.misses
+                totals["evictions"] += shard.evictions
+                totals["expirations"] += shard.expirations
+                totals["rejections"] += shard.rejections
+        
+        lookups = totals["hits"] + totals["misses"]
+        return {
+            "total_keys": totals["keys"],
+            "max_size": self.max_size,
+            "usage_percent": (totals["keys"] / self.max_size * 100) if self.max_size > 0 else 0,
+            "total_bytes": totals["bytes"],
+            "max_bytes": self.max_bytes,
+            "hits": totals["hits"],
+            "misses": totals["misses"],
+            "hit_rate": (totals["hits"] / lookups) if lookups else 0.0,
+            "evictions": totals["evictions"],
+            "expirations": totals["expirations"],
+            "rejections": totals["rejections"],
+            "shards": len(self._shards),
+            "admission": self.admission
+        }
     
     def _cleanup_expired(self) -> int:
-        """清理过期项"""
+        """清理过期项，每个分段只处理堆顶已到期的记录"""
         current_time = time.time()
-        expired_keys = []
+        expired = 0
         
-        with self.lock:
-            for key, (_, expire_time) in self.cache.items():
-                if current_time >= expire_time:
-                    expired_keys.append(key)
-            
-            for key in expired_keys:
-                self._remove_key(key)
+        for shard in self._shards:
+            with shard.lock:
+                expired += shard.expire(current_time)
         
-        if expired_keys:
-            logger.debug(f"清理了 {len(expired_keys)} 个过期缓存项")
+        if expired:
+            logger.debug(f"清理了 {expired} 个过期缓存项")
         
-        return len(expired_keys)
+        return expired
     
     def _start_cleanup_thread(self) -> None:
         """启动后台清理线程"""
-        import threading
+        cache_ref = weakref.ref(self)
+        interval = self._cleanup_interval
         
         def cleanup_worker():
             while True:
+                time.sleep(interval)
+                cache = cache_ref()
+                if cache is None:
+                    # 缓存已被回收，线程退出
+                    return
                 try:
-                    time.sleep(60)  # 每分钟清理一次
-                    self._cleanup_expired()
+                    cache._cleanup_expired()
                 except Exception as e:
                     logger.error(f"缓存清理线程出错: {str(e)}")
+                del cache
         
         cleanup_thread = threading.Thread(target=cleanup_worker, daemon=True)
         cleanup_thread.start()
@@ -469,6 +668,12 @@ def get_memory_cache(max_size: int = None, default_ttl: int = None) -> MemoryCac
         max_size = max_size or get_config("cache", "memory", "max_size", default=1000)
         default_ttl = default_ttl or get_config("cache", "memory", "default_ttl", default=3600)
         
-        _memory_cache = MemoryCache(max_size=max_size, default_ttl=default_ttl)
+        _memory_cache = MemoryCache(
+            max_size=max_size,
+            default_ttl=default_ttl,
+            num_shards=get_config("cache", "memory", "num_shards", default=16),
+            max_bytes=get_config("cache", "memory", "max_bytes", default=None),
+            admission=get_config("cache", "memory", "admission", default="lru")
+        )
     
     return _memory_cache 
\ No newline at end of file
@@ -5,7 +5,7 @@ Redis客户端模块
 
 import redis
 import logging
-from typing import Optional, Any, Union, Dict, List
+from typing import Optional, Any, Union, Dict, List, Iterator
 import json
 import pickle
 from datetime import timedelta
@@ -422,6 +422,8 @@ class RedisClient:
         """
         查找匹配模式的键
         
+        使用SCAN增量遍历，不会像KEYS那样阻塞Redis
+        
         Args:
             pattern: 匹配模式
             
@@ -429,11 +431,42 @@ class RedisClient:
             匹配的键列表
         """
         try:
-            return self.client.keys(pattern)
+            return list(self.scan_iter(pattern))
         except Exception as e:
-            logger.error(f"Redis KEYS操作失败 {pattern}: {str(e)}")
+            logger.error(f"Redis SCAN操作失败 {pattern}: {str(e)}")
             return []
     
+    def scan_iter(self, pattern: str = "*", count: int = 1000) -> Iterator[str]:
+        """
+        增量遍历匹配模式的键
+        
+        Args:
+            pattern: 匹配模式
+            count: 每次SCAN的建议返回数量
+            
+        Returns:
+            键的迭代器
+        """
+        return self.client.scan_iter(match=pattern, count=count)
+    
+    def mget(self, keys: List[str]) -> List[Optional[str]]:
+        """
+        批量获取键值（单次往返）
+        
+        Args:
+            keys: 键名列表
+            
+        Returns:
+            与键一一对应的值列表，不存在的键为None
+        """
+        if not keys:
+            return []
+        try:
+            return self.client.mget(keys)
+        except Exception as e:
+            logger.error(f"Redis MGET操作失败: {str(e)}")
+            return [None] * len(keys)
+    
     def flushdb(self) -> bool:
         """
         清空当前数据库
@@ -5,10 +5,24 @@
 
 from .message_queue import *
 
+try:
+    from .async_message_queue import (
+        AsyncRabbitMQClient,
+        get_async_rabbitmq_client,
+        publish_message_async
+    )
+except ImportError:  # aio-pika为可选依赖
+    AsyncRabbitMQClient = None
+    get_async_rabbitmq_client = None
+    publish_message_async = None
+
 __all__ = [
     "MessageQueue",
     "RabbitMQClient",
     "publish_message",
     "consume_messages",
-    "create_queue"
+    "create_queue",
+    "AsyncRabbitMQClient",
+    "get_async_rabbitmq_client",
+    "publish_message_async"
 ] 
\ No newline at end of file
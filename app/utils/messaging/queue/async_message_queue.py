@@ -0,0 +1,397 @@
+"""
+异步RabbitMQ客户端
+基于aio-pika，每个进程复用一个长连接，发布端使用通道池、缓存交换机声明并批量等待发布确认，
+消费端按预取数量限制并发处理消息，处理失败的消息带重试计数重新投递，超过上限后拒绝并交给死信交换机
+
+连接通过connection_factory创建，测试时可替换为本地的broker替身
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import aio_pika
+from aio_pika.pool import Pool
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 重新投递次数记录在消息头中；经典队列不统计投递次数，不能依赖redelivered标志
+RETRY_HEADER = "x-retry-count"
+
+
+def _default_url() -> str:
+    """根据配置拼接AMQP连接地址"""
+    return (
+        f"amqp://{settings.RABBITMQ_USER}:{settings.RABBITMQ_PASSWORD}"
+        f"@{settings.RABBITMQ_HOST}:{settings.RABBITMQ_PORT}/"
+    )
+
+
+def encode_message(message: Any) -> Tuple[bytes, str]:
+    """
+    编码消息体，与同步publish_message的约定一致
+    
+    返回:
+        (消息体, content_type)
+    """
+    if isinstance(message, (dict, list)):
+        return json.dumps(message, ensure_ascii=False).encode("utf-8"), "application/json"
+    if isinstance(message, bytes):
+        return message, "application/octet-stream"
+    text = str(message)
+    content_type = "application/json" if text.startswith("{") else "text/plain"
+    return text.encode("utf-8"), content_type
+
+
+def decode_message(body: bytes, content_type: Optional[str]) -> Any:
+    """解码消息体"""
+    if content_type == "application/json":
+        return json.loads(body)
+    if content_type == "application/octet-stream":
+        return body
+    return body.decode("utf-8")
+
+
+def _queue_arguments(dead_letter_exchange: Optional[str]) -> Optional[Dict[str, Any]]:
+    """队列声明参数"""
+    if dead_letter_exchange is None:
+        return None
+    return {"x-dead-letter-exchange": dead_letter_exchange}
+
+
+class _PooledChannel:
+    """池化的发布通道，缓存本通道上的交换机对象"""
+    
+    def __init__(self, channel):
+        self.channel = channel
+        self.exchanges: Dict[str, Any] = {}
+    
+    async def close(self) -> None:
+        await self.channel.close()
+
+
+class AsyncRabbitMQClient:
+    """
+    异步RabbitMQ客户端
+    
+    一个实例持有一个自动重连的长连接；发布使用通道池，消费者各自使用独立通道
+    """
+    
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        channel_pool_size: int = 8,
+        confirm_batch_size: int = 100,
+        connection_factory: Optional[Callable[[str], Awaitable[Any]]] = None
+    ):
+        """
+        初始化客户端
+        
+        参数:
+            url: AMQP连接地址，默认根据配置拼接
+            channel_pool_size: 发布通道池大小
+            confirm_batch_size: 批量发布时一次等待确认的消息数
+            connection_factory: 连接工厂，默认使用aio_pika.connect_robust
+        """
+        self.url = url or _default_url()
+        self.channel_pool_size = channel_pool_size
+        self.confirm_batch_size = max(1, confirm_batch_size)
+        self._connection_factory = connection_factory or aio_pika.connect_robust
+        
+        self._connection = None
+        self._channel_pool: Optional[Pool] = None
+        self._connect_lock = asyncio.Lock()
+        
+        # 已在broker上声明过的交换机，其他通道只需取本地引用
+        self._declared_exchanges: Set[str] = set()
+        self._declare_lock = asyncio.Lock()
+        
+        # 消费者标签 -> (队列, 通道, 处理中的任务)
+        self._consumers: Dict[str, Tuple[Any, Any, Set[asyncio.Task]]] = {}
+    
+    async def connect(self):
+        """建立连接（幂等）"""
+        if self._connection is not None and not self._connection.is_closed:
+            return self._connection
+        
+        async with self._connect_lock:
+            if self._connection is None or self._connection.is_closed:
+                self._connection = await self._connection_factory(self.url)
+                self._channel_pool = Pool(self._create_channel, max_size=self.channel_pool_size)
+                self._declared_exchanges.clear()
+                logger.info("RabbitMQ异步连接已建立")
+        
+        return self._connection
+    
+    async def _create_channel(self) -> _PooledChannel:
+        """为通道池创建开启发布确认的通道"""
+        connection = await self.connect()
+        return _PooledChannel(await connection.channel(publisher_confirms=True))
+    
+    async def _get_exchange(self, pooled: _PooledChannel, exchange: str, exchange_type: str):
+        """获取交换机，进程内只向broker声明一次；默认交换机""无需也不能声明"""
+        if not exchange:
+            return pooled.channel.default_exchange
+        
+        cached = pooled.exchanges.get(exchange)
+        if cached is not None:
+            return cached
+        
+        if exchange not in self._declared_exchanges:
+            async with self._declare_lock:
+                if exchange not in self._declared_exchanges:
+                    await pooled.channel.declare_exchange(exchange, exchange_type, durable=True)
+                    self._declared_exchanges.add(exchange)
+        
+        cached = await pooled.channel.get_exchange(exchange, ensure=False)
+        pooled.exchanges[exchange] = cached
+        return cached
+    
+    async def publish(
+        self,
+        exchange: str,
+        routing_key: str,
+        message: Any,
+        exchange_type: str = "direct",
+        headers: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        发布单条持久化消息并等待broker确认
+        
+        参数:
+            exchange: 交换机名称
+            routing_key: 路由键
+            message: 消息内容，字典或列表按JSON编码
+            exchange_type: 交换机类型
+            headers: 消息头
+        """
+        await self.publish_many(exchange, [(routing_key, message)], exchange_type, headers)
+    
+    async def publish_many(
+        self,
+        exchange: str,
+        messages: Iterable[Tuple[str, Any]],
+        exchange_type: str = "direct",
+        headers: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        批量发布消息，每confirm_batch_size条并发发送后统一等待确认
+        
+        参数:
+            exchange: 交换机名称
+            messages: (路由键, 消息内容)序列
+            exchange_type: 交换机类型
+            headers: 所有消息共用的消息头
+        
+        返回:
+            已确认的消息数
+        """
+        await self.connect()
+        confirmed = 0
+        
+        async with self._channel_pool.acquire() as pooled:
+            target = await self._get_exchange(pooled, exchange, exchange_type)
+            batch: List[Awaitable] = []
+            
+            for routing_key, message in messages:
+                body, content_type = encode_message(message)
+                batch.append(target.publish(
+                    aio_pika.Message(
+                        body,
+                        content_type=content_type,
+                        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                        headers=headers
+                    ),
+                    routing_key=routing_key
+                ))
+                if len(batch) >= self.confirm_batch_size:
+                    await asyncio.gather(*batch)
+                    confirmed += len(batch)
+                    batch = []
+            
+            if batch:
+                await asyncio.gather(*batch)
+                confirmed += len(batch)
+        
+        return confirmed
+    
+    async def init_queue(
+        self,
+        queue_name: str,
+        exchange: str,
+        routing_key: str,
+        exchange_type: str = "direct",
+        dead_letter_exchange: Optional[str] = None
+    ) -> None:
+        """
+        声明队列并绑定到交换机
+        
+        参数:
+            queue_name: 队列名称
+            exchange: 交换机名称，为空时使用默认交换机，无需绑定
+            routing_key: 路由键
+            exchange_type: 交换机类型
+            dead_letter_exchange: 死信交换机，被拒绝的消息转发到该交换机
+        """
+        await self.connect()
+        async with self._channel_pool.acquire() as pooled:
+            target = await self._get_exchange(pooled, exchange, exchange_type)
+            queue = await pooled.channel.declare_queue(
+                queue_name,
+                durable=True,
+                arguments=_queue_arguments(dead_letter_exchange)
+            )
+            if exchange:
+                await queue.bind(target, routing_key=routing_key)
+    
+    async def start_consumer(
+        self,
+        queue_name: str,
+        callback: Callable[[Any], Any],
+        prefetch_count: int = 10,
+        concurrency: Optional[int] = None,
+        max_retries: int = 3,
+        dead_letter_exchange: Optional[str] = None
+    ) -> str:
+        """
+        启动消费者，消息处理成功后确认
+        
+        处理失败的消息不直接重新入队（否则必然失败的消息会被无限投递），
+        而是带上重试计数重新发布到队列尾部；超过max_retries后拒绝且不重新入队，
+        队列配置了死信交换机时由broker转发过去，否则丢弃
+        
+        参数:
+            queue_name: 队列名称
+            callback: 消息处理函数，可以是协程函数；同步函数在线程池中执行
+            prefetch_count: 预取数量，即未确认消息的上限
+            concurrency: 同时处理的消息数，默认等于prefetch_count
+            max_retries: 处理失败后的最大重试次数
+            dead_letter_exchange: 死信交换机，需与队列已有的声明参数一致
+        
+        返回:
+            消费者标签，用于stop_consumer
+        """
+        connection = await self.connect()
+        # 消费通道只接收消息，发布（包括重试）都走发布通道池
+        channel = await connection.channel(publisher_confirms=False)
+        await channel.set_qos(prefetch_count=prefetch_count)
+        queue = await channel.declare_queue(
+            queue_name,
+            durable=True,
+            arguments=_queue_arguments(dead_letter_exchange)
+        )
+        
+        semaphore = asyncio.Semaphore(concurrency or prefetch_count)
+        tasks: Set[asyncio.Task] = set()
+        is_async = asyncio.iscoroutinefunction(callback)
+        
+        async def handle(incoming):
+            try:
+                message = decode_message(incoming.body, incoming.content_type)
+                if is_async:
+                    await callback(message)
+                else:
+                    await asyncio.to_thread(callback, message)
+                await incoming.ack()
+            except Exception as e:
+                logger.error(f"处理队列 {queue_name} 的消息时出错: {str(e)}")
+                await self._retry_or_reject(queue_name, incoming, max_retries)
+            finally:
+                semaphore.release()
+        
+        async def on_message(incoming):
+            # 预取已限制了未确认消息数，信号量进一步限制实际并发
+            await semaphore.acquire()
+            task = asyncio.create_task(handle(incoming))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        
+        consumer_tag = await queue.consume(on_message)
+        self._consumers[consumer_tag] = (queue, channel, tasks)
+        logger.info(f"正在为队列 {queue_name} 启动异步消费者 (prefetch={prefetch_count})")
+        return consumer_tag
+    
+    async def _retry_or_reject(self, queue_name: str, incoming, max_retries: int) -> None:
+        """
+        失败消息未超过重试上限时带计数重新发布，否则拒绝并交给死信交换机
+        
+        重新发布走开启发布确认的发布通道池，broker确认后才确认原消息，
+        否则broker在两者之间故障时消息会丢失
+        """
+        headers = dict(incoming.headers or {})
+        retries = int(headers.get(RETRY_HEADER, 0) or 0)
+        
+        if retries >= max_retries:
+            logger.warning(f"队列 {queue_name} 的消息已重试 {retries} 次，拒绝并转入死信")
+            await incoming.nack(requeue=False)
+            return
+        
+        headers[RETRY_HEADER] = retries + 1
+        try:
+            await self.connect()
+            async with self._channel_pool.acquire() as pooled:
+                await pooled.channel.default_exchange.publish(
+                    aio_pika.Message(
+                        incoming.body,
+                        content_type=incoming.content_type,
+                        delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+                        headers=headers
+                    ),
+                    routing_key=queue_name
+                )
+        except Exception as e:
+            # 重新发布失败或未被确认说明broker不可用，退回队列等待下次投递，不丢消息
+            logger.error(f"重新发布队列 {queue_name} 的失败消息出错: {str(e)}")
+            await incoming.nack(requeue=True)
+            return
+        await incoming.ack()
+    
+    async def stop_consumer(self, consumer_tag: str, timeout: float = 30.0) -> None:
+        """停止消费者，等待处理中的消息完成后关闭通道"""
+        entry = self._consumers.pop(consumer_tag, None)
+        if entry is None:
+            return
+        
+        queue, channel, tasks = entry
+        await queue.cancel(consumer_tag)
+        if tasks:
+            await asyncio.wait(list(tasks), timeout=timeout)
+        await channel.close()
+    
+    async def close(self) -> None:
+        """停止所有消费者并关闭连接"""
+        for consumer_tag in list(self._consumers):
+            try:
+                await self.stop_consumer(consumer_tag)
+            except Exception as e:
+                logger.warning(f"停止消费者 {consumer_tag} 失败: {str(e)}")
+        
+        if self._channel_pool is not None:
+            await self._channel_pool.close()
+            self._channel_pool = None
+        
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+        
+        self._declared_exchanges.clear()
+
+
+# 进程级单例
+_async_client: Optional[AsyncRabbitMQClient] = None
+
+
+def get_async_rabbitmq_client() -> AsyncRabbitMQClient:
+    """获取进程级异步RabbitMQ客户端"""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncRabbitMQClient()
+    return _async_client
+
+
+async def publish_message_async(exchange: str, routing_key: str, message: Any, exchange_type: str = 'direct'):
+    """异步发布消息，复用进程级连接"""
+    await get_async_rabbitmq_client().publish(exchange, routing_key, message, exchange_type)
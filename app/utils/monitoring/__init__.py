@@ -14,6 +14,8 @@ from .core import (
     MetricsCollector, 
     Metric, 
     MetricType,
+    QuantileSketch,
+    get_metrics_collector,
     MonitoringError, 
     MetricsCollectionError, 
     HealthCheckError
@@ -32,6 +34,8 @@ try:
         "MetricsCollector",
         "Metric",
         "MetricType", 
+        "QuantileSketch",
+        "get_metrics_collector",
         "MonitoringError",
         "MetricsCollectionError",
         "HealthCheckError",
@@ -55,6 +59,8 @@ except ImportError:
         "MetricsCollector", 
         "Metric",
         "MetricType",
+        "QuantileSketch",
+        "get_metrics_collector",
         "MonitoringError",
         "MetricsCollectionError",
         "HealthCheckError"
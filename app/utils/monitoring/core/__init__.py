@@ -4,7 +4,7 @@
 """
 
 from .base import MonitoringComponent
-from .metrics import MetricsCollector, Metric, MetricType
+from .metrics import MetricsCollector, Metric, MetricType, QuantileSketch, get_metrics_collector
 from .exceptions import MonitoringError, MetricsCollectionError, HealthCheckError
 
 __all__ = [
@@ -12,6 +12,8 @@ __all__ = [
     "MetricsCollector",
     "Metric",
     "MetricType",
+    "QuantileSketch",
+    "get_metrics_collector",
     "MonitoringError",
     "MetricsCollectionError", 
     "HealthCheckError"
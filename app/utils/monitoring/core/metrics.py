@@ -1,20 +1,23 @@
 """
 指标收集框架
+
+计数器和直方图按线程分片累加，读取时合并；仪表按键分片。直方图使用稀疏、
+可合并的对数分桶分位数草图(DDSketch风格)，记录一个样本是O(1)，内存只随实际出现的桶数增长
 """
 
 from enum import Enum
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 from dataclasses import dataclass, field
 from datetime import datetime
+import math
 import time
 import threading
-from collections import defaultdict, deque
 
 
 class MetricType(str, Enum):
     """指标类型"""
     COUNTER = "counter"      # 计数器 - 只能增加
-    GAUGE = "gauge"          # 仪表 - 可以任意增减  
+    GAUGE = "gauge"          # 仪表 - 可以任意增减
     HISTOGRAM = "histogram"  # 直方图 - 分布统计
     SUMMARY = "summary"      # 摘要 - 分位数统计
 
@@ -43,26 +46,199 @@ class Metric:
         }
 
 
+class QuantileSketch:
+    """
+    对数分桶分位数草图
+    
+    值v落在第ceil(log_gamma(v))个桶，gamma=(1+alpha)/(1-alpha)，桶内任意值的相对误差不超过alpha。
+    桶以字典稀疏存储，只保存出现过的桶(实际观测值通常只覆盖几十个桶)，超出max_value的值归入最高的桶；
+    相同参数的草图可以逐桶相加合并。适用于耗时、大小等非负观测值，
+    不大于min_value的值(包括0和负数)计入零值桶
+    """
+    
+    __slots__ = (
+        "relative_accuracy", "min_value", "max_value", "_gamma", "_log_gamma",
+        "_offset", "_max_index", "_bins", "zero_count", "count", "sum", "min", "max"
+    )
+    
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-9, max_value: float = 1e9):
+        """
+        初始化草图
+        
+        参数:
+            relative_accuracy: 分位数的相对误差上限
+            min_value: 可区分的最小正值
+            max_value: 可区分的最大值
+        """
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._offset = math.ceil(math.log(min_value) / self._log_gamma)
+        self._max_index = math.ceil(math.log(max_value) / self._log_gamma) - self._offset
+        self._bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+    
+    def add(self, value: float) -> None:
+        """记录一个观测值"""
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        
+        if value <= self.min_value:
+            self.zero_count += 1
+            return
+        
+        index = math.ceil(math.log(value) / self._log_gamma) - self._offset
+        if index > self._max_index:
+            index = self._max_index
+        bins = self._bins
+        bins[index] = bins.get(index, 0) + 1
+    
+    def merge(self, other: "QuantileSketch") -> None:
+        """合并另一个相同参数的草图"""
+        if other._offset != self._offset or other._max_index != self._max_index:
+            raise ValueError("只能合并参数相同的分位数草图")
+        if other.count == 0:
+            return
+        
+        bins = self._bins
+        for i, c in other._bins.items():
+            bins[i] = bins.get(i, 0) + c
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+    
+    def copy(self) -> "QuantileSketch":
+        """复制草图"""
+        result = QuantileSketch(self.relative_accuracy, self.min_value, self.max_value)
+        result.merge(self)
+        return result
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """序列化为字典，只保存非空桶"""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "min_value": self.min_value,
+            "max_value": self.max_value,
+            "bins": {str(i): c for i, c in self._bins.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QuantileSketch":
+        """从to_dict的结果恢复草图"""
+        sketch = cls(data["relative_accuracy"], data["min_value"], data["max_value"])
+        for index, c in data.get("bins", {}).items():
+            if c:
+                sketch._bins[int(index)] = c
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data.get("count", 0)
+        sketch.sum = data.get("sum", 0.0)
+        if sketch.count:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        估算分位数
+        
+        参数:
+            q: 分位点，取值[0, 1]
+        
+        返回:
+            分位数估计值，没有样本时返回None
+        """
+        if self.count == 0:
+            return None
+        
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return max(self.min, 0.0) if self.min <= self.min_value else self.min
+        
+        for i in sorted(self._bins):
+            seen += self._bins[i]
+            if rank < seen:
+                value = 2 * self._gamma ** (i + self._offset) / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        
+        return self.max
+
+
+class _Shard:
+    """指标分片，各自持有一把锁"""
+    
+    __slots__ = ("lock", "counters", "gauges", "sketches")
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, Tuple[float, float]] = {}  # 键 -> (值, 时间戳)
+        self.sketches: Dict[str, QuantileSketch] = {}
+
+
 class MetricsCollector:
     """
     指标收集器
     提供线程安全的指标收集和存储功能
     """
     
-    def __init__(self, max_metrics: int = 10000):
+    # 直方图统计和Prometheus输出的分位点
+    QUANTILES = (0.5, 0.9, 0.95, 0.99)
+    
+    def __init__(self, max_metrics: int = 10000, num_shards: int = 16, relative_accuracy: float = 0.01):
         """
         初始化指标收集器
         
         参数:
-            max_metrics: 最大存储指标数量
+            max_metrics: 最大指标序列数量(名称+标签组合)，超出后新序列被忽略
+            num_shards: 分片数量
+            relative_accuracy: 直方图分位数的相对误差上限
         """
         self.max_metrics = max_metrics
-        self._metrics: Dict[str, deque] = defaultdict(lambda: deque(maxlen=max_metrics))
-        self._counters: Dict[str, float] = defaultdict(float)
-        self._gauges: Dict[str, float] = defaultdict(float)
-        self._histograms: Dict[str, List[float]] = defaultdict(list)
+        self.relative_accuracy = relative_accuracy
+        self._shards = [_Shard() for _ in range(max(1, num_shards))]
+        # 指标键 -> (名称, 标签, 类型, 描述)，只在首次出现时写入
+        self._series: Dict[str, Tuple[str, Dict[str, str], MetricType, str]] = {}
         self._lock = threading.Lock()
     
+    def _thread_shard(self) -> _Shard:
+        """按线程选择分片，同一线程总是写同一分片"""
+        return self._shards[threading.get_ident() % len(self._shards)]
+    
+    def _key_shard(self, metric_key: str) -> _Shard:
+        """按指标键选择分片"""
+        return self._shards[hash(metric_key) % len(self._shards)]
+    
+    def _register(self, name: str, labels: Optional[Dict[str, str]], metric_type: MetricType, description: str) -> Optional[str]:
+        """返回指标键，首次出现时登记元数据；超出序列上限时返回None"""
+        metric_key = self._make_key(name, labels)
+        if metric_key in self._series:
+            return metric_key
+        
+        with self._lock:
+            if metric_key not in self._series:
+                if len(self._series) >= self.max_metrics:
+                    return None
+                self._series[metric_key] = (name, dict(labels or {}), metric_type, description)
+        return metric_key
+    
     def record_counter(self, name: str, value: float = 1.0, labels: Optional[Dict[str, str]] = None, description: str = "") -> None:
         """
         记录计数器指标
@@ -73,19 +249,13 @@ class MetricsCollector:
             labels: 标签
             description: 描述
         """
-        with self._lock:
-            metric_key = self._make_key(name, labels)
-            self._counters[metric_key] += value
-            
-            metric = Metric(
-                name=name,
-                value=self._counters[metric_key], 
-                metric_type=MetricType.COUNTER,
-                labels=labels or {},
-                description=description
-            )
-            
-            self._metrics[metric_key].append(metric)
+        metric_key = self._register(name, labels, MetricType.COUNTER, description)
+        if metric_key is None:
+            return
+        
+        shard = self._thread_shard()
+        with shard.lock:
+            shard.counters[metric_key] = shard.counters.get(metric_key, 0.0) + value
     
     def record_gauge(self, name: str, value: float, labels: Optional[Dict[str, str]] = None, description: str = "") -> None:
         """
@@ -97,19 +267,13 @@ class MetricsCollector:
             labels: 标签
             description: 描述
         """
-        with self._lock:
-            metric_key = self._make_key(name, labels)
-            self._gauges[metric_key] = value
-            
-            metric = Metric(
-                name=name,
-                value=value,
-                metric_type=MetricType.GAUGE,
-                labels=labels or {},
-                description=description
-            )
-            
-            self._metrics[metric_key].append(metric)
+        metric_key = self._register(name, labels, MetricType.GAUGE, description)
+        if metric_key is None:
+            return
+        
+        shard = self._key_shard(metric_key)
+        with shard.lock:
+            shard.gauges[metric_key] = (value, time.time())
     
     def record_histogram(self, name: str, value: float, labels: Optional[Dict[str, str]] = None, description: str = "") -> None:
         """
@@ -121,73 +285,130 @@ class MetricsCollector:
             labels: 标签
             description: 描述
         """
-        with self._lock:
-            metric_key = self._make_key(name, labels)
-            self._histograms[metric_key].append(value)
-            
-            # 保持直方图大小在合理范围内
-            if len(self._histograms[metric_key]) > 1000:
-                self._histograms[metric_key] = self._histograms[metric_key][-1000:]
-            
-            metric = Metric(
-                name=name,
-                value=value,
-                metric_type=MetricType.HISTOGRAM,
-                labels=labels or {},
-                description=description
-            )
-            
-            self._metrics[metric_key].append(metric)
+        metric_key = self._register(name, labels, MetricType.HISTOGRAM, description)
+        if metric_key is None:
+            return
+        
+        shard = self._thread_shard()
+        with shard.lock:
+            sketch = shard.sketches.get(metric_key)
+            if sketch is None:
+                sketch = QuantileSketch(self.relative_accuracy)
+                shard.sketches[metric_key] = sketch
+            sketch.add(value)
     
     def get_counter(self, name: str, labels: Optional[Dict[str, str]] = None) -> float:
         """获取计数器当前值"""
         metric_key = self._make_key(name, labels)
-        return self._counters.get(metric_key, 0.0)
+        total = 0.0
+        for shard in self._shards:
+            with shard.lock:
+                total += shard.counters.get(metric_key, 0.0)
+        return total
     
     def get_gauge(self, name: str, labels: Optional[Dict[str, str]] = None) -> Optional[float]:
         """获取仪表当前值"""
         metric_key = self._make_key(name, labels)
-        return self._gauges.get(metric_key)
+        shard = self._key_shard(metric_key)
+        with shard.lock:
+            entry = shard.gauges.get(metric_key)
+        return entry[0] if entry else None
+    
+    def get_histogram_sketch(self, name: str, labels: Optional[Dict[str, str]] = None) -> Optional[QuantileSketch]:
+        """获取合并各分片后的直方图草图"""
+        return self._merged_sketch(self._make_key(name, labels))
+    
+    def _merged_sketch(self, metric_key: str) -> Optional[QuantileSketch]:
+        merged = None
+        for shard in self._shards:
+            with shard.lock:
+                sketch = shard.sketches.get(metric_key)
+                if sketch is None:
+                    continue
+                if merged is None:
+                    merged = sketch.copy()
+                else:
+                    merged.merge(sketch)
+        return merged
     
     def get_histogram_stats(self, name: str, labels: Optional[Dict[str, str]] = None) -> Dict[str, float]:
         """获取直方图统计信息"""
-        metric_key = self._make_key(name, labels)
-        values = self._histograms.get(metric_key, [])
-        
-        if not values:
+        return self._sketch_stats(self.get_histogram_sketch(name, labels))
+    
+    def _sketch_stats(self, sketch: Optional[QuantileSketch]) -> Dict[str, float]:
+        if sketch is None or sketch.count == 0:
             return {}
         
-        sorted_values = sorted(values)
-        count = len(sorted_values)
-        
-        return {
-            "count": count,
-            "sum": sum(sorted_values),
-            "min": min(sorted_values),
-            "max": max(sorted_values),
-            "mean": sum(sorted_values) / count,
-            "p50": sorted_values[int(count * 0.5)],
-            "p90": sorted_values[int(count * 0.9)],
-            "p95": sorted_values[int(count * 0.95)],
-            "p99": sorted_values[int(count * 0.99)]
+        stats = {
+            "count": sketch.count,
+            "sum": sketch.sum,
+            "min": sketch.min,
+            "max": sketch.max,
+            "mean": sketch.sum / sketch.count
         }
+        for q in self.QUANTILES:
+            stats[f"p{int(q * 100)}"] = sketch.quantile(q)
+        return stats
+    
+    def _snapshot(self) -> Dict[str, Tuple[float, float]]:
+        """
+        合并所有分片的当前值
+        
+        返回:
+            指标键 -> (值, 时间戳)；直方图的值为合并后的草图
+        """
+        counters: Dict[str, float] = {}
+        gauges: Dict[str, Tuple[float, float]] = {}
+        sketches: Dict[str, QuantileSketch] = {}
+        
+        for shard in self._shards:
+            with shard.lock:
+                for key, value in shard.counters.items():
+                    counters[key] = counters.get(key, 0.0) + value
+                gauges.update(shard.gauges)
+                for key, sketch in shard.sketches.items():
+                    if key in sketches:
+                        sketches[key].merge(sketch)
+                    else:
+                        sketches[key] = sketch.copy()
+        
+        now = time.time()
+        snapshot = {key: (value, now) for key, value in counters.items()}
+        snapshot.update(gauges)
+        snapshot.update({key: (sketch, now) for key, sketch in sketches.items()})
+        return snapshot
+    
+    def _to_metric(self, metric_key: str, value: Any, timestamp: float) -> Optional[Metric]:
+        series = self._series.get(metric_key)
+        if series is None:
+            return None
+        name, labels, metric_type, description = series
+        if isinstance(value, QuantileSketch):
+            value = value.sum / value.count if value.count else 0.0
+        return Metric(
+            name=name,
+            value=value,
+            metric_type=metric_type,
+            timestamp=timestamp,
+            labels=labels,
+            description=description
+        )
     
     def get_all_metrics(self) -> Dict[str, List[Dict[str, Any]]]:
-        """获取所有指标"""
-        with self._lock:
-            result = {}
-            for key, metrics_deque in self._metrics.items():
-                result[key] = [metric.to_dict() for metric in metrics_deque]
-            return result
+        """获取所有指标（每个序列只保留当前值，不再保存逐样本历史）"""
+        return {key: [metric] for key, metric in self.get_latest_metrics().items()}
     
     def get_latest_metrics(self) -> Dict[str, Dict[str, Any]]:
-        """获取最新的指标值"""
-        with self._lock:
-            result = {}
-            for key, metrics_deque in self._metrics.items():
-                if metrics_deque:
-                    result[key] = metrics_deque[-1].to_dict()
-            return result
+        """获取最新的指标值，直方图的value为均值并附带分位数统计"""
+        result = {}
+        for key, (value, timestamp) in self._snapshot().items():
+            metric = self._to_metric(key, value, timestamp)
+            if metric is None:
+                continue
+            result[key] = metric.to_dict()
+            if isinstance(value, QuantileSketch):
+                result[key]["stats"] = self._sketch_stats(value)
+        return result
     
     def clear_metrics(self, name_pattern: Optional[str] = None) -> None:
         """
@@ -197,18 +418,22 @@ class MetricsCollector:
             name_pattern: 指标名称模式，如果为None则清除所有指标
         """
         with self._lock:
+            for shard in self._shards:
+                with shard.lock:
+                    if name_pattern is None:
+                        shard.counters.clear()
+                        shard.gauges.clear()
+                        shard.sketches.clear()
+                    else:
+                        for store in (shard.counters, shard.gauges, shard.sketches):
+                            for key in [key for key in store if name_pattern in key]:
+                                del store[key]
+            
             if name_pattern is None:
-                self._metrics.clear()
-                self._counters.clear()
-                self._gauges.clear()
-                self._histograms.clear()
+                self._series.clear()
             else:
-                keys_to_remove = [key for key in self._metrics.keys() if name_pattern in key]
-                for key in keys_to_remove:
-                    del self._metrics[key]
-                    self._counters.pop(key, None)
-                    self._gauges.pop(key, None)
-                    self._histograms.pop(key, None)
+                for key in [key for key in self._series if name_pattern in key]:
+                    del self._series[key]
     
     def _make_key(self, name: str, labels: Optional[Dict[str, str]]) -> str:
         """生成指标键"""
@@ -220,14 +445,108 @@ class MetricsCollector:
     
     def get_metrics_summary(self) -> Dict[str, Any]:
         """获取指标摘要信息"""
-        with self._lock:
-            return {
-                "total_metrics": len(self._metrics),
-                "counters": len(self._counters),
-                "gauges": len(self._gauges),
-                "histograms": len(self._histograms),
-                "memory_usage": {
-                    "metrics_count": sum(len(deque) for deque in self._metrics.values()),
-                    "max_metrics": self.max_metrics
-                }
-            } 
\ No newline at end of file
+        counts = {metric_type: 0 for metric_type in MetricType}
+        for _, _, metric_type, _ in list(self._series.values()):
+            counts[metric_type] += 1
+        
+        bins = 0
+        for shard in self._shards:
+            with shard.lock:
+                bins += sum(len(sketch._bins) for sketch in shard.sketches.values())
+        
+        return {
+            "total_metrics": len(self._series),
+            "counters": counts[MetricType.COUNTER],
+            "gauges": counts[MetricType.GAUGE],
+            "histograms": counts[MetricType.HISTOGRAM],
+            "memory_usage": {
+                "metrics_count": len(self._series),
+                "max_metrics": self.max_metrics,
+                "sketch_bins": bins,
+                "shards": len(self._shards)
+            }
+        }
+    
+    def render_prometheus(self) -> str:
+        """
+        按Prometheus文本格式(0.0.4)输出所有指标
+        
+        计数器和仪表原样输出，直方图输出为summary(分位数、_sum、_count)
+        """
+        lines: List[str] = []
+        append = lines.append
+        declared = set()
+        
+        snapshot = self._snapshot()
+        for key in sorted(snapshot):
+            series = self._series.get(key)
+            if series is None:
+                continue
+            name, labels, metric_type, description = series
+            value = snapshot[key][0]
+            metric_name = _prometheus_name(name)
+            
+            if metric_name not in declared:
+                declared.add(metric_name)
+                if description:
+                    append(f"# HELP {metric_name} {_escape_help(description)}")
+                prom_type = "summary" if metric_type == MetricType.HISTOGRAM else metric_type.value
+                append(f"# TYPE {metric_name} {prom_type}")
+            
+            if isinstance(value, QuantileSketch):
+                for q in self.QUANTILES:
+                    append(f"{metric_name}{_prometheus_labels(labels, ('quantile', str(q)))} {_format_value(value.quantile(q))}")
+                label_str = _prometheus_labels(labels)
+                append(f"{metric_name}_sum{label_str} {_format_value(value.sum)}")
+                append(f"{metric_name}_count{label_str} {value.count}")
+            else:
+                append(f"{metric_name}{_prometheus_labels(labels)} {_format_value(value)}")
+        
+        append("")
+        return "\n".join(lines)
+
+
+def _prometheus_name(name: str) -> str:
+    """把指标名转换为合法的Prometheus名称"""
+    chars = [c if c.isalnum() or c in "_:" else "_" for c in name]
+    if chars and chars[0].isdigit():
+        chars.insert(0, "_")
+    return "".join(chars)
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _prometheus_labels(labels: Dict[str, str], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = [f'{_prometheus_name(k)}="{_escape_label_value(v)}"' for k, v in sorted(labels.items())]
+    if extra:
+        items.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(items) + "}" if items else ""
+
+
+def _format_value(value: Optional[float]) -> str:
+    if value is None:
+        return "NaN"
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        if math.isnan(value):
+            return "NaN"
+    return repr(float(value))
+
+
+# 进程级共享的指标收集器
+_metrics_collector: Optional[MetricsCollector] = None
+
+
+def get_metrics_collector() -> MetricsCollector:
+    """获取进程级共享的指标收集器"""
+    global _metrics_collector
+    if _metrics_collector is None:
+        _metrics_collector = MetricsCollector()
+    return _metrics_collector
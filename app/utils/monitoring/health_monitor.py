@@ -198,6 +198,29 @@ class ServiceHealthChecker:
             }
         }
     
+    @staticmethod
+    def _verify_rabbitmq_blocking(host: str, port: int) -> Tuple[bool, Optional[str]]:
+        """未安装aio-pika时用pika验证RabbitMQ连接"""
+        try:
+            import pika
+            credentials = pika.PlainCredentials(
+                settings.RABBITMQ_USER, 
+                settings.RABBITMQ_PASSWORD
+            )
+            connection = pika.BlockingConnection(
+                pika.ConnectionParameters(
+                    host=host,
+                    port=port,
+                    credentials=credentials,
+                    connection_attempts=1,
+                    socket_timeout=2
+                )
+            )
+            connection.close()
+            return True, None
+        except Exception as e:
+            return False, f"RabbitMQ功能验证失败: {str(e)}"
+    
     @classmethod
     async def check_rabbitmq(cls) -> Dict[str, Any]:
         """检查RabbitMQ连接"""
@@ -206,24 +229,15 @@ class ServiceHealthChecker:
         
         status, response_time, error_msg = await cls.check_tcp_service(host, port)
         
-        # 尝试进一步验证RabbitMQ功能
+        # 尝试进一步验证RabbitMQ功能：复用进程级异步连接，不在事件循环里建立阻塞连接
         if status:
             try:
-                import pika
-                credentials = pika.PlainCredentials(
-                    settings.RABBITMQ_USER, 
-                    settings.RABBITMQ_PASSWORD
-                )
-                connection = pika.BlockingConnection(
-                    pika.ConnectionParameters(
-                        host=host,
-                        port=port,
-                        credentials=credentials,
-                        connection_attempts=1,
-                        socket_timeout=2
-                    )
-                )
-                connection.close()
+                from app.utils.messaging.queue.async_message_queue import get_async_rabbitmq_client
+                connection = await asyncio.wait_for(get_async_rabbitmq_client().connect(), timeout=2)
+                if connection.is_closed:
+                    raise ConnectionError("连接已关闭")
+            except ImportError:
+                status, error_msg = await asyncio.to_thread(cls._verify_rabbitmq_blocking, host, port)
             except Exception as e:
                 status = False
                 error_msg = f"RabbitMQ功能验证失败: {str(e)}"
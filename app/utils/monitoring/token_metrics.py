@@ -3,21 +3,24 @@ Token计算与统计工具
 
 提供基于InfluxDB的Token使用量计算与统计功能，作为对话的后置异步处理工具。
 支持多种模型的token计算，并将结果存储到InfluxDB时序数据库中。
+
+数据点编码为line protocol后进入有界缓冲区，由后台协程按数量或时间间隔批量写入
+InfluxDB的HTTP写接口；写入端过慢时按配置丢弃最旧的数据点或让调用方等待。
 """
 
 import os
 import time
 import asyncio
 import logging
+from collections import deque
 from typing import Dict, Any, Optional, List, Union
-from datetime import datetime
 from functools import lru_cache
-import concurrent.futures
+
+import httpx
 
 # InfluxDB客户端
 try:
-    from influxdb_client import InfluxDBClient, Point
-    from influxdb_client.client.write_api import ASYNCHRONOUS
+    from influxdb_client import InfluxDBClient
     INFLUXDB_AVAILABLE = True
 except ImportError:
     INFLUXDB_AVAILABLE = False
@@ -58,7 +61,7 @@ class TokenCounter:
         # 其他模型默认使用相同编码器
         "default": "cl100k_base"
     }
-
+    
     @classmethod
     def get_encoder(cls, model_name: str):
         """获取模型对应的编码器"""
@@ -76,7 +79,7 @@ class TokenCounter:
                 return tiktoken.get_encoding("cl100k_base")
             except Exception:
                 return None
-
+    
     @classmethod
     def count_tokens(cls, text: str, model_name: str = "gpt-3.5-turbo") -> int:
         """计算文本的token数量"""
@@ -101,7 +104,7 @@ class TokenCounter:
             cn_char_count = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
             en_char_count = len(text) - cn_char_count
             return int(cn_char_count / 1.5 + en_char_count / 4)
-
+    
     @classmethod
     def count_messages_tokens(cls, messages: List[Dict[str, str]], model_name: str = "gpt-3.5-turbo") -> int:
         """计算消息列表的token数量"""
@@ -129,6 +132,256 @@ class TokenCounter:
         return total_tokens
 
 
+def _escape_newlines(text: str) -> str:
+    """换行会截断line protocol的一行，转义为字面的\\n、\\r"""
+    return text.replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _escape_key(value: str) -> str:
+    """转义度量名、标签键值和字段键中的特殊字符"""
+    text = str(value).replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+    return _escape_newlines(text)
+
+
+def _format_field_value(value: Any) -> str:
+    """按line protocol格式化字段值"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return f"{value}i"
+    if isinstance(value, float):
+        return repr(value)
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{_escape_newlines(text)}"'
+
+
+def to_line_protocol(measurement: str,
+                     tags: Dict[str, Any],
+                     fields: Dict[str, Any],
+                     timestamp_ns: Optional[int] = None) -> str:
+    """
+    把一个数据点编码为InfluxDB line protocol
+    
+    参数:
+        measurement: 度量名
+        tags: 标签，值为空的标签会被忽略
+        fields: 字段，至少需要一个非None字段
+        timestamp_ns: 纳秒时间戳，默认当前时间
+    
+    返回:
+        一行line protocol文本
+    """
+    line = _escape_newlines(str(measurement).replace("\\", "\\\\").replace(",", "\\,").replace(" ", "\\ "))
+    for key in sorted(tags):
+        value = tags[key]
+        if value is None or value == "":
+            continue
+        line += f",{_escape_key(key)}={_escape_key(value)}"
+    
+    field_str = ",".join(
+        f"{_escape_key(key)}={_format_field_value(value)}"
+        for key, value in fields.items()
+        if value is not None
+    )
+    if not field_str:
+        raise ValueError("数据点至少需要一个字段")
+    
+    return f"{line} {field_str} {timestamp_ns if timestamp_ns is not None else time.time_ns()}"
+
+
+class InfluxDBBatchWriter:
+    """
+    InfluxDB批量写入器
+    
+    数据点以line protocol文本缓存在有界队列中，后台协程在缓冲达到batch_size或
+    flush_interval到期时把一批数据点合并成一个HTTP请求写入/api/v2/write。
+    缓冲区满时overflow="drop"丢弃最旧的数据点，overflow="block"让写入方等待
+    """
+    
+    def __init__(self,
+                 url: str,
+                 token: str,
+                 org: str,
+                 bucket: str,
+                 batch_size: int = 500,
+                 flush_interval: float = 1.0,
+                 max_buffer: int = 10000,
+                 overflow: str = "drop",
+                 max_retries: int = 3,
+                 retry_backoff: float = 0.5,
+                 timeout: float = 10.0,
+                 http_client: Optional[httpx.AsyncClient] = None):
+        """
+        初始化批量写入器
+        
+        参数:
+            url: InfluxDB地址
+            token: 访问令牌
+            org: 组织
+            bucket: 存储桶
+            batch_size: 单个请求的最大数据点数，缓冲达到该数量时立即刷新
+            flush_interval: 刷新间隔(秒)
+            max_buffer: 缓冲区容量
+            overflow: 缓冲区满时的策略，drop或block
+            max_retries: 写入失败(网络错误、429、5xx)时的重试次数
+            retry_backoff: 首次重试的等待时间(秒)，之后每次翻倍，最长10秒
+            timeout: 单次请求超时(秒)
+            http_client: 自定义HTTP客户端，测试时可指向本地替身服务
+        """
+        if overflow not in ("drop", "block"):
+            raise ValueError(f"不支持的溢出策略: {overflow}")
+        
+        self.write_url = f"{url.rstrip('/')}/api/v2/write"
+        self.params = {"org": org, "bucket": bucket, "precision": "ns"}
+        self.headers = {
+            "Authorization": f"Token {token}",
+            "Content-Type": "text/plain; charset=utf-8"
+        }
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max(self.batch_size, max_buffer)
+        self.overflow = overflow
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        
+        self._http = http_client
+        self._owns_http = http_client is None
+        self._buffer: deque = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop = None
+        self._closed = False
+        
+        self.stats = {"written": 0, "dropped": 0, "failed": 0, "batches": 0, "retries": 0}
+    
+    def _ensure_worker(self) -> None:
+        """按当前事件循环启动后台刷新协程"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._space = asyncio.Event()
+            self._worker = loop.create_task(self._flush_loop())
+    
+    @property
+    def pending(self) -> int:
+        """缓冲区中等待写入的数据点数"""
+        return len(self._buffer)
+    
+    async def write(self, line: str) -> bool:
+        """
+        写入一行line protocol
+        
+        返回:
+            是否进入缓冲区，写入器已关闭时返回False
+        """
+        if self._closed:
+            self.stats["dropped"] += 1
+            return False
+        
+        self._ensure_worker()
+        
+        if len(self._buffer) >= self.max_buffer:
+            if self.overflow == "block":
+                while len(self._buffer) >= self.max_buffer and not self._closed:
+                    self._space.clear()
+                    self._wakeup.set()
+                    await self._space.wait()
+                if self._closed:
+                    self.stats["dropped"] += 1
+                    return False
+            else:
+                self._buffer.popleft()
+                self.stats["dropped"] += 1
+        
+        self._buffer.append(line)
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+        return True
+    
+    async def _flush_loop(self) -> None:
+        """等待批次满或间隔到期后写出缓冲区"""
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self._drain()
+    
+    async def _drain(self) -> None:
+        """分批写出当前缓冲区中的全部数据点"""
+        while self._buffer:
+            size = min(self.batch_size, len(self._buffer))
+            batch = [self._buffer.popleft() for _ in range(size)]
+            self._space.set()
+            await self._send(batch)
+    
+    async def _send(self, batch: List[str]) -> bool:
+        """把一批数据点写入InfluxDB，可重试的错误按指数退避重试"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=self.timeout)
+        
+        body = "\n".join(batch).encode("utf-8")
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._http.post(
+                    self.write_url, params=self.params, headers=self.headers, content=body
+                )
+                if response.status_code < 300:
+                    self.stats["written"] += len(batch)
+                    self.stats["batches"] += 1
+                    return True
+                if response.status_code != 429 and response.status_code < 500:
+                    logger.error(f"InfluxDB拒绝写入 {len(batch)} 个数据点: {response.status_code} {response.text[:200]}")
+                    break
+                error = f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                error = str(e)
+            
+            if attempt < self.max_retries:
+                self.stats["retries"] += 1
+                await asyncio.sleep(min(self.retry_backoff * (2 ** attempt), 10.0))
+            else:
+                logger.error(f"写入InfluxDB失败，丢弃 {len(batch)} 个数据点: {error}")
+        
+        self.stats["failed"] += len(batch)
+        return False
+    
+    async def flush(self) -> None:
+        """立即写出缓冲区中的数据点"""
+        if self._buffer:
+            self._ensure_worker()
+            await self._drain()
+    
+    async def close(self) -> None:
+        """停止后台协程，写出剩余数据点并关闭HTTP客户端"""
+        if self._closed:
+            return
+        self._closed = True
+        
+        if self._worker is not None and self._loop is asyncio.get_running_loop():
+            if self._space is not None:
+                self._space.set()
+            self._wakeup.set()
+            try:
+                await self._worker
+            except Exception as e:
+                logger.warning(f"停止InfluxDB刷新协程失败: {str(e)}")
+        self._worker = None
+        
+        if self._buffer:
+            if self._space is None:
+                self._space = asyncio.Event()
+            await self._drain()
+        
+        if self._owns_http and self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
 class InfluxDBMetricsClient:
     """InfluxDB指标客户端，用于存储Token计算结果"""
     
@@ -136,8 +389,7 @@ class InfluxDBMetricsClient:
         """初始化InfluxDB客户端"""
         self._initialized = False
         self._client = None
-        self._write_api = None
-        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=5)
+        self._writer: Optional[InfluxDBBatchWriter] = None
         
         # 初始化客户端
         self._initialize()
@@ -157,19 +409,28 @@ class InfluxDBMetricsClient:
             return
             
         try:
-            # 创建InfluxDB客户端
+            # 创建InfluxDB客户端，仅用于管理bucket
             self._client = InfluxDBClient(
                 url=settings.metrics.influxdb_url,
                 token=settings.metrics.influxdb_token,
                 org=settings.metrics.influxdb_org
             )
             
-            # 创建写入API
-            self._write_api = self._client.write_api(write_options=ASYNCHRONOUS)
-            
             # 检查bucket是否存在，不存在则创建
             self._create_bucket_if_not_exists()
             
+            # 数据点通过批量写入器写入
+            self._writer = InfluxDBBatchWriter(
+                url=settings.metrics.influxdb_url,
+                token=settings.metrics.influxdb_token,
+                org=settings.metrics.influxdb_org,
+                bucket=settings.metrics.influxdb_bucket,
+                batch_size=getattr(settings, "INFLUXDB_BATCH_SIZE", 500),
+                flush_interval=getattr(settings, "INFLUXDB_FLUSH_INTERVAL", 1.0),
+                max_buffer=getattr(settings, "INFLUXDB_MAX_BUFFER", 10000),
+                overflow=getattr(settings, "INFLUXDB_OVERFLOW", "drop")
+            )
+            
             self._initialized = True
             logger.info(f"InfluxDB客户端初始化成功: {settings.metrics.influxdb_url}")
         except Exception as e:
@@ -213,61 +474,69 @@ class InfluxDBMetricsClient:
             additional_tags: 额外标签
             additional_fields: 额外字段
         """
-        if not self._initialized or self._write_api is None:
+        if not self._initialized or self._writer is None:
             return
         
         try:
-            # 创建数据点
-            point = Point("llm_token_usage")
-            
-            # 添加标签 (索引)
-            point.tag("user_id", user_id)
-            point.tag("model", model_name)
+            # 标签 (索引)
+            tags = {"user_id": user_id, "model": model_name}
             if conversation_id:
-                point.tag("conversation_id", conversation_id)
+                tags["conversation_id"] = conversation_id
             
             # 添加额外标签
             if additional_tags:
                 for tag_name, tag_value in additional_tags.items():
                     if tag_value:
-                        point.tag(tag_name, tag_value)
+                        tags[tag_name] = tag_value
             
-            # 添加指标字段
-            point.field("input_tokens", input_tokens)
-            point.field("output_tokens", output_tokens)
-            point.field("total_tokens", input_tokens + output_tokens)
+            # 指标字段
+            fields = {
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens
+            }
             
             if execution_time is not None:
-                point.field("execution_time_ms", execution_time)
+                fields["execution_time_ms"] = float(execution_time)
             
             # 添加额外字段
             if additional_fields:
                 for field_name, field_value in additional_fields.items():
                     if field_value is not None:
                         if isinstance(field_value, (int, float, bool, str)):
-                            point.field(field_name, field_value)
+                            fields[field_name] = field_value
                         else:
                             # 对于复杂类型，转换为字符串
-                            point.field(field_name, str(field_value))
+                            fields[field_name] = str(field_value)
             
-            # 设置时间戳
-            point.time(datetime.utcnow())
-            
-            # 异步写入数据
-            loop = asyncio.get_event_loop()
-            await loop.run_in_executor(
-                self._executor,
-                self._write_api.write,
-                settings.metrics.influxdb_bucket,
-                settings.metrics.influxdb_org,
-                point
-            )
+            # 进入批量写入缓冲区，由后台协程写入
+            line = to_line_protocol("llm_token_usage", tags, fields)
+            if not await self._writer.write(line):
+                return False
             
             logger.debug(f"Token统计数据已写入InfluxDB: {user_id}, {model_name}, {input_tokens+output_tokens} tokens")
             return True
         except Exception as e:
             logger.error(f"写入Token统计数据失败: {e}")
             return False
+    
+    @property
+    def stats(self) -> Dict[str, int]:
+        """批量写入统计: 已写入、丢弃、失败的数据点数等"""
+        return dict(self._writer.stats) if self._writer else {}
+    
+    async def flush(self):
+        """立即写出缓冲中的数据点"""
+        if self._writer is not None:
+            await self._writer.flush()
+    
+    async def close(self):
+        """写出剩余数据点并释放连接"""
+        if self._writer is not None:
+            await self._writer.close()
+        if self._client is not None:
+            self._client.close()
+            self._client = None
 
 
 @lru_cache(maxsize=1)
@@ -276,6 +545,12 @@ def get_influxdb_client() -> InfluxDBMetricsClient:
     return InfluxDBMetricsClient()
 
 
+async def shutdown_token_metrics():
+    """应用关闭时写出缓冲中的Token指标"""
+    if get_influxdb_client.cache_info().currsize:
+        await get_influxdb_client().close()
+
+
 class TokenMetricsService:
     """Token指标服务，提供Token计算和统计功能"""
     
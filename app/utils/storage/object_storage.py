@@ -124,3 +124,27 @@ def get_file_url(object_name: str, expires: int = 3600) -> str:
     except S3Error as e:
         print(f"获取预签名URL时出错: {e}")
         raise
+
+def set_prefix_expiration(prefix: str, days: int, rule_id: Optional[str] = None) -> bool:
+    """为指定前缀的对象设置过期生命周期规则，保留存储桶上的其他规则"""
+    from minio.commonconfig import ENABLED, Filter
+    from minio.lifecycleconfig import Expiration, LifecycleConfig, Rule
+    
+    client = get_minio_client()
+    rule_id = rule_id or f"expire-{prefix.strip('/').replace('/', '-')}"
+    
+    try:
+        existing = client.get_bucket_lifecycle(settings.MINIO_BUCKET)
+        rules = [rule for rule in (existing.rules if existing else []) if rule.rule_id != rule_id]
+        rules.append(Rule(
+            ENABLED,
+            rule_filter=Filter(prefix=prefix),
+            rule_id=rule_id,
+            expiration=Expiration(days=days)
+        ))
+        client.set_bucket_lifecycle(settings.MINIO_BUCKET, LifecycleConfig(rules))
+        return True
+    
+    except S3Error as e:
+        print(f"设置MinIO生命周期规则时出错: {e}")
+        return False
@@ -22,6 +22,7 @@ from .standard_initializer import (
 from .milvus_adapter import MilvusVectorStore
 from .pgvector_adapter import PgVectorStore
 from .elasticsearch_adapter import ElasticsearchVectorStore
+from .memory_adapter import InMemoryVectorStore
 
 # 导入工具函数
 from .store import VectorStore, get_vector_store
@@ -65,6 +66,7 @@ __all__ = [
     "MilvusVectorStore",
     "PgVectorStore",
     "ElasticsearchVectorStore",
+    "InMemoryVectorStore",
     
     # 工具函数
     "VectorStore",
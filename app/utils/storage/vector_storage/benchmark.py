@@ -0,0 +1,330 @@
+"""
+向量存储基准测试
+用同一份语料测试各向量存储适配器的写入吞吐、检索延迟分位数、召回率和内存占用，
+召回率以内存适配器的精确检索结果为基准
+"""
+
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional
+import json
+import logging
+import os
+import platform
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+from ..core.base import VectorStorage
+from .memory_adapter import InMemoryVectorStore
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BenchmarkCorpus:
+    """基准测试语料"""
+    vectors: np.ndarray
+    queries: np.ndarray
+    ids: List[str]
+    metadata: List[Dict[str, Any]]
+
+    @property
+    def dimension(self) -> int:
+        return int(self.vectors.shape[1])
+
+
+@dataclass
+class BenchmarkResult:
+    """单个适配器的基准测试结果"""
+    backend: str
+    num_vectors: int
+    num_queries: int
+    top_k: int
+    insert_seconds: float = 0.0
+    insert_throughput: float = 0.0
+    search_p50_ms: float = 0.0
+    search_p95_ms: float = 0.0
+    search_p99_ms: float = 0.0
+    search_qps: float = 0.0
+    recall_at_k: float = 0.0
+    memory_bytes: Optional[int] = None
+    rss_delta_bytes: Optional[int] = None
+    error: Optional[str] = None
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+def generate_corpus(
+    num_vectors: int,
+    dimension: int,
+    num_queries: int = 100,
+    seed: int = 42
+) -> BenchmarkCorpus:
+    """
+    生成合成语料
+
+    向量围绕若干簇中心分布，比均匀随机向量更接近真实嵌入的检索难度
+
+    参数:
+        num_vectors: 向量数量
+        dimension: 向量维度
+        num_queries: 查询数量
+        seed: 随机种子
+
+    返回:
+        基准测试语料
+    """
+    rng = np.random.default_rng(seed)
+    num_clusters = max(1, num_vectors // 1000)
+    centers = rng.standard_normal((num_clusters, dimension)).astype(np.float32)
+
+    assignments = rng.integers(0, num_clusters, size=num_vectors)
+    vectors = centers[assignments] + 0.3 * rng.standard_normal((num_vectors, dimension)).astype(np.float32)
+
+    query_assignments = rng.integers(0, num_clusters, size=num_queries)
+    queries = centers[query_assignments] + 0.3 * rng.standard_normal((num_queries, dimension)).astype(np.float32)
+
+    return build_corpus(vectors, queries)
+
+
+def build_corpus(vectors: np.ndarray, queries: np.ndarray) -> BenchmarkCorpus:
+    """
+    由已有向量构建语料（如导出的真实嵌入）
+
+    参数:
+        vectors: 语料向量矩阵
+        queries: 查询向量矩阵
+
+    返回:
+        基准测试语料
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    ids = [str(uuid.uuid4()) for _ in range(len(vectors))]
+    metadata = [
+        {
+            "chunk_id": index,
+            "document_id": index // 10,
+            "knowledge_base_id": "benchmark",
+            "content": f"chunk-{index}",
+            "metadata": {}
+        }
+        for index in range(len(vectors))
+    ]
+    return BenchmarkCorpus(
+        vectors=vectors,
+        queries=np.asarray(queries, dtype=np.float32),
+        ids=ids,
+        metadata=metadata
+    )
+
+
+def _percentile_ms(latencies: List[float], q: float) -> float:
+    """计算延迟分位数（毫秒）"""
+    return float(np.percentile(latencies, q) * 1000) if latencies else 0.0
+
+
+def _current_rss_bytes() -> int:
+    """当前进程的常驻内存（字节）
+
+    不能用ru_maxrss，它是进程峰值，前面的适配器抬高峰值后，后面适配器的增量会被低估为0
+    """
+    try:
+        import psutil
+        return int(psutil.Process().memory_info().rss)
+    except ImportError:
+        # 未安装psutil时读取/proc（仅Linux），第二列为常驻页数
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+class VectorStoreBenchmark:
+    """
+    向量存储基准测试器
+
+    依次对每个适配器执行: 创建集合 -> 分批写入 -> 逐条检索 -> 与精确结果比对
+    """
+
+    def __init__(
+        self,
+        corpus: BenchmarkCorpus,
+        top_k: int = 10,
+        batch_size: int = 1000,
+        metric_type: str = "COSINE",
+        collection_prefix: str = "bench"
+    ):
+        """
+        初始化基准测试器
+
+        参数:
+            corpus: 测试语料
+            top_k: 检索结果数量
+            batch_size: 写入批量大小
+            metric_type: 相似度度量，用于精确基线 (COSINE, IP, L2)
+            collection_prefix: 测试集合名前缀
+        """
+        self.corpus = corpus
+        self.top_k = top_k
+        self.batch_size = batch_size
+        self.metric_type = metric_type
+        self.collection_prefix = collection_prefix
+        self._ground_truth: Optional[List[set]] = None
+
+    async def ground_truth(self) -> List[set]:
+        """用内存适配器计算每个查询的精确top_k（以chunk_id标识）"""
+        if self._ground_truth is None:
+            baseline = InMemoryVectorStore("benchmark_baseline")
+            collection = f"{self.collection_prefix}_baseline"
+            await baseline.create_collection(
+                collection, self.corpus.dimension, metric_type=self.metric_type
+            )
+            await baseline.add_vectors(
+                collection, self.corpus.vectors, self.corpus.ids, self.corpus.metadata
+            )
+            results = await baseline.search_many(collection, self.corpus.queries, self.top_k)
+            self._ground_truth = [
+                {str(hit["chunk_id"]) for hit in hits} for hits in results
+            ]
+        return self._ground_truth
+
+    async def run_backend(
+        self,
+        backend: str,
+        store: VectorStorage,
+        collection_kwargs: Optional[Dict[str, Any]] = None,
+        cleanup: bool = True
+    ) -> BenchmarkResult:
+        """
+        测试单个适配器
+
+        参数:
+            backend: 适配器名称
+            store: 向量存储适配器
+            collection_kwargs: 创建集合的额外参数（索引类型等）
+            cleanup: 测试结束后是否删除集合
+
+        返回:
+            测试结果
+        """
+        corpus = self.corpus
+        result = BenchmarkResult(
+            backend=backend,
+            num_vectors=len(corpus.vectors),
+            num_queries=len(corpus.queries),
+            top_k=self.top_k
+        )
+        collection = f"{self.collection_prefix}_{backend}_{uuid.uuid4().hex[:8]}"
+        truth = await self.ground_truth()
+
+        try:
+            await store.connect()
+            await store.create_collection(collection, corpus.dimension, **(collection_kwargs or {}))
+            rss_before = _current_rss_bytes()
+
+            # 写入
+            started = time.perf_counter()
+            for start in range(0, len(corpus.vectors), self.batch_size):
+                end = start + self.batch_size
+                await store.add_vectors(
+                    collection,
+                    corpus.vectors[start:end].tolist(),
+                    corpus.ids[start:end],
+                    corpus.metadata[start:end]
+                )
+            # 带写缓冲的适配器需要提交后才计入写入时间
+            if hasattr(store, "flush"):
+                await store.flush(collection)
+            result.insert_seconds = time.perf_counter() - started
+            result.insert_throughput = result.num_vectors / result.insert_seconds if result.insert_seconds else 0.0
+
+            # 检索
+            latencies = []
+            hits_found = 0
+            search_started = time.perf_counter()
+            for index, query in enumerate(corpus.queries):
+                query_started = time.perf_counter()
+                hits = await store.search_vectors(collection, query.tolist(), self.top_k)
+                latencies.append(time.perf_counter() - query_started)
+
+                returned = {str(hit.get("chunk_id")) for hit in hits[:self.top_k]}
+                hits_found += len(returned & truth[index])
+            search_seconds = time.perf_counter() - search_started
+
+            result.search_p50_ms = _percentile_ms(latencies, 50)
+            result.search_p95_ms = _percentile_ms(latencies, 95)
+            result.search_p99_ms = _percentile_ms(latencies, 99)
+            result.search_qps = len(latencies) / search_seconds if search_seconds else 0.0
+            expected = sum(len(items) for items in truth)
+            result.recall_at_k = hits_found / expected if expected else 0.0
+
+            # 内存占用: 适配器自报优先，外部服务只能记录本进程增量
+            result.rss_delta_bytes = max(0, _current_rss_bytes() - rss_before)
+            if hasattr(store, "get_collection_stats"):
+                stats = await store.get_collection_stats(collection)
+                result.memory_bytes = stats.get("memory_bytes")
+                result.extra["collection_stats"] = stats
+
+        except Exception as e:
+            logger.error(f"基准测试 {backend} 出错: {str(e)}")
+            result.error = str(e)
+
+        finally:
+            if cleanup and hasattr(store, "drop_collection"):
+                try:
+                    await store.drop_collection(collection)
+                except Exception as e:
+                    logger.warning(f"清理测试集合 {collection} 失败: {str(e)}")
+
+        return result
+
+    async def run(
+        self,
+        stores: Dict[str, VectorStorage],
+        collection_kwargs: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        依次测试所有适配器
+
+        参数:
+            stores: 名称到适配器的映射
+            collection_kwargs: 名称到创建集合参数的映射
+
+        返回:
+            可直接序列化为JSON的报告
+        """
+        collection_kwargs = collection_kwargs or {}
+        results = []
+        for backend, store in stores.items():
+            logger.info(f"开始基准测试: {backend}")
+            results.append(await self.run_backend(backend, store, collection_kwargs.get(backend)))
+
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            "environment": {
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "numpy": np.__version__
+            },
+            "corpus": {
+                "num_vectors": len(self.corpus.vectors),
+                "num_queries": len(self.corpus.queries),
+                "dimension": self.corpus.dimension,
+                "metric_type": self.metric_type
+            },
+            "top_k": self.top_k,
+            "batch_size": self.batch_size,
+            "results": [asdict(item) for item in results]
+        }
+
+
+def write_report(report: Dict[str, Any], path: str) -> None:
+    """
+    写出JSON报告
+
+    参数:
+        report: 报告内容
+        path: 输出路径
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
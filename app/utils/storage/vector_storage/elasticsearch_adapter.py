@@ -349,6 +349,13 @@ class ElasticsearchVectorStore(VectorStorage):
             self.logger.error(f"检查索引存在性失败: {str(e)}")
             return False
     
+    async def flush(self, name: Optional[str] = None) -> None:
+        """刷新索引，使已写入的向量可被检索"""
+        if not self._connected:
+            await self.connect()
+        
+        self._client.indices.refresh(index=name or "_all")
+    
     async def drop_collection(self, name: str) -> bool:
         """删除集合（索引）"""
         try:
@@ -0,0 +1,301 @@
+"""
+内存向量存储适配器
+基于NumPy的精确检索实现，用作召回率基线和测试替身，不依赖外部服务
+"""
+
+from typing import List, Dict, Any, Optional, Union
+import logging
+import uuid
+from ..core.base import VectorStorage
+from ..core.exceptions import VectorStoreError
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class _MemoryCollection:
+    """内存集合，向量按行存放在预分配的矩阵中"""
+
+    def __init__(self, dimension: int, metric_type: str, initial_capacity: int = 1024):
+        self.dimension = dimension
+        self.metric_type = metric_type.upper()
+        self.vectors = np.zeros((initial_capacity, dimension), dtype=np.float32)
+        # 余弦度量下缓存向量范数，避免每次查询重复计算
+        self.norms = np.zeros(initial_capacity, dtype=np.float32)
+        self.ids: List[str] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self.positions: Dict[str, int] = {}
+        self.size = 0
+
+    def _ensure_capacity(self, required: int) -> None:
+        """容量不足时按倍数扩容"""
+        capacity = self.vectors.shape[0]
+        if required <= capacity:
+            return
+
+        new_capacity = max(required, capacity * 2)
+        vectors = np.zeros((new_capacity, self.dimension), dtype=np.float32)
+        vectors[:self.size] = self.vectors[:self.size]
+        norms = np.zeros(new_capacity, dtype=np.float32)
+        norms[:self.size] = self.norms[:self.size]
+        self.vectors, self.norms = vectors, norms
+
+    def upsert(self, ids: List[str], vectors: "np.ndarray", metadata: List[Dict[str, Any]]) -> None:
+        """写入或覆盖向量"""
+        self._ensure_capacity(self.size + len(ids))
+        norms = np.linalg.norm(vectors, axis=1)
+
+        for row, (vector_id, meta) in enumerate(zip(ids, metadata)):
+            position = self.positions.get(vector_id)
+            if position is None:
+                position = self.size
+                self.size += 1
+                self.ids.append(vector_id)
+                self.metadata.append(meta)
+                self.positions[vector_id] = position
+            else:
+                self.metadata[position] = meta
+            self.vectors[position] = vectors[row]
+            self.norms[position] = norms[row]
+
+    def delete(self, ids: List[str]) -> int:
+        """删除向量，用末尾行填补空位"""
+        deleted = 0
+        for vector_id in ids:
+            position = self.positions.pop(vector_id, None)
+            if position is None:
+                continue
+
+            last = self.size - 1
+            if position != last:
+                moved_id = self.ids[last]
+                self.vectors[position] = self.vectors[last]
+                self.norms[position] = self.norms[last]
+                self.ids[position] = moved_id
+                self.metadata[position] = self.metadata[last]
+                self.positions[moved_id] = position
+
+            self.ids.pop()
+            self.metadata.pop()
+            self.size -= 1
+            deleted += 1
+        return deleted
+
+    def scores(self, queries: "np.ndarray") -> "np.ndarray":
+        """
+        计算查询与所有向量的分数，分数越大越相似
+
+        L2度量返回负的平方距离
+        """
+        vectors = self.vectors[:self.size]
+        products = queries @ vectors.T
+
+        if self.metric_type == "IP":
+            return products
+        if self.metric_type == "L2":
+            query_sq = np.einsum("ij,ij->i", queries, queries)[:, None]
+            return -(query_sq - 2 * products + self.norms[:self.size] ** 2)
+
+        # 默认余弦
+        query_norms = np.linalg.norm(queries, axis=1)[:, None]
+        denominator = query_norms * self.norms[:self.size]
+        return products / np.where(denominator == 0, 1.0, denominator)
+
+    def memory_usage(self) -> int:
+        """向量矩阵占用的字节数"""
+        return int(self.vectors.nbytes + self.norms.nbytes)
+
+
+class InMemoryVectorStore(VectorStorage):
+    """
+    内存向量存储适配器
+    使用NumPy暴力检索给出精确的top_k结果
+    """
+
+    def __init__(self, name: str = "memory", config: Optional[Dict[str, Any]] = None):
+        """
+        初始化内存向量存储
+
+        参数:
+            name: 存储名称
+            config: 配置参数
+        """
+        super().__init__(name, config)
+        self._collections: Dict[str, _MemoryCollection] = {}
+
+    async def initialize(self) -> None:
+        """初始化内存向量存储"""
+        if self._initialized:
+            return
+
+        if not NUMPY_AVAILABLE:
+            raise VectorStoreError("NumPy依赖库未安装")
+
+        self._initialized = True
+        self._connected = True
+
+    async def connect(self) -> bool:
+        """建立连接"""
+        if not self._initialized:
+            await self.initialize()
+        return self._connected
+
+    async def disconnect(self) -> None:
+        """断开连接"""
+        self._connected = False
+
+    async def health_check(self) -> bool:
+        """健康检查"""
+        return self._connected
+
+    async def create_collection(self, name: str, dimension: int, **kwargs) -> bool:
+        """
+        创建向量集合
+
+        参数:
+            name: 集合名称
+            dimension: 向量维度
+            **kwargs: 支持metric_type (COSINE, IP, L2)，默认COSINE
+        """
+        if not self._connected:
+            await self.connect()
+
+        if name not in self._collections:
+            self._collections[name] = _MemoryCollection(
+                dimension, kwargs.get("metric_type", "COSINE")
+            )
+        return True
+
+    async def add_vectors(self,
+                         collection: str,
+                         vectors: List[List[float]],
+                         ids: Optional[List[Union[int, str]]] = None,
+                         metadata: Optional[List[Dict[str, Any]]] = None) -> bool:
+        """添加向量，ID已存在时覆盖"""
+        coll = self._get_collection(collection)
+
+        data = np.asarray(vectors, dtype=np.float32)
+        if data.ndim != 2 or data.shape[1] != coll.dimension:
+            raise VectorStoreError(
+                f"向量维度不匹配，期望 {coll.dimension}", collection=collection
+            )
+
+        vector_ids = [
+            str(ids[i]) if ids and i < len(ids) else str(uuid.uuid4())
+            for i in range(len(data))
+        ]
+        metas = [
+            dict(metadata[i]) if metadata and i < len(metadata) else {}
+            for i in range(len(data))
+        ]
+        coll.upsert(vector_ids, data, metas)
+        return True
+
+    async def search_vectors(self,
+                           collection: str,
+                           query_vector: List[float],
+                           top_k: int = 10,
+                           filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """搜索相似向量"""
+        results = await self.search_many(collection, [query_vector], top_k, filters)
+        return results[0]
+
+    async def search_many(self,
+                          collection: str,
+                          query_vectors: List[List[float]],
+                          top_k: int = 10,
+                          filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        批量搜索相似向量
+
+        参数:
+            collection: 集合名称
+            query_vectors: 查询向量列表
+            top_k: 每个查询返回的结果数量
+            filters: 元数据等值过滤条件，值为列表时表示取值之一
+
+        返回:
+            与查询向量一一对应的结果列表
+        """
+        coll = self._get_collection(collection)
+        if len(query_vectors) == 0:
+            return []
+        if coll.size == 0:
+            return [[] for _ in query_vectors]
+
+        queries = np.asarray(query_vectors, dtype=np.float32).reshape(-1, coll.dimension)
+        scores = coll.scores(queries)
+
+        if filters:
+            scores = np.where(self._filter_mask(coll, filters)[None, :], scores, -np.inf)
+
+        k = min(top_k, coll.size)
+        # 先用argpartition取候选再排序，避免全量排序
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        results = []
+        for row, positions in enumerate(candidates):
+            ordered = positions[np.argsort(-scores[row, positions])]
+            hits = []
+            for position in ordered:
+                score = float(scores[row, position])
+                if score == -np.inf:
+                    continue
+                meta = coll.metadata[position]
+                hits.append({
+                    "id": coll.ids[position],
+                    "document_id": meta.get("document_id"),
+                    "chunk_id": meta.get("chunk_id"),
+                    "content": meta.get("content"),
+                    "metadata": meta.get("metadata", {}),
+                    "score": score
+                })
+            results.append(hits)
+        return results
+
+    async def delete_vectors(self,
+                           collection: str,
+                           ids: List[Union[int, str]]) -> bool:
+        """删除向量"""
+        coll = self._get_collection(collection)
+        return coll.delete([str(vector_id) for vector_id in ids]) > 0
+
+    async def drop_collection(self, name: str) -> bool:
+        """删除集合"""
+        return self._collections.pop(name, None) is not None
+
+    async def get_collection_stats(self, name: str) -> Dict[str, Any]:
+        """获取集合统计信息"""
+        coll = self._get_collection(name)
+        return {
+            "name": name,
+            "total_vectors": coll.size,
+            "memory_bytes": coll.memory_usage(),
+            "backend": "memory"
+        }
+
+    def _filter_mask(self, coll: _MemoryCollection, filters: Dict[str, Any]) -> "np.ndarray":
+        """计算满足过滤条件的行掩码"""
+        mask = np.ones(coll.size, dtype=bool)
+        for position, meta in enumerate(coll.metadata):
+            for key, expected in filters.items():
+                value = meta.get(key, meta.get("metadata", {}).get(key))
+                if isinstance(expected, (list, tuple, set)):
+                    matched = value in expected
+                else:
+                    matched = value == expected
+                if not matched:
+                    mask[position] = False
+                    break
+        return mask
+
+    def _get_collection(self, name: str) -> _MemoryCollection:
+        """获取集合对象"""
+        if name not in self._collections:
+            raise VectorStoreError(f"集合 {name} 不存在", collection=name)
+        return self._collections[name]
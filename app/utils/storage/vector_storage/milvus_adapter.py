@@ -1,10 +1,15 @@
 """
 Milvus向量存储适配器
+写入和删除先进入缓冲区，按批量大小或时间间隔异步刷新；所有pymilvus调用都在线程中执行
 """
 
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Tuple
 import logging
 import asyncio
+import json
+import re
+import time
+from collections import deque
 from ..core.base import VectorStorage
 from ..core.exceptions import VectorStoreError, ConnectionError
 
@@ -36,11 +41,86 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# 过滤字段名只允许标识符，避免拼接出非法表达式
+_FIELD_NAME_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# 过滤操作符到Milvus表达式操作符的映射
+_FILTER_OPERATORS = {
+    "$eq": "==",
+    "$ne": "!=",
+    "$gt": ">",
+    "$gte": ">=",
+    "$lt": "<",
+    "$lte": "<=",
+}
+
+
+def _format_expr_value(value: Any) -> str:
+    """格式化表达式中的字面量"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, (list, tuple, set)):
+        return "[" + ", ".join(_format_expr_value(v) for v in value) + "]"
+    return json.dumps(str(value), ensure_ascii=False)
+
+
+def build_filter_expr(filters: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    将过滤条件转换为Milvus布尔表达式
+    
+    支持的写法:
+        {"document_id": 1}                     -> document_id == 1
+        {"document_id": [1, 2]}                -> document_id in [1, 2]
+        {"chunk_id": {"$gte": 10, "$lt": 20}}  -> chunk_id >= 10 and chunk_id < 20
+        {"document_id": {"$in": [1, 2]}}       -> document_id in [1, 2]
+        {"document_id": {"$nin": [1, 2]}}      -> document_id not in [1, 2]
+    
+    参数:
+        filters: 过滤条件字典
+        
+    返回:
+        表达式字符串，无过滤条件时返回None
+    """
+    if not filters:
+        return None
+    
+    clauses = []
+    for field_name, condition in filters.items():
+        if not _FIELD_NAME_PATTERN.match(str(field_name)):
+            raise VectorStoreError(f"非法的过滤字段: {field_name}")
+        
+        if isinstance(condition, dict):
+            for op, value in condition.items():
+                if op == "$in":
+                    clauses.append(f"{field_name} in {_format_expr_value(list(value))}")
+                elif op == "$nin":
+                    clauses.append(f"{field_name} not in {_format_expr_value(list(value))}")
+                elif op in _FILTER_OPERATORS:
+                    clauses.append(f"{field_name} {_FILTER_OPERATORS[op]} {_format_expr_value(value)}")
+                else:
+                    raise VectorStoreError(f"不支持的过滤操作符: {op}")
+        elif isinstance(condition, (list, tuple, set)):
+            clauses.append(f"{field_name} in {_format_expr_value(list(condition))}")
+        else:
+            clauses.append(f"{field_name} == {_format_expr_value(condition)}")
+    
+    return " and ".join(clauses) if clauses else None
+
 
 class MilvusVectorStore(VectorStorage):
     """
     Milvus向量存储适配器
     实现基于Milvus的向量存储功能
+    
+    插入和删除先写入按集合划分的缓冲区，缓冲达到write_buffer_size或超过
+    write_flush_interval秒时批量提交；集合只在首次搜索时加载一次。
+    
+    提交按步骤重试：插入失败时插入和删除都放回缓冲区，插入成功而删除失败时只放回删除。
+    同一集合连续插入失败达到write_max_retries次且连接正常时，二分定位无法写入的行，
+    其余行照常写入，无法写入的行移入死信列表。缓冲区达到write_buffer_max时写入方
+    同步提交，提交仍失败则拒绝新的写入。
     """
     
     def __init__(self, name: str = "milvus", config: Optional[Dict[str, Any]] = None):
@@ -49,11 +129,49 @@ class MilvusVectorStore(VectorStorage):
         
         参数:
             name: 存储名称
-            config: 配置参数
+            config: 配置参数，除连接参数外支持:
+                write_buffer_size: 缓冲区批量大小，0表示不缓冲直接写入
+                write_flush_interval: 缓冲区最长停留时间（秒）
+                write_buffer_max: 单个集合缓冲区的最大条目数，默认为批量大小的10倍
+                write_max_retries: 连续插入失败多少次后定位并剔除无法写入的行
+                dead_letter_size: 每个集合保留的死信行数
+                search_params: 搜索参数
         """
         super().__init__(name, config)
         self._connection_alias = f"milvus_{name}"
         self._collections = {}
+        
+        self._write_buffer_size = int(self.get_config("write_buffer_size", 1000))
+        self._flush_interval = float(self.get_config("write_flush_interval", 1.0))
+        self._write_buffer_max = int(self.get_config("write_buffer_max", self._write_buffer_size * 10))
+        self._max_write_retries = max(1, int(self.get_config("write_max_retries", 3)))
+        self._dead_letter_size = int(self.get_config("dead_letter_size", 1000))
+        self._search_params = self.get_config(
+            "search_params", {"metric_type": "L2", "params": {"nprobe": 10}}
+        )
+        
+        # 集合名 -> 待插入行 [(chunk_id, document_id, vector)]
+        self._pending_inserts: Dict[str, List[Tuple[Any, Any, List[float]]]] = {}
+        # 集合名 -> 待删除主键
+        self._pending_deletes: Dict[str, List[Union[int, str]]] = {}
+        self._buffer_started_at: Dict[str, float] = {}
+        # 集合名 -> 连续插入失败次数
+        self._insert_failures: Dict[str, int] = {}
+        # 集合名 -> 无法写入的行 (行, 错误信息)
+        self._dead_letters: Dict[str, deque] = {}
+        # 集合名 -> 向量维度
+        self._dimensions: Dict[str, Optional[int]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._background_flushes: set = set()
+        
+        # 已加载到内存的集合
+        self._loaded_collections: set = set()
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+    
+    async def _run(self, func, *args, **kwargs):
+        """在线程中执行阻塞的pymilvus调用"""
+        return await asyncio.to_thread(func, *args, **kwargs)
     
     async def initialize(self) -> None:
         """初始化Milvus向量存储"""
@@ -63,13 +181,14 @@ class MilvusVectorStore(VectorStorage):
         if not MILVUS_AVAILABLE:
             raise VectorStoreError("Milvus依赖库未安装")
         
+        # 从配置获取连接参数
+        host = self.get_config("vector_store_host", "localhost")
+        port = self.get_config("vector_store_port", 19530)
+        
         try:
-            # 从配置获取连接参数
-            host = self.get_config("vector_store_host", "localhost")
-            port = self.get_config("vector_store_port", 19530)
-            
             # 建立连接
-            connections.connect(
+            await self._run(
+                connections.connect,
                 alias=self._connection_alias,
                 host=host,
                 port=port
@@ -82,6 +201,9 @@ class MilvusVectorStore(VectorStorage):
         except Exception as e:
             self.logger.error(f"Milvus初始化失败: {str(e)}")
             raise ConnectionError(f"Milvus连接失败: {str(e)}", endpoint=f"{host}:{port}")
+        
+        if self._write_buffer_size > 0 and self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
     
     async def connect(self) -> bool:
         """建立连接"""
@@ -90,11 +212,25 @@ class MilvusVectorStore(VectorStorage):
         return self._connected
     
     async def disconnect(self) -> None:
-        """断开连接"""
+        """断开连接，断开前提交缓冲区中的写入"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        
+        try:
+            if self._connected:
+                await self.flush()
+        except Exception as e:
+            self.logger.error(f"断开前刷新写缓冲失败: {str(e)}")
+        
         try:
             if MILVUS_AVAILABLE and self._connection_alias in connections.list_connections():
-                connections.disconnect(self._connection_alias)
+                await self._run(connections.disconnect, self._connection_alias)
             self._connected = False
+            self._initialized = False
+            self._loaded_collections.clear()
+            self._collections.clear()
+            self._dimensions.clear()
             self.logger.info("Milvus连接已断开")
         except Exception as e:
             self.logger.error(f"断开Milvus连接失败: {str(e)}")
@@ -106,7 +242,7 @@ class MilvusVectorStore(VectorStorage):
                 return False
             
             # 尝试列出集合来验证连接
-            utility.list_collections(using=self._connection_alias)
+            await self._run(utility.list_collections, using=self._connection_alias)
             return True
         except Exception as e:
             self.logger.warning(f"Milvus健康检查失败: {str(e)}")
@@ -122,7 +258,7 @@ class MilvusVectorStore(VectorStorage):
                 await self.connect()
             
             # 检查集合是否已存在
-            if utility.has_collection(name, using=self._connection_alias):
+            if await self._run(utility.has_collection, name, using=self._connection_alias):
                 self.logger.info(f"集合 {name} 已存在")
                 return True
             
@@ -141,7 +277,9 @@ class MilvusVectorStore(VectorStorage):
             
             # 创建collection schema
             schema = CollectionSchema(fields=fields, description=f"向量集合: {name}")
-            collection = Collection(name=name, schema=schema, using=self._connection_alias)
+            collection = await self._run(
+                Collection, name=name, schema=schema, using=self._connection_alias
+            )
             
             # 创建索引
             index_params = kwargs.get("index_params", {
@@ -150,7 +288,7 @@ class MilvusVectorStore(VectorStorage):
                 "params": {"nlist": 1024}
             })
             
-            collection.create_index(field_name="embedding", index_params=index_params)
+            await self._run(collection.create_index, field_name="embedding", index_params=index_params)
             
             # 缓存集合对象
             self._collections[name] = collection
@@ -167,7 +305,7 @@ class MilvusVectorStore(VectorStorage):
                          vectors: List[List[float]], 
                          ids: Optional[List[Union[int, str]]] = None,
                          metadata: Optional[List[Dict[str, Any]]] = None) -> bool:
-        """添加向量"""
+        """添加向量（写入缓冲区，批量提交）"""
         if not MILVUS_AVAILABLE:
             raise VectorStoreError("Milvus依赖库未安装")
             
@@ -175,29 +313,39 @@ class MilvusVectorStore(VectorStorage):
             if not self._connected:
                 await self.connect()
             
-            # 获取集合对象
-            coll = self._get_collection(collection)
+            # 校验集合存在以及向量维度，维度不符的向量永远无法写入，直接拒绝
+            coll = await self._get_collection(collection)
+            dimension = self._collection_dimension(collection, coll)
+            if dimension is not None:
+                invalid = [i for i, vector in enumerate(vectors) if len(vector) != dimension]
+                if invalid:
+                    raise VectorStoreError(
+                        f"向量维度与集合不符（期望 {dimension}），位置: {invalid[:10]}",
+                        collection=collection
+                    )
             
             # 准备数据
-            chunk_ids = []
-            document_ids = []
-            
             if metadata:
-                for meta in metadata:
-                    chunk_ids.append(meta.get("chunk_id", 0))
-                    document_ids.append(meta.get("document_id", 0))
+                rows = [
+                    (meta.get("chunk_id", 0), meta.get("document_id", 0), vector)
+                    for meta, vector in zip(metadata, vectors)
+                ]
             else:
-                chunk_ids = list(range(len(vectors)))
-                document_ids = [0] * len(vectors)
+                rows = [(index, 0, vector) for index, vector in enumerate(vectors)]
             
-            # 插入数据
-            data = [chunk_ids, document_ids, vectors]
-            coll.insert(data)
-            coll.flush()
+            if self._write_buffer_size <= 0:
+                await self._insert_rows(collection, rows)
+            else:
+                await self._reserve_buffer(collection, len(rows))
+                self._pending_inserts.setdefault(collection, []).extend(rows)
+                self._buffer_started_at.setdefault(collection, time.monotonic())
+                self._maybe_schedule_flush(collection)
             
-            self.logger.info(f"成功添加 {len(vectors)} 个向量到集合 {collection}")
+            self.logger.debug(f"已接收 {len(vectors)} 个向量，目标集合 {collection}")
             return True
             
+        except VectorStoreError:
+            raise
         except Exception as e:
             self.logger.error(f"添加向量失败: {str(e)}")
             raise VectorStoreError(f"添加向量失败: {str(e)}", collection=collection)
@@ -208,44 +356,78 @@ class MilvusVectorStore(VectorStorage):
                            top_k: int = 10,
                            filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """搜索相似向量"""
+        results = await self.search_many(collection, [query_vector], top_k, filters)
+        return results[0] if results else []
+    
+    async def search_many(self,
+                          collection: str,
+                          query_vectors: List[List[float]],
+                          top_k: int = 10,
+                          filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """
+        批量搜索相似向量
+        
+        多个查询向量（子问题、查询扩展等）通过一次ANN调用完成
+        
+        参数:
+            collection: 集合名称
+            query_vectors: 查询向量列表
+            top_k: 每个查询返回的结果数量
+            filters: 过滤条件，对所有查询生效
+            
+        返回:
+            与查询向量一一对应的结果列表
+        """
         if not MILVUS_AVAILABLE:
             raise VectorStoreError("Milvus依赖库未安装")
+        
+        if len(query_vectors) == 0:
+            return []
             
         try:
             if not self._connected:
                 await self.connect()
             
+            # 保证读到本集合缓冲中的写入
+            if self._pending_inserts.get(collection) or self._pending_deletes.get(collection):
+                await self.flush(collection)
+            
             # 获取集合对象
-            coll = self._get_collection(collection)
-            coll.load()
+            coll = await self._get_collection(collection)
+            await self._ensure_loaded(collection, coll)
             
             # 准备查询向量
-            if not isinstance(query_vector, np.ndarray):
-                query_vector = np.array([query_vector])
+            data = np.asarray(query_vectors, dtype=np.float32)
+            if data.ndim == 1:
+                data = data.reshape(1, -1)
             
             # 执行搜索
-            search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
-            results = coll.search(
-                data=query_vector,
+            results = await self._run(
+                coll.search,
+                data=data.tolist(),
                 anns_field="embedding",
-                param=search_params,
+                param=self._search_params,
                 limit=top_k,
+                expr=build_filter_expr(filters),
                 output_fields=["chunk_id", "document_id"]
             )
             
             # 格式化结果
-            formatted_results = []
-            for hits in results:
-                for hit in hits:
-                    formatted_results.append({
+            return [
+                [
+                    {
                         "id": hit.id,
                         "chunk_id": hit.entity.get("chunk_id"),
                         "document_id": hit.entity.get("document_id"),
                         "score": hit.distance
-                    })
-            
-            return formatted_results
+                    }
+                    for hit in hits
+                ]
+                for hits in results
+            ]
             
+        except VectorStoreError:
+            raise
         except Exception as e:
             self.logger.error(f"搜索向量失败: {str(e)}")
             raise VectorStoreError(f"搜索向量失败: {str(e)}", collection=collection)
@@ -253,7 +435,7 @@ class MilvusVectorStore(VectorStorage):
     async def delete_vectors(self,
                            collection: str,
                            ids: List[Union[int, str]]) -> bool:
-        """删除向量"""
+        """删除向量（写入缓冲区，批量提交）"""
         if not MILVUS_AVAILABLE:
             raise VectorStoreError("Milvus依赖库未安装")
             
@@ -261,33 +443,235 @@ class MilvusVectorStore(VectorStorage):
             if not self._connected:
                 await self.connect()
             
-            # 获取集合对象
-            coll = self._get_collection(collection)
+            await self._get_collection(collection)
             
-            # 构建删除表达式
-            id_list = [str(id_val) for id_val in ids]
-            expr = f"id in [{','.join(id_list)}]"
-            
-            # 执行删除
-            coll.delete(expr)
-            coll.flush()
+            if self._write_buffer_size <= 0:
+                await self._delete_ids(collection, list(ids))
+            else:
+                await self._reserve_buffer(collection, len(ids))
+                self._pending_deletes.setdefault(collection, []).extend(ids)
+                self._buffer_started_at.setdefault(collection, time.monotonic())
+                self._maybe_schedule_flush(collection)
             
-            self.logger.info(f"成功删除 {len(ids)} 个向量从集合 {collection}")
+            self.logger.debug(f"已接收 {len(ids)} 个待删除向量，目标集合 {collection}")
             return True
             
+        except VectorStoreError:
+            raise
         except Exception as e:
             self.logger.error(f"删除向量失败: {str(e)}")
             raise VectorStoreError(f"删除向量失败: {str(e)}", collection=collection)
     
-    def _get_collection(self, name: str) -> Collection:
+    async def flush(self, collection: Optional[str] = None, seal: bool = False) -> None:
+        """
+        提交缓冲区中的写入和删除
+        
+        每个集合先插入后删除，只有失败的步骤放回缓冲区；所有集合处理完后
+        如有失败，抛出第一个错误
+        
+        参数:
+            collection: 集合名称，None表示所有集合
+            seal: 是否同时调用Milvus flush将增长段落盘
+        """
+        errors = []
+        async with self._flush_lock:
+            names = [collection] if collection else list(
+                set(self._pending_inserts) | set(self._pending_deletes)
+            )
+            for name in names:
+                rows = self._pending_inserts.pop(name, [])
+                delete_ids = self._pending_deletes.pop(name, [])
+                self._buffer_started_at.pop(name, None)
+                
+                if rows:
+                    try:
+                        await self._insert_rows(name, rows)
+                        self._insert_failures.pop(name, None)
+                    except Exception as e:
+                        # 删除尚未执行，与未写入的行一起放回，保持先插入后删除的顺序
+                        retry_rows = await self._handle_insert_failure(name, rows, e)
+                        self._requeue(name, retry_rows, delete_ids)
+                        errors.append(e)
+                        continue
+                
+                if delete_ids:
+                    try:
+                        await self._delete_ids(name, delete_ids)
+                    except Exception as e:
+                        # 插入已成功，只放回删除，避免重复插入
+                        self._requeue(name, [], delete_ids)
+                        errors.append(e)
+                        continue
+                
+                if seal and (rows or delete_ids):
+                    try:
+                        coll = await self._get_collection(name)
+                        await self._run(coll.flush)
+                    except Exception as e:
+                        # 数据已经提交，落盘失败不需要放回
+                        errors.append(e)
+        
+        if errors:
+            raise errors[0]
+    
+    def get_dead_letters(self, collection: str) -> List[Tuple[Tuple[Any, Any, List[float]], str]]:
+        """
+        获取集合中无法写入的行
+        
+        参数:
+            collection: 集合名称
+            
+        返回:
+            (行, 错误信息)列表，行为(chunk_id, document_id, vector)
+        """
+        return list(self._dead_letters.get(collection, ()))
+    
+    def _requeue(self, collection: str, rows: List[Tuple[Any, Any, List[float]]], delete_ids: List[Union[int, str]]) -> None:
+        """把未提交的行和删除放回缓冲区头部"""
+        if rows:
+            self._pending_inserts[collection] = rows + self._pending_inserts.get(collection, [])
+        if delete_ids:
+            self._pending_deletes[collection] = delete_ids + self._pending_deletes.get(collection, [])
+        if rows or delete_ids:
+            self._buffer_started_at.setdefault(collection, time.monotonic())
+    
+    async def _handle_insert_failure(self,
+                                     collection: str,
+                                     rows: List[Tuple[Any, Any, List[float]]],
+                                     error: Exception) -> List[Tuple[Any, Any, List[float]]]:
+        """
+        处理插入失败，返回需要放回缓冲区重试的行
+        
+        未达到重试次数或连接异常时整批重试；否则二分定位无法写入的行移入死信，
+        其余行在定位过程中已经写入
+        """
+        failures = self._insert_failures.get(collection, 0) + 1
+        self._insert_failures[collection] = failures
+        if failures < self._max_write_retries or not await self.health_check():
+            self.logger.warning(f"插入集合 {collection} 失败（第 {failures} 次），稍后重试: {str(error)}")
+            return rows
+        
+        self._insert_failures.pop(collection, None)
+        bad_rows = await self._isolate_bad_rows(collection, rows)
+        if bad_rows:
+            letters = self._dead_letters.setdefault(collection, deque(maxlen=self._dead_letter_size))
+            letters.extend(bad_rows)
+            self.logger.error(f"集合 {collection} 有 {len(bad_rows)} 行无法写入，已移入死信: {str(error)}")
+        return []
+    
+    async def _isolate_bad_rows(self,
+                                collection: str,
+                                rows: List[Tuple[Any, Any, List[float]]]) -> List[Tuple[Tuple[Any, Any, List[float]], str]]:
+        """二分插入，写入可写的行，返回无法写入的行及错误"""
+        try:
+            await self._insert_rows(collection, rows)
+            return []
+        except Exception as e:
+            if len(rows) == 1:
+                return [(rows[0], str(e))]
+        middle = len(rows) // 2
+        return (await self._isolate_bad_rows(collection, rows[:middle])
+                + await self._isolate_bad_rows(collection, rows[middle:]))
+    
+    async def _reserve_buffer(self, collection: str, incoming: int) -> None:
+        """缓冲区将超过上限时先同步提交，提交失败则拒绝写入"""
+        if self._write_buffer_max <= 0:
+            return
+        pending = len(self._pending_inserts.get(collection, [])) + len(
+            self._pending_deletes.get(collection, [])
+        )
+        if pending + incoming <= self._write_buffer_max:
+            return
+        
+        try:
+            await self.flush(collection)
+        except Exception as e:
+            pending = len(self._pending_inserts.get(collection, [])) + len(
+                self._pending_deletes.get(collection, [])
+            )
+            if pending + incoming > self._write_buffer_max:
+                raise VectorStoreError(
+                    f"写缓冲已满（{pending} 条）且提交失败: {str(e)}", collection=collection
+                )
+    
+    def _collection_dimension(self, name: str, coll: Collection) -> Optional[int]:
+        """读取集合向量字段的维度，无法确定时返回None"""
+        if name not in self._dimensions:
+            dimension = None
+            for field in getattr(getattr(coll, "schema", None), "fields", None) or []:
+                if getattr(field, "dtype", None) == DataType.FLOAT_VECTOR:
+                    dim = (getattr(field, "params", None) or {}).get("dim")
+                    dimension = int(dim) if dim is not None else None
+                    break
+            self._dimensions[name] = dimension
+        return self._dimensions[name]
+    
+    async def _insert_rows(self, collection: str, rows: List[Tuple[Any, Any, List[float]]]) -> None:
+        """批量插入行"""
+        coll = await self._get_collection(collection)
+        chunk_ids, document_ids, vectors = (list(column) for column in zip(*rows))
+        await self._run(coll.insert, [chunk_ids, document_ids, vectors])
+        self.logger.info(f"成功添加 {len(rows)} 个向量到集合 {collection}")
+    
+    async def _delete_ids(self, collection: str, ids: List[Union[int, str]]) -> None:
+        """按主键批量删除"""
+        coll = await self._get_collection(collection)
+        await self._run(coll.delete, f"id in {_format_expr_value(list(ids))}")
+        self.logger.info(f"成功删除 {len(ids)} 个向量从集合 {collection}")
+    
+    def _maybe_schedule_flush(self, collection: str) -> None:
+        """缓冲区达到批量大小时在后台提交"""
+        pending = len(self._pending_inserts.get(collection, [])) + len(
+            self._pending_deletes.get(collection, [])
+        )
+        if pending < self._write_buffer_size:
+            return
+        
+        task = asyncio.create_task(self._flush_in_background(collection))
+        self._background_flushes.add(task)
+        task.add_done_callback(self._background_flushes.discard)
+    
+    async def _flush_in_background(self, collection: Optional[str] = None) -> None:
+        """后台提交，失败只记录日志"""
+        try:
+            await self.flush(collection)
+        except Exception as e:
+            self.logger.error(f"刷新写缓冲失败: {str(e)}")
+    
+    async def _flush_loop(self) -> None:
+        """定时提交停留时间超过flush间隔的缓冲"""
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            now = time.monotonic()
+            expired = [
+                name for name, started_at in list(self._buffer_started_at.items())
+                if now - started_at >= self._flush_interval
+            ]
+            for name in expired:
+                await self._flush_in_background(name)
+    
+    async def _ensure_loaded(self, name: str, coll: Collection) -> None:
+        """确保集合已加载到内存，每个集合只加载一次"""
+        if name in self._loaded_collections:
+            return
+        
+        lock = self._load_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            if name not in self._loaded_collections:
+                await self._run(coll.load)
+                self._loaded_collections.add(name)
+    
+    async def _get_collection(self, name: str) -> Collection:
         """获取集合对象"""
         if not MILVUS_AVAILABLE:
             raise VectorStoreError("Milvus依赖库未安装")
             
         if name not in self._collections:
-            if not utility.has_collection(name, using=self._connection_alias):
+            if not await self._run(utility.has_collection, name, using=self._connection_alias):
                 raise VectorStoreError(f"集合 {name} 不存在", collection=name)
             
-            self._collections[name] = Collection(name=name, using=self._connection_alias)
+            self._collections[name] = await self._run(
+                Collection, name=name, using=self._connection_alias
+            )
         
-        return self._collections[name] 
\ No newline at end of file
+        return self._collections[name]
@@ -1,11 +1,14 @@
 """
 PostgreSQL+pgvector向量存储适配器
+表结构管理使用SQLAlchemy，批量写入和检索使用asyncpg连接池（二进制COPY、预编译语句）
 """
 
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Sequence
 import logging
 import asyncio
 import json
+import re
+import struct
 import uuid
 from datetime import datetime
 from ..core.base import VectorStorage
@@ -23,8 +26,63 @@ try:
 except ImportError:
     PGVECTOR_AVAILABLE = False
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 logger = logging.getLogger(__name__)
 
+# 表名和过滤字段只允许标识符，避免SQL注入
+_IDENTIFIER_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+# 批量写入的列顺序
+_LOAD_COLUMNS = [
+    "id", "document_id", "knowledge_base_id", "chunk_id",
+    "embedding", "content", "metadata", "created_at", "updated_at"
+]
+
+# 检索结果列
+_RESULT_COLUMNS = "id, document_id, knowledge_base_id, chunk_id, content, metadata"
+
+
+def _check_identifier(name: str) -> str:
+    """校验SQL标识符"""
+    if not _IDENTIFIER_PATTERN.match(str(name)):
+        raise VectorStoreError(f"非法的标识符: {name}")
+    return name
+
+
+def _encode_vector(value: Sequence[float]) -> bytes:
+    """编码pgvector二进制格式: int16维度 + int16保留位 + float4数组（大端）"""
+    if np is not None:
+        data = np.asarray(value, dtype=">f4")
+        return struct.pack(">HH", data.shape[0], 0) + data.tobytes()
+    return struct.pack(f">HH{len(value)}f", len(value), 0, *value)
+
+
+def _decode_vector(data: bytes) -> List[float]:
+    """解码pgvector二进制格式"""
+    dim, _ = struct.unpack_from(">HH", data)
+    if np is not None:
+        return np.frombuffer(data, dtype=">f4", count=dim, offset=4).astype(np.float32).tolist()
+    return list(struct.unpack_from(f">{dim}f", data, 4))
+
+
+def _to_text(value: Any) -> Optional[str]:
+    """VARCHAR列的值转为字符串，二进制COPY不会做隐式类型转换"""
+    return None if value is None else str(value)
+
+
+def _encode_jsonb(value: Any) -> bytes:
+    """编码jsonb二进制格式: 版本号1 + JSON文本"""
+    return b"\x01" + json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def _decode_jsonb(data: bytes) -> Any:
+    """解码jsonb二进制格式"""
+    return json.loads(data[1:].decode("utf-8"))
+
 Base = declarative_base()
 
 
@@ -61,6 +119,9 @@ class PgVectorStore(VectorStorage):
         self._engine = None
         self._session_factory = None
         self._tables = {}
+        self._database_url = None
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
         
     async def initialize(self) -> None:
         """初始化PostgreSQL+pgvector向量存储"""
@@ -80,6 +141,7 @@ class PgVectorStore(VectorStorage):
                 password = self.get_config("password", "password")
                 database = self.get_config("database", "postgres")
                 database_url = f"postgresql://{user}:{password}@{host}:{port}/{database}"
+            self._database_url = database_url
             
             # 创建数据库引擎
             self._engine = create_engine(database_url, echo=False)
@@ -121,6 +183,33 @@ class PgVectorStore(VectorStorage):
             self.logger.error(f"创建表结构失败: {str(e)}")
             raise
     
+    async def _get_pool(self):
+        """获取asyncpg连接池，首次使用时创建"""
+        if self._pool is not None:
+            return self._pool
+        
+        async with self._pool_lock:
+            if self._pool is None:
+                # asyncpg不识别SQLAlchemy的驱动后缀
+                dsn = re.sub(r"^postgresql\+\w+://", "postgresql://", self._database_url)
+                self._pool = await asyncpg.create_pool(
+                    dsn,
+                    min_size=self.get_config("pool_min_size", 1),
+                    max_size=self.get_config("pool_max_size", 10),
+                    init=self._init_connection
+                )
+        return self._pool
+    
+    async def _init_connection(self, conn) -> None:
+        """为连接注册vector和jsonb的二进制编解码器"""
+        await conn.set_type_codec(
+            "vector", encoder=_encode_vector, decoder=_decode_vector, format="binary"
+        )
+        await conn.set_type_codec(
+            "jsonb", encoder=_encode_jsonb, decoder=_decode_jsonb,
+            schema="pg_catalog", format="binary"
+        )
+    
     async def connect(self) -> bool:
         """建立连接"""
         if not self._initialized:
@@ -129,6 +218,9 @@ class PgVectorStore(VectorStorage):
     
     async def disconnect(self) -> None:
         """断开连接"""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
         if self._engine:
             self._engine.dispose()
         self._connected = False
@@ -262,142 +354,268 @@ class PgVectorStore(VectorStorage):
                          vectors: List[List[float]], 
                          ids: Optional[List[Union[int, str]]] = None,
                          metadata: Optional[List[Dict[str, Any]]] = None) -> bool:
-        """添加向量"""
+        """添加向量（按主键批量写入或更新）"""
+        await self.bulk_load(collection, vectors, ids=ids, metadata=metadata)
+        return True
+    
+    async def bulk_load(self,
+                        collection: str,
+                        vectors: Sequence[Sequence[float]],
+                        ids: Optional[List[Union[uuid.UUID, str]]] = None,
+                        metadata: Optional[List[Dict[str, Any]]] = None,
+                        batch_size: Optional[int] = None) -> int:
+        """
+        批量导入向量
+        
+        每批数据以二进制COPY写入临时表，再通过一条INSERT ... ON CONFLICT合并到目标表
+        
+        参数:
+            collection: 集合（表）名称
+            vectors: 向量列表
+            ids: 主键列表，未提供时自动生成
+            metadata: 元数据列表，包含document_id、knowledge_base_id、chunk_id、content、metadata
+            batch_size: 每批行数，默认读取配置bulk_batch_size
+            
+        返回:
+            写入的行数
+        """
+        _check_identifier(collection)
+        batch_size = batch_size or self.get_config("bulk_batch_size", 10000)
+        
         try:
             if not self._connected:
                 await self.connect()
             
-            session = self._session_factory()
-            
-            try:
-                for i, vector in enumerate(vectors):
-                    # 准备数据
-                    data = {
-                        "embedding": vector,
-                        "created_at": datetime.utcnow(),
-                        "updated_at": datetime.utcnow()
-                    }
-                    
-                    # 添加ID
-                    if ids and i < len(ids):
-                        data["id"] = ids[i]
-                    
-                    # 添加元数据
-                    if metadata and i < len(metadata):
-                        meta = metadata[i]
-                        data.update({
-                            "document_id": meta.get("document_id"),
-                            "knowledge_base_id": meta.get("knowledge_base_id"),
-                            "chunk_id": meta.get("chunk_id"),
-                            "content": meta.get("content"),
-                            "metadata": meta.get("metadata", {})
-                        })
-                    
-                    # 构建插入SQL
-                    placeholders = ", ".join([f":{key}" for key in data.keys()])
-                    columns = ", ".join(data.keys())
-                    
-                    sql = f"""
-                    INSERT INTO {collection} ({columns}) 
-                    VALUES ({placeholders})
-                    """
-                    
-                    session.execute(text(sql), data)
+            pool = await self._get_pool()
+            total = 0
+            
+            for start in range(0, len(vectors), batch_size):
+                end = min(start + batch_size, len(vectors))
+                now = datetime.utcnow()
+                records = []
+                for i in range(start, end):
+                    meta = metadata[i] if metadata and i < len(metadata) else {}
+                    row_id = ids[i] if ids and i < len(ids) else uuid.uuid4()
+                    records.append((
+                        row_id if isinstance(row_id, uuid.UUID) else uuid.UUID(str(row_id)),
+                        _to_text(meta.get("document_id")),
+                        _to_text(meta.get("knowledge_base_id")),
+                        _to_text(meta.get("chunk_id")),
+                        vectors[i],
+                        meta.get("content"),
+                        meta.get("metadata", {}),
+                        now,
+                        now
+                    ))
                 
-                session.commit()
-                self.logger.info(f"成功向表 {collection} 添加 {len(vectors)} 个向量")
-                return True
+                async with pool.acquire() as conn:
+                    async with conn.transaction():
+                        staging = f"_{collection}_staging"
+                        await conn.execute(
+                            f"CREATE TEMP TABLE IF NOT EXISTS {staging} "
+                            f"(LIKE {collection} INCLUDING DEFAULTS) ON COMMIT DROP"
+                        )
+                        await conn.copy_records_to_table(
+                            staging, records=records, columns=_LOAD_COLUMNS
+                        )
+                        columns = ", ".join(_LOAD_COLUMNS)
+                        updates = ", ".join(
+                            f"{column} = EXCLUDED.{column}"
+                            for column in _LOAD_COLUMNS if column not in ("id", "created_at")
+                        )
+                        await conn.execute(
+                            f"INSERT INTO {collection} ({columns}) "
+                            f"SELECT {columns} FROM {staging} "
+                            f"ON CONFLICT (id) DO UPDATE SET {updates}"
+                        )
                 
-            finally:
-                session.close()
+                total += len(records)
+            
+            self.logger.info(f"成功向表 {collection} 添加 {total} 个向量")
+            return total
                 
+        except VectorStoreError:
+            raise
         except Exception as e:
             self.logger.error(f"添加向量失败: {str(e)}")
             raise VectorStoreError(f"添加向量失败: {str(e)}", collection=collection)
     
+    async def _apply_search_settings(self, conn, probes: Optional[int], ef_search: Optional[int]) -> None:
+        """在当前事务内设置索引检索参数"""
+        probes = probes or self.get_config("ivfflat_probes")
+        ef_search = ef_search or self.get_config("hnsw_ef_search")
+        
+        # SET不支持绑定参数，取整后拼接
+        if probes:
+            await conn.execute(f"SET LOCAL ivfflat.probes = {int(probes)}")
+        if ef_search:
+            await conn.execute(f"SET LOCAL hnsw.ef_search = {int(ef_search)}")
+    
+    def _build_where(self, filter_conditions: Optional[Dict[str, Any]], first_param: int, alias: str = ""):
+        """构建参数化的WHERE子句，返回(子句, 参数列表)"""
+        if not filter_conditions:
+            return "", []
+        
+        prefix = f"{alias}." if alias else ""
+        clauses = []
+        params = []
+        for offset, (key, value) in enumerate(filter_conditions.items()):
+            clauses.append(f"{prefix}{_check_identifier(key)} = ${first_param + offset}")
+            params.append(value)
+        return " WHERE " + " AND ".join(clauses), params
+    
+    def _format_row(self, row) -> Dict[str, Any]:
+        """格式化检索结果行"""
+        distance = float(row["distance"])
+        return {
+            "id": str(row["id"]),
+            "document_id": row["document_id"],
+            "knowledge_base_id": row["knowledge_base_id"],
+            "chunk_id": row["chunk_id"],
+            "content": row["content"],
+            "metadata": row["metadata"],
+            "score": 1 - distance,  # 转换为相似度分数
+            "distance": distance
+        }
+    
     async def search_vectors(self, 
                            collection: str,
                            query_vector: List[float],
                            top_k: int = 10,
-                           filter_conditions: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-        """搜索相似向量"""
+                           filter_conditions: Optional[Dict[str, Any]] = None,
+                           probes: Optional[int] = None,
+                           ef_search: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        搜索相似向量
+        
+        参数:
+            collection: 集合（表）名称
+            query_vector: 查询向量
+            top_k: 返回结果数量
+            filter_conditions: 等值过滤条件
+            probes: ivfflat索引的probes，仅对本次查询生效
+            ef_search: hnsw索引的ef_search，仅对本次查询生效
+            
+        返回:
+            检索结果列表
+        """
+        _check_identifier(collection)
+        
         try:
             if not self._connected:
                 await self.connect()
             
-            # 构建搜索SQL
-            distance_metric = "embedding <=> %s"  # 余弦距离
-            base_sql = f"""
-            SELECT 
-                id,
-                document_id,
-                knowledge_base_id,
-                chunk_id,
-                content,
-                metadata,
-                {distance_metric} as distance
-            FROM {collection}
+            # 余弦距离；asyncpg按SQL文本缓存预编译语句，相同过滤字段的查询复用同一语句
+            where_sql, filter_params = self._build_where(filter_conditions, first_param=3)
+            sql = f"""
+            SELECT {_RESULT_COLUMNS}, embedding <=> $1 AS distance
+            FROM {collection}{where_sql}
+            ORDER BY distance
+            LIMIT $2
             """
             
-            # 添加过滤条件
-            where_conditions = []
-            params = [str(query_vector)]
-            
-            if filter_conditions:
-                for key, value in filter_conditions.items():
-                    where_conditions.append(f"{key} = %s")
-                    params.append(value)
-            
-            if where_conditions:
-                base_sql += " WHERE " + " AND ".join(where_conditions)
+            pool = await self._get_pool()
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    await self._apply_search_settings(conn, probes, ef_search)
+                    rows = await conn.fetch(sql, query_vector, top_k, *filter_params)
             
-            # 添加排序和限制
-            sql = f"{base_sql} ORDER BY distance LIMIT %s"
-            params.append(top_k)
-            
-            with self._engine.connect() as conn:
-                result = conn.execute(text(sql), params)
-                results = []
-                
-                for row in result:
-                    results.append({
-                        "id": str(row.id),
-                        "document_id": row.document_id,
-                        "knowledge_base_id": row.knowledge_base_id,
-                        "chunk_id": row.chunk_id,
-                        "content": row.content,
-                        "metadata": row.metadata,
-                        "score": float(1 - row.distance),  # 转换为相似度分数
-                        "distance": float(row.distance)
-                    })
-                
-                self.logger.info(f"在表 {collection} 中搜索到 {len(results)} 个结果")
-                return results
+            results = [self._format_row(row) for row in rows]
+            self.logger.debug(f"在表 {collection} 中搜索到 {len(results)} 个结果")
+            return results
                 
+        except VectorStoreError:
+            raise
         except Exception as e:
             self.logger.error(f"搜索向量失败: {str(e)}")
             raise VectorStoreError(f"搜索向量失败: {str(e)}", collection=collection)
     
+    async def search_many(self,
+                          collection: str,
+                          query_vectors: List[List[float]],
+                          top_k: int = 10,
+                          filter_conditions: Optional[Dict[str, Any]] = None,
+                          probes: Optional[int] = None,
+                          ef_search: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """
+        批量搜索相似向量
+        
+        多个查询向量在一条SQL中通过LATERAL连接分别取top_k
+        
+        参数:
+            collection: 集合（表）名称
+            query_vectors: 查询向量列表
+            top_k: 每个查询返回的结果数量
+            filter_conditions: 等值过滤条件，对所有查询生效
+            probes: ivfflat索引的probes
+            ef_search: hnsw索引的ef_search
+            
+        返回:
+            与查询向量一一对应的结果列表
+        """
+        _check_identifier(collection)
+        if not query_vectors:
+            return []
+        
+        try:
+            if not self._connected:
+                await self.connect()
+            
+            where_sql, filter_params = self._build_where(filter_conditions, first_param=3, alias="t")
+            sql = f"""
+            SELECT q.idx, r.*
+            FROM unnest($1::vector[]) WITH ORDINALITY AS q(embedding, idx)
+            CROSS JOIN LATERAL (
+                SELECT {", ".join(f"t.{c.strip()}" for c in _RESULT_COLUMNS.split(","))},
+                       t.embedding <=> q.embedding AS distance
+                FROM {collection} t{where_sql}
+                ORDER BY distance
+                LIMIT $2
+            ) r
+            ORDER BY q.idx, r.distance
+            """
+            
+            pool = await self._get_pool()
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    await self._apply_search_settings(conn, probes, ef_search)
+                    rows = await conn.fetch(sql, list(query_vectors), top_k, *filter_params)
+            
+            results: List[List[Dict[str, Any]]] = [[] for _ in query_vectors]
+            for row in rows:
+                results[row["idx"] - 1].append(self._format_row(row))
+            return results
+            
+        except VectorStoreError:
+            raise
+        except Exception as e:
+            self.logger.error(f"批量搜索向量失败: {str(e)}")
+            raise VectorStoreError(f"批量搜索向量失败: {str(e)}", collection=collection)
+    
     async def delete_vectors(self, 
                            collection: str,
                            ids: List[Union[int, str]]) -> bool:
         """删除向量"""
+        _check_identifier(collection)
+        
         try:
             if not self._connected:
                 await self.connect()
             
-            # 构建删除SQL
-            placeholders = ", ".join(["%s"] * len(ids))
-            sql = f"DELETE FROM {collection} WHERE id IN ({placeholders})"
-            
-            with self._engine.connect() as conn:
-                result = conn.execute(text(sql), ids)
-                deleted_count = result.rowcount
-                conn.commit()
+            pool = await self._get_pool()
+            async with pool.acquire() as conn:
+                result = await conn.execute(
+                    f"DELETE FROM {collection} WHERE id = ANY($1::uuid[])",
+                    [uuid.UUID(str(id_val)) for id_val in ids]
+                )
             
+            # 命令标签形如 "DELETE 3"
+            deleted_count = int(result.split()[-1])
             self.logger.info(f"从表 {collection} 删除了 {deleted_count} 个向量")
             return deleted_count > 0
             
+        except VectorStoreError:
+            raise
         except Exception as e:
             self.logger.error(f"删除向量失败: {str(e)}")
             raise VectorStoreError(f"删除向量失败: {str(e)}", collection=collection)
@@ -39,6 +39,9 @@ class VectorStore(VectorStorage):
             if self._backend_type.lower() == "milvus":
                 from .milvus_adapter import MilvusVectorStore
                 self._backend = MilvusVectorStore(f"{self.name}_milvus", self.config)
+            elif self._backend_type.lower() == "memory":
+                from .memory_adapter import InMemoryVectorStore
+                self._backend = InMemoryVectorStore(f"{self.name}_memory", self.config)
             else:
                 raise ConfigurationError(f"不支持的向量存储类型: {self._backend_type}")
             
@@ -117,6 +120,26 @@ class VectorStore(VectorStorage):
             self.logger.error(f"搜索向量失败: {str(e)}")
             raise VectorStoreError(f"搜索向量失败: {str(e)}", collection=collection)
     
+    async def search_many(self,
+                          collection: str,
+                          query_vectors: List[List[float]],
+                          top_k: int = 10,
+                          filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+        """批量搜索相似向量，后端不支持批量时逐个查询"""
+        if not self._backend:
+            await self.initialize()
+        
+        try:
+            if hasattr(self._backend, "search_many"):
+                return await self._backend.search_many(collection, query_vectors, top_k, filters)
+            return [
+                await self._backend.search_vectors(collection, vector, top_k, filters)
+                for vector in query_vectors
+            ]
+        except Exception as e:
+            self.logger.error(f"批量搜索向量失败: {str(e)}")
+            raise VectorStoreError(f"批量搜索向量失败: {str(e)}", collection=collection)
+    
     async def delete_vectors(self,
                            collection: str,
                            ids: List[Union[int, str]]) -> bool:
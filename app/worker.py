@@ -84,45 +84,81 @@ def process_document_task(self, document_id: int):
     retry_backoff=True, 
     retry_kwargs={'max_retries': 2, 'countdown': 300}
 )
-def rebuild_vector_store_task(self):
+def rebuild_vector_store_task(self, knowledge_base_id: int = None, force: bool = False):
     """
     重建向量存储任务（带重试机制）
-    - 清除现有向量存储
-    - 处理所有文档
-    - 为所有文档创建嵌入向量
+    - 以服务端游标流式扫描文档，内存占用与文档总数无关
+    - 跳过内容指纹和嵌入模型都未变化的文档（force=True时全部重建）
+    - 按文档数和内容大小分批派发rebuild_vector_batch任务
+    - 每派发一批记录检查点，重试或再次执行时从检查点继续
     """
     # 使用新的标准化向量存储组件
     from app.utils.storage.vector_storage import init_milvus
-    from app.models.knowledge import Document
-    from sqlalchemy.orm import Session
+    from core.knowledge.vector_rebuild import VectorRebuildOrchestrator
     
-    # 获取数据库会话
-    db = SessionLocal()
     try:
-        logger.info("开始重建向量存储")
+        logger.info(f"开始重建向量存储: knowledge_base_id={knowledge_base_id}, force={force}")
         
         # 初始化Milvus
         init_milvus()
         
-        # 获取所有文档
-        documents = db.query(Document).all()
+        orchestrator = VectorRebuildOrchestrator(
+            session_factory=SessionLocal,
+            dispatch=lambda run_id, documents: rebuild_vector_batch_task.delay(run_id, documents),
+            knowledge_base_id=knowledge_base_id,
+            force=force
+        )
+        summary = orchestrator.run()
         
-        # 处理每个文档
-        for document in documents:
-            process_document_task.delay(document.id)
-        
-        logger.info(f"向量存储重建任务已提交，文档数量: {len(documents)}")
-        return {"status": "success", "documents_count": len(documents)}
+        logger.info(f"向量存储重建任务已提交: {summary}")
+        return {"status": "success", **summary}
     
     except Exception as exc:
         logger.error(f"向量存储重建失败: {exc}")
         
-        # 重试机制
+        # 重试机制，重试时从检查点继续
         if self.request.retries < self.retry_kwargs['max_retries']:
             logger.info(f"向量存储重建将重试，当前重试次数: {self.request.retries}")
             raise self.retry(exc=exc, countdown=300 * (2 ** self.request.retries))
         
         return {"status": "error", "error": str(exc)}
+
+@celery_app.task(name="rebuild_vector_batch", bind=True)
+def rebuild_vector_batch_task(self, run_id: int, documents: list):
+    """
+    重建一批文档的向量
+    
+    documents中每项为[文档ID, 内容指纹, 嵌入模型]；每个文档先删除旧向量再写入新向量，
+    向量写入成功的文档才记录索引状态，失败的文档下次重建时会重新处理；
+    整批出错时按全部失败计入运行进度，运行仍能结束
+    """
+    import asyncio
+    from app.utils.storage.vector_storage import init_milvus
+    from core.knowledge.vector_rebuild import DocumentBatchRebuilder, record_batch_result
+    
+    db = SessionLocal()
+    recorded = False
+    try:
+        init_milvus()
+        
+        indexed = asyncio.run(DocumentBatchRebuilder(db).rebuild(documents))
+        failed_count = len(documents) - len(indexed)
+        record_batch_result(db, run_id, indexed, failed_count)
+        recorded = True
+        
+        logger.info(f"文档批次重建完成: run_id={run_id}, 成功 {len(indexed)} 个，失败 {failed_count} 个")
+        return {"status": "success", "run_id": run_id, "indexed": len(indexed), "failed": failed_count}
+    
+    except Exception as exc:
+        db.rollback()
+        logger.error(f"文档批次重建失败: run_id={run_id}, 错误: {exc}")
+        if not recorded:
+            try:
+                record_batch_result(db, run_id, [], len(documents))
+            except Exception as e:
+                db.rollback()
+                logger.error(f"记录批次失败结果失败: run_id={run_id}, 错误: {str(e)}")
+        return {"status": "error", "run_id": run_id, "error": str(exc)}
     
     finally:
         db.close()
@@ -0,0 +1,442 @@
+"""
+向量存储重建编排
+用服务端游标流式扫描文档，按内容指纹和嵌入模型跳过未变化的文档，
+把需要重建的文档按数量和大小分批派发，每派发一批记录一次检查点，中断的重建从检查点继续；
+批次任务逐个文档分块、嵌入并替换其向量，向量写入成功后才记录索引状态
+"""
+
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.knowledge import Document, DocumentChunk, DocumentIndexState, KnowledgeBase, VectorRebuildRun
+
+logger = logging.getLogger(__name__)
+
+# 重建运行状态
+RUN_RUNNING = "running"
+RUN_DISPATCHED = "dispatched"
+RUN_COMPLETED = "completed"
+
+# 批次派发函数: (运行ID, [[文档ID, 内容指纹, 嵌入模型], ...])
+BatchDispatcher = Callable[[int, List[List[Any]]], None]
+
+# 向量写入函数: (文档ID, 分块ID列表, 向量列表)，写入前删除该文档已有的向量
+VectorWriter = Callable[[int, List[int], List[List[float]]], None]
+
+
+def document_fingerprint(content_md5: Optional[str],
+                         file_path: Optional[str],
+                         file_size: Optional[int],
+                         mime_type: Optional[str]) -> str:
+    """
+    计算文档内容指纹
+    
+    参数:
+        content_md5: 数据库端计算的内容MD5，内容为空时为None
+        file_path: 文件路径，内容为空时从文件提取
+        file_size: 文件大小
+        mime_type: MIME类型，影响分块方式
+    
+    返回:
+        十六进制SHA-256指纹
+    """
+    raw = f"{content_md5 or ''}|{file_path or ''}|{file_size or 0}|{mime_type or ''}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Batch:
+    """按文档数和内容字节数限定大小的批次"""
+    
+    __slots__ = ("documents", "size", "max_documents", "max_bytes")
+    
+    def __init__(self, max_documents: int, max_bytes: int):
+        self.documents: List[List[Any]] = []
+        self.size = 0
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+    
+    def add(self, document_id: int, fingerprint: str, embedding_model: str, size: int) -> None:
+        self.documents.append([document_id, fingerprint, embedding_model])
+        self.size += size
+    
+    @property
+    def full(self) -> bool:
+        return len(self.documents) >= self.max_documents or self.size >= self.max_bytes
+    
+    def take(self) -> List[List[Any]]:
+        documents = self.documents
+        self.documents = []
+        self.size = 0
+        return documents
+
+
+class VectorRebuildOrchestrator:
+    """
+    向量存储重建编排器
+    
+    扫描和检查点使用两个独立的数据库会话：提交检查点会结束事务，
+    而服务端游标只在其所在事务内有效，因此扫描会话在整个扫描期间不提交
+    """
+    
+    def __init__(self,
+                 session_factory: Callable[[], Session],
+                 dispatch: BatchDispatcher,
+                 knowledge_base_id: Optional[int] = None,
+                 force: bool = False,
+                 max_batch_documents: Optional[int] = None,
+                 max_batch_bytes: Optional[int] = None,
+                 page_size: Optional[int] = None):
+        """
+        初始化编排器
+        
+        参数:
+            session_factory: 数据库会话工厂
+            dispatch: 批次派发函数，通常提交一个Celery任务
+            knowledge_base_id: 只重建指定知识库，默认全部
+            force: 忽略索引状态，重建全部文档
+            max_batch_documents: 每批最多文档数
+            max_batch_bytes: 每批最多内容字节数
+            page_size: 服务端游标每次读取的行数
+        """
+        self.session_factory = session_factory
+        self.dispatch = dispatch
+        self.knowledge_base_id = knowledge_base_id
+        self.force = force
+        self.max_batch_documents = max_batch_documents or getattr(settings, "VECTOR_REBUILD_BATCH_DOCUMENTS", 50)
+        self.max_batch_bytes = max_batch_bytes or getattr(settings, "VECTOR_REBUILD_BATCH_BYTES", 8 * 1024 * 1024)
+        self.page_size = page_size or getattr(settings, "VECTOR_REBUILD_PAGE_SIZE", 1000)
+        self.default_embedding_model = getattr(settings, "EMBEDDING_MODEL", "")
+    
+    def _start_or_resume(self, db: Session) -> VectorRebuildRun:
+        """继续同范围内未完成扫描的运行，没有时新建"""
+        run = (
+            db.query(VectorRebuildRun)
+            .filter(
+                VectorRebuildRun.status == RUN_RUNNING,
+                VectorRebuildRun.knowledge_base_id == self.knowledge_base_id
+                if self.knowledge_base_id is not None
+                else VectorRebuildRun.knowledge_base_id.is_(None),
+                VectorRebuildRun.force == self.force
+            )
+            .order_by(VectorRebuildRun.id.desc())
+            .first()
+        )
+        if run is not None:
+            logger.info(f"继续向量存储重建: run_id={run.id}, 检查点文档ID={run.last_document_id}")
+            return run
+        
+        run = VectorRebuildRun(
+            knowledge_base_id=self.knowledge_base_id,
+            force=self.force,
+            status=RUN_RUNNING,
+            last_document_id=0,
+            scanned_documents=0,
+            skipped_documents=0,
+            dispatched_batches=0,
+            completed_batches=0,
+            indexed_documents=0,
+            failed_documents=0
+        )
+        db.add(run)
+        db.commit()
+        return run
+    
+    def _stream_documents(self, db: Session, after_id: int):
+        """按ID顺序流式读取文档指纹所需的列以及其索引状态，不加载文档内容"""
+        query = (
+            db.query(
+                Document.id,
+                func.md5(Document.content).label("content_md5"),
+                func.coalesce(func.length(Document.content), 0).label("content_length"),
+                Document.file_path,
+                Document.file_size,
+                Document.mime_type,
+                KnowledgeBase.embedding_model,
+                DocumentIndexState.content_hash.label("indexed_hash"),
+                DocumentIndexState.embedding_model.label("indexed_model")
+            )
+            .outerjoin(KnowledgeBase, Document.knowledge_base_id == KnowledgeBase.id)
+            .outerjoin(DocumentIndexState, DocumentIndexState.document_id == Document.id)
+            .filter(Document.id > after_id)
+        )
+        if self.knowledge_base_id is not None:
+            query = query.filter(Document.knowledge_base_id == self.knowledge_base_id)
+        return query.order_by(Document.id).yield_per(self.page_size)
+    
+    def run(self) -> Dict[str, Any]:
+        """
+        执行扫描和派发
+        
+        返回:
+            运行摘要
+        """
+        state_db = self.session_factory()
+        scan_db = self.session_factory()
+        try:
+            run = self._start_or_resume(state_db)
+            batch = _Batch(self.max_batch_documents, self.max_batch_bytes)
+            unsaved = 0
+            
+            def checkpoint(last_id: int) -> None:
+                run.last_document_id = last_id
+                state_db.commit()
+            
+            last_id = run.last_document_id or 0
+            for row in self._stream_documents(scan_db, last_id):
+                last_id = row.id
+                run.scanned_documents += 1
+                unsaved += 1
+                
+                fingerprint = document_fingerprint(row.content_md5, row.file_path, row.file_size, row.mime_type)
+                embedding_model = row.embedding_model or self.default_embedding_model
+                if (not self.force
+                        and row.indexed_hash == fingerprint
+                        and row.indexed_model == embedding_model):
+                    run.skipped_documents += 1
+                    # 没有待派发的文档时检查点可以越过已跳过的文档
+                    if not batch.documents and unsaved >= self.page_size:
+                        checkpoint(last_id)
+                        unsaved = 0
+                    continue
+                
+                batch.add(row.id, fingerprint, embedding_model, row.content_length or row.file_size or 0)
+                if batch.full:
+                    self.dispatch(run.id, batch.take())
+                    run.dispatched_batches += 1
+                    checkpoint(last_id)
+                    unsaved = 0
+            
+            if batch.documents:
+                self.dispatch(run.id, batch.take())
+                run.dispatched_batches += 1
+            
+            run.status = RUN_DISPATCHED
+            checkpoint(last_id)
+            _complete_if_finished(state_db, run.id)
+            state_db.refresh(run)
+            
+            logger.info(
+                f"向量存储重建扫描完成: run_id={run.id}, 扫描 {run.scanned_documents} 个文档，"
+                f"跳过 {run.skipped_documents} 个，派发 {run.dispatched_batches} 批"
+            )
+            return run_summary(run)
+        
+        except Exception:
+            state_db.rollback()
+            raise
+        
+        finally:
+            scan_db.close()
+            state_db.close()
+
+
+def _complete_if_finished(db: Session, run_id: int) -> None:
+    """扫描已结束且所有批次完成时把运行标记为完成"""
+    db.query(VectorRebuildRun).filter(
+        VectorRebuildRun.id == run_id,
+        VectorRebuildRun.status == RUN_DISPATCHED,
+        VectorRebuildRun.completed_batches >= VectorRebuildRun.dispatched_batches
+    ).update({
+        VectorRebuildRun.status: RUN_COMPLETED,
+        VectorRebuildRun.finished_at: datetime.now()
+    }, synchronize_session=False)
+    db.commit()
+
+
+def record_batch_result(db: Session,
+                        run_id: int,
+                        indexed: List[Tuple[int, str, str]],
+                        failed_count: int) -> None:
+    """
+    记录一批文档的重建结果
+    
+    参数:
+        db: 数据库会话
+        run_id: 重建运行ID
+        indexed: 成功建立索引的(文档ID, 内容指纹, 嵌入模型)列表
+        failed_count: 失败的文档数
+    """
+    if indexed:
+        states = {
+            state.document_id: state
+            for state in db.query(DocumentIndexState)
+            .filter(DocumentIndexState.document_id.in_([item[0] for item in indexed]))
+            .all()
+        }
+        now = datetime.now()
+        for document_id, fingerprint, embedding_model in indexed:
+            state = states.get(document_id)
+            if state is None:
+                db.add(DocumentIndexState(
+                    document_id=document_id,
+                    content_hash=fingerprint,
+                    embedding_model=embedding_model,
+                    indexed_at=now
+                ))
+            else:
+                state.content_hash = fingerprint
+                state.embedding_model = embedding_model
+                state.indexed_at = now
+    
+    # 计数用原子自增，多个批次任务并发完成时不会互相覆盖
+    db.query(VectorRebuildRun).filter(VectorRebuildRun.id == run_id).update({
+        VectorRebuildRun.completed_batches: VectorRebuildRun.completed_batches + 1,
+        VectorRebuildRun.indexed_documents: VectorRebuildRun.indexed_documents + len(indexed),
+        VectorRebuildRun.failed_documents: VectorRebuildRun.failed_documents + failed_count
+    }, synchronize_session=False)
+    db.commit()
+    _complete_if_finished(db, run_id)
+
+
+def milvus_vector_writer(document_id: int, chunk_ids: List[int], vectors: List[List[float]]) -> None:
+    """删除文档在Milvus中已有的向量后写入新向量，重复处理同一文档不会留下重复向量"""
+    from app.utils.storage.vector_storage import add_vectors, get_collection
+    
+    get_collection().delete(f"document_id in [{int(document_id)}]")
+    if chunk_ids:
+        add_vectors(chunk_ids, [document_id] * len(chunk_ids), vectors)
+
+
+class DocumentBatchRebuilder:
+    """
+    重建一批文档的分块和向量
+    
+    每个文档独立提交：先生成全部分块的嵌入，再替换分块行并写入向量，
+    任何一步失败都回滚该文档的数据库修改，不影响同批其他文档
+    """
+    
+    def __init__(self,
+                 db: Session,
+                 embed: Optional[Callable[[str, Optional[str]], Awaitable[List[float]]]] = None,
+                 write_vectors: Optional[VectorWriter] = None,
+                 chunk: Optional[Callable[..., Awaitable[List[Tuple[str, Dict[str, Any]]]]]] = None,
+                 extract: Optional[Callable[[str, str], Awaitable[Optional[str]]]] = None,
+                 chunk_size: Optional[int] = None,
+                 chunk_overlap: Optional[int] = None):
+        """
+        初始化批次重建器
+        
+        参数:
+            db: 数据库会话
+            embed: 异步嵌入函数(文本, 模型名)，默认get_embedding
+            write_vectors: 向量写入函数，默认milvus_vector_writer
+            chunk: 异步分块函数(内容, MIME类型, 分块大小, 分块重叠)，默认使用文档处理器的分块
+            extract: 异步文件内容提取函数(文件路径, MIME类型)，默认使用文档处理器的提取
+            chunk_size: 分块大小
+            chunk_overlap: 分块重叠
+        """
+        self.db = db
+        if embed is None:
+            from app.utils.text.embedding_utils import get_embedding
+            embed = get_embedding
+        if chunk is None or extract is None:
+            from core.knowledge.document_processor import DocumentProcessor
+            processor = DocumentProcessor(db)
+            chunk = chunk or processor._chunk_document
+            extract = extract or processor._extract_content_from_file
+        self.embed = embed
+        self.write_vectors = write_vectors or milvus_vector_writer
+        self.chunk = chunk
+        self.extract = extract
+        self.chunk_size = chunk_size or getattr(settings, "DOCUMENT_CHUNK_SIZE", 1000)
+        self.chunk_overlap = chunk_overlap or getattr(settings, "DOCUMENT_CHUNK_OVERLAP", 200)
+    
+    async def rebuild_document(self, document_id: int, embedding_model: str) -> int:
+        """
+        重建单个文档的分块和向量，失败时抛出异常，调用方负责回滚
+        
+        参数:
+            document_id: 文档ID
+            embedding_model: 嵌入模型
+        
+        返回:
+            写入的向量数
+        """
+        document = self.db.query(Document).filter(Document.id == document_id).first()
+        if document is None:
+            raise ValueError(f"文档不存在: {document_id}")
+        
+        mime_type = document.mime_type or "text/plain"
+        content = document.content
+        if not content and document.file_path:
+            content = await self.extract(document.file_path, mime_type)
+        if not content:
+            raise ValueError(f"无法获取文档内容: {document_id}")
+        
+        chunks = await self.chunk(content, mime_type, self.chunk_size, self.chunk_overlap)
+        if not chunks:
+            raise ValueError(f"文档没有可嵌入的分块: {document_id}")
+        
+        vectors = []
+        for text, _ in chunks:
+            vector = await self.embed(text, embedding_model or None)
+            # get_embedding出错时返回全零向量，写入后会污染检索结果
+            if not vector or not any(vector):
+                raise ValueError(f"分块嵌入失败: {document_id}")
+            vectors.append(vector)
+        
+        self.db.query(DocumentChunk).filter(
+            DocumentChunk.document_id == document_id
+        ).delete(synchronize_session=False)
+        rows = [
+            DocumentChunk(
+                document_id=document_id,
+                content=text,
+                meta_data={**(metadata or {}), "chunk_index": i, "total_chunks": len(chunks)}
+            )
+            for i, (text, metadata) in enumerate(chunks)
+        ]
+        self.db.add_all(rows)
+        self.db.flush()
+        
+        chunk_ids = [row.id for row in rows]
+        self.write_vectors(document_id, chunk_ids, vectors)
+        
+        for row in rows:
+            row.embedding_id = f"{document_id}_{row.id}"
+        document.status = "indexed"
+        document.error_message = None
+        self.db.commit()
+        return len(chunk_ids)
+    
+    async def rebuild(self, documents: List[List[Any]]) -> List[Tuple[int, str, str]]:
+        """
+        逐个重建一批文档
+        
+        参数:
+            documents: [[文档ID, 内容指纹, 嵌入模型], ...]
+        
+        返回:
+            向量写入成功的(文档ID, 内容指纹, 嵌入模型)列表
+        """
+        indexed = []
+        for document_id, fingerprint, embedding_model in documents:
+            try:
+                await self.rebuild_document(document_id, embedding_model)
+            except Exception as e:
+                self.db.rollback()
+                logger.warning(f"文档重建失败: {document_id}, 错误: {str(e)}")
+                continue
+            indexed.append((document_id, fingerprint, embedding_model))
+        return indexed
+
+
+def run_summary(run: VectorRebuildRun) -> Dict[str, Any]:
+    """重建运行摘要"""
+    return {
+        "run_id": run.id,
+        "status": run.status,
+        "knowledge_base_id": run.knowledge_base_id,
+        "scanned_documents": run.scanned_documents,
+        "skipped_documents": run.skipped_documents,
+        "dispatched_batches": run.dispatched_batches,
+        "completed_batches": run.completed_batches,
+        "indexed_documents": run.indexed_documents,
+        "failed_documents": run.failed_documents
+    }
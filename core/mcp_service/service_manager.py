@@ -12,7 +12,10 @@ from typing import Dict, List, Any, Optional
 from datetime import datetime
 from pathlib import Path
 
+import aiohttp
+
 from app.utils.mcp_service_registrar import get_mcp_service_registrar
+from core.mcp_service.tool_catalog import ToolCatalogCache, get_tool_catalog
 
 logger = logging.getLogger(__name__)
 
@@ -23,12 +26,17 @@ class MCPServiceManager:
     负责管理MCP服务的生命周期，包括部署、启动、停止、重启和状态查询
     """
     
-    def __init__(self, deployments_dir: Optional[str] = None):
+    def __init__(
+        self,
+        deployments_dir: Optional[str] = None,
+        tool_catalog: Optional[ToolCatalogCache] = None
+    ):
         """
         初始化MCP服务管理器
         
         参数:
             deployments_dir: 部署配置文件目录，如果不提供则使用默认目录
+            tool_catalog: 工具目录缓存，如果不提供则使用全局实例
         """
         self.deployments_dir = deployments_dir or os.path.join(
             os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
@@ -40,6 +48,9 @@ class MCPServiceManager:
         self._load_all_deployments()
         # 获取MCP服务注册器
         self.service_registrar = get_mcp_service_registrar()
+        # 工具Schema/示例缓存与共享HTTP会话
+        self.tool_catalog = tool_catalog or get_tool_catalog()
+        self._http_session: Optional[aiohttp.ClientSession] = None
     
     def _load_all_deployments(self) -> None:
         """加载所有部署配置"""
@@ -155,6 +166,9 @@ class MCPServiceManager:
         if not container_name:
             return {"status": "error", "message": "部署配置缺少容器名称"}
         
+        # 服务（重新）启动后工具定义可能变化
+        self.tool_catalog.invalidate(deployment_id)
+        
         try:
             # 检查容器是否已存在
             status = self.get_deployment_status(deployment_id)
@@ -272,6 +286,8 @@ class MCPServiceManager:
         返回:
             操作结果
         """
+        self.tool_catalog.invalidate(deployment_id)
+        
         try:
             # 先停止再启动
             stop_result = await self.stop_deployment(deployment_id)
@@ -349,6 +365,7 @@ class MCPServiceManager:
             # 从缓存中移除
             if deployment_id in self.deployments_cache:
                 del self.deployments_cache[deployment_id]
+            self.tool_catalog.invalidate(deployment_id)
             
             return {"status": "success", "message": "部署已完全删除"}
             
@@ -446,21 +463,21 @@ class MCPServiceManager:
             return {"health": "uncertain", "message": "未配置服务端口"}
         
         try:
-            import aiohttp
             health_url = f"http://localhost:{service_port}{health_endpoint}"
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(health_url, timeout=5) as response:
-                    if response.status == 200:
-                        health_result = {"health": "healthy", "message": "服务健康"}
-                        # 更新Nacos中的服务健康状态
-                        self.service_registrar.update_mcp_service_status(deployment_id, True)
-                        return health_result
-                    else:
-                        health_result = {"health": "unhealthy", "message": f"服务返回错误状态码: {response.status}"}
-                        # 更新Nacos中的服务健康状态
-                        self.service_registrar.update_mcp_service_status(deployment_id, False)
-                        return health_result
+            async with self._get_http_session().get(
+                health_url, timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                if response.status == 200:
+                    health_result = {"health": "healthy", "message": "服务健康"}
+                    # 更新Nacos中的服务健康状态
+                    self.service_registrar.update_mcp_service_status(deployment_id, True)
+                    return health_result
+                else:
+                    health_result = {"health": "unhealthy", "message": f"服务返回错误状态码: {response.status}"}
+                    # 更新Nacos中的服务健康状态
+                    self.service_registrar.update_mcp_service_status(deployment_id, False)
+                    return health_result
         
         except Exception as e:
             health_result = {"health": "unhealthy", "message": f"健康检查失败: {str(e)}"}
@@ -533,6 +550,8 @@ class MCPServiceManager:
         """
         获取工具的JSON Schema
         
+        优先从工具目录缓存读取，未命中时请求部署服务并写入缓存
+        
         参数:
             deployment_id: 部署ID
             tool_name: 工具名称
@@ -544,6 +563,11 @@ class MCPServiceManager:
         if not deployment:
             raise ValueError(f"部署不存在: {deployment_id}")
         
+        version = self._deployment_version(deployment)
+        entry = self.tool_catalog.get_entry(deployment_id, tool_name, version)
+        if entry is not None and entry.schema is not None:
+            return entry.schema
+        
         # 获取服务URL
         service_port = deployment.get("service_port")
         if not service_port:
@@ -559,25 +583,26 @@ class MCPServiceManager:
                 raise ValueError(f"服务未运行: {deployment_id}")
             
             # 发送HTTP请求获取Schema
-            async with aiohttp.ClientSession() as client:
-                response = await client.get(schema_url)
+            async with self._get_http_session().get(schema_url) as response:
                 response.raise_for_status()
-                
-                tool_data = response.json()
-                
-                # 提取Schema
-                if "schema" in tool_data:
-                    return tool_data["schema"]
-                else:
-                    # 如果没有schema字段，尝试构造一个基本schema
-                    return {
-                        "name": tool_name,
-                        "description": tool_data.get("description", ""),
-                        "parameters": {
-                            "type": "object",
-                            "properties": {}
-                        }
+                tool_data = await response.json()
+            
+            # 提取Schema
+            if "schema" in tool_data:
+                schema = tool_data["schema"]
+            else:
+                # 如果没有schema字段，尝试构造一个基本schema
+                schema = {
+                    "name": tool_name,
+                    "description": tool_data.get("description", ""),
+                    "parameters": {
+                        "type": "object",
+                        "properties": {}
                     }
+                }
+            
+            self.tool_catalog.put_entry(deployment_id, tool_name, version, schema=schema)
+            return schema
                     
         except aiohttp.ClientResponseError as e:
             logger.error(f"获取工具Schema失败: {str(e)}")
@@ -601,6 +626,11 @@ class MCPServiceManager:
         if not deployment:
             raise ValueError(f"部署不存在: {deployment_id}")
         
+        version = self._deployment_version(deployment)
+        entry = self.tool_catalog.get_entry(deployment_id, tool_name, version)
+        if entry is not None and entry.examples is not None:
+            return entry.examples
+        
         # 获取服务URL
         service_port = deployment.get("service_port")
         if not service_port:
@@ -616,34 +646,96 @@ class MCPServiceManager:
                 raise ValueError(f"服务未运行: {deployment_id}")
             
             # 发送HTTP请求获取示例
-            async with aiohttp.ClientSession() as client:
-                try:
-                    response = await client.get(examples_url)
+            try:
+                async with self._get_http_session().get(examples_url) as response:
                     response.raise_for_status()
-                    return response.json()
-                except aiohttp.ClientResponseError as e:
-                    # 如果没有示例接口，则生成一个基本示例
-                    if e.status == 404:
-                        # 获取工具Schema
-                        schema = await self.get_tool_schema(deployment_id, tool_name)
-                        
-                        # 生成一个基本示例
-                        return [
-                            {
-                                "tool_name": tool_name,
-                                "description": "基本示例",
-                                "parameters": self._generate_example_parameters(schema),
-                                "expected_result": None
-                            }
-                        ]
-                    else:
-                        raise
+                    examples = await response.json()
+            except aiohttp.ClientResponseError as e:
+                # 如果没有示例接口，则生成一个基本示例
+                if e.status == 404:
+                    # 获取工具Schema
+                    schema = await self.get_tool_schema(deployment_id, tool_name)
+                    
+                    # 生成一个基本示例
+                    examples = [
+                        {
+                            "tool_name": tool_name,
+                            "description": "基本示例",
+                            "parameters": self._generate_example_parameters(schema),
+                            "expected_result": None
+                        }
+                    ]
+                else:
+                    raise
+            
+            self.tool_catalog.put_entry(deployment_id, tool_name, version, examples=examples)
+            return examples
                     
         except Exception as e:
             logger.error(f"获取工具示例出错: {str(e)}")
             # 返回空示例列表而不是抛出异常
             return []
     
+    async def prewarm_tool_catalog(self) -> int:
+        """
+        预热工具目录缓存
+        
+        为所有运行中的部署拉取工具列表及其Schema，通常在应用启动时调用
+        
+        返回:
+            成功缓存的工具数量
+        """
+        warmed = 0
+        for deployment_id, deployment in list(self.deployments_cache.items()):
+            service_port = deployment.get("service_port")
+            if not service_port or deployment.get("status") != "running":
+                continue
+            
+            try:
+                tools_url = f"http://localhost:{service_port}/api/mcp/tools"
+                async with self._get_http_session().get(
+                    tools_url, timeout=aiohttp.ClientTimeout(total=10)
+                ) as response:
+                    response.raise_for_status()
+                    tools_data = await response.json()
+            except Exception as e:
+                logger.warning(f"预热部署 {deployment_id} 的工具目录失败: {str(e)}")
+                continue
+            
+            if isinstance(tools_data, dict):
+                tools_data = tools_data.get("tools", [])
+            
+            names = [
+                tool.get("name") if isinstance(tool, dict) else tool
+                for tool in tools_data or []
+            ]
+            results = await asyncio.gather(
+                *[self.get_tool_schema(deployment_id, name) for name in names if name],
+                return_exceptions=True
+            )
+            warmed += sum(1 for result in results if not isinstance(result, Exception))
+        
+        logger.info(f"工具目录缓存预热完成，共缓存 {warmed} 个工具")
+        return warmed
+    
+    async def close(self) -> None:
+        """关闭共享的HTTP会话"""
+        if self._http_session is not None and not self._http_session.closed:
+            await self._http_session.close()
+        self._http_session = None
+    
+    def _get_http_session(self) -> aiohttp.ClientSession:
+        """获取共享的HTTP会话，避免每次请求都新建连接池"""
+        if self._http_session is None or self._http_session.closed:
+            self._http_session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+        return self._http_session
+    
+    def _deployment_version(self, deployment: Dict[str, Any]) -> str:
+        """部署版本标识，部署版本或启动时间变化时缓存键随之变化"""
+        return f"{deployment.get('version', '')}:{deployment.get('last_started', '')}"
+    
     def _generate_example_parameters(self, schema: Dict[str, Any]) -> Dict[str, Any]:
         """
         根据工具Schema生成示例参数
@@ -0,0 +1,339 @@
+"""
+工具目录缓存模块
+缓存工具的JSON Schema、使用示例和元数据，避免每次请求都访问部署服务或重新组装仓库数据
+"""
+
+import asyncio
+import time
+import threading
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    from jsonschema.validators import validator_for
+except ImportError:  # jsonschema为可选依赖
+    validator_for = None
+
+
+@dataclass
+class ToolCatalogEntry:
+    """工具目录条目"""
+    namespace: str
+    tool_name: str
+    version: str
+    schema: Optional[Dict[str, Any]] = None
+    examples: Optional[List[Dict[str, Any]]] = None
+    metadata: Optional[Dict[str, Any]] = None
+    validator: Any = None
+    expire_at: float = 0.0
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+
+class ToolCatalogCache:
+    """
+    工具目录缓存
+
+    以 (命名空间, 工具名, 版本) 为键缓存工具信息。命名空间通常是MCP部署ID，
+    统一工具服务的聚合结果使用独立的命名空间。部署启停、删除或注册表更新时
+    按命名空间整体失效。
+
+    配置了Redis时，失效会递增Redis中该命名空间的代数；各进程读取缓存时
+    最多每隔sync_interval秒比对一次代数，发现变化就丢弃本地的该命名空间缓存，
+    因此其他工作进程的失效最迟在sync_interval秒后生效。Redis客户端是同步的，
+    在事件循环中调用时读写代数放到线程池执行，查询不等待Redis，本次先使用本地缓存。
+    """
+
+    GENERATION_KEY_PREFIX = "tool_catalog:generation:"
+
+    def __init__(
+        self,
+        default_ttl: int = 3600,
+        max_entries: int = 10000,
+        redis_client: Any = None,
+        sync_interval: float = 2.0
+    ):
+        """
+        初始化工具目录缓存
+
+        参数:
+            default_ttl: 默认缓存时间（秒）
+            max_entries: 最大条目数量
+            redis_client: 用于跨进程失效的Redis客户端，None表示只在进程内失效
+            sync_interval: 与Redis比对失效代数的最小间隔（秒）
+        """
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self.redis_client = redis_client
+        self.sync_interval = sync_interval
+        self._entries: Dict[Tuple[str, str, str], ToolCatalogEntry] = {}
+        self._values: Dict[Tuple[str, str], Tuple[Any, float]] = {}
+        # 命名空间 -> (已知的失效代数, 下次比对时间)
+        self._generations: Dict[str, Tuple[Optional[str], float]] = {}
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+
+    def get_entry(self, namespace: str, tool_name: str, version: str = "") -> Optional[ToolCatalogEntry]:
+        """
+        获取工具目录条目
+
+        参数:
+            namespace: 命名空间（部署ID等）
+            tool_name: 工具名称
+            version: 工具或部署版本
+
+        返回:
+            未过期的条目，不存在时返回None
+        """
+        key = (namespace, tool_name, version)
+        self._sync_generation(namespace)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expire_at <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self._misses += 1
+                return None
+            self._hits += 1
+            return entry
+
+    def put_entry(
+        self,
+        namespace: str,
+        tool_name: str,
+        version: str = "",
+        ttl: Optional[int] = None,
+        **fields: Any
+    ) -> ToolCatalogEntry:
+        """
+        写入或更新工具目录条目
+
+        传入schema时会同时编译校验器（需要jsonschema）
+
+        参数:
+            namespace: 命名空间
+            tool_name: 工具名称
+            version: 版本
+            ttl: 缓存时间（秒），None使用默认值
+            **fields: schema、examples、metadata等字段
+
+        返回:
+            更新后的条目
+        """
+        key = (namespace, tool_name, version)
+        expire_at = time.time() + (ttl or self.default_ttl)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    self._evict_one()
+                entry = ToolCatalogEntry(namespace=namespace, tool_name=tool_name, version=version)
+                self._entries[key] = entry
+
+            for name, value in fields.items():
+                if hasattr(entry, name):
+                    setattr(entry, name, value)
+                else:
+                    entry.extra[name] = value
+
+            if "schema" in fields:
+                entry.validator = self._compile_schema(fields["schema"])
+            entry.expire_at = expire_at
+            return entry
+
+    def get_value(self, namespace: str, key: str) -> Optional[Any]:
+        """
+        获取命名空间下的聚合值（如工具列表）
+
+        参数:
+            namespace: 命名空间
+            key: 值的键
+
+        返回:
+            缓存值或None
+        """
+        self._sync_generation(namespace)
+        with self._lock:
+            item = self._values.get((namespace, key))
+            if item is None or item[1] <= time.time():
+                if item is not None:
+                    del self._values[(namespace, key)]
+                self._misses += 1
+                return None
+            self._hits += 1
+            return item[0]
+
+    def set_value(self, namespace: str, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        """
+        设置命名空间下的聚合值
+
+        参数:
+            namespace: 命名空间
+            key: 值的键
+            value: 值
+            ttl: 缓存时间（秒），None使用默认值
+        """
+        with self._lock:
+            self._values[(namespace, key)] = (value, time.time() + (ttl or self.default_ttl))
+
+    def invalidate(self, namespace: str, tool_name: Optional[str] = None) -> int:
+        """
+        使缓存失效，配置了Redis时同时通知其他进程
+
+        参数:
+            namespace: 命名空间
+            tool_name: 工具名称，None表示整个命名空间
+
+        返回:
+            本进程内失效的条目数量
+        """
+        removed = self._invalidate_local(namespace, tool_name)
+
+        if self.redis_client is not None:
+            self._run_off_loop(self._publish_generation, namespace)
+
+        return removed
+
+    def _run_off_loop(self, func, *args: Any) -> None:
+        """在事件循环中时把同步的Redis调用放到线程池执行，不阻塞循环；否则直接调用"""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            func(*args)
+            return
+        loop.run_in_executor(None, func, *args)
+
+    def _publish_generation(self, namespace: str) -> None:
+        """递增命名空间的失效代数，通知其他进程"""
+        try:
+            # 其他进程只能感知到命名空间级别的变化，下次比对时整体失效
+            generation = self.redis_client.incr(self.GENERATION_KEY_PREFIX + namespace)
+            with self._lock:
+                self._generations[namespace] = (str(generation), time.time() + self.sync_interval)
+        except Exception as e:
+            logger.warning(f"发布工具目录失效通知失败: {namespace}, {str(e)}")
+
+    def _invalidate_local(self, namespace: str, tool_name: Optional[str] = None) -> int:
+        """使本进程内的缓存失效"""
+        with self._lock:
+            entry_keys = [
+                key for key in self._entries
+                if key[0] == namespace and (tool_name is None or key[1] == tool_name)
+            ]
+            for key in entry_keys:
+                del self._entries[key]
+
+            # 聚合值可能包含该工具，整体失效
+            value_keys = [key for key in self._values if key[0] == namespace]
+            for key in value_keys:
+                del self._values[key]
+
+        removed = len(entry_keys) + len(value_keys)
+        if removed:
+            logger.debug(f"工具目录缓存失效: {namespace}/{tool_name or '*'}，共 {removed} 项")
+        return removed
+
+    def _sync_generation(self, namespace: str) -> None:
+        """到达比对间隔时与Redis比对命名空间的失效代数"""
+        if self.redis_client is None:
+            return
+
+        now = time.time()
+        with self._lock:
+            known, next_check = self._generations.get(namespace, (None, 0.0))
+            if now < next_check:
+                return
+            self._generations[namespace] = (known, now + self.sync_interval)
+
+        self._run_off_loop(self._check_generation, namespace, known, now)
+
+    def _check_generation(self, namespace: str, known: Optional[str], checked_at: float) -> None:
+        """读取Redis中的失效代数，其他进程失效过时丢弃本地缓存"""
+        try:
+            current = self.redis_client.get(self.GENERATION_KEY_PREFIX + namespace)
+        except Exception as e:
+            logger.debug(f"读取工具目录失效代数失败: {namespace}, {str(e)}")
+            return
+
+        current = str(current) if current is not None else None
+        if current == known:
+            return
+        with self._lock:
+            self._generations[namespace] = (current, checked_at + self.sync_interval)
+        # 首次比对时本地缓存可能早于进程启动后的失效，同样丢弃
+        self._invalidate_local(namespace)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._values.clear()
+            self._generations.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计信息
+
+        返回:
+            统计信息字典
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "values": len(self._values),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": (self._hits / total) if total else 0.0
+            }
+
+    def _evict_one(self) -> None:
+        """移除最早过期的条目"""
+        if self._entries:
+            oldest = min(self._entries, key=lambda k: self._entries[k].expire_at)
+            del self._entries[oldest]
+
+    def _compile_schema(self, schema: Optional[Dict[str, Any]]) -> Any:
+        """编译工具参数的JSON Schema校验器"""
+        if not schema or validator_for is None:
+            return None
+
+        # MCP工具Schema通常把参数定义放在parameters字段中
+        parameters = schema.get("parameters", schema) if isinstance(schema, dict) else None
+        if not isinstance(parameters, dict):
+            return None
+
+        try:
+            validator_cls = validator_for(parameters)
+            validator_cls.check_schema(parameters)
+            return validator_cls(parameters)
+        except Exception as e:
+            logger.warning(f"编译工具Schema失败: {str(e)}")
+            return None
+
+
+# 创建全局实例
+_catalog_instance = None
+
+
+def get_tool_catalog() -> ToolCatalogCache:
+    """
+    获取工具目录缓存实例
+
+    返回:
+        ToolCatalogCache实例
+    """
+    global _catalog_instance
+    if _catalog_instance is None:
+        redis_client = None
+        try:
+            from app.utils.core.cache.redis_client import get_redis_client
+            redis_client = get_redis_client()
+        except Exception as e:
+            logger.warning(f"Redis不可用，工具目录缓存只在进程内失效: {str(e)}")
+        _catalog_instance = ToolCatalogCache(redis_client=redis_client)
+    return _catalog_instance
@@ -3,12 +3,23 @@ Core监控模块
 提供系统监控和性能指标的业务逻辑封装
 """
 
-from .monitoring_manager import MonitoringManager
-from .metrics_collector import MetricsCollector
-from .alert_manager import AlertManager
+import logging
+
+from .request_log_pipeline import RequestLogPipeline, get_request_log_pipeline
 
 __all__ = [
-    "MonitoringManager",
-    "MetricsCollector",
-    "AlertManager"
-] 
\ No newline at end of file
+    "RequestLogPipeline",
+    "get_request_log_pipeline"
+]
+
+# 监控管理器依赖的系统指标模型和仓库尚未迁移到当前代码库，缺失时不影响请求日志管道
+try:
+    from .monitoring_manager import MonitoringManager
+    from .metrics_collector import MetricsCollector
+    from .alert_manager import AlertManager
+    __all__.extend(["MonitoringManager", "MetricsCollector", "AlertManager"])
+except ImportError as e:
+    logging.warning(f"监控管理器导入失败: {e}")
+    MonitoringManager = None
+    MetricsCollector = None
+    AlertManager = None
@@ -14,6 +14,8 @@ from app.models.monitoring import SystemMetrics, ServiceHealth, AlertRule, Alert
 from app.repositories.monitoring_repository import MonitoringRepository
 from .metrics_collector import MetricsCollector
 from .alert_manager import AlertManager
+from .request_log_pipeline import get_request_log_pipeline, query_request_analytics
+from app.models.monitoring import RequestLog
 
 logger = logging.getLogger(__name__)
 
@@ -212,6 +214,98 @@ class MonitoringManager:
                 "error_code": "GET_SERVICES_HEALTH_FAILED"
             }
     
+    # ============ 请求日志 ============
+    
+    async def log_request(self, endpoint: str, method: str, user_id: Optional[str],
+                        response_time: float, status_code: int,
+                        request_data: Optional[Dict[str, Any]] = None,
+                        response_data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """记录API请求 - 业务逻辑层
+        
+        日志进入写后管道，由后台批量写入并更新预聚合统计，不在请求路径上访问数据库
+        """
+        try:
+            timestamp = datetime.utcnow()
+            get_request_log_pipeline().enqueue({
+                "timestamp": timestamp,
+                "endpoint": endpoint,
+                "method": method,
+                "user_id": user_id,
+                "status_code": status_code,
+                "response_time": response_time,
+                "request_data": request_data,
+                "response_data": response_data
+            })
+            
+            return {
+                "success": True,
+                "data": {
+                    "endpoint": endpoint,
+                    "method": method,
+                    "status_code": status_code,
+                    "response_time": response_time,
+                    "timestamp": timestamp.isoformat(),
+                    "queued": True
+                }
+            }
+            
+        except Exception as e:
+            logger.error(f"记录请求日志失败: {str(e)}")
+            return {
+                "success": False,
+                "error": f"记录请求日志失败: {str(e)}",
+                "error_code": "LOG_REQUEST_FAILED"
+            }
+    
+    async def get_request_logs(self, start_time: datetime, end_time: datetime,
+                             filters: Optional[Dict[str, Any]] = None,
+                             skip: int = 0, limit: int = 100) -> Dict[str, Any]:
+        """获取请求日志 - 业务逻辑层"""
+        try:
+            query = self.db.query(RequestLog).filter(
+                RequestLog.timestamp >= start_time,
+                RequestLog.timestamp <= end_time
+            )
+            for field_name, value in (filters or {}).items():
+                query = query.filter(getattr(RequestLog, field_name) == value)
+            
+            logs = query.order_by(RequestLog.timestamp.desc()).offset(skip).limit(limit).all()
+            
+            return {
+                "success": True,
+                "data": {
+                    "logs": [log.to_dict() for log in logs]
+                }
+            }
+            
+        except Exception as e:
+            logger.error(f"获取请求日志失败: {str(e)}")
+            return {
+                "success": False,
+                "error": f"获取请求日志失败: {str(e)}",
+                "error_code": "GET_REQUEST_LOGS_FAILED"
+            }
+    
+    async def get_request_analytics(self, start_time: datetime, end_time: datetime,
+                                  granularity: Optional[str] = None) -> Dict[str, Any]:
+        """获取请求统计分析 - 业务逻辑层
+        
+        读取按分钟/小时预聚合的统计行，不扫描原始日志
+        """
+        try:
+            return {
+                "success": True,
+                "data": query_request_analytics(self.db, start_time, end_time, granularity)
+            }
+            
+        except Exception as e:
+            logger.error(f"获取请求统计分析失败: {str(e)}")
+            return {
+                "success": False,
+                "error": f"获取请求统计分析失败: {str(e)}",
+                "error_code": "GET_REQUEST_ANALYTICS_FAILED"
+            }
+    
     # ============ 性能分析 ============
     
     async def analyze_performance_trends(self, days: int = 7) -> Dict[str, Any]:
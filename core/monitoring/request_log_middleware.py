@@ -0,0 +1,59 @@
+"""
+请求日志中间件
+每个请求结束后把端点、方法、状态码和耗时放入请求日志写后管道，
+不依赖监控管理器，也不在请求路径上访问数据库
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import Callable
+
+from fastapi import FastAPI, Request, Response
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.config import settings
+from .request_log_pipeline import get_request_log_pipeline
+
+logger = logging.getLogger(__name__)
+
+
+def _endpoint_of(request: Request) -> str:
+    """优先使用路由模板作为端点，避免路径参数使统计行无限增长"""
+    route = request.scope.get("route")
+    path = getattr(route, "path", None)
+    return path or request.url.path
+
+
+class RequestLogMiddleware(BaseHTTPMiddleware):
+    """把每个请求记录到请求日志管道"""
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        start_time = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            try:
+                get_request_log_pipeline().enqueue({
+                    "timestamp": datetime.utcnow(),
+                    "endpoint": _endpoint_of(request),
+                    "method": request.method,
+                    "user_id": getattr(request.state, "user_id", None),
+                    "status_code": status_code,
+                    "response_time": (time.perf_counter() - start_time) * 1000,
+                    "request_data": None,
+                    "response_data": None
+                })
+            except Exception as e:
+                logger.warning(f"记录请求日志失败: {str(e)}")
+
+
+def setup_request_log_middleware(app: FastAPI) -> None:
+    """按配置为应用安装请求日志中间件"""
+    if not getattr(settings, "REQUEST_LOG_ENABLED", True):
+        return
+    app.add_middleware(RequestLogMiddleware)
+    logger.info("请求日志中间件已安装")
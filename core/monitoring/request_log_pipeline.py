@@ -0,0 +1,419 @@
+"""
+请求日志写后管道
+请求路径只把日志放入内存缓冲区；后台协程批量写入原始日志，
+并在同一事务中增量更新按分钟和小时预聚合的统计行，统计查询只读取预聚合行。
+写入失败的批次放回缓冲区头部，按指数退避重试，超过重试次数后丢弃并计数
+"""
+
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.monitoring import RequestLog, RequestLogRollup
+from app.utils.core.database import get_db_connection
+from app.utils.monitoring.core.metrics import QuantileSketch
+
+logger = logging.getLogger(__name__)
+
+# 预聚合粒度 -> 时间桶截断函数
+GRANULARITIES: Dict[str, Callable[[datetime], datetime]] = {
+    "minute": lambda ts: ts.replace(second=0, microsecond=0),
+    "hour": lambda ts: ts.replace(minute=0, second=0, microsecond=0),
+}
+
+# 查询范围超过该值时读取小时粒度的统计
+HOURLY_THRESHOLD = timedelta(hours=6)
+
+# 统计中输出的响应时间分位点
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+
+
+class _RollupDelta:
+    """一个时间桶内某个端点的增量统计"""
+    
+    __slots__ = ("count", "errors", "total_time", "max_time", "sketch")
+    
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.sketch = QuantileSketch()
+    
+    def add(self, status_code: int, response_time: float) -> None:
+        self.count += 1
+        if status_code >= 400:
+            self.errors += 1
+        self.total_time += response_time
+        self.max_time = max(self.max_time, response_time)
+        self.sketch.add(response_time)
+
+
+def build_rollup_deltas(entries: List[Dict[str, Any]]) -> Dict[Tuple[str, datetime, str, str], _RollupDelta]:
+    """
+    把一批日志聚合为各粒度时间桶的增量
+    
+    参数:
+        entries: 日志字典列表
+    
+    返回:
+        (粒度, 时间桶起点, 端点, 方法) -> 增量统计
+    """
+    deltas: Dict[Tuple[str, datetime, str, str], _RollupDelta] = {}
+    for entry in entries:
+        for granularity, truncate in GRANULARITIES.items():
+            key = (granularity, truncate(entry["timestamp"]), entry["endpoint"], entry["method"])
+            delta = deltas.get(key)
+            if delta is None:
+                delta = deltas[key] = _RollupDelta()
+            delta.add(entry["status_code"], entry["response_time"])
+    return deltas
+
+
+class RequestLogPipeline:
+    """
+    请求日志写后管道
+    
+    enqueue不做任何IO；缓冲达到batch_size或flush_interval到期时，后台协程在线程中
+    执行一次批量插入和预聚合更新。缓冲区满时丢弃最旧的日志并计数。
+    写入失败(连接中断、死锁等)时批次回到缓冲区头部，后台协程退避后重试
+    """
+    
+    def __init__(self,
+                 session_factory: Optional[Callable[[], Session]] = None,
+                 batch_size: int = 500,
+                 flush_interval: float = 2.0,
+                 max_buffer: int = 20000,
+                 max_retries: int = 3,
+                 retry_backoff: float = 1.0):
+        """
+        初始化管道
+        
+        参数:
+            session_factory: 数据库会话工厂，默认使用全局数据库连接
+            batch_size: 单个事务写入的最大日志数
+            flush_interval: 刷新间隔(秒)
+            max_buffer: 缓冲区容量
+            max_retries: 同一批次写入失败后的最大重试次数
+            retry_backoff: 首次重试前的等待时间(秒)，之后每次翻倍，最长60秒
+        """
+        self.session_factory = session_factory or get_db_connection().create_session
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max(self.batch_size, max_buffer)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        # 缓冲区头部批次已连续失败的次数
+        self._failures = 0
+        
+        self._buffer: deque = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._closing = False
+        self._worker: Optional[asyncio.Task] = None
+        self._loop = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        
+        self.stats = {"queued": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0, "retries": 0}
+    
+    def _ensure_worker(self) -> None:
+        """按当前事件循环启动后台刷新协程"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._stop = asyncio.Event()
+            self._flush_lock = asyncio.Lock()
+            self._worker = None
+        if not self._closing and (self._worker is None or self._worker.done()):
+            self._worker = loop.create_task(self._flush_loop())
+    
+    def enqueue(self, entry: Dict[str, Any]) -> bool:
+        """
+        放入一条请求日志，需在事件循环中调用
+        
+        参数:
+            entry: 日志字典，包含timestamp、endpoint、method、user_id、status_code、
+                response_time、request_data、response_data
+        
+        返回:
+            是否丢弃了更早的日志
+        """
+        self._ensure_worker()
+        
+        dropped = False
+        if len(self._buffer) >= self.max_buffer:
+            self._buffer.popleft()
+            self.stats["dropped"] += 1
+            dropped = True
+        
+        self._buffer.append(entry)
+        self.stats["queued"] += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+        return dropped
+    
+    @property
+    def pending(self) -> int:
+        """缓冲区中等待写入的日志数"""
+        return len(self._buffer)
+    
+    def _retry_delay(self) -> float:
+        """当前失败次数对应的退避时间"""
+        return min(self.retry_backoff * (2 ** max(self._failures - 1, 0)), 60.0)
+    
+    async def _flush_loop(self) -> None:
+        """
+        等待批次满或间隔到期后写出缓冲区；上一次写入失败时先退避，
+        退避期间缓冲区写满也不提前重试。关闭时由close设置_stop退出，不在写入中途取消
+        """
+        while not self._closing:
+            try:
+                if self._failures:
+                    await asyncio.wait_for(self._stop.wait(), self._retry_delay())
+                else:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._closing:
+                break
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"写出请求日志失败: {str(e)}")
+    
+    async def flush(self) -> bool:
+        """
+        分批写出缓冲区中的全部日志
+        
+        返回:
+            是否已写完；某批写入失败且仍可重试时放回缓冲区并返回False
+        """
+        if not self._buffer:
+            return True
+        self._ensure_worker()
+        
+        async with self._flush_lock:
+            while self._buffer:
+                size = min(self.batch_size, len(self._buffer))
+                batch = [self._buffer.popleft() for _ in range(size)]
+                if not await self._write_or_requeue(batch):
+                    return False
+        return True
+    
+    async def _write_or_requeue(self, batch: List[Dict[str, Any]]) -> bool:
+        """写入一批日志；失败时未超过重试次数则放回缓冲区头部，否则丢弃"""
+        try:
+            await asyncio.to_thread(self._write_batch, batch)
+        except Exception as e:
+            self._failures += 1
+            if self._failures > self.max_retries:
+                self._failures = 0
+                self.stats["failed"] += len(batch)
+                logger.error(f"批量写入 {len(batch)} 条请求日志重试 {self.max_retries} 次后仍失败，丢弃: {str(e)}")
+                return True
+            
+            self.stats["retries"] += 1
+            self._buffer.extendleft(reversed(batch))
+            logger.warning(
+                f"批量写入 {len(batch)} 条请求日志失败，{self._retry_delay():.1f} 秒后第 {self._failures} 次重试: {str(e)}"
+            )
+            return False
+        
+        self._failures = 0
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+        return True
+    
+    def _write_batch(self, batch: List[Dict[str, Any]]) -> None:
+        """在工作线程中插入原始日志并合并预聚合行，两者在同一事务中提交"""
+        deltas = build_rollup_deltas(batch)
+        
+        db = self.session_factory()
+        try:
+            for attempt in range(2):
+                try:
+                    db.bulk_insert_mappings(RequestLog, batch)
+                    self._merge_rollups(db, deltas)
+                    db.commit()
+                    return
+                except IntegrityError:
+                    # 其他进程并发创建了同一时间桶的统计行，回滚后按更新路径重试一次
+                    db.rollback()
+                    if attempt:
+                        raise
+        finally:
+            db.close()
+    
+    def _merge_rollups(self, db: Session, deltas: Dict[Tuple[str, datetime, str, str], _RollupDelta]) -> None:
+        """把增量合并进预聚合行，已存在的行加行锁后更新"""
+        bucket_starts = {key[1] for key in deltas}
+        endpoints = {key[2] for key in deltas}
+        existing = {
+            (row.granularity, row.bucket_start, row.endpoint, row.method): row
+            for row in db.query(RequestLogRollup)
+            .filter(
+                RequestLogRollup.bucket_start.in_(bucket_starts),
+                RequestLogRollup.endpoint.in_(endpoints)
+            )
+            .with_for_update()
+            .all()
+        }
+        
+        for key, delta in deltas.items():
+            row = existing.get(key)
+            if row is None:
+                granularity, bucket_start, endpoint, method = key
+                db.add(RequestLogRollup(
+                    granularity=granularity,
+                    bucket_start=bucket_start,
+                    endpoint=endpoint,
+                    method=method,
+                    request_count=delta.count,
+                    error_count=delta.errors,
+                    total_response_time=delta.total_time,
+                    max_response_time=delta.max_time,
+                    latency_sketch=delta.sketch.to_dict()
+                ))
+                continue
+            
+            sketch = QuantileSketch.from_dict(row.latency_sketch) if row.latency_sketch else QuantileSketch()
+            sketch.merge(delta.sketch)
+            row.request_count += delta.count
+            row.error_count += delta.errors
+            row.total_response_time += delta.total_time
+            row.max_response_time = max(row.max_response_time or 0.0, delta.max_time)
+            row.latency_sketch = sketch.to_dict()
+    
+    async def close(self) -> None:
+        """停止后台协程并写出剩余日志，写入失败时按退避重试，某批次耗尽重试后丢弃其余日志"""
+        self._closing = True
+        if self._worker is not None and self._loop is asyncio.get_running_loop():
+            self._stop.set()
+            self._wakeup.set()
+            try:
+                await self._worker
+            except Exception as e:
+                logger.warning(f"停止请求日志刷新协程失败: {str(e)}")
+        self._worker = None
+        
+        failed_before = self.stats["failed"]
+        while not await self.flush():
+            if self.stats["failed"] > failed_before:
+                # 已有批次耗尽重试，数据库持续不可用，不再为剩余批次逐个退避而拖住关闭
+                remaining = len(self._buffer)
+                self._buffer.clear()
+                self._failures = 0
+                self.stats["failed"] += remaining
+                logger.error(f"关闭时数据库仍不可用，丢弃 {remaining} 条请求日志")
+                break
+            await asyncio.sleep(self._retry_delay())
+
+
+def query_request_analytics(db: Session,
+                            start_time: datetime,
+                            end_time: datetime,
+                            granularity: Optional[str] = None) -> Dict[str, Any]:
+    """
+    基于预聚合行计算请求统计
+    
+    参数:
+        db: 数据库会话
+        start_time: 开始时间
+        end_time: 结束时间
+        granularity: 统计粒度，默认范围超过6小时用hour，否则用minute
+    
+    返回:
+        总请求数、成功率、错误率以及各端点的请求数、错误率、平均和分位响应时间。
+        统计以时间桶为单位，起止时间所在的时间桶整体计入
+    """
+    if granularity is None:
+        granularity = "hour" if end_time - start_time > HOURLY_THRESHOLD else "minute"
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"不支持的统计粒度: {granularity}")
+    
+    rows = (
+        db.query(RequestLogRollup)
+        .filter(
+            RequestLogRollup.granularity == granularity,
+            RequestLogRollup.bucket_start >= GRANULARITIES[granularity](start_time),
+            RequestLogRollup.bucket_start <= end_time
+        )
+        .all()
+    )
+    
+    endpoints: Dict[str, Dict[str, Any]] = {}
+    sketches: Dict[str, QuantileSketch] = {}
+    for row in rows:
+        data = endpoints.setdefault(row.endpoint, {
+            "count": 0,
+            "error_count": 0,
+            "total_response_time": 0.0,
+            "max_response_time": 0.0
+        })
+        data["count"] += row.request_count
+        data["error_count"] += row.error_count
+        data["total_response_time"] += row.total_response_time
+        data["max_response_time"] = max(data["max_response_time"], row.max_response_time)
+        if row.latency_sketch:
+            sketch = QuantileSketch.from_dict(row.latency_sketch)
+            if row.endpoint in sketches:
+                sketches[row.endpoint].merge(sketch)
+            else:
+                sketches[row.endpoint] = sketch
+    
+    total_requests = 0
+    total_errors = 0
+    for endpoint, data in endpoints.items():
+        count = data["count"]
+        total_requests += count
+        total_errors += data["error_count"]
+        data["success_count"] = count - data["error_count"]
+        data["error_rate"] = (data["error_count"] / count) * 100 if count else 0
+        data["avg_response_time"] = data.pop("total_response_time") / count if count else 0
+        sketch = sketches.get(endpoint)
+        for q in LATENCY_QUANTILES:
+            data[f"p{int(q * 100)}_response_time"] = sketch.quantile(q) if sketch else None
+    
+    return {
+        "total_requests": total_requests,
+        "success_rate": ((total_requests - total_errors) / total_requests) * 100 if total_requests else 0,
+        "error_rate": (total_errors / total_requests) * 100 if total_requests else 0,
+        "endpoint_stats": endpoints,
+        "granularity": granularity,
+        "time_range": {
+            "start": start_time.isoformat(),
+            "end": end_time.isoformat()
+        }
+    }
+
+
+# 进程级单例
+_pipeline: Optional[RequestLogPipeline] = None
+
+
+def get_request_log_pipeline() -> RequestLogPipeline:
+    """获取进程级请求日志管道"""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = RequestLogPipeline(
+            batch_size=getattr(settings, "REQUEST_LOG_BATCH_SIZE", 500),
+            flush_interval=getattr(settings, "REQUEST_LOG_FLUSH_INTERVAL", 2.0),
+            max_buffer=getattr(settings, "REQUEST_LOG_MAX_BUFFER", 20000),
+            max_retries=getattr(settings, "REQUEST_LOG_MAX_RETRIES", 3),
+            retry_backoff=getattr(settings, "REQUEST_LOG_RETRY_BACKOFF", 1.0)
+        )
+    return _pipeline
+
+
+async def shutdown_request_log_pipeline() -> None:
+    """应用关闭时写出缓冲中的请求日志"""
+    if _pipeline is not None:
+        await _pipeline.close()
@@ -4,5 +4,6 @@
 """
 
 from .orchestrator import ToolOrchestrator
+from .runtime import ToolRuntime, ToolPolicy, get_tool_runtime
 
-__all__ = ["ToolOrchestrator"] 
\ No newline at end of file
+__all__ = ["ToolOrchestrator", "ToolRuntime", "ToolPolicy", "get_tool_runtime"] 
\ No newline at end of file
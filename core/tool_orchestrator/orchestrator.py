@@ -1,15 +1,48 @@
 from typing import Any, Dict, List, Optional, Callable
+from types import CodeType
+import functools
 import logging
 
+from .runtime import ToolRuntime, get_tool_runtime
+
 logger = logging.getLogger(__name__)
 
+# 条件表达式可使用的内置函数
+_SAFE_GLOBALS = {
+    "len": len,
+    "str": str,
+    "int": int,
+    "float": float,
+    "bool": bool,
+    "min": min,
+    "max": max,
+    "sum": sum,
+    "abs": abs,
+    "round": round,
+    "any": any,
+    "all": all
+}
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_condition(condition: str) -> CodeType:
+    """将条件表达式编译为代码对象，相同表达式只编译一次"""
+    return compile(condition, "<tool_condition>", "eval")
+
+
 class ToolOrchestrator:
     """工具链编排引擎，管理工具调用顺序和条件"""
     
-    def __init__(self):
+    def __init__(self, runtime: Optional[ToolRuntime] = None):
+        """初始化编排引擎
+        
+        Args:
+            runtime: 工具执行运行时，None使用全局运行时
+        """
         self.tools = []  # 存储(工具, 顺序)元组
         self.conditions = {}  # 工具 -> 条件表达式
         self.default_params = {}  # 工具 -> 默认参数
+        self.runtime = runtime or get_tool_runtime()
         
     def add_tool(self, tool: Any, order: int, 
                 condition: Optional[str] = None, 
@@ -25,6 +58,11 @@ class ToolOrchestrator:
         self.tools.append((tool, order))
         if condition:
             self.conditions[tool] = condition
+            # 提前编译，语法错误在添加时即可发现
+            try:
+                _compile_condition(condition)
+            except SyntaxError as e:
+                logger.error(f"条件表达式语法错误: {condition}: {e}")
         if default_params:
             self.default_params[tool] = default_params
         
@@ -130,16 +168,8 @@ class ToolOrchestrator:
         params = self.prepare_params(tool, context)
         
         try:
-            if hasattr(tool, "async_run"):
-                result = await tool.async_run(**params)
-            elif hasattr(tool, "run"):
-                result = tool.run(**params)
-            elif callable(tool):
-                result = tool(**params)
-            else:
-                raise ValueError(f"工具 {tool} 不可调用")
-                
-            return result
+            # 同步工具由运行时放到执行池中运行，避免阻塞事件循环
+            return await self.runtime.run(tool, params)
         except Exception as e:
             logger.error(f"工具执行错误: {e}", exc_info=True)
             raise
@@ -156,27 +186,13 @@ class ToolOrchestrator:
         """
         # 使用安全的条件评估方法
         try:
-            # 创建一个安全的命名空间
-            safe_globals = {
-                "len": len,
-                "str": str,
-                "int": int,
-                "float": float,
-                "bool": bool,
-                "min": min,
-                "max": max,
-                "sum": sum,
-                "abs": abs,
-                "round": round,
-                "any": any,
-                "all": all
-            }
+            code = _compile_condition(condition)
             
             # 加载上下文作为局部变量
             local_vars = dict(context)
             
             # 评估条件
-            return eval(condition, safe_globals, local_vars)
+            return eval(code, dict(_SAFE_GLOBALS), local_vars)
         except Exception as e:
             logger.error(f"条件评估错误: {e}")
             return False
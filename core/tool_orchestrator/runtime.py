@@ -0,0 +1,275 @@
+"""
+工具执行运行时
+负责在不阻塞事件循环的前提下执行工具，提供按工具的并发限制、超时和执行指标
+"""
+
+from typing import Any, Callable, Dict, Optional
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from dataclasses import dataclass
+import asyncio
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+import weakref
+
+from app.utils.monitoring.core.metrics import MetricsCollector, get_metrics_collector
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ToolPolicy:
+    """工具执行策略"""
+    max_concurrency: int = 4           # 单个工具的最大并发执行数
+    timeout: Optional[float] = None    # 单次执行超时（秒），None表示不限制
+    executor: str = "thread"           # 同步工具的执行方式: thread, process
+
+
+class ToolRuntime:
+    """
+    工具执行运行时
+
+    异步工具直接在事件循环中等待；同步工具放到有界线程池执行，
+    标记为CPU密集型的工具放到进程池执行（工具及参数需要可序列化）。
+    每个工具有独立的并发信号量，并记录排队时间和执行时间。
+    同步工具超时后线程仍在执行，并发名额保留到线程真正结束，
+    卡住的工具不会绕过并发限制把共享线程池占满。
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        max_process_workers: Optional[int] = None,
+        default_policy: Optional[ToolPolicy] = None,
+        metrics: Optional[MetricsCollector] = None
+    ):
+        """
+        初始化工具运行时
+
+        Args:
+            max_workers: 同步工具线程池的最大线程数
+            max_process_workers: CPU密集型工具进程池的最大进程数，None表示CPU核数
+            default_policy: 未单独配置的工具使用的默认策略
+            metrics: 指标收集器，默认使用进程级共享实例
+        """
+        self.max_workers = max_workers
+        self.max_process_workers = max_process_workers or os.cpu_count() or 1
+        self.default_policy = default_policy or ToolPolicy()
+        self.metrics = metrics or get_metrics_collector()
+
+        self._policies: Dict[str, ToolPolicy] = {}
+        # 事件循环 -> {工具名称: 信号量}；asyncio信号量绑定首次等待时的事件循环
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = weakref.WeakKeyDictionary()
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def set_policy(self, tool_name: str, policy: ToolPolicy) -> None:
+        """
+        设置工具执行策略
+
+        Args:
+            tool_name: 工具名称
+            policy: 执行策略
+        """
+        self._policies[tool_name] = policy
+        # 并发数可能变化，重新创建信号量
+        for semaphores in list(self._semaphores.values()):
+            semaphores.pop(tool_name, None)
+
+    def get_policy(self, tool_name: str) -> ToolPolicy:
+        """获取工具执行策略"""
+        return self._policies.get(tool_name, self.default_policy)
+
+    async def run(self, tool: Any, params: Dict[str, Any]) -> Any:
+        """
+        执行工具
+
+        Args:
+            tool: 工具实例或可调用对象
+            params: 调用参数
+
+        Returns:
+            Any: 工具执行结果
+
+        Raises:
+            asyncio.TimeoutError: 执行超时
+            ValueError: 工具不可调用
+        """
+        tool_name = get_tool_name(tool)
+        policy = self.get_policy(tool_name)
+        labels = {"tool": tool_name}
+
+        func, is_async = self._resolve_callable(tool)
+        semaphore = self._get_semaphore(tool_name, policy)
+
+        submitted_at = time.perf_counter()
+        status = "success"
+        try:
+            await semaphore.acquire()
+            future: Optional[Future] = None
+            try:
+                acquired_at = time.perf_counter()
+                timing: Dict[str, float] = {}
+
+                if is_async:
+                    timing["start"] = acquired_at
+                    call = func(**params)
+                else:
+                    future = self._run_sync(func, params, policy, timing)
+                    call = asyncio.wrap_future(future)
+
+                try:
+                    if policy.timeout:
+                        result = await asyncio.wait_for(call, timeout=policy.timeout)
+                    else:
+                        result = await call
+
+                    # 兼容返回可等待对象的同步入口
+                    if inspect.isawaitable(result):
+                        result = await result
+                    return result
+                finally:
+                    started_at = timing.get("start", acquired_at)
+                    finished_at = time.perf_counter()
+                    self.metrics.record_histogram(
+                        "tool_queue_seconds", started_at - submitted_at, labels,
+                        description="工具调用从提交到开始执行的等待时间"
+                    )
+                    self.metrics.record_histogram(
+                        "tool_run_seconds", finished_at - started_at, labels,
+                        description="工具实际执行时间"
+                    )
+            finally:
+                if future is not None and not future.done():
+                    # 超时或被取消时执行池中的调用无法中断，等它结束后再释放并发名额
+                    future.add_done_callback(functools.partial(
+                        _release_when_done, asyncio.get_running_loop(), semaphore
+                    ))
+                else:
+                    semaphore.release()
+        except asyncio.TimeoutError:
+            status = "timeout"
+            logger.warning(f"工具 {tool_name} 执行超时（{policy.timeout}秒）")
+            raise
+        except Exception:
+            status = "error"
+            raise
+        finally:
+            self.metrics.record_counter(
+                "tool_calls_total", 1.0, {**labels, "status": status},
+                description="工具调用次数"
+            )
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        关闭执行池
+
+        Args:
+            wait: 是否等待正在执行的任务完成
+        """
+        with self._lock:
+            if self._thread_pool:
+                self._thread_pool.shutdown(wait=wait)
+                self._thread_pool = None
+            if self._process_pool:
+                self._process_pool.shutdown(wait=wait)
+                self._process_pool = None
+
+    def _resolve_callable(self, tool: Any):
+        """解析工具的调用入口，返回(可调用对象, 是否异步)"""
+        if hasattr(tool, "async_run"):
+            return tool.async_run, True
+        if hasattr(tool, "run"):
+            return tool.run, inspect.iscoroutinefunction(tool.run)
+        if callable(tool):
+            is_async = inspect.iscoroutinefunction(tool) or inspect.iscoroutinefunction(
+                getattr(tool, "__call__", None)
+            )
+            return tool, is_async
+        raise ValueError(f"工具 {tool} 不可调用")
+
+    def _get_semaphore(self, tool_name: str, policy: ToolPolicy) -> asyncio.Semaphore:
+        """获取当前事件循环中工具的并发信号量"""
+        loop = asyncio.get_running_loop()
+        semaphores = self._semaphores.setdefault(loop, {})
+        semaphore = semaphores.get(tool_name)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max(1, policy.max_concurrency))
+            semaphores[tool_name] = semaphore
+        return semaphore
+
+    def _run_sync(
+        self,
+        func: Callable[..., Any],
+        params: Dict[str, Any],
+        policy: ToolPolicy,
+        timing: Dict[str, float]
+    ) -> Future:
+        """在执行池中运行同步工具，返回执行池的Future，用于判断调用是否真正结束"""
+        if policy.executor == "process":
+            # 进程池无法回传开始时间，以提交时间近似
+            timing["start"] = time.perf_counter()
+            return self._get_process_pool().submit(functools.partial(func, **params))
+
+        def call():
+            timing["start"] = time.perf_counter()
+            return func(**params)
+
+        return self._get_thread_pool().submit(call)
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        """懒加载线程池"""
+        with self._lock:
+            if self._thread_pool is None:
+                self._thread_pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="tool-runtime"
+                )
+            return self._thread_pool
+
+    def _get_process_pool(self) -> ProcessPoolExecutor:
+        """懒加载进程池"""
+        with self._lock:
+            if self._process_pool is None:
+                self._process_pool = ProcessPoolExecutor(max_workers=self.max_process_workers)
+            return self._process_pool
+
+
+def _release_when_done(loop: asyncio.AbstractEventLoop, semaphore: asyncio.Semaphore, _future: Future) -> None:
+    """执行池中的调用结束后，在信号量所属的事件循环中释放并发名额"""
+    try:
+        loop.call_soon_threadsafe(semaphore.release)
+    except RuntimeError:
+        # 事件循环已关闭，信号量随之失效
+        pass
+
+
+def get_tool_name(tool: Any) -> str:
+    """获取工具名称，用于策略查找和指标标签"""
+    name = getattr(tool, "name", None) or getattr(tool, "__name__", None)
+    if isinstance(name, str) and name:
+        return name
+    return type(tool).__name__
+
+
+# 全局工具运行时实例
+_tool_runtime = None
+
+
+def get_tool_runtime() -> ToolRuntime:
+    """
+    获取全局工具运行时实例
+
+    Returns:
+        ToolRuntime: 工具运行时
+    """
+    global _tool_runtime
+
+    if _tool_runtime is None:
+        _tool_runtime = ToolRuntime()
+
+    return _tool_runtime
@@ -38,7 +38,7 @@ from app.utils.mcp_service_registrar import get_mcp_service_registrar
 from app.utils.services.management import get_service_manager, register_lightrag_service
 from core.mcp_service_manager import get_mcp_service_manager
 from app.middleware.sensitive_word_middleware import SensitiveWordMiddleware
-from app.startup import register_searxng_startup, register_context_compression
+from app.startup import register_searxng_startup, register_context_compression, register_tool_catalog_startup
 from app.utils.core.config import inject_config_to_env, get_base_dependencies
 from app.utils.core.config import get_config_manager as get_legacy_config_manager
 
@@ -233,9 +233,19 @@ logger = get_logger(__name__)
 from app.middleware.security import setup_security_middleware
 setup_security_middleware(app)
 
+# 请求日志写后管道：每个请求记录到缓冲区，后台批量写入并更新预聚合统计
+try:
+    from core.monitoring.request_log_middleware import setup_request_log_middleware
+    setup_request_log_middleware(app)
+except ImportError as e:
+    logger.warning(f"安装请求日志中间件失败: {str(e)}")
+
 # 注册SearxNG服务启动
 register_searxng_startup(app)
 
+# 注册工具目录缓存预热
+register_tool_catalog_startup(app)
+
 # 如果静态文件目录不存在则创建
 os.makedirs("static", exist_ok=True)
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -427,6 +437,27 @@ async def shutdown_event():
     except Exception as e:
         logger.error(f"关闭向量数据库时发生异常: {str(e)}")
     
+    # 关闭LightRAG实例池
+    try:
+        from app.frameworks.lightrag.workdir_manager import shutdown_workdir_manager
+        await shutdown_workdir_manager()
+    except Exception as e:
+        logger.error(f"关闭LightRAG实例池时发生异常: {str(e)}")
+    
+    # 写出缓冲中的请求日志
+    try:
+        from core.monitoring.request_log_pipeline import shutdown_request_log_pipeline
+        await shutdown_request_log_pipeline()
+    except Exception as e:
+        logger.error(f"写出请求日志时发生异常: {str(e)}")
+    
+    # 写出缓冲中的Token指标
+    try:
+        from app.utils.monitoring.token_metrics import shutdown_token_metrics
+        await shutdown_token_metrics()
+    except Exception as e:
+        logger.error(f"写出Token指标时发生异常: {str(e)}")
+    
     logger.info("ZZDSJ Backend API 已关闭")
 
 # 注册关闭处理程序
@@ -20,6 +20,9 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 # 使用独立的迁移配置，避免循环导入
 from config import get_database_url
+from vector_snapshot import (
+    SnapshotExporter, SnapshotImporter, load_manifest, latest_snapshot_dir, next_snapshot_dir
+)
 
 DATABASE_URL = get_database_url()
 
@@ -70,6 +73,7 @@ class VectorDBMigrator:
         self.base_dir = Path(__file__).parent
         self.migrations_dir = self.base_dir / "vector_migrations"
         self.migrations_dir.mkdir(exist_ok=True)
+        self.backups_dir = self.base_dir / "vector_backups"
         
         # 数据库连接（用于记录迁移历史）
         self.db_url = DATABASE_URL
@@ -154,9 +158,14 @@ class VectorDBMigrator:
                     "note": "需要手动实现回滚逻辑"
                 })
         
-        # 处理集合删除
+        # 处理集合删除，删除前先备份以便回滚时恢复
         if collections_to_drop:
             for collection_name in collections_to_drop:
+                up_operations.append({
+                    "type": "custom",
+                    "custom_type": "backup_collection",
+                    "collection_name": collection_name
+                })
                 up_operations.append({
                     "type": "drop_collection",
                     "collection_name": collection_name
@@ -349,6 +358,11 @@ class VectorDBMigrator:
                 return await self._create_index(operation.get("config", {}))
             elif operation_type == "drop_index":
                 return await self._drop_index(operation.get("config", {}))
+            elif operation_type == "restore_collection":
+                return await self._restore_collection({
+                    "collection_name": operation.get("collection_name"),
+                    **operation.get("config", {})
+                })
             elif operation_type == "custom":
                 return await self._execute_custom_operation(operation)
             else:
@@ -500,7 +514,10 @@ class VectorDBMigrator:
             custom_type = operation.get("custom_type")
             
             if custom_type == "backup_collection":
-                return await self._backup_collection(operation.get("collection_name"))
+                return await self._backup_collection(
+                    operation.get("collection_name"),
+                    operation.get("config", {})
+                )
             elif custom_type == "restore_collection":
                 return await self._restore_collection(operation.get("config", {}))
             else:
@@ -515,21 +532,153 @@ class VectorDBMigrator:
                 "error": f"执行自定义操作失败: {str(e)}"
             }
     
-    async def _backup_collection(self, collection_name: str) -> Dict[str, Any]:
-        """备份集合"""
-        # 这里实现集合备份逻辑
-        return {
-            "success": True,
-            "message": f"集合 {collection_name} 备份完成（待实现）"
-        }
+    def _snapshot_root(self, collection_name: str, vector_store_type: Optional[str] = None) -> Path:
+        """集合的快照根目录，每次备份是其中的一个版本子目录"""
+        return self.backups_dir / f"{collection_name}_{vector_store_type or self.vector_store_type}"
+    
+    async def _backup_collection(self, collection_name: str, config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        备份集合为流式快照，中断后重复执行会从最后完成的块继续
+        
+        Args:
+            collection_name: 集合名称
+            config: 可选配置，支持snapshot_path、vector_store_type、block_size、
+                concurrency、collection_config
+            
+        Returns:
+            备份结果
+        """
+        try:
+            if not collection_name:
+                return {"success": False, "error": "缺少集合名称"}
+            
+            config = config or {}
+            store_type = config.get("vector_store_type", self.vector_store_type)
+            # 未指定目录时续传未完成的备份，否则新建版本目录，不覆盖已有快照
+            snapshot_dir = Path(
+                config.get("snapshot_path") or next_snapshot_dir(self._snapshot_root(collection_name, store_type))
+            )
+            
+            exporter = SnapshotExporter(
+                self.create_vector_store(store_type),
+                collection_name,
+                snapshot_dir,
+                block_size=config.get("block_size", 10000),
+                concurrency=config.get("concurrency", 4),
+                source_type=store_type,
+                collection_config=config.get("collection_config")
+            )
+            summary = await exporter.run()
+            
+            return {
+                "success": True,
+                "message": f"集合 {collection_name} 备份完成",
+                "snapshot_path": str(snapshot_dir),
+                **summary
+            }
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"备份集合失败: {str(e)}"
+            }
     
     async def _restore_collection(self, config: Dict[str, Any]) -> Dict[str, Any]:
-        """恢复集合"""
-        # 这里实现集合恢复逻辑
-        return {
-            "success": True,
-            "message": "集合恢复完成（待实现）"
-        }
+        """
+        从快照恢复集合，目标集合不存在时先创建；中断后重复执行会跳过已导入的块
+        
+        Args:
+            config: 恢复配置，支持collection_name(目标集合)、snapshot_path、
+                vector_store_type、batch_size、concurrency、verify、collection_config
+            
+        Returns:
+            恢复结果
+        """
+        try:
+            collection_name = config.get("collection_name")
+            snapshot_path = config.get("snapshot_path")
+            if not snapshot_path and not collection_name:
+                return {"success": False, "error": "缺少集合名称或快照路径"}
+            
+            if snapshot_path:
+                snapshot_dir = Path(snapshot_path)
+            else:
+                # 默认使用该集合最新的已完成快照
+                snapshot_root = self._snapshot_root(collection_name)
+                snapshot_dir = latest_snapshot_dir(snapshot_root)
+                if snapshot_dir is None:
+                    return {"success": False, "error": f"快照不存在: {snapshot_root}"}
+            manifest = load_manifest(snapshot_dir)
+            if manifest is None:
+                return {"success": False, "error": f"快照不存在: {snapshot_dir}"}
+            collection_name = collection_name or manifest["collection_name"]
+            
+            vector_store = self.create_vector_store(config.get("vector_store_type", self.vector_store_type))
+            
+            # 目标集合不存在时按快照中的配置创建
+            if not await vector_store.collection_exists(collection_name):
+                collection_config = dict(config.get("collection_config") or manifest.get("collection_config") or {})
+                collection_config.setdefault("name", collection_name)
+                collection_config.setdefault("dimension", manifest["dimension"])
+                if not await vector_store.create_collection(collection_name, collection_config):
+                    return {"success": False, "error": f"集合 {collection_name} 创建失败"}
+            
+            importer = SnapshotImporter(
+                vector_store,
+                snapshot_dir,
+                collection_name=collection_name,
+                batch_size=config.get("batch_size", 1000),
+                concurrency=config.get("concurrency", 4),
+                verify=config.get("verify", True)
+            )
+            summary = await importer.run()
+            
+            return {
+                "success": True,
+                "message": f"集合 {collection_name} 恢复完成",
+                "snapshot_path": str(snapshot_dir),
+                **summary
+            }
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"恢复集合失败: {str(e)}"
+            }
+    
+    async def copy_collection(self,
+                              collection_name: str,
+                              target_store_type: str,
+                              target_collection: Optional[str] = None,
+                              config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        经由快照把集合复制到另一个向量数据库，可用于跨后端迁移或重建索引
+        
+        Args:
+            collection_name: 源集合名称
+            target_store_type: 目标向量数据库类型
+            target_collection: 目标集合名称，默认与源集合同名
+            config: 传给备份和恢复的配置
+            
+        Returns:
+            复制结果
+        """
+        config = dict(config or {})
+        snapshot_path = config.get("snapshot_path") or next_snapshot_dir(self._snapshot_root(collection_name))
+        config["snapshot_path"] = str(snapshot_path)
+        
+        # 指定的快照已经完成时直接用于恢复
+        manifest = load_manifest(Path(snapshot_path))
+        if manifest is None or not manifest["completed"]:
+            backup_result = await self._backup_collection(collection_name, config)
+            if not backup_result.get("success", False):
+                return backup_result
+        
+        return await self._restore_collection({
+            **config,
+            "collection_name": target_collection or collection_name,
+            "vector_store_type": target_store_type
+        })
     
     def _record_migration(self, migration: VectorDBMigration):
         """记录迁移历史"""
@@ -659,6 +808,12 @@ async def main():
     parser.add_argument("--status", action="store_true", help="查看迁移状态")
     parser.add_argument("--apply", help="应用指定版本的迁移")
     parser.add_argument("--rollback", help="回滚指定版本的迁移")
+    parser.add_argument("--backup", help="备份指定集合为快照")
+    parser.add_argument("--restore", help="从快照恢复指定集合")
+    parser.add_argument("--copy", help="经由快照把指定集合复制到--target-store-type")
+    parser.add_argument("--snapshot-path", help="快照目录，默认使用vector_backups下的目录")
+    parser.add_argument("--target-store-type", choices=["milvus", "pgvector"], help="复制的目标向量数据库类型")
+    parser.add_argument("--concurrency", type=int, default=4, help="快照导出/导入的并发块数")
     
     args = parser.parse_args()
     
@@ -707,6 +862,25 @@ async def main():
         else:
             print(f"回滚迁移失败: {result['error']}")
     
+    elif args.backup or args.restore or args.copy:
+        config = {"concurrency": args.concurrency}
+        if args.snapshot_path:
+            config["snapshot_path"] = args.snapshot_path
+        
+        if args.backup:
+            result = await migrator._backup_collection(args.backup, config)
+        elif args.restore:
+            result = await migrator._restore_collection({"collection_name": args.restore, **config})
+        else:
+            if not args.target_store_type:
+                parser.error("--copy 需要指定 --target-store-type")
+            result = await migrator.copy_collection(args.copy, args.target_store_type, config=config)
+        
+        if result.get("success"):
+            print(f"{result['message']}: {result['snapshot_path']}")
+        else:
+            print(f"操作失败: {result['error']}")
+    
     else:
         parser.print_help()
 
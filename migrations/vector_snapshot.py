@@ -0,0 +1,531 @@
+"""
+向量集合快照模块
+提供流式的集合备份与恢复，快照目录结构:
+    manifest.json                快照清单，记录集合信息、维度和每个块的校验和
+    blocks/block_000000.vec      float32向量块，按行连续存储，可直接内存映射
+    blocks/block_000000.meta     列式元数据(JSON)，包含主键列和各元数据字段列
+导出和导入都以块为单位，内存占用与块大小和并发数成正比，中断后从已完成的块继续。
+同一集合的多次备份放在集合目录下按时间命名的版本子目录中，已完成的快照不会被覆盖
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import sys
+from array import array
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = "vector-snapshot"
+SNAPSHOT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+BLOCKS_DIR = "blocks"
+
+# 向量块使用4字节浮点数
+FLOAT_TYPECODE = "f"
+assert array(FLOAT_TYPECODE).itemsize == 4
+
+
+class SnapshotError(Exception):
+    """快照格式或校验错误"""
+
+
+def _sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _sha256_file(path: Path, chunk_size: int = 1 << 20) -> str:
+    """流式计算文件校验和"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """先写临时文件再替换，中断时不会留下不完整的文件"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _write_json(path: Path, data: Dict[str, Any]) -> None:
+    _write_atomic(path, json.dumps(data, ensure_ascii=False, indent=2, default=str).encode("utf-8"))
+
+
+def _block_name(index: int) -> str:
+    return f"block_{index:06d}"
+
+
+def _to_columns(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """把记录的主键和元数据转换为列式结构，记录中缺失的字段记为None"""
+    columns: Dict[str, List[Any]] = {}
+    for i, row in enumerate(rows):
+        for key, value in (row.get("metadata") or {}).items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = [None] * i
+            column.append(value)
+        for column in columns.values():
+            if len(column) <= i:
+                column.append(None)
+    return {"ids": [row["id"] for row in rows], "columns": columns}
+
+
+def _from_columns(data: Dict[str, Any]) -> List[Tuple[Any, Dict[str, Any]]]:
+    """把列式元数据还原为(主键, 元数据)列表，值为None的字段不还原"""
+    ids = data["ids"]
+    metadata: List[Dict[str, Any]] = [{} for _ in ids]
+    for key, values in data["columns"].items():
+        for item, value in zip(metadata, values):
+            if value is not None:
+                item[key] = value
+    return list(zip(ids, metadata))
+
+
+def load_manifest(snapshot_dir: Path) -> Optional[Dict[str, Any]]:
+    """读取快照清单，不存在时返回None"""
+    manifest_path = Path(snapshot_dir) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return None
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise SnapshotError(f"不是有效的向量快照: {snapshot_dir}")
+    if manifest.get("version", 0) > SNAPSHOT_VERSION:
+        raise SnapshotError(f"不支持的快照版本: {manifest.get('version')}")
+    return manifest
+
+
+def _snapshot_versions(root: Path) -> List[Tuple[Path, Dict[str, Any]]]:
+    """按版本顺序列出集合目录下的快照及其清单，旧版直接位于集合目录的快照排在最前"""
+    root = Path(root)
+    if not root.is_dir():
+        return []
+    candidates = [root] + sorted(path for path in root.iterdir() if path.is_dir() and path.name != BLOCKS_DIR)
+    versions = []
+    for path in candidates:
+        manifest = load_manifest(path)
+        if manifest is not None:
+            versions.append((path, manifest))
+    return versions
+
+
+def latest_snapshot_dir(root: Path) -> Optional[Path]:
+    """集合目录下最新的已完成快照，没有时返回None"""
+    completed = [path for path, manifest in _snapshot_versions(root) if manifest["completed"]]
+    return completed[-1] if completed else None
+
+
+def next_snapshot_dir(root: Path) -> Path:
+    """
+    为新的备份选择快照目录
+    
+    最新的快照未完成时复用其目录以便续传，否则在集合目录下创建新的版本子目录
+    """
+    versions = _snapshot_versions(root)
+    if versions and not versions[-1][1]["completed"]:
+        return versions[-1][0]
+    return Path(root) / datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+
+
+def write_block(snapshot_dir: Path, index: int, rows: List[Dict[str, Any]], dimension: int) -> Dict[str, Any]:
+    """
+    写出一个块并返回其清单条目
+    
+    Args:
+        snapshot_dir: 快照目录
+        index: 块序号
+        rows: 记录列表，每条包含id、vector、metadata
+        dimension: 向量维度
+    
+    Returns:
+        块清单条目
+    """
+    vectors = array(FLOAT_TYPECODE)
+    for row in rows:
+        vector = row["vector"]
+        if len(vector) != dimension:
+            raise SnapshotError(f"记录 {row['id']} 的向量维度为 {len(vector)}，期望 {dimension}")
+        vectors.extend(vector)
+    
+    vector_bytes = vectors.tobytes()
+    metadata_bytes = json.dumps(_to_columns(rows), ensure_ascii=False, default=str).encode("utf-8")
+    
+    name = _block_name(index)
+    blocks_dir = Path(snapshot_dir) / BLOCKS_DIR
+    _write_atomic(blocks_dir / f"{name}.vec", vector_bytes)
+    _write_atomic(blocks_dir / f"{name}.meta", metadata_bytes)
+    
+    return {
+        "index": index,
+        "name": name,
+        "rows": len(rows),
+        "first_id": rows[0]["id"],
+        "last_id": rows[-1]["id"],
+        "vectors_sha256": _sha256_bytes(vector_bytes),
+        "metadata_sha256": _sha256_bytes(metadata_bytes)
+    }
+
+
+def verify_block(snapshot_dir: Path, entry: Dict[str, Any]) -> None:
+    """校验块文件的校验和，不一致时抛出SnapshotError"""
+    blocks_dir = Path(snapshot_dir) / BLOCKS_DIR
+    for suffix, key in ((".vec", "vectors_sha256"), (".meta", "metadata_sha256")):
+        path = blocks_dir / f"{entry['name']}{suffix}"
+        if not path.exists():
+            raise SnapshotError(f"快照块文件缺失: {path.name}")
+        if _sha256_file(path) != entry[key]:
+            raise SnapshotError(f"快照块校验失败: {path.name}")
+
+
+class SnapshotBlock:
+    """以内存映射方式按行读取一个块"""
+    
+    def __init__(self, snapshot_dir: Path, entry: Dict[str, Any], dimension: int, byteorder: str):
+        self.entry = entry
+        self.dimension = dimension
+        self.swap = byteorder != sys.byteorder
+        self._blocks_dir = Path(snapshot_dir) / BLOCKS_DIR
+        self._records: List[Tuple[Any, Dict[str, Any]]] = []
+        self._file = None
+        self._mmap = None
+        self._view = None
+    
+    def open(self) -> None:
+        """读取元数据并映射向量文件"""
+        with open(self._blocks_dir / f"{self.entry['name']}.meta", "rb") as f:
+            self._records = _from_columns(json.loads(f.read()))
+        if len(self._records) != self.entry["rows"]:
+            raise SnapshotError(f"快照块行数不一致: {self.entry['name']}")
+        
+        self._file = open(self._blocks_dir / f"{self.entry['name']}.vec", "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap).cast(FLOAT_TYPECODE)
+        if len(self._view) != self.entry["rows"] * self.dimension:
+            raise SnapshotError(f"快照块大小与维度不匹配: {self.entry['name']}")
+    
+    def rows(self, start: int, stop: int) -> List[Dict[str, Any]]:
+        """读取[start, stop)范围内的记录"""
+        dimension = self.dimension
+        result = []
+        for i in range(start, min(stop, len(self._records))):
+            vector = self._view[i * dimension:(i + 1) * dimension]
+            if self.swap:
+                values = array(FLOAT_TYPECODE, vector.tobytes())
+                values.byteswap()
+                vector = values
+            row_id, metadata = self._records[i]
+            result.append({"id": row_id, "vector": vector.tolist(), "metadata": metadata})
+        return result
+    
+    def close(self) -> None:
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+async def _run_tasks(coros: List[Awaitable]) -> None:
+    """并发运行一组协程，任一失败时取消其余协程并抛出异常"""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+class SnapshotExporter:
+    """
+    流式集合导出器
+    
+    读取协程按主键顺序分页读取源集合，每页成为一个块；多个写出协程并行编码、
+    计算校验和并写盘。队列容量等于并发数，内存中最多同时存在约2倍并发数个块
+    """
+    
+    def __init__(self,
+                 vector_store,
+                 collection_name: str,
+                 snapshot_dir: Path,
+                 block_size: int = 10000,
+                 concurrency: int = 4,
+                 source_type: Optional[str] = None,
+                 collection_config: Optional[Dict[str, Any]] = None):
+        """
+        初始化导出器
+        
+        Args:
+            vector_store: 源向量存储，需实现read_batch
+            collection_name: 源集合名称
+            snapshot_dir: 快照目录
+            block_size: 每个块的记录数
+            concurrency: 并行写出的块数
+            source_type: 源向量存储类型，写入清单供恢复时参考
+            collection_config: 集合配置，写入清单供恢复时创建集合；
+                未提供时通过源存储的describe_collection读取
+        """
+        self.vector_store = vector_store
+        self.collection_name = collection_name
+        self.snapshot_dir = Path(snapshot_dir)
+        self.block_size = max(1, block_size)
+        self.concurrency = max(1, concurrency)
+        self.source_type = source_type
+        self.collection_config = collection_config
+    
+    def _prepare_manifest(self, collection_config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        加载未完成的清单以便续传，只保留从第0块开始连续完成的块；
+        目录中已有完成的快照时拒绝导出，不覆盖已有备份
+        """
+        manifest = load_manifest(self.snapshot_dir)
+        if manifest is not None and manifest["completed"]:
+            raise SnapshotError(f"快照目录已包含完成的快照，不会覆盖: {self.snapshot_dir}")
+        (self.snapshot_dir / BLOCKS_DIR).mkdir(parents=True, exist_ok=True)
+        
+        if manifest is None:
+            manifest = {
+                "format": SNAPSHOT_FORMAT,
+                "version": SNAPSHOT_VERSION,
+                "collection_name": self.collection_name,
+                "source_type": self.source_type,
+                "collection_config": collection_config,
+                "dimension": (collection_config or {}).get("dimension"),
+                "dtype": "float32",
+                "byteorder": sys.byteorder,
+                "block_size": self.block_size,
+                "created_at": datetime.utcnow().isoformat(),
+                "completed": False,
+                "total_rows": 0,
+                "blocks": []
+            }
+        elif manifest["collection_name"] != self.collection_name:
+            raise SnapshotError(
+                f"快照目录已包含集合 {manifest['collection_name']} 的快照: {self.snapshot_dir}"
+            )
+        elif not manifest.get("collection_config"):
+            manifest["collection_config"] = collection_config
+        
+        blocks = sorted(manifest["blocks"], key=lambda entry: entry["index"])
+        contiguous = []
+        for entry in blocks:
+            if entry["index"] != len(contiguous):
+                break
+            contiguous.append(entry)
+        manifest["blocks"] = contiguous
+        _write_json(self.snapshot_dir / MANIFEST_NAME, manifest)
+        return manifest
+    
+    async def run(self) -> Dict[str, Any]:
+        """
+        执行导出
+        
+        Returns:
+            导出摘要，包括总行数、块数、维度以及本次是否为续传
+        """
+        collection_config = self.collection_config
+        if collection_config is None:
+            collection_config = await self.vector_store.describe_collection(self.collection_name)
+        if not collection_config:
+            logger.warning(f"未能读取集合 {self.collection_name} 的结构，恢复时只能按维度创建集合")
+        
+        manifest = await asyncio.to_thread(self._prepare_manifest, collection_config)
+        resumed_blocks = len(manifest["blocks"])
+        if resumed_blocks:
+            logger.info(f"从第 {resumed_blocks} 个块继续导出集合 {self.collection_name}")
+        
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency)
+        manifest_lock = asyncio.Lock()
+        read_errors: List[Exception] = []
+        
+        async def read_blocks():
+            index = resumed_blocks
+            after_id = manifest["blocks"][-1]["last_id"] if manifest["blocks"] else None
+            try:
+                while True:
+                    rows = await self.vector_store.read_batch(self.collection_name, after_id, self.block_size)
+                    if not rows:
+                        break
+                    if manifest["dimension"] is None:
+                        manifest["dimension"] = len(rows[0]["vector"])
+                    await queue.put((index, rows))
+                    index += 1
+                    after_id = rows[-1]["id"]
+                    if len(rows) < self.block_size:
+                        break
+            except Exception as e:
+                # 读取失败时先让已读出的块写完，下次续传可少读这些块
+                read_errors.append(e)
+            for _ in range(self.concurrency):
+                await queue.put(None)
+        
+        async def write_blocks():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                index, rows = item
+                entry = await asyncio.to_thread(
+                    write_block, self.snapshot_dir, index, rows, manifest["dimension"]
+                )
+                async with manifest_lock:
+                    manifest["blocks"].append(entry)
+                    manifest["blocks"].sort(key=lambda block: block["index"])
+                    await asyncio.to_thread(_write_json, self.snapshot_dir / MANIFEST_NAME, manifest)
+        
+        await _run_tasks([read_blocks()] + [write_blocks() for _ in range(self.concurrency)])
+        if read_errors:
+            raise read_errors[0]
+        
+        manifest["completed"] = True
+        manifest["completed_at"] = datetime.utcnow().isoformat()
+        manifest["total_rows"] = sum(entry["rows"] for entry in manifest["blocks"])
+        await asyncio.to_thread(_write_json, self.snapshot_dir / MANIFEST_NAME, manifest)
+        
+        logger.info(
+            f"集合 {self.collection_name} 导出完成: {manifest['total_rows']} 条，"
+            f"{len(manifest['blocks'])} 个块"
+        )
+        return self._summary(manifest, resumed_blocks)
+    
+    def _summary(self, manifest: Dict[str, Any], resumed_blocks: int) -> Dict[str, Any]:
+        return {
+            "total_rows": manifest["total_rows"],
+            "blocks": len(manifest["blocks"]),
+            "dimension": manifest["dimension"],
+            "resumed_blocks": resumed_blocks
+        }
+
+
+class SnapshotImporter:
+    """
+    流式集合导入器
+    
+    多个协程并行导入不同的块，每个块内按batch_size分批写入目标存储。
+    已完成的块记录在快照目录的进度文件中，中断后重新执行时跳过；
+    上一次导入已全部完成时从头导入；未完成的块会整体重写，目标存储的write_batch需保证重复写入幂等
+    """
+    
+    def __init__(self,
+                 vector_store,
+                 snapshot_dir: Path,
+                 collection_name: Optional[str] = None,
+                 batch_size: int = 1000,
+                 concurrency: int = 4,
+                 verify: bool = True):
+        """
+        初始化导入器
+        
+        Args:
+            vector_store: 目标向量存储，需实现write_batch
+            snapshot_dir: 快照目录
+            collection_name: 目标集合名称，默认与快照中的集合同名
+            batch_size: 单次写入的记录数
+            concurrency: 并行导入的块数
+            verify: 导入前是否校验块的校验和
+        """
+        self.vector_store = vector_store
+        self.snapshot_dir = Path(snapshot_dir)
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.verify = verify
+        
+        self.manifest = load_manifest(self.snapshot_dir)
+        if self.manifest is None:
+            raise SnapshotError(f"快照不存在: {self.snapshot_dir}")
+        if not self.manifest["completed"]:
+            raise SnapshotError(f"快照尚未导出完成: {self.snapshot_dir}")
+        self.collection_name = collection_name or self.manifest["collection_name"]
+        
+        store_name = type(vector_store).__name__
+        self.progress_path = self.snapshot_dir / f"restore_{store_name}_{self.collection_name}.json"
+    
+    def _load_progress(self) -> Dict[str, Any]:
+        """读取未完成导入的进度；上一次导入已完成时重新开始，再次恢复到新建的集合不会被跳过"""
+        if self.progress_path.exists():
+            with open(self.progress_path, "r", encoding="utf-8") as f:
+                progress = json.load(f)
+            if not progress.get("completed"):
+                return progress
+            logger.info(f"集合 {self.collection_name} 的上一次导入已完成，重新导入全部块")
+        return {"collection_name": self.collection_name, "completed_blocks": [], "completed": False}
+    
+    async def run(self) -> Dict[str, Any]:
+        """
+        执行导入
+        
+        Returns:
+            导入摘要，包括本次导入的行数、块数以及跳过的已完成块数
+        """
+        progress = await asyncio.to_thread(self._load_progress)
+        completed_blocks = set(progress["completed_blocks"])
+        pending = [entry for entry in self.manifest["blocks"] if entry["index"] not in completed_blocks]
+        skipped = len(self.manifest["blocks"]) - len(pending)
+        if skipped:
+            logger.info(f"跳过 {skipped} 个已导入的块，继续导入集合 {self.collection_name}")
+        
+        queue: asyncio.Queue = asyncio.Queue()
+        for entry in pending:
+            queue.put_nowait(entry)
+        progress_lock = asyncio.Lock()
+        imported_rows = 0
+        
+        async def import_blocks():
+            nonlocal imported_rows
+            while True:
+                try:
+                    entry = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self._import_block(entry)
+                async with progress_lock:
+                    imported_rows += entry["rows"]
+                    completed_blocks.add(entry["index"])
+                    progress["completed_blocks"] = sorted(completed_blocks)
+                    await asyncio.to_thread(_write_json, self.progress_path, progress)
+        
+        await _run_tasks([import_blocks() for _ in range(self.concurrency)])
+        await self.vector_store.finish_write(self.collection_name)
+        
+        progress["completed"] = True
+        progress["completed_at"] = datetime.utcnow().isoformat()
+        await asyncio.to_thread(_write_json, self.progress_path, progress)
+        
+        logger.info(f"集合 {self.collection_name} 导入完成: 本次 {imported_rows} 条，{len(pending)} 个块")
+        return {
+            "imported_rows": imported_rows,
+            "imported_blocks": len(pending),
+            "skipped_blocks": skipped,
+            "total_rows": self.manifest["total_rows"]
+        }
+    
+    async def _import_block(self, entry: Dict[str, Any]) -> None:
+        """校验并分批写入一个块"""
+        if self.verify:
+            await asyncio.to_thread(verify_block, self.snapshot_dir, entry)
+        
+        block = SnapshotBlock(self.snapshot_dir, entry, self.manifest["dimension"], self.manifest["byteorder"])
+        try:
+            await asyncio.to_thread(block.open)
+            for start in range(0, entry["rows"], self.batch_size):
+                rows = await asyncio.to_thread(block.rows, start, start + self.batch_size)
+                await self.vector_store.write_batch(self.collection_name, rows)
+        finally:
+            block.close()
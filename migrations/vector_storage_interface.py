@@ -3,6 +3,8 @@
 提供简化的向量存储操作，避免复杂的依赖关系
 """
 
+import asyncio
+import json
 import logging
 from typing import Dict, Any, Optional, List
 from abc import ABC, abstractmethod
@@ -33,6 +35,49 @@ class VectorStoreInterface(ABC):
     async def collection_exists(self, collection_name: str) -> bool:
         """检查集合是否存在"""
         pass
+    
+    async def describe_collection(self, collection_name: str) -> Optional[Dict[str, Any]]:
+        """
+        读取集合结构，返回值可直接传给create_collection重建集合
+        
+        Args:
+            collection_name: 集合名称
+            
+        Returns:
+            集合配置，不支持时返回None
+        """
+        return None
+    
+    async def read_batch(self, collection_name: str, after_id: Optional[Any], limit: int) -> List[Dict[str, Any]]:
+        """
+        按主键顺序分页读取数据
+        
+        Args:
+            collection_name: 集合名称
+            after_id: 上一页最后一条的主键，None表示从头读取
+            limit: 每页条数
+            
+        Returns:
+            记录列表，每条包含id、vector、metadata，按id升序
+        """
+        raise NotImplementedError(f"{type(self).__name__} 不支持分页读取")
+    
+    async def write_batch(self, collection_name: str, rows: List[Dict[str, Any]]) -> int:
+        """
+        批量写入数据，已存在的主键应被忽略或覆盖，以便中断后重复写入
+        
+        Args:
+            collection_name: 集合名称
+            rows: 记录列表，格式同read_batch
+            
+        Returns:
+            写入条数
+        """
+        raise NotImplementedError(f"{type(self).__name__} 不支持批量写入")
+    
+    async def finish_write(self, collection_name: str) -> None:
+        """批量写入全部完成后调用，用于刷新或修正自增序列"""
+        pass
 
 
 class MockVectorStore(VectorStoreInterface):
@@ -40,12 +85,15 @@ class MockVectorStore(VectorStoreInterface):
     
     def __init__(self):
         self.collections = set()
+        self.configs: Dict[str, Dict[str, Any]] = {}
+        self.rows: Dict[str, Dict[Any, Dict[str, Any]]] = {}
         logger.info("初始化模拟向量存储")
     
     async def create_collection(self, collection_name: str, config: Dict[str, Any]) -> bool:
         """创建集合"""
         try:
             self.collections.add(collection_name)
+            self.configs[collection_name] = dict(config)
             logger.info(f"模拟创建集合: {collection_name}")
             return True
         except Exception as e:
@@ -56,6 +104,8 @@ class MockVectorStore(VectorStoreInterface):
         """删除集合"""
         try:
             self.collections.discard(collection_name)
+            self.configs.pop(collection_name, None)
+            self.rows.pop(collection_name, None)
             logger.info(f"模拟删除集合: {collection_name}")
             return True
         except Exception as e:
@@ -69,6 +119,24 @@ class MockVectorStore(VectorStoreInterface):
     async def collection_exists(self, collection_name: str) -> bool:
         """检查集合是否存在"""
         return collection_name in self.collections
+    
+    async def describe_collection(self, collection_name: str) -> Optional[Dict[str, Any]]:
+        """读取创建集合时的配置"""
+        config = self.configs.get(collection_name)
+        return dict(config) if config is not None else None
+    
+    async def read_batch(self, collection_name: str, after_id: Optional[Any], limit: int) -> List[Dict[str, Any]]:
+        """分页读取数据"""
+        rows = self.rows.get(collection_name, {})
+        ids = sorted(row_id for row_id in rows if after_id is None or row_id > after_id)
+        return [rows[row_id] for row_id in ids[:limit]]
+    
+    async def write_batch(self, collection_name: str, rows: List[Dict[str, Any]]) -> int:
+        """批量写入数据"""
+        target = self.rows.setdefault(collection_name, {})
+        for row in rows:
+            target[row["id"]] = row
+        return len(rows)
 
 
 class MilvusVectorStore(VectorStoreInterface):
@@ -111,13 +179,15 @@ class MilvusVectorStore(VectorStoreInterface):
                 logger.info(f"集合 {collection_name} 已存在")
                 return True
             
-            # 创建字段模式
+            # 创建字段模式，未给出字段时按维度使用与PgVector表对应的默认结构
+            field_configs = config.get("fields") or self._default_fields(config)
             fields = []
-            for field_config in config.get("fields", []):
+            for field_config in field_configs:
                 field = FieldSchema(
                     name=field_config["name"],
                     dtype=getattr(DataType, field_config["type"]),
                     is_primary=field_config.get("is_primary", False),
+                    auto_id=field_config.get("auto_id", False),
                     max_length=field_config.get("max_length"),
                     dim=field_config.get("dimension")
                 )
@@ -142,6 +212,17 @@ class MilvusVectorStore(VectorStoreInterface):
             logger.error(f"创建Milvus集合失败: {str(e)}")
             return False
     
+    @staticmethod
+    def _default_fields(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """按维度生成默认字段：整数主键、向量和JSON元数据"""
+        if not config.get("dimension"):
+            raise ValueError("集合配置缺少fields和dimension，无法创建Milvus集合")
+        return [
+            {"name": "id", "type": "INT64", "is_primary": True},
+            {"name": "embedding", "type": "FLOAT_VECTOR", "dimension": config["dimension"]},
+            {"name": "metadata", "type": "JSON"}
+        ]
+    
     async def drop_collection(self, collection_name: str) -> bool:
         """删除集合"""
         try:
@@ -185,6 +266,97 @@ class MilvusVectorStore(VectorStoreInterface):
         except Exception as e:
             logger.error(f"检查Milvus集合存在性失败: {str(e)}")
             return False
+    
+    async def describe_collection(self, collection_name: str) -> Optional[Dict[str, Any]]:
+        """把集合的schema转换为create_collection使用的字段配置"""
+        from pymilvus import Collection
+        
+        await self._get_client()
+        schema = Collection(collection_name).schema
+        fields = []
+        dimension = None
+        for field in schema.fields:
+            field_config = {"name": field.name, "type": field.dtype.name}
+            if field.is_primary:
+                field_config["is_primary"] = True
+            if getattr(field, "auto_id", False):
+                field_config["auto_id"] = True
+            params = field.params or {}
+            if "max_length" in params:
+                field_config["max_length"] = int(params["max_length"])
+            if "dim" in params:
+                field_config["dimension"] = dimension = int(params["dim"])
+            fields.append(field_config)
+        return {
+            "name": collection_name,
+            "description": schema.description,
+            "dimension": dimension,
+            "fields": fields
+        }
+    
+    async def _get_collection(self, collection_name: str):
+        """获取集合对象及其主键字段和向量字段名"""
+        from pymilvus import Collection, DataType
+        
+        await self._get_client()
+        collection = Collection(collection_name)
+        primary_field = collection.schema.primary_field.name
+        vector_field = next(
+            field.name for field in collection.schema.fields
+            if field.dtype == DataType.FLOAT_VECTOR
+        )
+        return collection, primary_field, vector_field
+    
+    async def read_batch(self, collection_name: str, after_id: Optional[Any], limit: int) -> List[Dict[str, Any]]:
+        """按主键分页读取数据，其余标量字段放入metadata"""
+        collection, primary_field, vector_field = await self._get_collection(collection_name)
+        
+        expr = "" if after_id is None else (
+            f'{primary_field} > "{after_id}"' if isinstance(after_id, str) else f"{primary_field} > {after_id}"
+        )
+        
+        def query():
+            collection.load()
+            return collection.query(expr=expr, output_fields=["*"], limit=limit)
+        
+        results = await asyncio.to_thread(query)
+        results.sort(key=lambda item: item[primary_field])
+        return [
+            {
+                "id": item.pop(primary_field),
+                "vector": list(item.pop(vector_field)),
+                "metadata": item
+            }
+            for item in results
+        ]
+    
+    async def write_batch(self, collection_name: str, rows: List[Dict[str, Any]]) -> int:
+        """批量写入数据，metadata中与集合字段同名的值写入对应字段"""
+        collection, primary_field, vector_field = await self._get_collection(collection_name)
+        scalar_fields = [
+            field.name for field in collection.schema.fields
+            if field.name not in (primary_field, vector_field)
+        ]
+        
+        entities = []
+        for row in rows:
+            metadata = row.get("metadata") or {}
+            entity = {primary_field: row["id"], vector_field: row["vector"]}
+            for name in scalar_fields:
+                if name in metadata:
+                    entity[name] = metadata[name]
+                elif name == "metadata":
+                    entity[name] = metadata
+            entities.append(entity)
+        
+        # 主键已存在时覆盖，重复写入同一批数据不会产生重复记录
+        await asyncio.to_thread(collection.upsert, entities)
+        return len(entities)
+    
+    async def finish_write(self, collection_name: str) -> None:
+        """刷新集合使写入的数据落盘"""
+        collection, _, _ = await self._get_collection(collection_name)
+        await asyncio.to_thread(collection.flush)
 
 
 class PgVectorStore(VectorStoreInterface):
@@ -293,6 +465,95 @@ class PgVectorStore(VectorStoreInterface):
         except Exception as e:
             logger.error(f"检查PgVector表存在性失败: {str(e)}")
             return False
+    
+    async def describe_collection(self, collection_name: str) -> Optional[Dict[str, Any]]:
+        """读取表的向量维度和列定义"""
+        import asyncpg
+        
+        conn = await asyncpg.connect(self.database_url)
+        try:
+            # vector类型的atttypmod即为维度
+            dimension = await conn.fetchval("""
+                SELECT atttypmod FROM pg_attribute
+                WHERE attrelid = $1::regclass AND attname = 'embedding'
+            """, collection_name)
+            columns = await conn.fetch("""
+                SELECT column_name, udt_name
+                FROM information_schema.columns
+                WHERE table_schema = 'public' AND table_name = $1
+                ORDER BY ordinal_position
+            """, collection_name)
+        finally:
+            await conn.close()
+        
+        return {
+            "name": collection_name,
+            "dimension": dimension if dimension and dimension > 0 else None,
+            "columns": [{"name": row["column_name"], "type": row["udt_name"]} for row in columns]
+        }
+    
+    async def read_batch(self, collection_name: str, after_id: Optional[Any], limit: int) -> List[Dict[str, Any]]:
+        """按主键分页读取数据"""
+        import asyncpg
+        
+        conn = await asyncpg.connect(self.database_url)
+        try:
+            records = await conn.fetch(f"""
+                SELECT id, embedding::text AS embedding, metadata::text AS metadata
+                FROM {collection_name}
+                WHERE $1::bigint IS NULL OR id > $1
+                ORDER BY id
+                LIMIT $2
+            """, after_id, limit)
+        finally:
+            await conn.close()
+        
+        return [
+            {
+                "id": record["id"],
+                "vector": json.loads(record["embedding"]) if record["embedding"] else [],
+                "metadata": json.loads(record["metadata"]) if record["metadata"] else {}
+            }
+            for record in records
+        ]
+    
+    async def write_batch(self, collection_name: str, rows: List[Dict[str, Any]]) -> int:
+        """批量写入数据，已存在的主键被忽略"""
+        import asyncpg
+        
+        conn = await asyncpg.connect(self.database_url)
+        try:
+            await conn.executemany(f"""
+                INSERT INTO {collection_name} (id, embedding, metadata)
+                VALUES ($1, $2::vector, $3::jsonb)
+                ON CONFLICT (id) DO NOTHING
+            """, [
+                (
+                    row["id"],
+                    json.dumps(row["vector"]),
+                    json.dumps(row.get("metadata") or {}, ensure_ascii=False)
+                )
+                for row in rows
+            ])
+        finally:
+            await conn.close()
+        return len(rows)
+    
+    async def finish_write(self, collection_name: str) -> None:
+        """写入显式主键后，把自增序列推进到当前最大主键"""
+        import asyncpg
+        
+        conn = await asyncpg.connect(self.database_url)
+        try:
+            await conn.execute(f"""
+                SELECT setval(
+                    pg_get_serial_sequence('{collection_name}', 'id'),
+                    COALESCE((SELECT MAX(id) FROM {collection_name}), 0) + 1,
+                    false
+                )
+            """)
+        finally:
+            await conn.close()
 
 
 def create_vector_store(vector_store_type: str) -> VectorStoreInterface:
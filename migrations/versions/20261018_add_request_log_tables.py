@@ -0,0 +1,59 @@
+"""Add request log and rollup tables
+
+Revision ID: 20261018_request_logs
+Revises: 20250522_context_compression
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_request_logs'
+down_revision = '20250522_context_compression'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 创建请求日志表
+    op.create_table('request_logs',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('timestamp', sa.DateTime(), nullable=False),
+        sa.Column('endpoint', sa.String(length=255), nullable=False),
+        sa.Column('method', sa.String(length=10), nullable=False),
+        sa.Column('user_id', sa.String(length=36), nullable=True),
+        sa.Column('status_code', sa.Integer(), nullable=False),
+        sa.Column('response_time', sa.Float(), nullable=False),
+        sa.Column('request_data', sa.JSON(), nullable=True),
+        sa.Column('response_data', sa.JSON(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_request_logs_timestamp', 'request_logs', ['timestamp'], unique=False)
+    op.create_index('ix_request_logs_endpoint_timestamp', 'request_logs', ['endpoint', 'timestamp'], unique=False)
+
+    # 创建请求日志预聚合统计表
+    op.create_table('request_log_rollups',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('granularity', sa.String(length=10), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(), nullable=False),
+        sa.Column('endpoint', sa.String(length=255), nullable=False),
+        sa.Column('method', sa.String(length=10), nullable=False),
+        sa.Column('request_count', sa.Integer(), nullable=False, server_default=sa.text('0')),
+        sa.Column('error_count', sa.Integer(), nullable=False, server_default=sa.text('0')),
+        sa.Column('total_response_time', sa.Float(), nullable=False, server_default=sa.text('0')),
+        sa.Column('max_response_time', sa.Float(), nullable=False, server_default=sa.text('0')),
+        sa.Column('latency_sketch', sa.JSON(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('granularity', 'bucket_start', 'endpoint', 'method', name='uq_request_log_rollup_bucket')
+    )
+    op.create_index('ix_request_log_rollups_granularity_bucket', 'request_log_rollups', ['granularity', 'bucket_start'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_request_log_rollups_granularity_bucket', table_name='request_log_rollups')
+    op.drop_table('request_log_rollups')
+    op.drop_index('ix_request_logs_endpoint_timestamp', table_name='request_logs')
+    op.drop_index('ix_request_logs_timestamp', table_name='request_logs')
+    op.drop_table('request_logs')
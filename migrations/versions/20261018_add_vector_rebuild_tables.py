@@ -0,0 +1,56 @@
+"""Add document index state and vector rebuild run tables
+
+Revision ID: 20261018_vector_rebuild
+Revises: 20261018_request_logs
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '20261018_vector_rebuild'
+down_revision = '20261018_request_logs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 创建文档索引状态表
+    op.create_table('document_index_states',
+        sa.Column('document_id', sa.Integer(), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('embedding_model', sa.String(length=100), nullable=False),
+        sa.Column('indexed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('document_id')
+    )
+
+    # 创建向量存储重建运行表
+    op.create_table('vector_rebuild_runs',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('knowledge_base_id', sa.Integer(), nullable=True),
+        sa.Column('force', sa.Boolean(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('last_document_id', sa.Integer(), nullable=True),
+        sa.Column('scanned_documents', sa.Integer(), nullable=True),
+        sa.Column('skipped_documents', sa.Integer(), nullable=True),
+        sa.Column('dispatched_batches', sa.Integer(), nullable=True),
+        sa.Column('completed_batches', sa.Integer(), nullable=True),
+        sa.Column('indexed_documents', sa.Integer(), nullable=True),
+        sa.Column('failed_documents', sa.Integer(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['knowledge_base_id'], ['knowledge_bases.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_vector_rebuild_runs_id', 'vector_rebuild_runs', ['id'], unique=False)
+    op.create_index('ix_vector_rebuild_runs_status', 'vector_rebuild_runs', ['status', 'knowledge_base_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_vector_rebuild_runs_status', table_name='vector_rebuild_runs')
+    op.drop_index('ix_vector_rebuild_runs_id', table_name='vector_rebuild_runs')
+    op.drop_table('vector_rebuild_runs')
+    op.drop_table('document_index_states')
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+内存缓存微基准测试
+对比分段前的单锁MemoryCache（LegacyMemoryCache，按原实现保留在本脚本中）与多分段
+MemoryCache的多线程吞吐，以及LRU与TinyLFU准入在Zipf分布访问下的命中率
+
+示例:
+    python scripts/benchmark_memory_cache.py --threads 8 --ops 200000
+"""
+
+import sys
+import time
+import json
+import random
+import argparse
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from app.utils.core.cache.memory_cache import MemoryCache
+
+
+class LegacyMemoryCache:
+    """分段改造前的MemoryCache：一把全局锁，LRU顺序与TTL共用，清理线程全量扫描"""
+
+    def __init__(self, max_size: int = 1000, default_ttl: int = 3600):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.cache: Dict[str, Tuple[Any, float]] = {}  # key: (value, expire_time)
+        self.access_order = OrderedDict()  # 用于LRU
+        self.lock = threading.RLock()
+
+        # 启动后台清理线程
+        self._start_cleanup_thread()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            if key in self.cache:
+                value, expire_time = self.cache[key]
+                if time.time() < expire_time:
+                    # 更新访问顺序
+                    self.access_order.move_to_end(key)
+                    return value
+                else:
+                    # 过期，删除
+                    self._remove_key(key)
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        ttl = ttl or self.default_ttl
+        expire_time = time.time() + ttl
+
+        with self.lock:
+            # 如果是新键且已达到最大大小，移除最少使用的项
+            if key not in self.cache and len(self.cache) >= self.max_size:
+                self._evict_lru()
+
+            self.cache[key] = (value, expire_time)
+            self.access_order[key] = None  # 添加到访问顺序末尾
+
+    def _remove_key(self, key: str) -> None:
+        if key in self.cache:
+            del self.cache[key]
+        if key in self.access_order:
+            del self.access_order[key]
+
+    def _evict_lru(self) -> None:
+        if self.access_order:
+            lru_key = next(iter(self.access_order))
+            self._remove_key(lru_key)
+
+    def _cleanup_expired(self) -> int:
+        current_time = time.time()
+        expired_keys = []
+
+        with self.lock:
+            for key, (_, expire_time) in self.cache.items():
+                if current_time >= expire_time:
+                    expired_keys.append(key)
+
+            for key in expired_keys:
+                self._remove_key(key)
+
+        return len(expired_keys)
+
+    def _start_cleanup_thread(self) -> None:
+        def cleanup_worker():
+            while True:
+                time.sleep(60)  # 每分钟清理一次
+                self._cleanup_expired()
+
+        cleanup_thread = threading.Thread(target=cleanup_worker, daemon=True)
+        cleanup_thread.start()
+
+
+def zipf_keys(count: int, key_space: int, skew: float, seed: int) -> list:
+    """生成服从Zipf分布的键序列"""
+    rng = random.Random(seed)
+    weights = [1.0 / (rank ** skew) for rank in range(1, key_space + 1)]
+    return [f"key:{k}" for k in rng.choices(range(key_space), weights=weights, k=count)]
+
+
+def run_throughput(cache: Any, keys: list, threads: int, write_ratio: float) -> float:
+    """多线程混合读写，返回每秒操作数"""
+    per_thread = len(keys) // threads
+
+    def worker(offset: int):
+        rng = random.Random(offset)
+        for key in keys[offset:offset + per_thread]:
+            if rng.random() < write_ratio:
+                cache.set(key, key)
+            elif cache.get(key) is None:
+                cache.set(key, key)
+
+    workers = [threading.Thread(target=worker, args=(i * per_thread,)) for i in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return per_thread * threads / elapsed
+
+
+def run_hit_ratio(cache: Any, keys: list) -> float:
+    """单线程读穿透，返回命中率"""
+    hits = 0
+    for key in keys:
+        if cache.get(key) is not None:
+            hits += 1
+        else:
+            cache.set(key, key)
+    return hits / len(keys)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="内存缓存微基准测试")
+    parser.add_argument("--ops", type=int, default=200000, help="操作次数")
+    parser.add_argument("--threads", type=int, default=8, help="线程数")
+    parser.add_argument("--key-space", type=int, default=100000, help="键空间大小")
+    parser.add_argument("--capacity", type=int, default=10000, help="缓存容量")
+    parser.add_argument("--skew", type=float, default=0.9, help="Zipf偏斜度")
+    parser.add_argument("--write-ratio", type=float, default=0.1, help="写操作比例")
+    parser.add_argument("--output", help="JSON报告输出路径")
+    args = parser.parse_args()
+
+    keys = zipf_keys(args.ops, args.key_space, args.skew, seed=42)
+    configs = {
+        "legacy_single_lock": lambda: LegacyMemoryCache(max_size=args.capacity),
+        "sharded_lru": lambda: MemoryCache(max_size=args.capacity, num_shards=16, admission="lru"),
+        "sharded_tinylfu": lambda: MemoryCache(max_size=args.capacity, num_shards=16, admission="tinylfu"),
+    }
+
+    report = {"params": vars(args), "results": {}}
+    for name, create_cache in configs.items():
+        throughput = run_throughput(create_cache(), keys, args.threads, args.write_ratio)
+        hit_ratio = run_hit_ratio(create_cache(), keys)
+        report["results"][name] = {"ops_per_second": throughput, "hit_ratio": hit_ratio}
+        print(f"{name:<20} 吞吐: {throughput:>12.0f} ops/s   命中率: {hit_ratio:.3f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n📄 详细报告已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+向量存储基准测试脚本
+用同一份语料测试内存、Milvus、pgvector、Elasticsearch等适配器，输出JSON报告，
+便于在版本之间对比写入吞吐、检索延迟、召回率和内存占用
+
+示例:
+    python scripts/benchmark_vector_stores.py --backends memory,milvus --num-vectors 100000
+    python scripts/benchmark_vector_stores.py --vectors corpus.npy --queries queries.npy --output bench.json
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+
+# 添加项目根目录到路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+import numpy as np
+
+from app.utils.storage.vector_storage.benchmark import (
+    VectorStoreBenchmark, generate_corpus, build_corpus, write_report
+)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# pgvector和ES只支持余弦度量的默认配置，Milvus索引和检索参数需与之保持一致
+MILVUS_METRIC = "COSINE"
+
+
+def create_store(backend: str):
+    """
+    按名称创建适配器及其集合参数
+
+    返回:
+        (适配器, 创建集合参数)
+    """
+    if backend == "memory":
+        from app.utils.storage.vector_storage.memory_adapter import InMemoryVectorStore
+        return InMemoryVectorStore("benchmark"), {"metric_type": "COSINE"}
+
+    if backend == "milvus":
+        from app.utils.storage.vector_storage.milvus_adapter import MilvusVectorStore
+        config = {
+            "vector_store_host": os.getenv("MILVUS_HOST", "localhost"),
+            "vector_store_port": int(os.getenv("MILVUS_PORT", "19530")),
+            "search_params": {"metric_type": MILVUS_METRIC, "params": {"ef": 128}}
+        }
+        collection_kwargs = {
+            "index_params": {
+                "index_type": "HNSW",
+                "metric_type": MILVUS_METRIC,
+                "params": {"M": 16, "efConstruction": 200}
+            }
+        }
+        return MilvusVectorStore("benchmark", config), collection_kwargs
+
+    if backend == "pgvector":
+        from app.utils.storage.vector_storage.pgvector_adapter import PgVectorStore
+        config = {"database_url": os.getenv("PGVECTOR_DATABASE_URL") or os.getenv("DATABASE_URL")}
+        return PgVectorStore("benchmark", config), {"index_type": "hnsw"}
+
+    if backend == "elasticsearch":
+        from app.utils.storage.vector_storage.elasticsearch_adapter import ElasticsearchVectorStore
+        config = {
+            "es_url": os.getenv("ELASTICSEARCH_URL", "http://localhost:9200"),
+            "username": os.getenv("ELASTICSEARCH_USERNAME"),
+            "password": os.getenv("ELASTICSEARCH_PASSWORD"),
+        }
+        return ElasticsearchVectorStore("benchmark", config), {}
+
+    raise ValueError(f"不支持的后端: {backend}")
+
+
+def print_summary(report: dict) -> None:
+    """打印结果摘要"""
+    print(f"\n{'='*90}")
+    print(f"{'后端':<15}{'写入/秒':>12}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}"
+          f"{'QPS':>10}{'召回率':>10}  错误")
+    print("-" * 90)
+    for item in report["results"]:
+        print(f"{item['backend']:<15}{item['insert_throughput']:>12.1f}"
+              f"{item['search_p50_ms']:>10.2f}{item['search_p95_ms']:>10.2f}"
+              f"{item['search_p99_ms']:>10.2f}{item['search_qps']:>10.1f}"
+              f"{item['recall_at_k']:>10.3f}  {item['error'] or ''}")
+    print("=" * 90)
+
+
+async def run(args) -> dict:
+    """执行基准测试"""
+    if args.vectors:
+        vectors = np.load(args.vectors)
+        queries = np.load(args.queries) if args.queries else vectors[:args.num_queries]
+        corpus = build_corpus(vectors, queries)
+    else:
+        corpus = generate_corpus(args.num_vectors, args.dimension, args.num_queries, args.seed)
+
+    stores = {}
+    collection_kwargs = {}
+    for backend in [name.strip() for name in args.backends.split(",") if name.strip()]:
+        stores[backend], collection_kwargs[backend] = create_store(backend)
+
+    benchmark = VectorStoreBenchmark(
+        corpus,
+        top_k=args.top_k,
+        batch_size=args.batch_size,
+        metric_type="COSINE"
+    )
+    try:
+        return await benchmark.run(stores, collection_kwargs)
+    finally:
+        for store in stores.values():
+            await store.disconnect()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="向量存储基准测试")
+    parser.add_argument("--backends", default="memory", help="逗号分隔: memory,milvus,pgvector,elasticsearch")
+    parser.add_argument("--num-vectors", type=int, default=10000, help="合成语料向量数量")
+    parser.add_argument("--dimension", type=int, default=768, help="合成语料向量维度")
+    parser.add_argument("--num-queries", type=int, default=200, help="查询数量")
+    parser.add_argument("--top-k", type=int, default=10, help="检索结果数量")
+    parser.add_argument("--batch-size", type=int, default=1000, help="写入批量大小")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--vectors", help="真实语料向量文件 (.npy)")
+    parser.add_argument("--queries", help="真实查询向量文件 (.npy)")
+    parser.add_argument("--output", default="vector_store_benchmark.json", help="JSON报告输出路径")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_summary(report)
+    write_report(report, args.output)
+    print(f"\n📄 详细报告已保存到: {args.output}")
+
+    sys.exit(1 if any(item["error"] for item in report["results"]) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+测试异步RabbitMQ客户端：使用内存中的broker替身代替真实连接
+"""
+
+import asyncio
+
+import pytest
+
+async_message_queue = pytest.importorskip("app.utils.messaging.queue.async_message_queue")
+
+RETRY_HEADER = async_message_queue.RETRY_HEADER
+AsyncRabbitMQClient = async_message_queue.AsyncRabbitMQClient
+decode_message = async_message_queue.decode_message
+
+
+class FakeExchange:
+    def __init__(self, broker, name, publisher_confirms=True):
+        self.broker = broker
+        self.name = name
+        self.publisher_confirms = publisher_confirms
+
+    async def publish(self, message, routing_key):
+        if self.broker.fail_publish:
+            raise ConnectionError("broker went away")
+        self.broker.published.append((self.name, routing_key, message))
+        if not self.publisher_confirms:
+            self.broker.unconfirmed.append((self.name, routing_key, message))
+
+
+class FakeQueue:
+    def __init__(self, broker, name, arguments):
+        self.broker = broker
+        self.name = name
+        self.arguments = arguments
+        self.callback = None
+
+    async def bind(self, exchange, routing_key):
+        self.broker.bindings.append((self.name, exchange.name, routing_key))
+
+    async def consume(self, callback):
+        self.callback = callback
+        return f"ctag-{self.name}"
+
+    async def cancel(self, consumer_tag):
+        self.callback = None
+
+
+class FakeChannel:
+    def __init__(self, broker, publisher_confirms):
+        self.broker = broker
+        self.publisher_confirms = publisher_confirms
+        self.default_exchange = FakeExchange(broker, "", publisher_confirms)
+        self.is_closed = False
+
+    async def declare_exchange(self, name, exchange_type, durable=True):
+        self.broker.declared_exchanges.append(name)
+
+    async def get_exchange(self, name, ensure=True):
+        return FakeExchange(self.broker, name, self.publisher_confirms)
+
+    async def declare_queue(self, name, durable=True, arguments=None):
+        queue = FakeQueue(self.broker, name, arguments)
+        self.broker.queues[name] = queue
+        return queue
+
+    async def set_qos(self, prefetch_count):
+        self.broker.prefetch = prefetch_count
+
+    async def close(self):
+        self.is_closed = True
+
+
+class FakeConnection:
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_closed = False
+
+    async def channel(self, publisher_confirms=True):
+        return FakeChannel(self.broker, publisher_confirms)
+
+    async def close(self):
+        self.is_closed = True
+
+
+class FakeBroker:
+    """记录声明、绑定和发布的broker替身"""
+
+    def __init__(self):
+        self.connections = 0
+        self.declared_exchanges = []
+        self.bindings = []
+        self.published = []
+        self.unconfirmed = []
+        self.fail_publish = False
+        self.queues = {}
+        self.prefetch = None
+
+    async def connect(self, url):
+        self.connections += 1
+        return FakeConnection(self)
+
+
+class FakeIncoming:
+    def __init__(self, body=b'{"n": 1}', content_type="application/json", headers=None):
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers or {}
+        self.acked = False
+        self.nacked = None
+
+    async def ack(self):
+        self.acked = True
+
+    async def nack(self, requeue=True):
+        self.nacked = requeue
+
+
+@pytest.fixture
+def broker():
+    return FakeBroker()
+
+
+@pytest.fixture
+def client(broker):
+    return AsyncRabbitMQClient(url="amqp://stand-in/", connection_factory=broker.connect)
+
+
+async def _deliver(queue, incoming):
+    await queue.callback(incoming)
+    # 等待消费者任务处理完成
+    for _ in range(20):
+        if incoming.acked or incoming.nacked is not None:
+            break
+        await asyncio.sleep(0)
+
+
+async def test_reuses_connection_and_declares_exchange_once(client, broker):
+    for i in range(5):
+        await client.publish("events", "created", {"i": i})
+
+    assert broker.connections == 1
+    assert broker.declared_exchanges == ["events"]
+    assert [decode_message(msg.body, msg.content_type)["i"] for _, _, msg in broker.published] == list(range(5))
+
+
+async def test_publish_many_confirms_all_messages(client, broker):
+    client.confirm_batch_size = 3
+    confirmed = await client.publish_many("events", [("k", i) for i in range(7)])
+
+    assert confirmed == 7
+    assert len(broker.published) == 7
+
+
+async def test_default_exchange_is_not_declared(client, broker):
+    await client.publish("", "jobs", {"n": 1})
+    await client.init_queue("jobs", "", "jobs")
+
+    assert broker.declared_exchanges == []
+    assert broker.bindings == []
+    assert broker.published[0][:2] == ("", "jobs")
+
+
+async def test_failed_message_is_retried_with_counter(client, broker):
+    async def callback(message):
+        raise ValueError("boom")
+
+    await client.start_consumer("jobs", callback, prefetch_count=4, max_retries=2)
+    incoming = FakeIncoming()
+    await _deliver(broker.queues["jobs"], incoming)
+
+    assert incoming.acked and incoming.nacked is None
+    exchange, routing_key, retried = broker.published[-1]
+    assert (exchange, routing_key) == ("", "jobs")
+    assert retried.headers[RETRY_HEADER] == 1
+    # 重新发布走开启发布确认的通道
+    assert broker.unconfirmed == []
+
+
+async def test_failed_retry_publish_requeues_without_ack(client, broker):
+    async def callback(message):
+        raise ValueError("boom")
+
+    await client.start_consumer("jobs", callback, max_retries=2)
+    broker.fail_publish = True
+    incoming = FakeIncoming()
+    await _deliver(broker.queues["jobs"], incoming)
+
+    assert incoming.nacked is True
+    assert not incoming.acked
+    assert broker.published == []
+
+
+async def test_message_over_retry_limit_is_dead_lettered(client, broker):
+    async def callback(message):
+        raise ValueError("boom")
+
+    await client.start_consumer("jobs", callback, max_retries=2, dead_letter_exchange="jobs.dlx")
+    incoming = FakeIncoming(headers={RETRY_HEADER: 2})
+    await _deliver(broker.queues["jobs"], incoming)
+
+    assert incoming.nacked is False
+    assert not incoming.acked
+    assert broker.published == []
+    assert broker.queues["jobs"].arguments == {"x-dead-letter-exchange": "jobs.dlx"}
+
+
+async def test_successful_message_is_acked(client, broker):
+    received = []
+
+    await client.start_consumer("jobs", received.append, prefetch_count=2)
+    incoming = FakeIncoming()
+    await _deliver(broker.queues["jobs"], incoming)
+    for _ in range(50):
+        if incoming.acked:
+            break
+        await asyncio.sleep(0.01)
+
+    assert received == [{"n": 1}]
+    assert incoming.acked
+    assert broker.prefetch == 2
+    await client.close()
@@ -0,0 +1,73 @@
+"""
+测试上下文增量压缩：检索结果流式到达时边到达边总结，以及流式检索函数的压缩装饰器
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("llama_index.core")
+compressor_module = pytest.importorskip("app.tools.advanced.context_compression.context_compressor")
+decorators = pytest.importorskip("app.tools.advanced.context_compression.decorators")
+
+CompressionConfig = compressor_module.CompressionConfig
+ContextCompressor = compressor_module.ContextCompressor
+
+
+class RecordingLLM:
+    """记录每次总结的上下文，返回编号的总结"""
+
+    metadata = SimpleNamespace(context_window=4096, num_output=256)
+
+    def __init__(self):
+        self.calls = []
+
+    async def apredict(self, prompt, context_str, query_str):
+        self.calls.append(context_str)
+        return f"summary{len(self.calls)}"
+
+
+async def test_groups_are_summarized_while_results_stream_in():
+    llm = RecordingLLM()
+    compressor = ContextCompressor(llm=llm, config=CompressionConfig(num_children=2))
+    calls_before_end = []
+
+    async def results():
+        for i in range(4):
+            yield f"段落{i}"
+            await asyncio.sleep(0)
+        calls_before_end.append(len(llm.calls))
+
+    compressed = await compressor.acompress_stream(results(), "问题")
+
+    # 第一组在检索结束前已经开始总结
+    assert calls_before_end[0] >= 1
+    assert llm.calls[:2] == ["段落0\n\n段落1", "段落2\n\n段落3"]
+    assert compressed == "summary3"
+
+
+async def test_failed_stream_falls_back_to_received_text():
+    compressor = ContextCompressor(llm=RecordingLLM(), config=CompressionConfig(num_children=2))
+
+    async def results():
+        yield "甲"
+        yield "乙"
+        raise ConnectionError("search backend went away")
+
+    assert await compressor.acompress_stream(results(), "问题") == "甲\n\n乙"
+
+
+async def test_decorator_compresses_streaming_retrieval():
+    llm = RecordingLLM()
+
+    @decorators.compress_retrieval_results(config=CompressionConfig(num_children=2), llm=llm)
+    async def search(query):
+        for i in range(3):
+            yield {"content": f"结果{i}", "metadata": {"rank": i}}
+
+    result = await search(query="问题")
+
+    assert [item["content"] for item in result["original_results"]] == ["结果0", "结果1", "结果2"]
+    assert result["compressed_context"] == "summary3"
+    assert len(llm.calls) == 3
@@ -0,0 +1,132 @@
+"""
+测试InfluxDB批量写入器：使用httpx的本地传输替身代替InfluxDB写接口
+"""
+
+import asyncio
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+token_metrics = pytest.importorskip("app.utils.monitoring.token_metrics")
+
+InfluxDBBatchWriter = token_metrics.InfluxDBBatchWriter
+to_line_protocol = token_metrics.to_line_protocol
+
+
+class InfluxStandIn:
+    """记录写入请求的InfluxDB替身，按顺序返回预设的状态码，用完后返回204"""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.requests = []
+
+    def handler(self, request):
+        self.requests.append(request.content.decode("utf-8").split("\n"))
+        status = self.statuses.pop(0) if self.statuses else 204
+        return httpx.Response(status, text="" if status < 300 else "error")
+
+    @property
+    def lines(self):
+        return [line for body in self.requests for line in body]
+
+
+def make_writer(stand_in, **kwargs):
+    options = dict(
+        url="http://influx.local",
+        token="token",
+        org="org",
+        bucket="bucket",
+        flush_interval=60,
+        retry_backoff=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(stand_in.handler))
+    )
+    options.update(kwargs)
+    return InfluxDBBatchWriter(**options)
+
+
+async def test_retries_on_429_and_5xx():
+    stand_in = InfluxStandIn([429, 503])
+    writer = make_writer(stand_in, batch_size=10, max_retries=3)
+
+    await writer.write("m v=1i 1")
+    await writer.close()
+
+    assert len(stand_in.requests) == 3
+    assert writer.stats["retries"] == 2
+    assert writer.stats["written"] == 1
+    assert writer.stats["failed"] == 0
+
+
+async def test_client_error_is_not_retried():
+    stand_in = InfluxStandIn([400])
+    writer = make_writer(stand_in, batch_size=10, max_retries=3)
+
+    await writer.write("m v=1i 1")
+    await writer.close()
+
+    assert len(stand_in.requests) == 1
+    assert writer.stats["failed"] == 1
+
+
+async def test_gives_up_after_max_retries():
+    stand_in = InfluxStandIn([500, 500, 500])
+    writer = make_writer(stand_in, batch_size=10, max_retries=2)
+
+    await writer.write("m v=1i 1")
+    await writer.close()
+
+    assert len(stand_in.requests) == 3
+    assert writer.stats["failed"] == 1
+    assert writer.stats["written"] == 0
+
+
+async def test_drop_overflow_discards_oldest():
+    stand_in = InfluxStandIn()
+    writer = make_writer(stand_in, batch_size=2, max_buffer=2, overflow="drop")
+
+    for i in range(3):
+        assert await writer.write(f"m v={i}i {i}")
+    await writer.close()
+
+    assert writer.stats["dropped"] == 1
+    assert stand_in.lines == ["m v=1i 1", "m v=2i 2"]
+
+
+async def test_block_overflow_waits_for_space():
+    stand_in = InfluxStandIn()
+    writer = make_writer(stand_in, batch_size=2, max_buffer=2, overflow="block")
+
+    for i in range(5):
+        await asyncio.wait_for(writer.write(f"m v={i}i {i}"), timeout=1)
+    await writer.close()
+
+    assert writer.stats["dropped"] == 0
+    assert stand_in.lines == [f"m v={i}i {i}" for i in range(5)]
+
+
+async def test_close_drains_buffer():
+    stand_in = InfluxStandIn()
+    writer = make_writer(stand_in, batch_size=100)
+
+    for i in range(5):
+        await writer.write(f"m v={i}i {i}")
+    assert stand_in.requests == []
+
+    await writer.close()
+
+    assert writer.pending == 0
+    assert len(stand_in.requests) == 1
+    assert len(stand_in.lines) == 5
+    assert not await writer.write("m v=9i 9")
+
+
+def test_line_protocol_escapes_newlines():
+    line = to_line_protocol(
+        "token usage",
+        {"model": "gpt\n4", "user id": "a,b"},
+        {"note": 'say "hi"\nbye', "tokens": 3},
+        timestamp_ns=1
+    )
+
+    assert "\n" not in line
+    assert line == 'token\\ usage,model=gpt\\n4,user\\ id=a\\,b note="say \\"hi\\"\\nbye",tokens=3i 1'
@@ -0,0 +1,128 @@
+"""
+测试消息流：默认不限队列、消费者断开释放生产者、SSE事件名和文本块合并
+"""
+
+import asyncio
+
+import pytest
+
+stream_module = pytest.importorskip("app.messaging.core.stream")
+
+from app.messaging.core.formatters import format_to_sse
+from app.messaging.core.models import MessageType, TextMessage
+
+MessageStream = stream_module.MessageStream
+ChunkMessageStream = stream_module.ChunkMessageStream
+
+
+async def test_default_stream_accepts_more_than_old_bound_before_reading():
+    """先写完再返回的调用方不能因队列上限死锁"""
+    stream = MessageStream()
+    await stream.start_stream()
+    for i in range(3000):
+        await stream.add_text(f"结果 {i}")
+    await stream.end_stream()
+
+    received = [message async for message in stream.get_message_stream()]
+    assert len(received) == 3002
+    assert received[-1].type == MessageType.DONE
+
+
+async def test_disconnected_consumer_releases_producer():
+    stream = MessageStream(max_queue_size=2)
+    sse = stream.get_sse_stream()
+
+    async def produce():
+        for i in range(10):
+            await stream.add_text(str(i))
+
+    producer = asyncio.create_task(produce())
+    await sse.__anext__()
+    # 客户端断开时StreamingResponse关闭生成器
+    await sse.aclose()
+
+    await asyncio.wait_for(producer, timeout=1)
+    assert stream.closed
+
+
+async def test_stalled_consumer_times_out_producer():
+    stream = MessageStream(max_queue_size=1, put_timeout=0.05)
+    await stream.add_text("a")
+
+    await asyncio.wait_for(stream.add_text("b"), timeout=1)
+    assert stream.closed
+    await stream.add_text("c")
+    assert stream.queue.empty()
+
+
+async def test_sse_event_uses_message_type_value():
+    frame = format_to_sse(TextMessage(content="hi"))
+    assert frame.startswith("event: text\n")
+
+    stream = ChunkMessageStream(flush_interval=0)
+    await stream.add_text_chunk("hi")
+    item = stream.queue.get_nowait()
+    assert item.frame.startswith("event: text\n")
+    assert "timestamp" in item.metadata
+    assert item.metadata["is_chunk"] is True
+
+
+async def test_chunks_are_coalesced_in_order():
+    stream = ChunkMessageStream(flush_interval=10, flush_bytes=8)
+    for chunk in ["ab", "cd", "efgh", "ij"]:
+        await stream.add_text_chunk(chunk)
+    await stream.finalize_text()
+    await stream.end_stream()
+
+    received = [message async for message in stream.get_message_stream()]
+    chunks = [m.content for m in received if m.metadata.get("is_chunk")]
+    assert chunks == ["abcdefgh", "ij"]
+    final = [m for m in received if m.metadata.get("is_final")]
+    assert final[0].content == "abcdefghij"
+
+
+async def test_pushed_chunks_are_coalesced_without_a_task_per_token():
+    stream = ChunkMessageStream(flush_interval=10, flush_bytes=8)
+    tasks_before = len(asyncio.all_tasks())
+    for chunk in ["ab", "cd", "efgh", "ij"]:
+        stream.push_text_chunk(chunk)
+    # 同步追加只创建一个发送任务
+    assert len(asyncio.all_tasks()) - tasks_before == 1
+
+    await asyncio.sleep(0)
+    await stream.finalize_text()
+    await stream.end_stream()
+
+    received = [message async for message in stream.get_message_stream()]
+    chunks = [m.content for m in received if m.metadata.get("is_chunk")]
+    assert chunks == ["abcdefghij"]
+    final = [m for m in received if m.metadata.get("is_final")]
+    assert final[0].content == "abcdefghij"
+
+
+async def test_pushed_chunks_wait_for_slow_consumer():
+    stream = ChunkMessageStream(max_queue_size=1, flush_interval=0, put_timeout=1)
+    received = []
+
+    async def consume():
+        async for message in stream.get_message_stream():
+            received.append(message)
+            await asyncio.sleep(0.001)
+
+    consumer = asyncio.create_task(consume())
+    tasks_before = len(asyncio.all_tasks())
+    max_tasks = 0
+    for i in range(100):
+        stream.push_text_chunk(str(i % 10))
+        await asyncio.sleep(0)
+        max_tasks = max(max_tasks, len(asyncio.all_tasks()) - tasks_before)
+    # 队列满时发送任务等待消费者，追加的文本留在同一个缓冲中：最多一个发送中的任务
+    # 和一个等待下一窗口的任务(各自带有wait_for的内部任务)，不随token数增长
+    assert max_tasks <= 4
+
+    await stream.finalize_text()
+    await stream.end_stream()
+    await asyncio.wait_for(consumer, timeout=2)
+    streamed = "".join(m.content for m in received if m.metadata.get("is_chunk"))
+    assert streamed == "0123456789" * 10
+    assert len([m for m in received if m.metadata.get("is_chunk")]) < 100
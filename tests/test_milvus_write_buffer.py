@@ -0,0 +1,175 @@
+"""
+测试Milvus适配器写缓冲：按步骤重试、坏行进入死信、缓冲区上限
+"""
+
+import pytest
+
+milvus_adapter = pytest.importorskip("app.utils.storage.vector_storage.milvus_adapter")
+
+from app.utils.storage.core.exceptions import VectorStoreError
+
+
+class FakeField:
+    def __init__(self, dtype, params=None):
+        self.dtype = dtype
+        self.params = params or {}
+
+
+class FakeSchema:
+    def __init__(self, dimension):
+        self.fields = [
+            FakeField(milvus_adapter.DataType.INT64),
+            FakeField(milvus_adapter.DataType.FLOAT_VECTOR, {"dim": dimension}),
+        ]
+
+
+class FakeCollection:
+    """记录插入和删除的集合，可按需让插入或删除失败"""
+
+    def __init__(self, dimension=2):
+        self.schema = FakeSchema(dimension)
+        self.rows = []
+        self.deleted = []
+        self.fail_inserts = 0
+        self.fail_deletes = 0
+        self.bad_chunk_ids = set()
+
+    def insert(self, data):
+        if self.fail_inserts:
+            self.fail_inserts -= 1
+            raise RuntimeError("insert unavailable")
+        chunk_ids, document_ids, vectors = data
+        if self.bad_chunk_ids & set(chunk_ids):
+            raise RuntimeError("invalid row")
+        self.rows.extend(zip(chunk_ids, document_ids, vectors))
+
+    def delete(self, expr):
+        if self.fail_deletes:
+            self.fail_deletes -= 1
+            raise RuntimeError("delete unavailable")
+        self.deleted.append(expr)
+
+    def flush(self):
+        pass
+
+
+class FakeUtility:
+    healthy = True
+
+    @classmethod
+    def list_collections(cls, using=None):
+        if not cls.healthy:
+            raise RuntimeError("connection lost")
+        return ["docs"]
+
+
+@pytest.fixture
+def store(monkeypatch):
+    monkeypatch.setattr(milvus_adapter, "MILVUS_AVAILABLE", True)
+    FakeUtility.healthy = True
+    monkeypatch.setattr(milvus_adapter, "utility", FakeUtility, raising=False)
+
+    store = milvus_adapter.MilvusVectorStore(config={
+        "write_buffer_size": 100,
+        "write_buffer_max": 6,
+        "write_max_retries": 2,
+    })
+    store._initialized = True
+    store._connected = True
+    store._collections["docs"] = FakeCollection()
+    return store
+
+
+def _meta(*chunk_ids):
+    return [{"chunk_id": chunk_id, "document_id": 1} for chunk_id in chunk_ids]
+
+
+async def test_delete_failure_requeues_only_deletes(store):
+    coll = store._collections["docs"]
+    await store.add_vectors("docs", [[0.1, 0.2], [0.3, 0.4]], metadata=_meta(1, 2))
+    await store.delete_vectors("docs", [7])
+    coll.fail_deletes = 1
+
+    with pytest.raises(RuntimeError):
+        await store.flush("docs")
+    assert len(coll.rows) == 2
+    assert store._pending_inserts.get("docs", []) == []
+    assert store._pending_deletes["docs"] == [7]
+
+    await store.flush("docs")
+    assert len(coll.rows) == 2
+    assert coll.deleted == ["id in [7]"]
+
+
+async def test_insert_failure_requeues_rows_and_deletes(store):
+    coll = store._collections["docs"]
+    await store.add_vectors("docs", [[0.1, 0.2]], metadata=_meta(1))
+    await store.delete_vectors("docs", [7])
+    coll.fail_inserts = 1
+
+    with pytest.raises(RuntimeError):
+        await store.flush("docs")
+    assert coll.rows == [] and coll.deleted == []
+    assert len(store._pending_inserts["docs"]) == 1
+    assert store._pending_deletes["docs"] == [7]
+
+    await store.flush("docs")
+    assert len(coll.rows) == 1
+    assert coll.deleted == ["id in [7]"]
+
+
+async def test_poison_row_moves_to_dead_letters(store):
+    coll = store._collections["docs"]
+    coll.bad_chunk_ids = {3}
+    await store.add_vectors("docs", [[0.1, 0.2]] * 4, metadata=_meta(1, 2, 3, 4))
+
+    # 第一次失败整批重试，达到重试次数后二分剔除坏行
+    with pytest.raises(RuntimeError):
+        await store.flush("docs")
+    assert coll.rows == []
+    with pytest.raises(RuntimeError):
+        await store.flush("docs")
+
+    assert sorted(row[0] for row in coll.rows) == [1, 2, 4]
+    assert store._pending_inserts.get("docs", []) == []
+    dead = store.get_dead_letters("docs")
+    assert [row[0] for row, _ in dead] == [3]
+
+
+async def test_connection_errors_are_retried_not_dead_lettered(store):
+    coll = store._collections["docs"]
+    await store.add_vectors("docs", [[0.1, 0.2]] * 2, metadata=_meta(1, 2))
+    coll.fail_inserts = 10
+    FakeUtility.healthy = False
+
+    for _ in range(3):
+        with pytest.raises(RuntimeError):
+            await store.flush("docs")
+    assert len(store._pending_inserts["docs"]) == 2
+    assert store.get_dead_letters("docs") == []
+
+
+async def test_wrong_dimension_rejected_up_front(store):
+    with pytest.raises(VectorStoreError):
+        await store.add_vectors("docs", [[0.1, 0.2, 0.3]], metadata=_meta(1))
+    assert store._pending_inserts.get("docs", []) == []
+
+
+async def test_full_buffer_forces_flush(store):
+    coll = store._collections["docs"]
+    await store.add_vectors("docs", [[0.1, 0.2]] * 5, metadata=_meta(1, 2, 3, 4, 5))
+    assert coll.rows == []
+
+    await store.add_vectors("docs", [[0.1, 0.2]] * 2, metadata=_meta(6, 7))
+    assert len(coll.rows) == 5
+    assert len(store._pending_inserts["docs"]) == 2
+
+
+async def test_full_buffer_rejects_when_flush_fails(store):
+    coll = store._collections["docs"]
+    await store.add_vectors("docs", [[0.1, 0.2]] * 5, metadata=_meta(1, 2, 3, 4, 5))
+    coll.fail_inserts = 1
+
+    with pytest.raises(VectorStoreError):
+        await store.add_vectors("docs", [[0.1, 0.2]] * 2, metadata=_meta(6, 7))
+    assert len(store._pending_inserts["docs"]) == 5
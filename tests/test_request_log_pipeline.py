@@ -0,0 +1,142 @@
+"""
+测试请求日志写后管道：分批写入、预聚合行合并、失败重试和关闭时写出
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+pipeline_module = pytest.importorskip("core.monitoring.request_log_pipeline")
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models.monitoring import RequestLog, RequestLogRollup
+
+RequestLogPipeline = pipeline_module.RequestLogPipeline
+query_request_analytics = pipeline_module.query_request_analytics
+
+BASE_TIME = datetime(2026, 1, 1, 12, 0, 5)
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    RequestLog.metadata.create_all(engine, tables=[RequestLog.__table__, RequestLogRollup.__table__])
+    return sessionmaker(bind=engine)
+
+
+class FlakySessionFactory:
+    """前failures次创建会话时抛出连接错误"""
+
+    def __init__(self, session_factory, failures):
+        self.session_factory = session_factory
+        self.failures = failures
+
+    def __call__(self):
+        if self.failures:
+            self.failures -= 1
+            raise OperationalError("INSERT", {}, Exception("deadlock detected"))
+        return self.session_factory()
+
+
+def _entry(offset_seconds=0, endpoint="/api/items/{id}", status_code=200, response_time=10.0):
+    return {
+        "timestamp": BASE_TIME + timedelta(seconds=offset_seconds),
+        "endpoint": endpoint,
+        "method": "GET",
+        "user_id": None,
+        "status_code": status_code,
+        "response_time": response_time,
+        "request_data": None,
+        "response_data": None
+    }
+
+
+def _make_pipeline(session_factory, **kwargs):
+    options = dict(session_factory=session_factory, batch_size=2, flush_interval=60, retry_backoff=0)
+    options.update(kwargs)
+    return RequestLogPipeline(**options)
+
+
+async def test_flush_writes_in_batches(session_factory):
+    pipeline = _make_pipeline(session_factory)
+    for i in range(5):
+        pipeline.enqueue(_entry(i))
+
+    assert await pipeline.flush()
+    await pipeline.close()
+
+    db = session_factory()
+    assert db.query(RequestLog).count() == 5
+    assert pipeline.stats["batches"] == 3
+    assert pipeline.stats["written"] == 5
+
+
+async def test_rollups_are_merged_across_batches(session_factory):
+    pipeline = _make_pipeline(session_factory)
+    pipeline.enqueue(_entry(0, response_time=10.0))
+    pipeline.enqueue(_entry(10, response_time=30.0, status_code=500))
+    await pipeline.flush()
+    pipeline.enqueue(_entry(20, response_time=20.0))
+    await pipeline.close()
+
+    db = session_factory()
+    minute = db.query(RequestLogRollup).filter(RequestLogRollup.granularity == "minute").all()
+    hour = db.query(RequestLogRollup).filter(RequestLogRollup.granularity == "hour").all()
+    assert len(minute) == 1 and len(hour) == 1
+    assert minute[0].request_count == 3
+    assert minute[0].error_count == 1
+    assert minute[0].max_response_time == 30.0
+    assert minute[0].bucket_start == datetime(2026, 1, 1, 12, 0)
+
+    stats = query_request_analytics(db, BASE_TIME, BASE_TIME + timedelta(minutes=1))
+    endpoint = stats["endpoint_stats"]["/api/items/{id}"]
+    assert stats["total_requests"] == 3
+    assert endpoint["avg_response_time"] == pytest.approx(20.0)
+    assert endpoint["p50_response_time"] == pytest.approx(20.0, rel=0.02)
+
+
+async def test_failed_batch_is_retried(session_factory):
+    pipeline = _make_pipeline(FlakySessionFactory(session_factory, failures=2), max_retries=3)
+    pipeline.enqueue(_entry(0))
+    pipeline.enqueue(_entry(1))
+
+    assert not await pipeline.flush()
+    assert pipeline.pending == 2
+    await pipeline.close()
+
+    assert session_factory().query(RequestLog).count() == 2
+    assert pipeline.stats["retries"] == 2
+    assert pipeline.stats["failed"] == 0
+
+
+async def test_batch_dropped_after_max_retries(session_factory):
+    pipeline = _make_pipeline(FlakySessionFactory(session_factory, failures=10), max_retries=1)
+    for i in range(4):
+        pipeline.enqueue(_entry(i))
+
+    await pipeline.close()
+
+    assert pipeline.pending == 0
+    assert pipeline.stats["failed"] == 4
+    assert pipeline.stats["written"] == 0
+
+
+async def test_close_drains_pending_entries(session_factory):
+    pipeline = _make_pipeline(session_factory, batch_size=100)
+    for i in range(7):
+        pipeline.enqueue(_entry(i))
+    assert session_factory().query(RequestLog).count() == 0
+
+    await pipeline.close()
+
+    assert pipeline.pending == 0
+    assert session_factory().query(RequestLog).count() == 7
@@ -0,0 +1,61 @@
+"""
+测试工具目录缓存：通过Redis代数跨进程失效，以及在事件循环中不同步调用Redis
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+tool_catalog = pytest.importorskip("core.mcp_service.tool_catalog")
+
+ToolCatalogCache = tool_catalog.ToolCatalogCache
+
+
+class RecordingRedis:
+    """内存中的Redis替身，记录每次调用所在的线程"""
+
+    def __init__(self):
+        self.data = {}
+        self.threads = []
+
+    def incr(self, key):
+        self.threads.append(threading.current_thread())
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def get(self, key):
+        self.threads.append(threading.current_thread())
+        value = self.data.get(key)
+        return None if value is None else str(value)
+
+
+def test_invalidation_reaches_other_processes():
+    redis = RecordingRedis()
+    first = ToolCatalogCache(redis_client=redis, sync_interval=0)
+    second = ToolCatalogCache(redis_client=redis, sync_interval=0)
+
+    second.set_value("deploy-1", "tools", ["search"])
+    assert second.get_value("deploy-1", "tools") == ["search"]
+
+    first.invalidate("deploy-1")
+    assert second.get_value("deploy-1", "tools") is None
+
+
+async def test_lookups_on_the_event_loop_do_not_call_redis_inline():
+    redis = RecordingRedis()
+    first = ToolCatalogCache(redis_client=redis, sync_interval=0)
+    second = ToolCatalogCache(redis_client=redis, sync_interval=0)
+    second.put_entry("deploy-1", "search", schema=None)
+
+    first.invalidate("deploy-1")
+    # 比对在后台线程完成，之后的查询才看到其他进程的失效
+    for _ in range(50):
+        if second.get_entry("deploy-1", "search") is None:
+            break
+        await asyncio.sleep(0.01)
+    else:
+        pytest.fail("其他进程的失效没有生效")
+
+    assert redis.threads
+    assert threading.main_thread() not in redis.threads
@@ -0,0 +1,86 @@
+"""
+测试工具执行运行时：同步工具超时后保留并发名额直到线程结束，以及信号量按事件循环隔离
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+runtime_module = pytest.importorskip("core.tool_orchestrator.runtime")
+metrics_module = pytest.importorskip("app.utils.monitoring.core.metrics")
+
+ToolPolicy = runtime_module.ToolPolicy
+ToolRuntime = runtime_module.ToolRuntime
+
+
+class HangingTool:
+    """在release被设置前一直阻塞的同步工具"""
+
+    name = "hanging"
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.started = 0
+
+    def run(self, **params):
+        self.started += 1
+        self.release.wait(5)
+        return "done"
+
+
+def _runtime(**policy):
+    runtime = ToolRuntime(max_workers=4, metrics=metrics_module.MetricsCollector())
+    runtime.set_policy("hanging", ToolPolicy(**policy))
+    return runtime
+
+
+async def test_timed_out_sync_tool_keeps_its_slot():
+    runtime = _runtime(max_concurrency=1, timeout=0.05)
+    tool = HangingTool()
+    try:
+        with pytest.raises(asyncio.TimeoutError):
+            await runtime.run(tool, {})
+
+        # 线程仍在执行，第二次调用只能排队，不会再占用一个线程
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(runtime.run(tool, {}), timeout=0.1)
+        assert tool.started == 1
+        assert runtime._get_semaphore("hanging", runtime.get_policy("hanging")).locked()
+
+        tool.release.set()
+        await asyncio.sleep(0.05)
+        assert await runtime.run(tool, {}) == "done"
+        assert tool.started == 2
+    finally:
+        tool.release.set()
+        runtime.shutdown()
+
+
+async def test_finished_sync_tool_releases_slot_immediately():
+    runtime = _runtime(max_concurrency=1, timeout=1)
+    tool = HangingTool()
+    tool.release.set()
+    try:
+        for _ in range(3):
+            assert await runtime.run(tool, {}) == "done"
+        assert not runtime._get_semaphore("hanging", runtime.get_policy("hanging")).locked()
+    finally:
+        runtime.shutdown()
+
+
+def test_semaphores_are_created_per_event_loop():
+    runtime = _runtime(max_concurrency=1)
+    tool = HangingTool()
+    tool.release.set()
+
+    async def run_once():
+        assert await runtime.run(tool, {}) == "done"
+        return runtime._get_semaphore("hanging", runtime.get_policy("hanging"))
+
+    try:
+        first = asyncio.run(run_once())
+        second = asyncio.run(run_once())
+        assert first is not second
+    finally:
+        runtime.shutdown()
@@ -0,0 +1,257 @@
+"""
+测试向量存储重建：按内容指纹跳过未变化的文档、批次大小限制、从检查点继续扫描，
+以及批次重建只在向量写入成功后记录索引状态
+"""
+
+import hashlib
+
+import pytest
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+vector_rebuild = pytest.importorskip("core.knowledge.vector_rebuild")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.models.knowledge import Document, DocumentChunk, DocumentIndexState, KnowledgeBase, VectorRebuildRun
+
+DocumentBatchRebuilder = vector_rebuild.DocumentBatchRebuilder
+VectorRebuildOrchestrator = vector_rebuild.VectorRebuildOrchestrator
+record_batch_result = vector_rebuild.record_batch_result
+
+TABLES = [KnowledgeBase, Document, DocumentChunk, DocumentIndexState, VectorRebuildRun]
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+
+    # SQLite没有md5函数，注册一个与PostgreSQL结果一致的实现
+    @event.listens_for(engine, "connect")
+    def _register_md5(connection, record):
+        connection.create_function(
+            "md5", 1,
+            lambda value: None if value is None else hashlib.md5(value.encode("utf-8")).hexdigest()
+        )
+
+    KnowledgeBase.metadata.create_all(engine, tables=[model.__table__ for model in TABLES])
+    return sessionmaker(bind=engine)
+
+
+def _add_documents(session_factory, contents, embedding_model="embed-v1"):
+    db = session_factory()
+    kb = KnowledgeBase(name="kb", embedding_model=embedding_model)
+    db.add(kb)
+    db.flush()
+    documents = [Document(knowledge_base_id=kb.id, title=f"doc{i}", content=content)
+                 for i, content in enumerate(contents)]
+    db.add_all(documents)
+    db.commit()
+    ids = [document.id for document in documents]
+    db.close()
+    return ids
+
+
+class RecordingDispatcher:
+    """记录派发的批次，fail_after批之后抛出异常模拟派发中断"""
+
+    def __init__(self, fail_after=None):
+        self.batches = []
+        self.fail_after = fail_after
+
+    def __call__(self, run_id, documents):
+        if self.fail_after is not None and len(self.batches) >= self.fail_after:
+            raise ConnectionError("broker went away")
+        self.batches.append((run_id, documents))
+
+    @property
+    def document_ids(self):
+        return [document[0] for _, documents in self.batches for document in documents]
+
+
+def _orchestrator(session_factory, dispatch, **kwargs):
+    options = dict(max_batch_documents=100, max_batch_bytes=1024 * 1024, page_size=2)
+    options.update(kwargs)
+    return VectorRebuildOrchestrator(session_factory, dispatch, **options)
+
+
+def _complete(session_factory, dispatch):
+    db = session_factory()
+    for run_id, documents in dispatch.batches:
+        record_batch_result(db, run_id, [tuple(document) for document in documents], 0)
+    db.close()
+
+
+def test_unchanged_documents_are_skipped_by_fingerprint(session_factory):
+    ids = _add_documents(session_factory, ["alpha", "beta", "gamma"])
+    first = RecordingDispatcher()
+    summary = _orchestrator(session_factory, first).run()
+    assert first.document_ids == ids
+    assert summary["skipped_documents"] == 0
+    _complete(session_factory, first)
+
+    db = session_factory()
+    db.query(Document).filter(Document.id == ids[1]).update({Document.content: "beta v2"})
+    db.commit()
+    db.close()
+
+    second = RecordingDispatcher()
+    summary = _orchestrator(session_factory, second).run()
+    assert second.document_ids == [ids[1]]
+    assert summary["skipped_documents"] == 2
+
+    forced = RecordingDispatcher()
+    _orchestrator(session_factory, forced, force=True).run()
+    assert forced.document_ids == ids
+
+
+def test_changed_embedding_model_is_rebuilt(session_factory):
+    ids = _add_documents(session_factory, ["alpha", "beta"])
+    first = RecordingDispatcher()
+    _orchestrator(session_factory, first).run()
+    _complete(session_factory, first)
+
+    db = session_factory()
+    db.query(KnowledgeBase).update({KnowledgeBase.embedding_model: "embed-v2"})
+    db.commit()
+    db.close()
+
+    second = RecordingDispatcher()
+    _orchestrator(session_factory, second).run()
+    assert second.document_ids == ids
+    assert {document[2] for _, documents in second.batches for document in documents} == {"embed-v2"}
+
+
+def test_batches_respect_document_and_byte_limits(session_factory):
+    _add_documents(session_factory, ["x" * 10] * 5)
+
+    by_count = RecordingDispatcher()
+    summary = _orchestrator(session_factory, by_count, max_batch_documents=2).run()
+    assert [len(documents) for _, documents in by_count.batches] == [2, 2, 1]
+    assert summary["dispatched_batches"] == 3
+
+    by_bytes = RecordingDispatcher()
+    _orchestrator(session_factory, by_bytes, force=True, max_batch_bytes=25).run()
+    # 第3个文档使批次达到30字节后立即派发
+    assert [len(documents) for _, documents in by_bytes.batches] == [3, 2]
+
+
+def test_interrupted_scan_resumes_from_checkpoint(session_factory):
+    ids = _add_documents(session_factory, [f"doc {i}" for i in range(5)])
+
+    flaky = RecordingDispatcher(fail_after=1)
+    with pytest.raises(ConnectionError):
+        _orchestrator(session_factory, flaky, max_batch_documents=2).run()
+    assert flaky.document_ids == ids[:2]
+
+    db = session_factory()
+    run = db.query(VectorRebuildRun).one()
+    assert run.status == "running"
+    assert run.last_document_id == ids[1]
+    db.close()
+
+    resumed = RecordingDispatcher()
+    summary = _orchestrator(session_factory, resumed, max_batch_documents=2).run()
+    assert resumed.document_ids == ids[2:]
+    assert summary["run_id"] == run.id
+    assert summary["dispatched_batches"] == 3
+    assert summary["status"] == "dispatched"
+
+    _complete(session_factory, flaky)
+    _complete(session_factory, resumed)
+    db = session_factory()
+    assert db.query(VectorRebuildRun).one().status == "completed"
+
+
+class FakeVectorStore:
+    """按文档保存向量的存储替身，fail_for中的文档写入时抛出异常"""
+
+    def __init__(self, fail_for=()):
+        self.vectors = {}
+        self.fail_for = set(fail_for)
+
+    def __call__(self, document_id, chunk_ids, vectors):
+        if document_id in self.fail_for:
+            raise ConnectionError("milvus went away")
+        self.vectors[document_id] = dict(zip(chunk_ids, vectors))
+
+
+async def _embed(text, model_name=None):
+    return [float(len(text)), 1.0]
+
+
+async def _chunk(content, mime_type, chunk_size, chunk_overlap):
+    return [(part, {"type": "paragraph"}) for part in content.split("\n\n")]
+
+
+async def _extract(file_path, mime_type):
+    return None
+
+
+def _rebuilder(db, store, embed=_embed):
+    return DocumentBatchRebuilder(db, embed=embed, write_vectors=store, chunk=_chunk, extract=_extract)
+
+
+async def test_batch_rebuild_replaces_vectors_and_records_state(session_factory):
+    ids = _add_documents(session_factory, ["one\n\ntwo", "three"])
+    dispatch = RecordingDispatcher()
+    summary = _orchestrator(session_factory, dispatch).run()
+    run_id, documents = dispatch.batches[0]
+    store = FakeVectorStore()
+
+    db = session_factory()
+    for _ in range(2):
+        indexed = await _rebuilder(db, store).rebuild(documents)
+        assert [item[0] for item in indexed] == ids
+
+    chunks = db.query(DocumentChunk).filter(DocumentChunk.document_id == ids[0]).all()
+    assert [chunk.content for chunk in chunks] == ["one", "two"]
+    assert set(store.vectors[ids[0]]) == {chunk.id for chunk in chunks}
+    assert db.query(DocumentIndexState).count() == 0
+
+    record_batch_result(db, run_id, indexed, len(documents) - len(indexed))
+    assert db.query(DocumentIndexState).count() == 2
+    run = db.query(VectorRebuildRun).filter(VectorRebuildRun.id == summary["run_id"]).one()
+    assert run.status == "completed"
+    assert run.indexed_documents == 2
+
+
+async def test_failed_vector_write_is_not_indexed(session_factory):
+    ids = _add_documents(session_factory, ["one", "two"])
+    dispatch = RecordingDispatcher()
+    _orchestrator(session_factory, dispatch).run()
+    run_id, documents = dispatch.batches[0]
+
+    db = session_factory()
+    indexed = await _rebuilder(db, FakeVectorStore(fail_for=[ids[0]])).rebuild(documents)
+    assert [item[0] for item in indexed] == [ids[1]]
+    assert db.query(DocumentChunk).filter(DocumentChunk.document_id == ids[0]).count() == 0
+
+    record_batch_result(db, run_id, indexed, len(documents) - len(indexed))
+    assert [state.document_id for state in db.query(DocumentIndexState).all()] == [ids[1]]
+    run = db.query(VectorRebuildRun).one()
+    assert run.failed_documents == 1
+    assert run.status == "completed"
+
+    # 失败的文档在下次重建时重新派发
+    retry = RecordingDispatcher()
+    _orchestrator(session_factory, retry).run()
+    assert retry.document_ids == [ids[0]]
+
+
+async def test_zero_embedding_fails_the_document(session_factory):
+    ids = _add_documents(session_factory, ["one"])
+    store = FakeVectorStore()
+
+    async def broken_embed(text, model_name=None):
+        return [0.0, 0.0]
+
+    db = session_factory()
+    indexed = await _rebuilder(db, store, embed=broken_embed).rebuild([[ids[0], "fp", "embed-v1"]])
+    assert indexed == []
+    assert store.vectors == {}
@@ -0,0 +1,195 @@
+"""
+测试向量集合快照：使用迁移系统的MockVectorStore验证导出导入往返、结构记录、中断续传和不覆盖已完成快照
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+sys.path.insert(0, str(MIGRATIONS_DIR))
+
+vector_snapshot = pytest.importorskip("vector_snapshot")
+storage = pytest.importorskip("vector_storage_interface")
+
+MockVectorStore = storage.MockVectorStore
+SnapshotError = vector_snapshot.SnapshotError
+SnapshotExporter = vector_snapshot.SnapshotExporter
+SnapshotImporter = vector_snapshot.SnapshotImporter
+load_manifest = vector_snapshot.load_manifest
+latest_snapshot_dir = vector_snapshot.latest_snapshot_dir
+next_snapshot_dir = vector_snapshot.next_snapshot_dir
+
+COLLECTION_CONFIG = {
+    "name": "docs",
+    "description": "文档向量",
+    "fields": [
+        {"name": "id", "type": "INT64", "is_primary": True},
+        {"name": "embedding", "type": "FLOAT_VECTOR", "dimension": 4},
+        {"name": "title", "type": "VARCHAR", "max_length": 256}
+    ]
+}
+
+
+def _row(i):
+    metadata = {"title": f"文档{i}"}
+    if i % 2:
+        metadata["page"] = i
+    return {"id": i, "vector": [float(i), 0.5, -1.0, i / 4], "metadata": metadata}
+
+
+async def _make_source(rows=25):
+    store = MockVectorStore()
+    await store.create_collection("docs", COLLECTION_CONFIG)
+    await store.write_batch("docs", [_row(i) for i in range(1, rows + 1)])
+    return store
+
+
+class FailingReadStore(MockVectorStore):
+    """读取fail_after页后抛出连接错误"""
+
+    def __init__(self, source, fail_after):
+        super().__init__()
+        self.collections = source.collections
+        self.configs = source.configs
+        self.rows = source.rows
+        self.fail_after = fail_after
+        self.reads = []
+
+    async def read_batch(self, collection_name, after_id, limit):
+        self.reads.append(after_id)
+        if len(self.reads) > self.fail_after:
+            raise ConnectionError("source went away")
+        return await super().read_batch(collection_name, after_id, limit)
+
+
+class FailingWriteStore(MockVectorStore):
+    """第fail_on次写入时抛出异常"""
+
+    def __init__(self, fail_on):
+        super().__init__()
+        self.fail_on = fail_on
+        self.writes = 0
+
+    async def write_batch(self, collection_name, rows):
+        self.writes += 1
+        if self.writes == self.fail_on:
+            raise ConnectionError("target went away")
+        return await super().write_batch(collection_name, rows)
+
+
+async def test_round_trip_restores_rows_and_schema(tmp_path):
+    source = await _make_source()
+    snapshot_dir = tmp_path / "docs"
+
+    summary = await SnapshotExporter(source, "docs", snapshot_dir, block_size=10, concurrency=2).run()
+    assert summary["total_rows"] == 25
+    assert summary["blocks"] == 3
+
+    manifest = load_manifest(snapshot_dir)
+    assert manifest["collection_config"] == COLLECTION_CONFIG
+    assert manifest["dimension"] == 4
+
+    target = MockVectorStore()
+    await target.create_collection("docs", manifest["collection_config"])
+    result = await SnapshotImporter(target, snapshot_dir, batch_size=4, concurrency=2).run()
+
+    assert result["imported_rows"] == 25
+    assert target.configs["docs"] == COLLECTION_CONFIG
+    assert target.rows["docs"] == source.rows["docs"]
+
+
+async def test_export_resumes_after_interrupt(tmp_path):
+    source = await _make_source()
+    snapshot_dir = tmp_path / "docs"
+
+    flaky = FailingReadStore(source, fail_after=2)
+    with pytest.raises(ConnectionError):
+        await SnapshotExporter(flaky, "docs", snapshot_dir, block_size=10, concurrency=1).run()
+    assert not load_manifest(snapshot_dir)["completed"]
+    assert len(load_manifest(snapshot_dir)["blocks"]) == 2
+
+    resumed = FailingReadStore(source, fail_after=100)
+    summary = await SnapshotExporter(resumed, "docs", snapshot_dir, block_size=10, concurrency=1).run()
+
+    # 续传从第2块的最后一个主键之后开始读取
+    assert resumed.reads[0] == 20
+    assert summary["resumed_blocks"] == 2
+    assert summary["total_rows"] == 25
+
+
+async def test_import_resumes_after_interrupt(tmp_path):
+    source = await _make_source()
+    snapshot_dir = tmp_path / "docs"
+    await SnapshotExporter(source, "docs", snapshot_dir, block_size=10, concurrency=1).run()
+
+    target = FailingWriteStore(fail_on=2)
+    with pytest.raises(ConnectionError):
+        await SnapshotImporter(target, snapshot_dir, batch_size=10, concurrency=1).run()
+
+    result = await SnapshotImporter(target, snapshot_dir, batch_size=10, concurrency=1).run()
+
+    assert result["skipped_blocks"] == 1
+    assert result["imported_blocks"] == 2
+    assert target.rows["docs"] == source.rows["docs"]
+
+
+async def test_completed_snapshot_is_not_overwritten(tmp_path):
+    source = await _make_source()
+    snapshot_dir = tmp_path / "docs"
+    await SnapshotExporter(source, "docs", snapshot_dir, block_size=10).run()
+    before = load_manifest(snapshot_dir)
+
+    with pytest.raises(SnapshotError):
+        await SnapshotExporter(source, "docs", snapshot_dir, block_size=10).run()
+
+    assert load_manifest(snapshot_dir) == before
+
+
+async def test_backups_are_versioned_per_collection(tmp_path):
+    source = await _make_source(rows=5)
+    root = tmp_path / "docs_milvus"
+    assert latest_snapshot_dir(root) is None
+
+    first = next_snapshot_dir(root)
+    await SnapshotExporter(source, "docs", first, block_size=10).run()
+    await source.write_batch("docs", [_row(6)])
+    second = next_snapshot_dir(root)
+    assert second != first
+    await SnapshotExporter(source, "docs", second, block_size=10).run()
+
+    assert latest_snapshot_dir(root) == second
+    assert load_manifest(first)["total_rows"] == 5
+    assert load_manifest(second)["total_rows"] == 6
+
+
+async def test_interrupted_backup_directory_is_reused(tmp_path):
+    source = await _make_source()
+    root = tmp_path / "docs_milvus"
+
+    first = next_snapshot_dir(root)
+    with pytest.raises(ConnectionError):
+        await SnapshotExporter(FailingReadStore(source, fail_after=1), "docs", first, block_size=10).run()
+
+    assert next_snapshot_dir(root) == first
+    assert latest_snapshot_dir(root) is None
+
+
+async def test_completed_restore_can_run_again(tmp_path):
+    source = await _make_source(rows=10)
+    snapshot_dir = tmp_path / "docs"
+    await SnapshotExporter(source, "docs", snapshot_dir, block_size=4).run()
+
+    first = MockVectorStore()
+    await first.create_collection("docs", COLLECTION_CONFIG)
+    await SnapshotImporter(first, snapshot_dir).run()
+
+    # 同名集合被删除重建后再次恢复，不能因为上一次的进度而跳过
+    second = MockVectorStore()
+    await second.create_collection("docs", COLLECTION_CONFIG)
+    result = await SnapshotImporter(second, snapshot_dir).run()
+
+    assert result["imported_rows"] == 10
+    assert result["skipped_blocks"] == 0
+    assert second.rows["docs"] == source.rows["docs"]
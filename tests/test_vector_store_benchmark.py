@@ -0,0 +1,120 @@
+"""
+测试内存向量存储适配器：各相似度度量的排序、元数据过滤和批量检索，以及基准测试的召回率计算
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+memory_adapter = pytest.importorskip("app.utils.storage.vector_storage.memory_adapter")
+benchmark = pytest.importorskip("app.utils.storage.vector_storage.benchmark")
+
+InMemoryVectorStore = memory_adapter.InMemoryVectorStore
+VectorStoreError = memory_adapter.VectorStoreError
+
+VECTORS = [[1.0, 0.0], [0.6, 0.8], [3.0, 1.0]]
+METADATA = [
+    {"chunk_id": 0, "document_id": 1, "metadata": {"lang": "zh"}},
+    {"chunk_id": 1, "document_id": 1, "metadata": {"lang": "en"}},
+    {"chunk_id": 2, "document_id": 2, "metadata": {"lang": "zh"}},
+]
+
+
+async def _store(metric_type="COSINE"):
+    store = InMemoryVectorStore()
+    await store.create_collection("docs", 2, metric_type=metric_type)
+    await store.add_vectors("docs", VECTORS, ["a", "b", "c"], METADATA)
+    return store
+
+
+@pytest.mark.parametrize("metric_type, expected_ids, expected_top_score", [
+    ("COSINE", ["a", "c", "b"], 1.0),
+    ("IP", ["c", "a", "b"], 3.0),
+    # L2返回负的平方距离
+    ("L2", ["a", "b", "c"], 0.0),
+])
+async def test_search_orders_by_metric(metric_type, expected_ids, expected_top_score):
+    store = await _store(metric_type)
+    hits = await store.search_vectors("docs", [1.0, 0.0], top_k=3)
+
+    assert [hit["id"] for hit in hits] == expected_ids
+    assert hits[0]["score"] == pytest.approx(expected_top_score)
+    assert [hit["chunk_id"] for hit in hits] == ["abc".index(vector_id) for vector_id in expected_ids]
+
+
+async def test_filters_match_top_level_and_nested_metadata():
+    store = await _store()
+
+    by_document = await store.search_vectors("docs", [1.0, 0.0], top_k=3, filters={"document_id": 1})
+    assert [hit["id"] for hit in by_document] == ["a", "b"]
+
+    by_nested = await store.search_vectors("docs", [1.0, 0.0], top_k=3, filters={"lang": "zh"})
+    assert [hit["id"] for hit in by_nested] == ["a", "c"]
+
+    # 列表表示取值之一，过滤后不足top_k时只返回匹配项
+    by_list = await store.search_vectors("docs", [1.0, 0.0], top_k=3, filters={"document_id": [2, 3]})
+    assert [hit["id"] for hit in by_list] == ["c"]
+
+    assert await store.search_vectors("docs", [1.0, 0.0], filters={"lang": "fr"}) == []
+
+
+async def test_search_many_matches_single_queries():
+    store = await _store()
+    queries = [[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]]
+
+    batched = await store.search_many("docs", queries, top_k=2)
+
+    assert len(batched) == len(queries)
+    for query, hits in zip(queries, batched):
+        assert hits == await store.search_vectors("docs", query, top_k=2)
+    assert await store.search_many("docs", [], top_k=2) == []
+
+
+async def test_upsert_delete_and_stats():
+    store = await _store()
+    await store.add_vectors("docs", [[0.0, 1.0]], ["a"], [{"chunk_id": 9}])
+    await store.delete_vectors("docs", ["b"])
+
+    hits = await store.search_vectors("docs", [0.0, 1.0], top_k=3)
+    assert [hit["id"] for hit in hits] == ["a", "c"]
+    assert hits[0]["chunk_id"] == 9
+
+    stats = await store.get_collection_stats("docs")
+    assert stats["total_vectors"] == 2
+    assert stats["memory_bytes"] > 0
+
+    with pytest.raises(VectorStoreError):
+        await store.add_vectors("docs", [[1.0, 0.0, 0.0]])
+
+
+class DroppingStore(InMemoryVectorStore):
+    """每次检索只返回精确结果中的偶数名次，召回率为一半"""
+
+    async def search_vectors(self, collection, query_vector, top_k=10, filters=None):
+        hits = await super().search_vectors(collection, query_vector, top_k, filters)
+        return hits[::2]
+
+
+async def test_recall_against_exact_baseline():
+    corpus = benchmark.generate_corpus(num_vectors=200, dimension=8, num_queries=10)
+    runner = benchmark.VectorStoreBenchmark(corpus, top_k=4, batch_size=64)
+
+    exact = await runner.run_backend("memory", InMemoryVectorStore())
+    assert exact.error is None
+    assert exact.recall_at_k == pytest.approx(1.0)
+    assert exact.memory_bytes > 0
+    assert exact.rss_delta_bytes >= 0
+
+    dropping = await runner.run_backend("dropping", DroppingStore())
+    assert dropping.recall_at_k == pytest.approx(0.5)
+
+
+def test_current_rss_is_not_the_peak():
+    before = benchmark._current_rss_bytes()
+    block = np.ones(64 * 1024 * 1024, dtype=np.uint8)
+    during = benchmark._current_rss_bytes()
+    del block
+    after = benchmark._current_rss_bytes()
+
+    assert during - before >= 32 * 1024 * 1024
+    # 峰值只增不减，当前常驻内存在释放后回落
+    assert after < during
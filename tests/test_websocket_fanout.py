@@ -0,0 +1,172 @@
+"""
+测试WebSocket扇出：进程内总线的突发发布、投递统计、总线故障时本地投递和Redis监听重连
+"""
+
+import asyncio
+
+import pytest
+
+fanout = pytest.importorskip("app.messaging.core.fanout")
+
+FanoutHub = fanout.FanoutHub
+InProcessPubSubBus = fanout.InProcessPubSubBus
+RedisPubSubBus = fanout.RedisPubSubBus
+encode_frame = fanout.encode_frame
+
+
+class FakeWebSocket:
+    """记录已发送帧的WebSocket替身，block为True时发送一直挂起"""
+
+    def __init__(self, block=False):
+        self.block = block
+        self.sent = []
+        self.closed = None
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame):
+        if self.block:
+            await asyncio.Event().wait()
+        self.sent.append(frame)
+
+    async def close(self, code=1000):
+        self.closed = code
+
+
+class FailingBus(InProcessPubSubBus):
+    """订阅正常但发布总是失败的总线"""
+
+    async def publish(self, channel, data):
+        raise ConnectionError("bus down")
+
+
+async def _settle(hub, rounds=50):
+    for _ in range(rounds):
+        if all(c.queue.empty() for conns in hub.connections.values() for c in conns.values()):
+            break
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+
+async def test_burst_broadcast_is_not_dropped():
+    hub = FanoutHub(queue_size=4)
+    sockets = [FakeWebSocket() for _ in range(3)]
+    for i, websocket in enumerate(sockets):
+        await hub.connect(websocket, user_id=i)
+
+    for i in range(200):
+        await hub.broadcast({"n": i})
+    await _settle(hub)
+
+    for websocket in sockets:
+        assert websocket.sent == [encode_frame({"n": i}) for i in range(200)]
+    assert hub.stats["dropped"] == 0
+    assert hub.stats["delivered"] == 600
+    await hub.close()
+
+
+async def test_slow_connection_counts_dropped_not_delivered():
+    hub = FanoutHub(queue_size=2)
+    slow = FakeWebSocket(block=True)
+    await hub.connect(slow, user_id="u1")
+
+    for i in range(5):
+        await hub.send_to_user("u1", f"m{i}")
+    await asyncio.sleep(0)
+
+    # 第一帧卡在发送中，其余4帧进入容量为2的队列，丢弃最旧的2帧
+    assert hub.stats["dropped"] == 2
+    assert hub.stats["delivered"] == 0
+    await hub.close()
+
+
+async def test_send_to_user_only_reaches_that_user():
+    hub = FanoutHub()
+    alice, bob = FakeWebSocket(), FakeWebSocket()
+    await hub.connect(alice, user_id=1)
+    await hub.connect(bob, user_id=2)
+
+    await hub.send_to_user(1, "hello")
+    await _settle(hub)
+
+    assert alice.sent == ["hello"]
+    assert bob.sent == []
+    await hub.close()
+
+
+async def test_bus_failure_falls_back_to_local_delivery():
+    hub = FanoutHub(bus=FailingBus())
+    websocket = FakeWebSocket()
+    await hub.connect(websocket, user_id=1)
+
+    await hub.broadcast("still here")
+    await _settle(hub)
+
+    assert websocket.sent == ["still here"]
+    assert hub.stats["bus_errors"] == 1
+    await hub.close()
+
+
+def test_encode_frame_accepts_non_str_keys():
+    frame = encode_frame({1: "a", "b": {2: 3}})
+    assert frame.replace(" ", "") == '{"1":"a","b":{"2":3}}'
+
+
+class FakePubSub:
+    def __init__(self, client):
+        self.client = client
+        self.channels = []
+        self.closed = False
+
+    async def subscribe(self, *channels):
+        self.channels.extend(channels)
+
+    async def listen(self):
+        script = self.client.scripts.pop(0) if self.client.scripts else []
+        for item in script:
+            if isinstance(item, Exception):
+                raise item
+            yield item
+        await asyncio.Event().wait()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeRedis:
+    """每个订阅连接按顺序播放一段脚本：消息或异常"""
+
+    def __init__(self, scripts):
+        self.scripts = scripts
+        self.pubsubs = []
+
+    def pubsub(self, ignore_subscribe_messages=True):
+        pubsub = FakePubSub(self)
+        self.pubsubs.append(pubsub)
+        return pubsub
+
+
+async def test_redis_listener_reconnects_after_error():
+    client = FakeRedis([
+        [{"type": "message", "channel": b"c", "data": b"one"}, ConnectionError("reset")],
+        [{"type": "message", "channel": b"c", "data": b"two"}]
+    ])
+    bus = RedisPubSubBus(reconnect_backoff=0)
+    bus._client = client
+    received = []
+
+    async def handler(data):
+        received.append(data)
+
+    await bus.subscribe("c", handler)
+    for _ in range(50):
+        if len(received) == 2:
+            break
+        await asyncio.sleep(0)
+
+    assert received == ["one", "two"]
+    assert len(client.pubsubs) == 2
+    assert client.pubsubs[0].closed
+    assert client.pubsubs[1].channels == ["c"]
+    await bus.close()